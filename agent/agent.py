@@ -28,6 +28,8 @@ from livekit.agents import (
 )
 from livekit.plugins import openai, deepgram, silero
 
+from booking_outbox import BookingOutbox, HttpSender, start_background_drainer
+
 # -----------------------------------------------------
 # Load environment variables
 # -----------------------------------------------------
@@ -77,6 +79,15 @@ class VoiceAssistant:
     def __init__(self):
         logger.info("🤖 Voice Assistant initialized with OpenAI Realtime API")
         self.backend_url = self._resolve_backend_url()
+        # Built on first use inside the job process: the instance is pickled into every job
+        self._booking_outbox: Optional[BookingOutbox] = None
+
+    @property
+    def booking_outbox(self) -> BookingOutbox:
+        """Confirmed bookings are persisted here first and delivered to the backend from it"""
+        if self._booking_outbox is None:
+            self._booking_outbox = BookingOutbox(send=HttpSender(self.backend_url))
+        return self._booking_outbox
 
     def _resolve_backend_url(self) -> str:
         """Determine backend base URL for storing transcripts."""
@@ -224,8 +235,8 @@ class VoiceAssistant:
         except Exception as error:
             logger.warning(f"⚠️ Unable to send transcript to backend: {error}")
 
-    async def _create_flight_booking(self, booking_data: Dict[str, Any]) -> Dict[str, Any]:
-        """Create flight booking via backend API with instant dummy confirmation"""
+    async def _create_flight_booking(self, booking_data: Dict[str, Any], room_name: str = "") -> Dict[str, Any]:
+        """Create flight booking with instant confirmation, delivered to the backend via the durable outbox"""
         import uuid
         from datetime import datetime
         
@@ -260,46 +271,42 @@ class VoiceAssistant:
             "message": "✅ Your ticket has been successfully reserved! Confirmation details will be sent to your email shortly."
         }
         
+        # Prepare backend booking data with correct field mapping
+        backend_booking_data = {
+            "customer_email": customer_email,
+            "departure_location": departure_location,
+            "destination": destination,
+            "flight_name": booking_data.get("flight_name", "Air India"),
+            "departure_time": booking_data.get("departure_time", "08:30 AM"),
+            "departure_date": booking_data.get("departure_date", ""),
+            "return_date": booking_data.get("return_date"),
+            "num_travelers": booking_data.get("num_travelers", 1),
+            "service_details": booking_data.get("service_details", "Economy"),
+            "seat_preference": booking_data.get("seat_preference", "No preference"),
+            "meal_preference": booking_data.get("meal_preference", "No preference"),
+            "arrival_time": booking_data.get("arrival_time", "11:45 AM"),
+            "confirmation_number": confirmation_number  # Idempotency key: the backend stores it once
+        }
+        
+        # Persist before confirming - from here on the booking survives timeouts and restarts
+        try:
+            await asyncio.to_thread(self.booking_outbox.enqueue, room_name, confirmation_number, backend_booking_data)
+        except Exception as error:
+            logger.error(f"❌ Could not persist booking {confirmation_number}: {error}")
+            return {"success": False, "error": "Booking could not be saved, please try again"}
+        
         logger.info(f"✅ Flight booking confirmed instantly: {confirmation_number}")
         
-        # Try to save to backend SYNCHRONOUSLY - CRITICAL for immediate display
-        if self.backend_url:
-            try:
-                # Prepare backend booking data with correct field mapping
-                backend_booking_data = {
-                    "customer_email": customer_email,
-                    "departure_location": departure_location,
-                    "destination": destination,
-                    "flight_name": booking_data.get("flight_name", "Air India"),
-                    "departure_time": booking_data.get("departure_time", "08:30 AM"),
-                    "departure_date": booking_data.get("departure_date", ""),
-                    "return_date": booking_data.get("return_date"),
-                    "num_travelers": booking_data.get("num_travelers", 1),
-                    "service_details": booking_data.get("service_details", "Economy"),
-                    "seat_preference": booking_data.get("seat_preference", "No preference"),
-                    "meal_preference": booking_data.get("meal_preference", "No preference"),
-                    "arrival_time": booking_data.get("arrival_time", "11:45 AM"),
-                    "confirmation_number": confirmation_number  # NEW: Include confirmation ID
-                }
-                
-                url = f"{self.backend_url}/create_flight_booking"
-                
-                # Use ULTRA-SHORT timeout (1 second) for instant response - booking is confirmed locally
-                timeout = aiohttp.ClientTimeout(total=1)
-                async with aiohttp.ClientSession(timeout=timeout) as session:
-                    async with session.post(url, json=backend_booking_data) as resp:
-                        if resp.status == 200:
-                            backend_result = await resp.json()
-                            backend_booking_id = backend_result.get('booking_id')
-                            booking_result["backend_booking_id"] = backend_booking_id
-                            logger.info(f"✅ SAVED TO DATABASE: Booking ID #{backend_booking_id}")
-                        else:
-                            logger.warning(f"⚠️ Backend returned status {resp.status}")
-            except asyncio.TimeoutError:
-                logger.warning(f"⚠️ Backend timeout (1s) - booking confirmed locally, saving in background")
-            except Exception as error:
-                # Non-blocking error - don't fail the booking if backend is slow
-                logger.warning(f"⚠️ Backend save error (but booking confirmed): {error}")
+        # First delivery attempt - short wait so the backend id is available for immediate display
+        delivery = asyncio.ensure_future(self.booking_outbox.deliver_now(confirmation_number))
+        try:
+            backend_result = await asyncio.wait_for(asyncio.shield(delivery), timeout=1)
+            if backend_result:
+                booking_result["backend_booking_id"] = backend_result.get('booking_id')
+                logger.info(f"✅ SAVED TO DATABASE: Booking ID #{booking_result['backend_booking_id']}")
+        except asyncio.TimeoutError:
+            # The worker's background drainer retries it if this attempt fails
+            logger.info(f"⏳ Backend slow - booking {confirmation_number} stays queued in the outbox")
         
         return booking_result
 
@@ -1210,7 +1217,7 @@ Remember: Present itineraries as PERSONALIZED EXPERIENCES, not generic tours!
                 "arrival_time": arrival_time
             }
             
-            result = await self._create_flight_booking(booking_data)
+            result = await self._create_flight_booking(booking_data, room_name)
             
             if result.get("success"):
                 confirmation_number = result.get("confirmation_number", "N/A")
@@ -1451,6 +1458,10 @@ if __name__ == "__main__":
     
     assistant = VoiceAssistant()
 
+    # Replay bookings a previous worker confirmed but never delivered, then keep draining.
+    # The drainer gets its own outbox so `assistant` stays picklable for the job processes
+    start_background_drainer(BookingOutbox(send=HttpSender(assistant.backend_url)))
+
     cli.run_app(
         WorkerOptions(
             entrypoint_fnc=assistant.entrypoint,
@@ -0,0 +1,324 @@
+"""
+Durable outbox for flight bookings confirmed by the voice agent
+
+The caller hears the confirmation number as soon as the booking is committed
+to a local SQLite file. Delivery to the backend (/create_flight_booking) then
+happens from that file:
+
+- an immediate attempt right after enqueueing (fills in the backend booking id
+  when the backend answers quickly)
+- a background drainer that retries with exponential backoff until the backend
+  accepts the booking; nothing is dropped, undeliverable bookings are parked
+  as 'failed' for an operator to requeue
+- bookings of the same room are delivered in the order they were made: only
+  the oldest pending booking of a room is ever in flight
+- at worker startup the drainer replays whatever a previous process left
+  pending. Every entry carries its confirmation number and the backend ignores
+  a confirmation number it has already stored, so replays are idempotent.
+
+Several processes may share one outbox file; entries are leased while being
+delivered, and a lease expires if its process dies.
+
+Usage:
+    python booking_outbox.py --status
+    python booking_outbox.py --requeue-failed
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import sqlite3
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+logger = logging.getLogger("BookingOutbox")
+
+OUTBOX_PATH = os.getenv("BOOKING_OUTBOX_PATH", str(Path(__file__).parent / "booking_outbox.db"))
+DELIVERY_TIMEOUT_SECONDS = float(os.getenv("BOOKING_OUTBOX_TIMEOUT", "5"))
+BACKOFF_BASE_SECONDS = 1.0
+BACKOFF_MAX_SECONDS = 300.0
+LEASE_SECONDS = 30.0
+POLL_SECONDS = 2.0
+BATCH_ROOMS = 20  # rooms delivered concurrently per drain round
+
+# /create_flight_booking errors that a retry cannot fix
+PERMANENT_ERRORS = ("Customer not found", "Missing required fields")
+
+
+class DeliveryError(Exception):
+    """Delivery failed; retryable=False parks the entry instead of retrying."""
+
+    def __init__(self, message: str, retryable: bool = True):
+        super().__init__(message)
+        self.retryable = retryable
+
+
+Sender = Callable[[Dict[str, Any]], Awaitable[Dict[str, Any]]]
+
+
+class HttpSender:
+    """POST a booking to the backend's /create_flight_booking endpoint.
+
+    A plain class rather than a closure so that an outbox that has not started
+    draining yet (and the agent holding it) can be pickled into a job process.
+    """
+
+    def __init__(self, backend_url: str, timeout: float = DELIVERY_TIMEOUT_SECONDS):
+        self.url = f"{backend_url.rstrip('/')}/create_flight_booking"
+        self.timeout = timeout
+
+    async def __call__(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        import aiohttp
+
+        try:
+            async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=self.timeout)) as session:
+                async with session.post(self.url, json=payload) as resp:
+                    if resp.status >= 500 or resp.status in (408, 429):
+                        raise DeliveryError(f"HTTP {resp.status}")
+                    if resp.status != 200:
+                        raise DeliveryError(f"HTTP {resp.status}: {await resp.text()}", retryable=False)
+                    result = await resp.json()
+        except (aiohttp.ClientError, asyncio.TimeoutError) as error:
+            raise DeliveryError(f"{type(error).__name__}: {error}")
+
+        if not result.get("success"):
+            error = str(result.get("error") or result.get("message") or "rejected")
+            raise DeliveryError(error, retryable=not error.startswith(PERMANENT_ERRORS))
+        return result
+
+
+def backoff_seconds(attempts: int) -> float:
+    """Delay before retry number `attempts` (1-based): exponential, capped, with jitter"""
+    delay = min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2 ** (attempts - 1))
+    return delay * random.uniform(0.5, 1.0)
+
+
+class BookingOutbox:
+    """SQLite-backed outbox; the async methods run their SQL in a worker thread."""
+
+    def __init__(self, path: str = OUTBOX_PATH, send: Optional[Sender] = None,
+                 clock: Callable[[], float] = time.time):
+        self.path = path
+        self.send = send
+        self.clock = clock
+        self.owner = f"{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        self._wakeup: Optional[asyncio.Event] = None
+        self._init_schema()
+
+    # ---------- storage ----------
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("PRAGMA synchronous = FULL")  # an enqueued booking must survive a power cut
+        return conn
+
+    def _init_schema(self) -> None:
+        Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        conn = self._connect()
+        try:
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS booking_outbox (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    idempotency_key TEXT UNIQUE NOT NULL,
+                    room_name TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    status TEXT NOT NULL DEFAULT 'pending',
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    next_attempt_at REAL NOT NULL,
+                    lease_owner TEXT,
+                    lease_until REAL,
+                    last_error TEXT,
+                    result TEXT,
+                    created_at REAL NOT NULL,
+                    sent_at REAL
+                );
+                CREATE INDEX IF NOT EXISTS idx_booking_outbox_pending
+                ON booking_outbox(room_name, id) WHERE status = 'pending';
+            """)
+        finally:
+            conn.close()
+
+    def enqueue(self, room_name: str, idempotency_key: str, payload: Dict[str, Any]) -> bool:
+        """Durably record a booking; False if this key was already enqueued"""
+        conn = self._connect()
+        try:
+            cursor = conn.execute("""
+                INSERT OR IGNORE INTO booking_outbox
+                (idempotency_key, room_name, payload, next_attempt_at, created_at)
+                VALUES (?, ?, ?, ?, ?)
+            """, (idempotency_key, room_name or "", json.dumps(payload), self.clock(), self.clock()))
+            return cursor.rowcount == 1
+        finally:
+            conn.close()
+
+    def _claim(self, idempotency_key: Optional[str] = None, limit: int = BATCH_ROOMS) -> List[Dict]:
+        """Lease the oldest pending entry of each room that is due (or just the given key's, if it is)"""
+        now = self.clock()
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            heads = conn.execute("""
+                SELECT o.id, o.idempotency_key, o.room_name, o.payload, o.attempts
+                FROM booking_outbox o
+                WHERE o.status = 'pending'
+                  AND o.id = (SELECT MIN(id) FROM booking_outbox
+                              WHERE room_name = o.room_name AND status = 'pending')
+                  AND o.next_attempt_at <= ?
+                  AND (o.lease_until IS NULL OR o.lease_until < ?)
+                  AND (? IS NULL OR o.idempotency_key = ?)
+                ORDER BY o.id
+                LIMIT ?
+            """, (now, now, idempotency_key, idempotency_key, limit)).fetchall()
+            conn.executemany("UPDATE booking_outbox SET lease_owner = ?, lease_until = ? WHERE id = ?",
+                             [(self.owner, now + LEASE_SECONDS, row[0]) for row in heads])
+            conn.execute("COMMIT")
+        finally:
+            conn.close()
+        return [{'id': row[0], 'key': row[1], 'room_name': row[2], 'payload': json.loads(row[3]),
+                 'attempts': row[4]} for row in heads]
+
+    def _finish(self, entry: Dict, status: str, result: Optional[Dict] = None,
+                error: Optional[str] = None) -> None:
+        attempts = entry['attempts'] + 1
+        next_attempt = self.clock() + backoff_seconds(attempts) if status == 'pending' else self.clock()
+        conn = self._connect()
+        try:
+            conn.execute("""
+                UPDATE booking_outbox
+                SET status = ?, attempts = ?, next_attempt_at = ?, lease_owner = NULL, lease_until = NULL,
+                    last_error = ?, result = COALESCE(?, result),
+                    sent_at = CASE WHEN ? = 'sent' THEN ? ELSE sent_at END
+                WHERE id = ? AND lease_owner = ?
+            """, (status, attempts, next_attempt, error, json.dumps(result) if result is not None else None,
+                  status, self.clock(), entry['id'], self.owner))
+        finally:
+            conn.close()
+
+    # ---------- delivery ----------
+
+    async def _deliver(self, entry: Dict) -> Optional[Dict]:
+        try:
+            result = await self.send(entry['payload'])
+        except DeliveryError as error:
+            status = 'pending' if error.retryable else 'failed'
+            await asyncio.to_thread(self._finish, entry, status, error=str(error))
+            log = logger.warning if error.retryable else logger.error
+            log(f"⚠️ Booking {entry['key']} not delivered (attempt {entry['attempts'] + 1}): {error}"
+                + ("" if error.retryable else " - parked as failed"))
+            return None
+        except Exception as error:
+            await asyncio.to_thread(self._finish, entry, 'pending', error=f"{type(error).__name__}: {error}")
+            logger.warning(f"⚠️ Booking {entry['key']} delivery error: {error}")
+            return None
+
+        await asyncio.to_thread(self._finish, entry, 'sent', result=result)
+        logger.info(f"✅ Booking {entry['key']} delivered to backend (booking #{result.get('booking_id')})")
+        return result
+
+    async def deliver_now(self, idempotency_key: str) -> Optional[Dict]:
+        """Try to deliver one entry right away; None if it is queued behind others or failed"""
+        entries = await asyncio.to_thread(self._claim, idempotency_key, 1)
+        return await self._deliver(entries[0]) if entries else None
+
+    async def drain_once(self) -> int:
+        """Deliver the due head entry of every room once; returns how many were claimed"""
+        entries = await asyncio.to_thread(self._claim)
+        if entries:
+            await asyncio.gather(*(self._deliver(entry) for entry in entries))
+        return len(entries)
+
+    async def run(self, stop: Optional[asyncio.Event] = None) -> None:
+        """Drain forever: replay what is pending, then poll (or wake on notify())"""
+        self._wakeup = asyncio.Event()
+        pending = self.stats()['pending']
+        if pending:
+            logger.info(f"🔁 Replaying {pending} undelivered booking(s) from {self.path}")
+        while not (stop and stop.is_set()):
+            try:
+                if await self.drain_once():
+                    continue  # more heads may be due right away
+            except Exception as error:
+                logger.error(f"❌ Booking outbox drain failed: {error}")
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    def notify(self) -> None:
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    # ---------- operations ----------
+
+    def stats(self) -> Dict[str, Any]:
+        conn = self._connect()
+        try:
+            counts = dict(conn.execute("SELECT status, COUNT(*) FROM booking_outbox GROUP BY status").fetchall())
+            oldest, retries = conn.execute("""
+                SELECT MIN(created_at), COALESCE(SUM(attempts > 0), 0) FROM booking_outbox WHERE status = 'pending'
+            """).fetchone()
+        finally:
+            conn.close()
+        return {
+            'path': self.path,
+            'pending': counts.get('pending', 0),
+            'sent': counts.get('sent', 0),
+            'failed': counts.get('failed', 0),
+            'retrying': retries,
+            'oldest_pending_age_seconds': round(self.clock() - oldest, 1) if oldest else None,
+        }
+
+    def failed(self) -> List[Dict]:
+        conn = self._connect()
+        try:
+            rows = conn.execute("""
+                SELECT idempotency_key, room_name, attempts, last_error, created_at
+                FROM booking_outbox WHERE status = 'failed' ORDER BY id
+            """).fetchall()
+        finally:
+            conn.close()
+        return [{'confirmation_number': r[0], 'room_name': r[1], 'attempts': r[2], 'last_error': r[3],
+                 'created_at': r[4]} for r in rows]
+
+    def requeue_failed(self) -> int:
+        """Put parked entries back in the queue (e.g. after creating the missing customer)"""
+        conn = self._connect()
+        try:
+            return conn.execute("""
+                UPDATE booking_outbox SET status = 'pending', attempts = 0, next_attempt_at = ?
+                WHERE status = 'failed'
+            """, (self.clock(),)).rowcount
+        finally:
+            conn.close()
+
+
+def start_background_drainer(outbox: BookingOutbox) -> threading.Thread:
+    """Replay and drain in a daemon thread with its own event loop (for the worker main process)"""
+    thread = threading.Thread(target=lambda: asyncio.run(outbox.run()), name="booking-outbox", daemon=True)
+    thread.start()
+    return thread
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inspect the voice agent's booking outbox")
+    parser.add_argument("--path", default=OUTBOX_PATH)
+    parser.add_argument("--status", action="store_true", help="counts per status (default)")
+    parser.add_argument("--failed", action="store_true", help="list parked bookings")
+    parser.add_argument("--requeue-failed", action="store_true", help="retry parked bookings")
+    args = parser.parse_args()
+
+    outbox = BookingOutbox(args.path)
+    if args.requeue_failed:
+        print(json.dumps({'requeued': outbox.requeue_failed()}))
+    elif args.failed:
+        print(json.dumps(outbox.failed(), indent=2))
+    else:
+        print(json.dumps(outbox.stats(), indent=2))
@@ -4,17 +4,18 @@ FastAPI application with all REST endpoints
 UNIFIED BACKEND: Azure + LiveKit Token Generation
 """
 
+import hmac
 import os
-import sqlite3
+import threading
 import uuid
 import tempfile
 import base64
 import logging
 from datetime import datetime
 from typing import Optional, Dict
-from fastapi import FastAPI, HTTPException, UploadFile, File
+from fastapi import FastAPI, HTTPException, UploadFile, File, Request, Depends
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import HTMLResponse, FileResponse
+from fastapi.responses import HTMLResponse, FileResponse, StreamingResponse, JSONResponse
 from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel, EmailStr
 
@@ -22,9 +23,13 @@ from pydantic import BaseModel, EmailStr
 import sys
 sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
 
-from config import DB_PATH, SERVICE_PRICES
-from models import VoiceRequest, CustomerLogin, CustomerRegister, TravelBookingRequest
-from utils import hash_password, verify_password, get_flight_class_options, send_booking_confirmation_email, send_password_reset_email, send_conversation_transcript_email, send_conversation_summary_email
+from config import SERVICE_PRICES
+from models import VoiceRequest, CustomerLogin, CustomerRegister, TokenRefreshRequest, TravelBookingRequest
+from utils import verify_password, get_flight_class_options, send_booking_confirmation_email, send_password_reset_email, send_conversation_transcript_email, send_conversation_summary_email
+from email_dispatcher import email_dispatch_stats, shutdown_email_dispatcher
+from password_hasher import AuthBusy, password_hasher
+from session_tokens import TokenError, session_tokens
+from tts_cache import tts_cache
 
 # Configure logging FIRST (before any other imports that use logger)
 logging.basicConfig(level=logging.INFO)
@@ -49,7 +54,7 @@ except ImportError as e:
 
 # Optional LLM imports (for when Azure credentials are not available)
 try:
-    from llm import get_ai_response, speech_to_text, text_to_speech, detect_language, clear_conversation_history
+    from llm import get_ai_response, speech_to_text, text_to_speech, prewarm_speech, detect_language, clear_conversation_history
     LLM_AVAILABLE = True
     logger.info("✅ LLM services loaded successfully")
 except Exception as e:
@@ -66,33 +71,119 @@ except Exception as e:
         return "en"
     def clear_conversation_history(*args, **kwargs):
         return {"success": True}
+    def prewarm_speech(*args, **kwargs):
+        return 0
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..', 'database'))
 from database import (
+    DB_PATH,
     get_or_create_customer,
+    get_customer_credentials,
+    set_password_reset_token,
+    get_backend,
+    close_backend,
     create_travel_booking,
     get_customer_bookings,
-    save_conversation,
+    list_customer_bookings,
+    get_customer_dashboard,
+    get_booking_analytics,
     get_conversation_history,
+    search_conversations,
     cancel_booking,
     reschedule_booking,
-    record_livekit_session,
+    bulk_update_bookings,
     get_livekit_session,
-    update_livekit_session_activity,
-    get_livekit_transcript
+    get_livekit_transcript,
+    shutdown_write_queue,
+    write_queue_stats,
+    session_cache_stats,
+    start_maintenance_scheduler,
+    stop_maintenance_scheduler,
+    run_database_maintenance,
+    maintenance_stats
 )
+from connection_pool import get_connection, pool_stats, close_all_connections
+from async_db import adb
+from export import FORMATS as EXPORT_FORMATS, export_stream
 
 # Initialize FastAPI
 app = FastAPI(title="Travel AI Voice Agent")
 
 # Helper function for database connections
 def get_db_connection():
-    """Create a database connection with proper timeout settings"""
-    conn = sqlite3.connect(DB_PATH, timeout=30.0)
-    conn.execute("PRAGMA journal_mode=WAL;")
-    conn.execute("PRAGMA busy_timeout=5000;")
-    return conn
+    """Get this thread's pooled database connection (WAL/busy_timeout already applied).
 
-# Add CORS middleware
+    The connection is reused across requests, so callers must not close it.
+    """
+    return get_connection(DB_PATH)
+
+# ==================== SESSION TOKENS ====================
+# GET endpoints that take the customer's email in the path
+_CUSTOMER_PATH_PREFIXES = ("/my_bookings/", "/bookings/", "/dashboard/", "/chat_history/")
+REQUIRE_AUTH_TOKENS = os.getenv("REQUIRE_AUTH_TOKENS", "false").lower() == "true"
+if REQUIRE_AUTH_TOKENS and not session_tokens.enabled:
+    raise RuntimeError("REQUIRE_AUTH_TOKENS=true needs SECRET_KEY set to a real secret (shared by all workers)")
+
+
+@app.middleware("http")
+async def verify_session_token(request: Request, call_next):
+    """Verify `Authorization: Bearer` access tokens (cached claims, no DB hit).
+
+    Sets request.state.customer to the token claims. A token for another
+    customer gets 403 on the per-customer endpoints. Unless
+    REQUIRE_AUTH_TOKENS=true, requests without a valid token (none, expired,
+    or signed with another key) are still served there as before.
+    """
+    request.state.customer = None
+    token_error = None
+    scheme, _, token = request.headers.get("authorization", "").partition(" ")
+    if scheme.lower() == "bearer" and token:
+        try:
+            request.state.customer = session_tokens.verify(token.strip())
+        except TokenError as e:
+            token_error = str(e)
+
+    path = request.scope["path"]
+    if request.method == "GET" and path.startswith(_CUSTOMER_PATH_PREFIXES):
+        claims = request.state.customer
+        if claims is None and REQUIRE_AUTH_TOKENS:
+            return JSONResponse(status_code=401, content={"detail": token_error or "Not authenticated"},
+                                headers={"WWW-Authenticate": "Bearer"})
+        path_email = path.split("/", 2)[2].strip().lower()
+        if claims is not None and claims['sub'] != path_email:
+            logger.warning(f"⚠️ {claims['sub']} requested {path}")
+            return JSONResponse(status_code=403, content={"detail": "Token does not belong to this customer"})
+    return await call_next(request)
+
+
+def require_token_customer(request: Request, customer_email: Optional[str]) -> None:
+    """Same check as the middleware for endpoints that take the customer's email in the body or query"""
+    claims = request.state.customer
+    if claims is None and REQUIRE_AUTH_TOKENS:
+        raise HTTPException(status_code=401, detail="Not authenticated", headers={"WWW-Authenticate": "Bearer"})
+    if claims is not None and customer_email and claims['sub'] != str(customer_email).strip().lower():
+        logger.warning(f"⚠️ {claims['sub']} sent {request.url.path} for {customer_email}")
+        raise HTTPException(status_code=403, detail="Token does not belong to this customer")
+
+# ==================== ADMIN ACCESS ====================
+# Business-wide endpoints (all customers' data, maintenance) need the X-Admin-Key
+# header; they are off entirely while ADMIN_API_KEY is unset
+ADMIN_API_KEY = os.getenv("ADMIN_API_KEY", "")
+
+
+def _is_admin(request: Request) -> bool:
+    supplied = request.headers.get("x-admin-key", "")
+    return bool(ADMIN_API_KEY) and hmac.compare_digest(supplied.encode(), ADMIN_API_KEY.encode())
+
+
+def require_admin(request: Request) -> None:
+    """Dependency for admin-only endpoints"""
+    if not ADMIN_API_KEY:
+        raise HTTPException(status_code=403, detail="Admin endpoints are disabled (ADMIN_API_KEY not set)")
+    if not _is_admin(request):
+        logger.warning(f"⚠️ Rejected admin request to {request.url.path}")
+        raise HTTPException(status_code=401, detail="Admin credential required")
+
+# Add CORS middleware (added last so it wraps the token check and its 401/403 responses)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -124,18 +215,14 @@ def root():
 def check_customer_exists(email: str):
     """Check if a customer exists in the database"""
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT id, email, name FROM customers WHERE email = ?", (email,))
-        customer = cursor.fetchone()
-        conn.close()
+        customer = get_customer_credentials(email)
         
         if customer:
             logger.info(f"✅ Customer exists: {email}")
             return {
                 "exists": True,
-                "email": customer[1],
-                "name": customer[2]
+                "email": customer['email'],
+                "name": customer['name']
             }
         else:
             logger.info(f"❌ Customer not found: {email}")
@@ -144,110 +231,119 @@ def check_customer_exists(email: str):
         logger.error(f"❌ Error checking customer: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+def _auth_busy(error: AuthBusy) -> HTTPException:
+    """503 for a request that waited too long for a password hashing slot"""
+    logger.warning(f"⚠️ Auth pool busy: {error}")
+    return HTTPException(status_code=503, detail="Too many sign-in requests, please retry shortly",
+                         headers={"Retry-After": "1"})
+
 @app.post("/register")
-def register_customer(customer: CustomerRegister):
+async def register_customer(customer: CustomerRegister):
     """Customer registration with password"""
     try:
         # Check if customer already exists
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT id FROM customers WHERE email = ?", (customer.email,))
-        existing_customer = cursor.fetchone()
-        
-        if existing_customer:
-            conn.close()
+        if await adb.get_customer_credentials(customer.email):
             raise HTTPException(status_code=400, detail="Email already registered")
         
-        # Hash the password
-        salt, password_hash = hash_password(customer.password)
-        
-        # Create new customer with hashed password
-        cursor.execute("""
-            INSERT INTO customers (email, name, password_salt, password_hash, created_at)
-            VALUES (?, ?, ?, ?, ?)
-        """, (customer.email, customer.name, salt, password_hash, datetime.now()))
+        # Hash the password (on the auth process pool)
+        salt, password_hash = await password_hasher.hash_password(customer.password)
         
-        conn.commit()
-        customer_id = cursor.lastrowid
-        conn.close()
+        # Create new customer with hashed password (None if the email was taken meanwhile)
+        created = await adb.create_customer(customer.email, customer.name, salt, password_hash)
+        if not created:
+            raise HTTPException(status_code=400, detail="Email already registered")
         
         logger.info(f"👤 New customer registered: {customer.email}")
         return {
             "success": True,
-            "customer": {
-                "id": customer_id,
-                "email": customer.email,
-                "name": customer.name,
-                "created_at": datetime.now().isoformat()
-            },
+            "customer": created,
+            **session_tokens.issue(created),
             "message": "Registration successful"
         }
     except HTTPException:
         raise
+    except AuthBusy as e:
+        raise _auth_busy(e)
     except Exception as e:
         logger.error(f"❌ Registration error: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/login")
-def login_customer(customer: CustomerLogin):
+async def login_customer(customer: CustomerLogin):
     """Customer login with password verification"""
     try:
         logger.info(f"🔐 LOGIN ATTEMPT: Email={customer.email}, Password length={len(customer.password)}")
         
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
         # Get customer with password hash
-        cursor.execute("""
-            SELECT id, email, name, password_salt, password_hash, created_at
-            FROM customers WHERE email = ?
-        """, (customer.email,))
-        
-        customer_data = cursor.fetchone()
-        logger.info(f"🔐 Database query result: {customer_data}")
+        customer_data = await adb.get_customer_credentials(customer.email)
+        logger.info(f"🔐 Customer found: {bool(customer_data)}")
         
         if not customer_data:
-            conn.close()
             logger.warning(f"❌ User not found: {customer.email}")
             raise HTTPException(status_code=404, detail="User not found")
         
-        customer_id, email, name, salt, stored_hash, created_at = customer_data
+        customer_id, email, name = customer_data['id'], customer_data['email'], customer_data['name']
+        salt, stored_hash = customer_data['password_salt'], customer_data['password_hash']
+        created_at = customer_data['created_at']
         logger.info(f"🔐 User data: ID={customer_id}, Salt={'Yes' if salt else 'No'}, Hash={'Yes' if stored_hash else 'No'}")
         
         # Check if user has password hash (from new system)
         if not salt or not stored_hash:
-            conn.close()
             logger.warning(f"❌ Login attempt failed for {customer.email}: User exists but has no password set")
             raise HTTPException(status_code=401, detail="Password not set. Please register again with a password.")
         
-        # Verify password
-        password_valid = verify_password(customer.password, salt, stored_hash)
+        # Verify password (on the auth process pool)
+        password_valid = await password_hasher.verify_password(customer.password, salt, stored_hash)
         logger.info(f"🔐 Password verification result: {password_valid}")
         
         if not password_valid:
-            conn.close()
             logger.warning(f"❌ Login attempt failed for {customer.email}: Incorrect password provided")
             raise HTTPException(status_code=401, detail="Incorrect password. Please check your password and try again.")
         
-        conn.close()
-        
         logger.info(f"👤 Customer logged in: {customer.email}")
+        customer_info = {
+            "id": customer_id,
+            "email": email,
+            "name": name,
+            "created_at": created_at
+        }
         return {
             "success": True,
-            "customer": {
-                "id": customer_id,
-                "email": email,
-                "name": name,
-                "created_at": created_at
-            },
+            "customer": customer_info,
+            **session_tokens.issue(customer_info),
             "message": "Login successful"
         }
     except HTTPException:
         raise
+    except AuthBusy as e:
+        raise _auth_busy(e)
     except Exception as e:
         logger.error(f"❌ Login error: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/auth/refresh")
+async def refresh_session(request: TokenRefreshRequest):
+    """Exchange a refresh token for a new access/refresh token pair (no password check)"""
+    try:
+        claims = session_tokens.refresh_claims(request.refresh_token)
+    except TokenError as e:
+        raise HTTPException(status_code=401, detail=str(e), headers={"WWW-Authenticate": "Bearer"})
+    try:
+        # Rare compared with token checks: confirm the account still exists
+        customer_data = await adb.get_customer_credentials(claims['sub'])
+        if not customer_data:
+            raise HTTPException(status_code=401, detail="User not found")
+        return {
+            "success": True,
+            **session_tokens.issue({"id": customer_data['id'], "email": customer_data['email'],
+                                    "name": customer_data['name']})
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"❌ Token refresh error: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 # ==================== VOICE & CHAT ENDPOINTS ====================
 
 @app.post("/voice_chat")
@@ -272,8 +368,8 @@ async def voice_chat(request: VoiceRequest):
         # Save conversation to database if customer is logged in
         if request.customer_email:
             try:
-                save_conversation(request.customer_email, session_id, "user", user_message, lang_code)
-                save_conversation(request.customer_email, session_id, "assistant", ai_message, lang_code)
+                await adb.save_conversation(request.customer_email, session_id, "user", user_message, lang_code)
+                await adb.save_conversation(request.customer_email, session_id, "assistant", ai_message, lang_code)
                 logger.info(f"💾 Conversation saved for {request.customer_email}")
             except Exception as db_err:
                 logger.warning(f"⚠️ Failed to save conversation: {db_err}")
@@ -351,12 +447,14 @@ async def transcribe_audio(file: UploadFile = File(...)):
         logger.error(traceback.format_exc())
         return {"error": str(e), "text": "", "status": "failed"}
 
+# Shorter, more concise welcome message for better TTS (audio prewarmed in the TTS cache at startup)
+WELCOME_TEXT = "Hello! Welcome to Attar Travel. I'm Alex, your AI travel agent for Saudi Arabia. I can help you book flights, hotels, and plan your perfect trip to destinations like Riyadh, Jeddah, and Al-Ula. How may I help you today?"
+
 @app.get("/welcome")
 def get_welcome_message():
     """Get welcome greeting with audio"""
     try:
-        # Shorter, more concise welcome message for better TTS
-        welcome_text = "Hello! Welcome to Attar Travel. I'm Alex, your AI travel agent for Saudi Arabia. I can help you book flights, hotels, and plan your perfect trip to destinations like Riyadh, Jeddah, and Al-Ula. How may I help you today?"
+        welcome_text = WELCOME_TEXT
         
         # Generate audio
         audio_data = None
@@ -540,6 +638,17 @@ def create_flight_booking_endpoint(booking: dict):
         
         booking_id = booking_data.get('booking_id')
         
+        if booking_data.get('duplicate'):
+            # The agent's outbox replayed a booking that is already stored
+            logger.info(f"🔁 Booking {confirmation_number} already saved as #{booking_id} - skipping email")
+            return {
+                "success": True,
+                "booking_id": booking_id,
+                "booking": booking_data,
+                "total_amount": booking_data.get('total_amount'),
+                "message": f"✅ Flight booking confirmed! Booking ID: #{booking_id}. Check 'My Bookings' to view your reservation."
+            }
+        
         logger.info(f"✅ Flight booking SAVED to database")
         logger.info(f"   🆔 Booking ID: #{booking_id}")
         logger.info(f"   💵 Total Amount: ₹{total_amount}")
@@ -547,7 +656,7 @@ def create_flight_booking_endpoint(booking: dict):
         # Send confirmation email
         try:
             send_booking_confirmation_email(customer_email, booking_data)
-            logger.info(f"✅ Confirmation email sent to {customer_email}")
+            logger.info(f"✅ Confirmation email queued for {customer_email}")
         except Exception as email_error:
             logger.warning(f"⚠️ Email sending failed: {email_error}")
         
@@ -599,9 +708,65 @@ def get_my_bookings(email: str):
         logger.error(f"❌ Error fetching bookings: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/bookings/{email}")
+def list_bookings(email: str, status: Optional[str] = None, service_type: Optional[str] = None,
+                  departure_from: Optional[str] = None, departure_to: Optional[str] = None,
+                  limit: int = 20, cursor: Optional[str] = None, fields: Optional[str] = None):
+    """List a customer's bookings with filters and cursor pagination.
+
+    `fields` is a comma-separated projection (e.g. "booking_id,total_amount,status");
+    pass the returned `next_cursor` as `cursor` to fetch the next page.
+    """
+    try:
+        result = list_customer_bookings(
+            email,
+            status=status,
+            service_type=service_type,
+            departure_from=departure_from,
+            departure_to=departure_to,
+            limit=max(1, min(limit, 200)),
+            cursor=cursor,
+            fields=[f.strip() for f in fields.split(',') if f.strip()] if fields else None
+        )
+        return {
+            "success": True,
+            "bookings": result['bookings'],
+            "count": len(result['bookings']),
+            "next_cursor": result['next_cursor']
+        }
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"❌ Error listing bookings: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/dashboard/{email}")
+def get_dashboard(email: str):
+    """Dashboard aggregates for a customer, read from the booking rollup tables"""
+    try:
+        return {"success": True, **get_customer_dashboard(email)}
+    except Exception as e:
+        logger.error(f"❌ Error fetching dashboard for {email}: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/admin/analytics", dependencies=[Depends(require_admin)])
+def get_admin_analytics(date_from: Optional[str] = None, date_to: Optional[str] = None, top_routes: int = 10):
+    """Revenue per day, top routes, class mix and cancellation rate across all customers
+
+    Served from the daily rollup tables; the range defaults to the last 30 days.
+    """
+    try:
+        return {"success": True, **get_booking_analytics(date_from, date_to, max(1, min(top_routes, 100)))}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"❌ Error fetching admin analytics: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 @app.post("/cancel_booking")
-def cancel_booking_endpoint(request: dict):
+def cancel_booking_endpoint(request: dict, http_request: Request):
     """Cancel a booking"""
+    require_token_customer(http_request, request.get('customer_email'))
     try:
         booking_id = request.get('booking_id')
         customer_email = request.get('customer_email')
@@ -623,8 +788,9 @@ def cancel_booking_endpoint(request: dict):
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/cancel_booking/{booking_id}")
-def cancel_booking_endpoint_v2(booking_id: int, customer_email: str):
+def cancel_booking_endpoint_v2(booking_id: int, customer_email: str, http_request: Request):
     """Cancel a booking (alternative endpoint)"""
+    require_token_customer(http_request, customer_email)
     try:
         result = cancel_booking(booking_id, customer_email)
         if result['success']:
@@ -637,8 +803,9 @@ def cancel_booking_endpoint_v2(booking_id: int, customer_email: str):
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/reschedule_booking")
-def reschedule_booking_endpoint(request: dict):
+def reschedule_booking_endpoint(request: dict, http_request: Request):
     """Reschedule a booking"""
+    require_token_customer(http_request, request.get('customer_email'))
     try:
         booking_id = request.get('booking_id')
         customer_email = request.get('customer_email')
@@ -662,8 +829,9 @@ def reschedule_booking_endpoint(request: dict):
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/reschedule_booking/{booking_id}")
-def reschedule_booking_endpoint_v2(booking_id: int, request: dict):
+def reschedule_booking_endpoint_v2(booking_id: int, request: dict, http_request: Request):
     """Reschedule a booking (alternative endpoint)"""
+    require_token_customer(http_request, request.get('customer_email'))
     try:
         customer_email = request.get('customer_email')
         new_departure_date = request.get('new_departure_date')
@@ -683,6 +851,33 @@ def reschedule_booking_endpoint_v2(booking_id: int, request: dict):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.post("/bookings/bulk")
+def bulk_booking_operations_endpoint(request: dict, http_request: Request):
+    """Cancel/reschedule many bookings in one transaction, with a result per operation
+
+    Body: {"customer_email": ..., "operations": [{"op": "cancel", "booking_id": 1},
+           {"op": "reschedule", "booking_id": 2, "new_departure_date": "2025-07-01"}]}
+    """
+    customer_email = request.get('customer_email')
+    operations = request.get('operations')
+    require_token_customer(http_request, customer_email)
+
+    if not customer_email or not isinstance(operations, list):
+        raise HTTPException(status_code=400, detail="customer_email and an operations list are required")
+
+    try:
+        result = bulk_update_bookings(customer_email, operations)
+    except Exception as e:
+        logger.error(f"❌ Bulk booking error: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+    if not result.get('success'):
+        raise HTTPException(status_code=400, detail=result.get('message', 'Bulk update failed'))
+
+    logger.info(f"✅ Bulk booking update for {customer_email}: "
+                f"{result['succeeded']} applied, {result['failed']} rejected")
+    return result
+
 # ==================== PASSWORD RESET ENDPOINTS ====================
 
 @app.post("/forgot_password")
@@ -705,29 +900,8 @@ def forgot_password_endpoint(request: dict):
         reset_token = secrets.token_urlsafe(32)
         
         # Store reset token with expiration (24 hours)
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        # Add columns if they don't exist
-        try:
-            cursor.execute("ALTER TABLE customers ADD COLUMN reset_token TEXT")
-            cursor.execute("ALTER TABLE customers ADD COLUMN reset_token_expiry TIMESTAMP")
-            logger.info("✅ Added reset token columns to customers table")
-        except:
-            pass  # Columns already exist
-        
-        # Calculate expiry time (24 hours from now)
         expiry_time = datetime.now() + timedelta(hours=24)
-        
-        # Update customer with reset token
-        cursor.execute("""
-            UPDATE customers 
-            SET reset_token = ?, reset_token_expiry = ?
-            WHERE email = ?
-        """, (reset_token, expiry_time.isoformat(), email))
-        
-        conn.commit()
-        conn.close()
+        set_password_reset_token(email, reset_token, expiry_time)
         
         logger.info(f"🔐 Password reset requested for: {email}")
         logger.info(f"   Reset token stored (expires: {expiry_time})")
@@ -736,7 +910,7 @@ def forgot_password_endpoint(request: dict):
         email_sent = send_password_reset_email(email, reset_token)
         
         if email_sent:
-            logger.info(f"✅ Password reset email sent to: {email}")
+            logger.info(f"✅ Password reset email queued for: {email}")
             return {
                 "success": True,
                 "message": "Password reset email sent successfully",
@@ -760,7 +934,7 @@ def forgot_password_endpoint(request: dict):
         raise HTTPException(status_code=500, detail="Internal server error")
 
 @app.post("/reset_password")
-def reset_password_endpoint(request: dict):
+async def reset_password_endpoint(request: dict):
     """Reset user password with token"""
     try:
         token = request.get('token')
@@ -775,26 +949,15 @@ def reset_password_endpoint(request: dict):
             raise HTTPException(status_code=400, detail="Password must be at least 6 characters")
         
         # Check if user exists and validate token
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute("""
-            SELECT reset_token, reset_token_expiry 
-            FROM customers 
-            WHERE email = ?
-        """, (email,))
-        
-        result = cursor.fetchone()
+        result = await adb.get_customer_credentials(email)
         
         if not result:
-            conn.close()
             raise HTTPException(status_code=404, detail="User not found")
         
-        stored_token, expiry = result
+        stored_token, expiry = result['reset_token'], result['reset_token_expiry']
         
         # Validate token
-        if not stored_token or stored_token != token:
-            conn.close()
+        if not stored_token or not hmac.compare_digest(stored_token.encode(), str(token).encode()):
             logger.warning(f"⚠️ Invalid reset token for: {email}")
             raise HTTPException(status_code=400, detail="Invalid or expired reset token")
         
@@ -804,27 +967,16 @@ def reset_password_endpoint(request: dict):
             try:
                 expiry_dt = datetime.fromisoformat(expiry)
                 if datetime.now() > expiry_dt:
-                    conn.close()
                     logger.warning(f"⚠️ Expired reset token for: {email}")
                     raise HTTPException(status_code=400, detail="Reset token has expired. Please request a new one.")
             except Exception as dt_error:
                 logger.warning(f"⚠️ Token expiry check error: {dt_error}")
         
         # Update password in database
-        salt, hashed_password = hash_password(new_password)
+        salt, hashed_password = await password_hasher.hash_password(new_password)
         
         # Update customer password and clear reset token
-        cursor.execute("""
-            UPDATE customers 
-            SET password_salt = ?, 
-                password_hash = ?, 
-                reset_token = NULL, 
-                reset_token_expiry = NULL 
-            WHERE email = ?
-        """, (salt, hashed_password, email))
-        
-        conn.commit()
-        conn.close()
+        await adb.update_customer_password(email, salt, hashed_password)
         
         logger.info(f"✅ Password reset completed for: {email}")
         
@@ -836,6 +988,8 @@ def reset_password_endpoint(request: dict):
         
     except HTTPException:
         raise
+    except AuthBusy as e:
+        raise _auth_busy(e)
     except Exception as e:
         logger.error(f"❌ Reset password error: {str(e)}")
         raise HTTPException(status_code=500, detail="Internal server error")
@@ -843,20 +997,90 @@ def reset_password_endpoint(request: dict):
 # ==================== HISTORY ENDPOINTS ====================
 
 @app.get("/chat_history/{email}")
-def get_chat_history(email: str):
-    """Get chat history for a customer"""
+def get_chat_history(email: str, limit: int = 50, before: Optional[int] = None):
+    """Get chat history for a customer, newest first.
+
+    Pass the returned `next_before` as `before` to page through older messages.
+    """
     try:
-        conversations = get_conversation_history(email)
+        limit = max(1, min(limit, 500))
+        conversations = get_conversation_history(email, limit, before=before)
+        next_before = conversations[-1]['message_id'] if len(conversations) == limit else None
         return {
             "success": True,
             "conversations": conversations,
-            "count": len(conversations)
+            "count": len(conversations),
+            "next_before": next_before
         }
     except Exception as e:
         logger.error(f"❌ Error fetching chat history: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
+
+@app.get("/search/conversations")
+def search_conversation_transcripts(request: Request, q: str, customer_email: Optional[str] = None,
+                                    date_from: Optional[str] = None, date_to: Optional[str] = None,
+                                    limit: int = 20, offset: int = 0):
+    """Full-text search over call transcripts.
+
+    Customers (Bearer token) only search their own calls; searching across
+    customers (support staff lookup) needs the admin key.
+    """
+    try:
+        if not _is_admin(request):
+            claims = request.state.customer
+            if claims is None:
+                raise HTTPException(status_code=401, detail="Not authenticated",
+                                    headers={"WWW-Authenticate": "Bearer"})
+            customer_email = claims['sub']
+
+        if not q.strip():
+            raise HTTPException(status_code=400, detail="Search query is required")
+
+        result = search_conversations(
+            q,
+            customer_email=customer_email,
+            date_from=date_from,
+            date_to=date_to,
+            limit=max(1, min(limit, 100)),
+            offset=max(0, offset)
+        )
+        return {
+            "success": True,
+            "query": q,
+            "results": result['results'],
+            "count": len(result['results']),
+            "has_more": result['has_more'],
+            "archived_sessions": result['archived_sessions']
+        }
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"❌ Error searching conversations: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/export/{kind}", dependencies=[Depends(require_admin)])
+def export_data(kind: str, format: str = "ndjson", date_from: Optional[str] = None,
+                date_to: Optional[str] = None, after_id: int = 0, gzip: bool = False):
+    """Stream conversations or bookings as NDJSON/CSV (resume with after_id = last id received)"""
+    try:
+        stream = export_stream(kind, format, date_from, date_to, max(0, after_id), compress=gzip)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    filename = f"{kind}.{format}" + (".gz" if gzip else "")
+    logger.info(f"📤 Export started: {filename} (from={date_from}, to={date_to}, after_id={after_id})")
+    return StreamingResponse(
+        stream,
+        media_type="application/gzip" if gzip else EXPORT_FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+
 @app.post("/send_transcript_email")
 def send_transcript_email(request: dict):
     """Send conversation transcript to customer email after call ends"""
@@ -963,7 +1187,6 @@ def debug_user_info(email: str):
         cursor.execute("PRAGMA table_info(customers)")
         schema = cursor.fetchall()
         
-        conn.close()
         
         if not customer_data:
             return {"exists": False, "schema": schema}
@@ -987,22 +1210,13 @@ def debug_user_info(email: str):
 def test_password_verification(email: str, password: str):
     """Test endpoint to verify password validation is working"""
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
         # Get customer data
-        cursor.execute("""
-            SELECT id, email, name, password_salt, password_hash, created_at
-            FROM customers WHERE email = ?
-        """, (email,))
-        
-        customer_data = cursor.fetchone()
-        conn.close()
+        customer_data = get_customer_credentials(email)
         
         if not customer_data:
             return {"exists": False, "has_password": False}
         
-        customer_id, email, name, salt, stored_hash, created_at = customer_data
+        salt, stored_hash = customer_data['password_salt'], customer_data['password_hash']
         
         if not salt or not stored_hash:
             return {"exists": True, "has_password": False, "message": "User exists but no password set"}
@@ -1019,6 +1233,89 @@ def test_password_verification(email: str, password: str):
         return {"error": str(e)}
 
 
+@app.get("/db/pool_stats")
+def get_db_pool_stats():
+    """Connection pool, write-behind queue and async DB wait statistics"""
+    return {
+        "success": True,
+        "pool": pool_stats(),
+        "write_queue": write_queue_stats(),
+        "session_cache": session_cache_stats(),
+        "backend": get_backend().stats(),
+        "async_calls": adb.metrics.snapshot()
+    }
+
+
+@app.get("/auth/stats")
+def get_auth_stats():
+    """Password hashing pool (hash time, queue wait, 503 rejections) and session token checks"""
+    return {"success": True, "auth_pool": password_hasher.stats(), "session_tokens": session_tokens.stats()}
+
+
+@app.get("/email/stats")
+def get_email_stats():
+    """Email dispatch queue depth, delivery counters and SMTP send latency"""
+    return {"success": True, "email": email_dispatch_stats()}
+
+
+@app.get("/tts/stats")
+def get_tts_stats():
+    """TTS audio cache hits/misses and the Azure characters and synthesis time they saved"""
+    return {"success": True, "tts_cache": tts_cache.stats()}
+
+
+@app.get("/db/maintenance")
+def get_db_maintenance():
+    """Retention/vacuum scheduler status and recent run reports"""
+    return {"success": True, "maintenance": maintenance_stats()}
+
+
+@app.post("/db/maintenance/run", dependencies=[Depends(require_admin)])
+def run_db_maintenance(dry_run: bool = False):
+    """Run the retention sweep, WAL checkpoint and incremental vacuum now"""
+    try:
+        report = run_database_maintenance(dry_run=dry_run)
+        logger.info(f"🧹 Maintenance run: {report['pages_freed']} pages freed in {report['duration_ms']} ms")
+        return {"success": True, "report": report}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"❌ Maintenance run failed: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.on_event("startup")
+def start_db_maintenance():
+    """Schedule off-peak retention and vacuum runs in this process"""
+    if start_maintenance_scheduler():
+        logger.info("🧹 Database maintenance scheduler started")
+
+
+@app.on_event("startup")
+def start_password_hasher():
+    """Spawn the password hashing workers before the first sign-in"""
+    password_hasher.start()
+
+
+@app.on_event("startup")
+def prewarm_tts_cache():
+    """Synthesize fixed prompts into the TTS cache in the background (no-op when cached)"""
+    if LLM_AVAILABLE and tts_cache.enabled:
+        threading.Thread(target=prewarm_speech, args=([WELCOME_TEXT],), name="tts-prewarm", daemon=True).start()
+
+
+@app.on_event("shutdown")
+def close_db_connections():
+    """Flush queued transcript writes and emails and close pooled connections when the server stops"""
+    stop_maintenance_scheduler()
+    shutdown_email_dispatcher()
+    password_hasher.shutdown()
+    adb.shutdown()
+    shutdown_write_queue()
+    close_backend()
+    close_all_connections()
+
+
 # ==================== LIVEKIT TOKEN ENDPOINTS ====================
 # Unified backend now includes LiveKit token generation (was on port 3000)
 
@@ -1107,7 +1404,7 @@ async def get_livekit_token(request: LiveKitTokenRequest):
 
         # Persist mapping for transcripts
         try:
-            session_record = record_livekit_session(
+            session_record = await adb.record_livekit_session(
                 room_name=request.roomName,
                 participant_name=request.participantName,
                 customer_email=request.customerEmail,
@@ -1182,7 +1479,7 @@ async def record_livekit_transcript_endpoint(request: LiveKitTranscriptRequest):
         if not request.text or not request.text.strip():
             raise HTTPException(status_code=400, detail="Transcript text is required")
 
-        session_info = get_livekit_session(request.room_name)
+        session_info = await adb.get_livekit_session(request.room_name)
         session_id = request.session_id or (session_info.get('session_id') if session_info else None)
         customer_email = request.customer_email or (session_info.get('customer_email') if session_info else None)
 
@@ -1204,7 +1501,8 @@ async def record_livekit_transcript_endpoint(request: LiveKitTranscriptRequest):
             request.text
         )
 
-        save_conversation(
+        # Group-committed by the write-behind queue; pass wait=True for read-your-writes
+        await adb.queue_conversation(
             customer_email,
             session_id,
             request.speaker,
@@ -1213,7 +1511,7 @@ async def record_livekit_transcript_endpoint(request: LiveKitTranscriptRequest):
             timestamp
         )
 
-        update_livekit_session_activity(
+        await adb.queue_session_activity(
             request.room_name,
             customer_email=customer_email,
             last_transcript_at=timestamp
@@ -0,0 +1,285 @@
+"""
+Background email dispatcher with pooled SMTP connections
+
+Endpoints used to open a fresh SMTP connection (connect, STARTTLS, login) per
+email and send it inline, so a slow mail server added seconds to bookings and
+password resets. Messages are now put on a bounded queue and returned from
+immediately; EMAIL_WORKERS threads each keep one authenticated SMTP connection
+open and reuse it for every message they send. A connection idle for longer
+than SMTP_IDLE_SECONDS is closed (servers drop idle clients anyway) and reopened
+on demand. Transient failures are retried with exponential backoff on a fresh
+connection; permanent ones (refused recipient, 5xx, bad credentials) are not.
+
+    from email_dispatcher import get_email_dispatcher
+    queued = get_email_dispatcher().enqueue(to, subject, html_body)
+"""
+
+import atexit
+import logging
+import os
+import queue
+import smtplib
+import threading
+import time
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from typing import Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+EMAIL_WORKERS = int(os.getenv("EMAIL_WORKERS", "2"))            # = pooled SMTP connections
+EMAIL_QUEUE_SIZE = int(os.getenv("EMAIL_QUEUE_SIZE", "1000"))   # enqueue fails fast above this
+SMTP_TIMEOUT_SECONDS = 30
+SMTP_IDLE_SECONDS = 60
+MAX_ATTEMPTS = 4
+BACKOFF_BASE_SECONDS = 1.0
+
+
+def smtp_settings() -> Dict:
+    """SMTP configuration from the environment (read once per dispatcher)"""
+    username = os.getenv("SMTP_USERNAME")
+    return {
+        'server': os.getenv("SMTP_SERVER"),
+        'port': int(os.getenv("SMTP_PORT", "587")),
+        'username': username,
+        'password': os.getenv("SMTP_PASSWORD"),
+        'from_email': os.getenv("SMTP_FROM_EMAIL", username),
+        'starttls': os.getenv("SMTP_STARTTLS", "true").lower() != "false",
+    }
+
+
+def _is_transient(error: Exception) -> bool:
+    """Worth retrying on a fresh connection? 4xx replies and network errors are; 5xx are not"""
+    if isinstance(error, (smtplib.SMTPRecipientsRefused, smtplib.SMTPAuthenticationError)):
+        return False
+    if isinstance(error, smtplib.SMTPResponseException):
+        return 400 <= error.smtp_code < 500
+    return isinstance(error, (smtplib.SMTPException, OSError))
+
+
+class _Job:
+    __slots__ = ("message", "kind", "enqueued_at")
+
+    def __init__(self, message: MIMEMultipart, kind: str):
+        self.message = message
+        self.kind = kind
+        self.enqueued_at = time.perf_counter()
+
+
+class EmailDispatcher:
+    """Bounded email queue drained by worker threads that each reuse one SMTP connection."""
+
+    def __init__(self, settings: Optional[Dict] = None, workers: int = EMAIL_WORKERS,
+                 max_queued: int = EMAIL_QUEUE_SIZE,
+                 connect: Optional[Callable[[], smtplib.SMTP]] = None):
+        self.settings = settings or smtp_settings()
+        self._connect = connect or self._open_connection
+        self._queue: "queue.Queue[Optional[_Job]]" = queue.Queue(maxsize=max_queued)
+        self._stopping = False
+        self._lock = threading.Lock()
+        self._stats = {
+            'enqueued': 0,
+            'sent': 0,
+            'failed': 0,
+            'retries': 0,
+            'dropped': 0,
+            'connections_opened': 0,
+            'send_ms_total': 0.0,
+            'send_ms_max': 0.0,
+            'queue_wait_ms_total': 0.0,
+            'queue_wait_ms_max': 0.0,
+        }
+        self._threads = [
+            threading.Thread(target=self._run, name=f"email-dispatch-{i}", daemon=True)
+            for i in range(workers)
+        ] if self.configured else []
+        for thread in self._threads:
+            thread.start()
+
+    @property
+    def configured(self) -> bool:
+        s = self.settings
+        return bool(s['server'] and s['username'] and s['password'])
+
+    # ---------- producers ----------
+
+    def enqueue(self, to_email: str, subject: str, html_body: str,
+                text_body: Optional[str] = None, kind: str = "email") -> bool:
+        """Queue a message for delivery; False if SMTP is not configured or the queue is full"""
+        if not self.configured or self._stopping:
+            return False
+
+        msg = MIMEMultipart('alternative')
+        msg['Subject'] = subject
+        msg['From'] = self.settings['from_email']
+        msg['To'] = to_email
+        if text_body:
+            msg.attach(MIMEText(text_body, 'plain'))
+        msg.attach(MIMEText(html_body, 'html'))
+
+        try:
+            self._queue.put_nowait(_Job(msg, kind))
+        except queue.Full:
+            self._count('dropped')
+            logger.error(f"❌ Email queue full ({self._queue.maxsize}) - {kind} to {to_email} not sent")
+            return False
+        self._count('enqueued')
+        return True
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Block until every queued message has been sent or given up on"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._queue.all_tasks_done:
+            while self._queue.unfinished_tasks:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._queue.all_tasks_done.wait(remaining)
+        return True
+
+    # ---------- workers ----------
+
+    def _open_connection(self) -> smtplib.SMTP:
+        s = self.settings
+        server = smtplib.SMTP(s['server'], s['port'], timeout=SMTP_TIMEOUT_SECONDS)
+        try:
+            if s['starttls']:
+                server.starttls()
+            server.login(s['username'], s['password'])
+        except Exception:
+            server.close()
+            raise
+        return server
+
+    @staticmethod
+    def _close(server: Optional[smtplib.SMTP]) -> None:
+        if server is None:
+            return
+        try:
+            server.quit()
+        except Exception:
+            server.close()
+
+    def _send(self, server: Optional[smtplib.SMTP], job: _Job) -> Optional[smtplib.SMTP]:
+        """Deliver one job, retrying on a fresh connection; returns the connection to keep"""
+        for attempt in range(1, MAX_ATTEMPTS + 1):
+            try:
+                if server is None:
+                    server = self._connect()
+                    self._count('connections_opened')
+                started = time.perf_counter()
+                server.send_message(job.message)
+                self._record_sent(started, job)
+                logger.info(f"📧 {job.kind} SENT to {job.message['To']}")
+                return server
+            except Exception as error:
+                transient = _is_transient(error)
+                if transient:
+                    # The connection may be broken; retry on a fresh one
+                    self._close(server)
+                    server = None
+                if not transient or attempt == MAX_ATTEMPTS or self._stopping:
+                    self._count('failed')
+                    logger.warning(f"⚠️ {job.kind} to {job.message['To']} failed after {attempt} attempt(s): {error}")
+                    return server
+                self._count('retries')
+                time.sleep(BACKOFF_BASE_SECONDS * 2 ** (attempt - 1))
+        return server
+
+    def _run(self) -> None:
+        server = None
+        while True:
+            try:
+                job = self._queue.get(timeout=SMTP_IDLE_SECONDS if server else None)
+            except queue.Empty:
+                self._close(server)  # idle: release the connection, reopen on the next message
+                server = None
+                continue
+            try:
+                if job is None:
+                    self._close(server)
+                    return
+                server = self._send(server, job)
+            finally:
+                self._queue.task_done()
+
+    # ---------- metrics / lifecycle ----------
+
+    def _count(self, key: str) -> None:
+        with self._lock:
+            self._stats[key] += 1
+
+    def _record_sent(self, started: float, job: _Job) -> None:
+        sent_ms = (time.perf_counter() - started) * 1000
+        wait_ms = (started - job.enqueued_at) * 1000
+        with self._lock:
+            self._stats['sent'] += 1
+            self._stats['send_ms_total'] += sent_ms
+            self._stats['send_ms_max'] = max(self._stats['send_ms_max'], sent_ms)
+            self._stats['queue_wait_ms_total'] += wait_ms
+            self._stats['queue_wait_ms_max'] = max(self._stats['queue_wait_ms_max'], wait_ms)
+
+    def stats(self) -> Dict:
+        """Queue depth, delivery counters and send / queue-wait latency."""
+        with self._lock:
+            s = dict(self._stats)
+        sent = s['sent'] or 1
+        return {
+            'configured': self.configured,
+            'workers': len(self._threads),
+            'queue_depth': self._queue.qsize(),
+            'queue_capacity': self._queue.maxsize,
+            'enqueued': s['enqueued'],
+            'sent': s['sent'],
+            'failed': s['failed'],
+            'retries': s['retries'],
+            'dropped': s['dropped'],
+            'connections_opened': s['connections_opened'],
+            'avg_send_ms': round(s['send_ms_total'] / sent, 3),
+            'max_send_ms': round(s['send_ms_max'], 3),
+            'avg_queue_wait_ms': round(s['queue_wait_ms_total'] / sent, 3),
+            'max_queue_wait_ms': round(s['queue_wait_ms_max'], 3),
+        }
+
+    def stop(self, timeout: Optional[float] = 10.0) -> None:
+        """Send what is still queued (within `timeout`) and stop the workers."""
+        self.flush(timeout)
+        self._stopping = True
+        for _ in self._threads:
+            try:
+                self._queue.put(None, timeout=1)
+            except queue.Full:
+                break
+        for thread in self._threads:
+            thread.join(1)
+
+
+_dispatcher: Optional[EmailDispatcher] = None
+_dispatcher_lock = threading.Lock()
+
+
+def get_email_dispatcher() -> EmailDispatcher:
+    """Return the process-wide dispatcher, starting it on first use"""
+    global _dispatcher
+    with _dispatcher_lock:
+        if _dispatcher is None:
+            _dispatcher = EmailDispatcher()
+        return _dispatcher
+
+
+def shutdown_email_dispatcher(timeout: Optional[float] = 10.0) -> None:
+    """Drain queued emails and stop the dispatcher threads"""
+    global _dispatcher
+    with _dispatcher_lock:
+        if _dispatcher is not None:
+            _dispatcher.stop(timeout)
+            _dispatcher = None
+
+
+def email_dispatch_stats() -> Dict:
+    if _dispatcher is None:
+        return {'running': False}
+    return {'running': True, **_dispatcher.stats()}
+
+
+atexit.register(shutdown_email_dispatcher)
@@ -0,0 +1,151 @@
+"""
+Precompiled email templates
+
+The email bodies live in templates/email/ (one .html and one plain-text .txt per
+email). Each file is read once at import and compiled into a closure that
+joins its literal chunks and (escaped) values. Repeated pieces such as the
+transcript message cards are rendered one by one and joined once, so a
+transcript with thousands of messages renders in linear time without repeated
+string concatenation. stream() yields the same output chunk by chunk for
+writers that do not need the whole body in memory.
+
+Placeholders:
+    {{ name }}        value, HTML-escaped in .html templates
+    {{ name|safe }}   inserted as-is; may also be an iterable of already
+                      rendered chunks (e.g. the transcript messages stream)
+
+    from email_templates import render, render_fragment, render_text
+    html = render("password_reset", reset_link=link)
+"""
+
+import html
+import os
+import re
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Tuple, Union
+
+TEMPLATE_DIR = Path(__file__).parent / "templates" / "email"
+PLAIN_TEXT_PARTS = os.getenv("EMAIL_PLAIN_TEXT", "true").lower() != "false"
+
+_PLACEHOLDER = re.compile(r"\{\{\s*(\w+)(\|safe)?\s*\}\}")
+_escape = html.escape
+
+
+def _safe(value) -> str:
+    """Value of a |safe placeholder: inserted as-is, iterables of chunks joined"""
+    if isinstance(value, str):
+        return value
+    if isinstance(value, (int, float)):
+        return str(value)
+    return "".join(value)
+
+
+def _compile(parts) -> Callable[[Dict], str]:
+    """Closure that copies the literal chunks, fills in the placeholder slots and joins once"""
+    chunks: List[Optional[str]] = []
+    slots: List[Tuple[int, str, bool]] = []
+    for part in parts:
+        if isinstance(part, str):
+            chunks.append(part)
+        else:
+            slots.append((len(chunks), part[0], part[1]))
+            chunks.append(None)
+    template_chunks, template_slots = tuple(chunks), tuple(slots)
+
+    def render(v: Dict) -> str:
+        out = list(template_chunks)
+        for index, placeholder, escape in template_slots:
+            out[index] = _escape(str(v[placeholder])) if escape else _safe(v[placeholder])
+        return "".join(out)
+    return render
+
+
+class Template:
+    """A template parsed once into a closure that joins its literal chunks and values."""
+
+    __slots__ = ("name", "_parts", "_render")
+
+    def __init__(self, name: str, source: str, autoescape: bool):
+        self.name = name
+        parts: List[Union[str, Tuple[str, bool]]] = []
+        escaped: Dict[str, bool] = {}
+        position = 0
+        for match in _PLACEHOLDER.finditer(source):
+            placeholder, escape = match.group(1), autoescape and not match.group(2)
+            if escaped.setdefault(placeholder, escape) != escape:
+                raise ValueError(f"Template {name} uses '{placeholder}' both escaped and |safe")
+            if match.start() > position:
+                parts.append(source[position:match.start()])
+            parts.append((placeholder, escape))
+            position = match.end()
+        if position < len(source):
+            parts.append(source[position:])
+        self._parts = tuple(parts)
+        self._render = _compile(parts)
+
+    def render(self, context: Dict) -> str:
+        """Render to one string"""
+        if any(not isinstance(value, (str, int, float)) for value in context.values()):
+            # A chunk iterable (e.g. thousands of message cards): one join over the stream
+            # instead of joining the chunks first and copying the result again
+            return "".join(self.stream(context))
+        try:
+            return self._render(context)
+        except KeyError as missing:
+            raise KeyError(f"Template {self.name} needs {missing}") from None
+
+    def stream(self, context: Dict) -> Iterator[str]:
+        """Yield the output chunk by chunk, without materialising |safe iterables (streaming writers)"""
+        for part in self._parts:
+            if isinstance(part, str):
+                yield part
+                continue
+            placeholder, escape = part
+            try:
+                value = context[placeholder]
+            except KeyError:
+                raise KeyError(f"Template {self.name} needs '{placeholder}'") from None
+            if escape:
+                yield _escape(str(value))
+            elif isinstance(value, (str, int, float)):
+                yield str(value)
+            else:
+                yield from value
+
+
+def _load_templates(directory: Path = TEMPLATE_DIR) -> Dict[str, Template]:
+    templates = {}
+    for path in sorted(directory.iterdir()):
+        if path.suffix in (".html", ".txt"):
+            templates[path.name] = Template(path.name, path.read_text(encoding="utf-8"),
+                                            autoescape=path.suffix == ".html")
+    return templates
+
+
+TEMPLATES: Dict[str, Template] = _load_templates()
+
+
+def _template(name: str, text: bool) -> Template:
+    return TEMPLATES[f"{name}.{'txt' if text else 'html'}"]
+
+
+def stream(name: str, context: Dict, text: bool = False) -> Iterator[str]:
+    """Chunks of the named template (`name` without extension), e.g. for writing to a socket"""
+    return _template(name, text).stream(context)
+
+
+def render_fragment(name: str, context: Dict, text: bool = False) -> str:
+    """One rendered piece (e.g. a transcript message card) for a |safe iterable"""
+    return _template(name, text).render(context)
+
+
+def render(name: str, **context) -> str:
+    """HTML body of the named template"""
+    return _template(name, False).render(context)
+
+
+def render_text(name: str, **context) -> Optional[str]:
+    """Plain-text alternative of the named template, or None when disabled / not provided"""
+    if not PLAIN_TEXT_PARTS or f"{name}.txt" not in TEMPLATES:
+        return None
+    return _template(name, True).render(context)
@@ -9,6 +9,7 @@ import azure.cognitiveservices.speech as speechsdk
 from openai import AzureOpenAI
 from datetime import datetime
 import base64
+import uuid
 from config import (
     AZURE_OPENAI_ENDPOINT,
     AZURE_OPENAI_API_KEY,
@@ -19,6 +20,10 @@ from config import (
     LANGUAGE_VOICES,
     TRAVEL_CONTEXT
 )
+from tts_cache import tts_cache
+
+# Azure's default output for file synthesis; part of the TTS cache key
+TTS_AUDIO_FORMAT = "riff-16khz-16bit-mono-pcm"
 
 logger = logging.getLogger(__name__)
 
@@ -137,17 +142,29 @@ def speech_to_text(file_path):
         return None, None
 
 def text_to_speech(text, language_code='en-US'):
-    """Convert text to speech using Azure Speech Services with language support"""
+    """Convert text to speech using Azure Speech Services with language support
+
+    Repeated phrases are served from the TTS cache (tts_cache.py) instead of Azure.
+    """
     if not text:
         return None
     
+    # Get language prefix (en from en-US)
+    lang_prefix = language_code.split('-')[0] if language_code else 'en'
+    
+    # Select appropriate voice based on language
+    voice_name = LANGUAGE_VOICES.get(lang_prefix, 'en-US-GuyNeural')
+    
+    return tts_cache.get_or_synthesize(text, voice_name, TTS_AUDIO_FORMAT,
+                                       lambda: _synthesize_speech(text, voice_name))
+
+def prewarm_speech(phrases, language_code='en-US'):
+    """Cache the audio of fixed prompts (e.g. the welcome message) before the first request"""
+    return tts_cache.prewarm(phrases, lambda text: text_to_speech(text, language_code))
+
+def _synthesize_speech(text, voice_name):
+    """One Azure synthesis to a temporary WAV file; returns the audio bytes or None"""
     try:
-        # Get language prefix (en from en-US)
-        lang_prefix = language_code.split('-')[0] if language_code else 'en'
-        
-        # Select appropriate voice based on language
-        voice_name = LANGUAGE_VOICES.get(lang_prefix, 'en-US-GuyNeural')
-        
         # Create new speech config with selected voice
         tts_speech_config = speechsdk.SpeechConfig(
             subscription=AZURE_SPEECH_KEY,
@@ -155,7 +172,7 @@ def text_to_speech(text, language_code='en-US'):
         )
         tts_speech_config.speech_synthesis_voice_name = voice_name
         
-        speech_file_path = f"{datetime.now().strftime('%Y%m%d%H%M%S')}_speech.wav"
+        speech_file_path = f"{datetime.now().strftime('%Y%m%d%H%M%S')}_{uuid.uuid4().hex[:8]}_speech.wav"
         audio_config = speechsdk.audio.AudioOutputConfig(filename=speech_file_path)
         
         speech_synthesizer = speechsdk.SpeechSynthesizer(
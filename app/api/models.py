@@ -16,6 +16,9 @@ class CustomerLogin(BaseModel):
     password: str
     name: str = None
 
+class TokenRefreshRequest(BaseModel):
+    refresh_token: str
+
 class CustomerRegister(BaseModel):
     email: EmailStr
     password: str
@@ -0,0 +1,184 @@
+"""
+Password hashing on a dedicated process pool
+
+PBKDF2 with 100,000 iterations costs tens of milliseconds of CPU per call. Run
+inside `def` endpoints it holds one of FastAPI's few threadpool threads for the
+whole hash, so a login burst starved every other sync endpoint. The async
+/login, /register and /reset_password endpoints now await hashes computed on
+AUTH_WORKERS separate processes. At most AUTH_WORKERS hashes run at once;
+further callers wait up to AUTH_QUEUE_TIMEOUT seconds for a slot and then get
+AuthBusy (the endpoints answer 503 with Retry-After). Comparison of the
+stored hash uses hmac.compare_digest. Workers are spawned, not forked: the API
+process already runs pool, queue and dispatcher threads whose locks a forked
+child could inherit held. Call start() at startup so no request pays for it.
+
+    from password_hasher import password_hasher, AuthBusy
+    salt, password_hash = await password_hasher.hash_password(password)
+    valid = await password_hasher.verify_password(password, salt, stored_hash)
+"""
+
+import asyncio
+import hashlib
+import hmac
+import multiprocessing
+import os
+import secrets
+import threading
+import time
+import weakref
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Optional, Tuple
+
+PBKDF2_ITERATIONS = 100000
+AUTH_WORKERS = int(os.getenv("AUTH_WORKERS", str(min(4, os.cpu_count() or 1))))
+AUTH_QUEUE_TIMEOUT = float(os.getenv("AUTH_QUEUE_TIMEOUT", "2"))
+
+
+class AuthBusy(Exception):
+    """No hashing slot became free within the queue timeout."""
+
+
+def pbkdf2_hex(password: str, salt: str) -> str:
+    return hashlib.pbkdf2_hmac('sha256', password.encode('utf-8'), salt.encode('utf-8'),
+                               PBKDF2_ITERATIONS).hex()
+
+
+def hashes_match(password: str, salt: str, stored_hash: str) -> bool:
+    """Constant-time check of a password against its stored hash"""
+    return hmac.compare_digest(pbkdf2_hex(password, salt), stored_hash or "")
+
+
+def _timed_pbkdf2(password: str, salt: str) -> Tuple[str, float]:
+    """Runs in a worker process; also returns the CPU time spent hashing"""
+    started = time.perf_counter()
+    return pbkdf2_hex(password, salt), time.perf_counter() - started
+
+
+class HashMetrics:
+    """Hash counts, rejections and hash-time / queue-wait timings."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {
+            'hashes': 0, 'rejected': 0, 'in_flight': 0,
+            'hash_ms_total': 0.0, 'hash_ms_max': 0.0,
+            'queue_wait_ms_total': 0.0, 'queue_wait_ms_max': 0.0,
+        }
+
+    def started(self, queue_wait: float) -> None:
+        with self._lock:
+            self._stats['in_flight'] += 1
+            self._stats['queue_wait_ms_total'] += queue_wait * 1000
+            self._stats['queue_wait_ms_max'] = max(self._stats['queue_wait_ms_max'], queue_wait * 1000)
+
+    def finished(self, hash_time: Optional[float]) -> None:
+        with self._lock:
+            self._stats['in_flight'] -= 1
+            if hash_time is not None:
+                self._stats['hashes'] += 1
+                self._stats['hash_ms_total'] += hash_time * 1000
+                self._stats['hash_ms_max'] = max(self._stats['hash_ms_max'], hash_time * 1000)
+
+    def rejected(self) -> None:
+        with self._lock:
+            self._stats['rejected'] += 1
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            s = dict(self._stats)
+        admitted = (s['hashes'] + s['in_flight']) or 1
+        return {
+            'hashes': s['hashes'],
+            'rejected': s['rejected'],
+            'in_flight': s['in_flight'],
+            'avg_hash_ms': round(s['hash_ms_total'] / (s['hashes'] or 1), 3),
+            'max_hash_ms': round(s['hash_ms_max'], 3),
+            'avg_queue_wait_ms': round(s['queue_wait_ms_total'] / admitted, 3),
+            'max_queue_wait_ms': round(s['queue_wait_ms_max'], 3),
+        }
+
+
+class PasswordHasher:
+    """Awaitable PBKDF2 on a process pool, capped at `workers` concurrent hashes."""
+
+    def __init__(self, workers: int = AUTH_WORKERS, queue_timeout: float = AUTH_QUEUE_TIMEOUT):
+        self.workers = max(1, workers)
+        self.queue_timeout = queue_timeout
+        self.metrics = HashMetrics()
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._executor_lock = threading.Lock()
+        # asyncio.Semaphore is bound to one event loop
+        self._gates: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = \
+            weakref.WeakKeyDictionary()
+
+    def _pool(self) -> ProcessPoolExecutor:
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.workers,
+                                                     mp_context=multiprocessing.get_context("spawn"))
+            return self._executor
+
+    def start(self) -> None:
+        """Start the worker processes now instead of on the first hash"""
+        pool = self._pool()
+        for future in [pool.submit(int) for _ in range(self.workers)]:
+            future.result()
+
+    def _reset_pool(self, broken: ProcessPoolExecutor) -> None:
+        with self._executor_lock:
+            if self._executor is broken:
+                self._executor = None
+        broken.shutdown(wait=False)
+
+    async def _pbkdf2(self, password: str, salt: str) -> str:
+        loop = asyncio.get_running_loop()
+        gate = self._gates.get(loop)
+        if gate is None:
+            gate = self._gates.setdefault(loop, asyncio.Semaphore(self.workers))
+
+        queued = time.perf_counter()
+        try:
+            await asyncio.wait_for(gate.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.metrics.rejected()
+            raise AuthBusy(f"no password hashing slot free within {self.queue_timeout}s") from None
+
+        self.metrics.started(time.perf_counter() - queued)
+        hash_time = None
+        try:
+            pool = self._pool()
+            try:
+                digest, hash_time = await loop.run_in_executor(pool, _timed_pbkdf2, password, salt)
+            except BrokenProcessPool:
+                # A worker died (e.g. OOM-killed): start a fresh pool and retry once
+                self._reset_pool(pool)
+                digest, hash_time = await loop.run_in_executor(self._pool(), _timed_pbkdf2, password, salt)
+            return digest
+        finally:
+            self.metrics.finished(hash_time)
+            gate.release()
+
+    async def hash_password(self, password: str) -> Tuple[str, str]:
+        """Hash a password with a random salt; returns (salt, hash)"""
+        salt = secrets.token_hex(16)
+        return salt, await self._pbkdf2(password, salt)
+
+    async def verify_password(self, password: str, salt: str, stored_hash: str) -> bool:
+        """Verify a password against its stored hash (constant-time comparison)"""
+        return hmac.compare_digest(await self._pbkdf2(password, salt), stored_hash or "")
+
+    def stats(self) -> Dict:
+        return {'workers': self.workers, 'queue_timeout_s': self.queue_timeout,
+                'running': self._executor is not None, **self.metrics.snapshot()}
+
+    def shutdown(self) -> None:
+        """Stop the worker processes"""
+        with self._executor_lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+
+# Shared pool used by the auth endpoints
+password_hasher = PasswordHasher()
@@ -0,0 +1,164 @@
+"""
+Signed session tokens for the customer endpoints
+
+/login (the only step that pays for PBKDF2) now also issues a short-lived
+access token and a longer-lived refresh token, both HS256 JWTs signed with
+SECRET_KEY (python-jose). Clients send `Authorization: Bearer <access_token>`;
+the API middleware checks the signature and expiry without touching the
+database and caches the decoded claims per token, so a repeat request costs a
+dictionary lookup instead of another signature check, let alone another
+password hash. /auth/refresh trades a refresh token for a new pair.
+
+Tokens are only issued with a real SECRET_KEY, shared by every worker. While it
+is unset or still the env.example placeholder, SessionTokens is disabled:
+/login returns no tokens and every token is rejected.
+
+Claims: sub (customer email, lower-cased), name, cid (customer id),
+typ ("access" / "refresh"), iat, exp, jti.
+
+    from session_tokens import session_tokens, TokenError
+    tokens = session_tokens.issue(customer)           # after a successful login
+    claims = session_tokens.verify(access_token)      # raises TokenError
+"""
+
+import logging
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Optional
+
+from jose import JWTError, jwt
+
+logger = logging.getLogger(__name__)
+
+ALGORITHM = "HS256"
+ACCESS_TOKEN_TTL = int(os.getenv("ACCESS_TOKEN_TTL", "900"))          # 15 minutes
+REFRESH_TOKEN_TTL = int(os.getenv("REFRESH_TOKEN_TTL", "604800"))     # 7 days
+TOKEN_CACHE_SIZE = int(os.getenv("AUTH_TOKEN_CACHE_SIZE", "10000"))
+_PLACEHOLDER_SECRETS = {"", "your-secret-key-here", "change-me-in-production"}
+
+
+class TokenError(Exception):
+    """Token missing, malformed, wrongly signed, expired or of the wrong type."""
+
+
+def _secret_key() -> str:
+    secret = os.getenv("SECRET_KEY", "")
+    if secret in _PLACEHOLDER_SECRETS:
+        # A per-process key would sign everyone out on restart and break across workers
+        logger.warning("⚠️ SECRET_KEY not set: session tokens are disabled")
+        return ""
+    return secret
+
+
+class SessionTokens:
+    """Issues and verifies access/refresh tokens, caching verified access-token claims.
+
+    An empty secret disables tokens: nothing is issued and verification always fails.
+    """
+
+    def __init__(self, secret: Optional[str] = None, access_ttl: int = ACCESS_TOKEN_TTL,
+                 refresh_ttl: int = REFRESH_TOKEN_TTL, cache_size: int = TOKEN_CACHE_SIZE,
+                 clock: Callable[[], float] = time.time):
+        self._secret = secret if secret is not None else _secret_key()
+        self.enabled = bool(self._secret)
+        self.access_ttl = access_ttl
+        self.refresh_ttl = refresh_ttl
+        self.cache_size = max(0, cache_size)
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._cache: "OrderedDict[str, Dict]" = OrderedDict()
+        self._stats = {'issued': 0, 'verified': 0, 'cache_hits': 0, 'rejected': 0, 'refreshed': 0}
+
+    def _count(self, key: str) -> None:
+        with self._lock:
+            self._stats[key] += 1
+
+    def _encode(self, customer: Dict, token_type: str, ttl: int, now: int) -> str:
+        claims = {
+            'sub': customer['email'].lower(),
+            'name': customer.get('name'),
+            'cid': customer.get('id'),
+            'typ': token_type,
+            'iat': now,
+            'exp': now + ttl,
+            'jti': secrets.token_hex(8),
+        }
+        return jwt.encode(claims, self._secret, algorithm=ALGORITHM)
+
+    def issue(self, customer: Dict) -> Dict:
+        """Access + refresh token for a customer row ({'email', 'name', 'id'}); {} when disabled"""
+        if not self.enabled:
+            return {}
+        now = int(self._clock())
+        self._count('issued')
+        return {
+            'access_token': self._encode(customer, "access", self.access_ttl, now),
+            'refresh_token': self._encode(customer, "refresh", self.refresh_ttl, now),
+            'token_type': "bearer",
+            'expires_in': self.access_ttl,
+        }
+
+    def _decode(self, token: str, token_type: str) -> Dict:
+        if not self.enabled:
+            raise TokenError("Session tokens are disabled (SECRET_KEY not set)")
+        try:
+            # exp is checked below against our clock (also used for cached claims)
+            claims = jwt.decode(token, self._secret, algorithms=[ALGORITHM],
+                                options={'verify_exp': False})
+        except JWTError as e:
+            raise TokenError(f"Invalid token: {e}") from None
+        if claims.get('typ') != token_type:
+            raise TokenError(f"Expected a {token_type} token")
+        if not isinstance(claims.get('exp'), int) or not claims.get('sub'):
+            raise TokenError("Invalid token: missing claims")
+        if claims['exp'] <= self._clock():
+            raise TokenError("Token expired")
+        return claims
+
+    def verify(self, token: str) -> Dict:
+        """Claims of a valid access token; cached until the token expires"""
+        if not token:
+            self._count('rejected')
+            raise TokenError("Missing token")
+        with self._lock:
+            claims = self._cache.get(token)
+            if claims is not None:
+                if claims['exp'] > self._clock():
+                    self._cache.move_to_end(token)
+                    self._stats['cache_hits'] += 1
+                    return claims
+                del self._cache[token]
+        try:
+            claims = self._decode(token, "access")
+        except TokenError:
+            self._count('rejected')
+            raise
+        with self._lock:
+            self._stats['verified'] += 1
+            if self.cache_size:
+                self._cache[token] = claims
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        return claims
+
+    def refresh_claims(self, refresh_token: str) -> Dict:
+        """Claims of a valid refresh token (not cached; refreshes are rare)"""
+        try:
+            claims = self._decode(refresh_token, "refresh")
+        except TokenError:
+            self._count('rejected')
+            raise
+        self._count('refreshed')
+        return claims
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {'enabled': self.enabled, 'access_ttl_s': self.access_ttl, 'refresh_ttl_s': self.refresh_ttl,
+                    'cached': len(self._cache), 'cache_size': self.cache_size, **self._stats}
+
+
+# Shared instance used by the API middleware and the auth endpoints
+session_tokens = SessionTokens()
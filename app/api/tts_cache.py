@@ -0,0 +1,251 @@
+"""
+Content-addressed cache for synthesized speech
+
+Azure TTS is billed per character and takes a second or more per phrase, yet
+the /welcome greeting is identical on every page load and /voice_chat keeps
+repeating the same confirmations. llm.text_to_speech now looks audio up by
+sha256(voice, format, text) first: an in-memory LRU (TTS_CACHE_MEMORY_MB)
+in front of a directory of audio files (TTS_CACHE_DISK_MB), both evicting
+least-recently-used entries once over budget. Only successful syntheses are
+stored; concurrent misses for the same phrase synthesize it once.
+
+    from tts_cache import tts_cache
+    audio = tts_cache.get_or_synthesize(text, voice, "riff-16khz-16bit-mono-pcm", synthesize)
+    tts_cache.stats()   # hits / misses, Azure characters and synthesis time saved
+"""
+
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+TTS_CACHE_ENABLED = os.getenv("TTS_CACHE_ENABLED", "true").lower() != "false"
+TTS_CACHE_DIR = os.getenv("TTS_CACHE_DIR", str(Path(__file__).parent / "tts_cache"))
+TTS_CACHE_MEMORY_MB = float(os.getenv("TTS_CACHE_MEMORY_MB", "32"))
+TTS_CACHE_DISK_MB = float(os.getenv("TTS_CACHE_DISK_MB", "512"))
+AUDIO_SUFFIX = ".audio"
+
+
+def cache_key(text: str, voice: str, audio_format: str) -> str:
+    """Content address of one synthesized phrase"""
+    return hashlib.sha256(f"{voice}\0{audio_format}\0{text}".encode("utf-8")).hexdigest()
+
+
+class TTSCache:
+    """Two-level (memory, disk) LRU of synthesized audio keyed by cache_key()."""
+
+    def __init__(self, directory: Optional[str] = TTS_CACHE_DIR,
+                 memory_budget: int = int(TTS_CACHE_MEMORY_MB * 1024 * 1024),
+                 disk_budget: int = int(TTS_CACHE_DISK_MB * 1024 * 1024),
+                 enabled: bool = TTS_CACHE_ENABLED):
+        self.directory = Path(directory) if directory else None
+        self.memory_budget = max(0, memory_budget)
+        self.disk_budget = max(0, disk_budget)
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._memory: "OrderedDict[str, bytes]" = OrderedDict()
+        self._memory_bytes = 0
+        self._disk: "Optional[OrderedDict[str, int]]" = None  # key -> size, oldest use first
+        self._disk_bytes = 0
+        self._inflight: Dict[str, threading.Lock] = {}
+        self._stats = {
+            'memory_hits': 0, 'disk_hits': 0, 'misses': 0, 'failures': 0, 'evictions': 0,
+            'chars_saved': 0, 'chars_synthesized': 0, 'synth_ms_total': 0.0,
+        }
+
+    # -------------------- memory level --------------------
+
+    def _memory_get(self, key: str) -> Optional[bytes]:
+        audio = self._memory.get(key)
+        if audio is not None:
+            self._memory.move_to_end(key)
+        return audio
+
+    def _memory_put(self, key: str, audio: bytes) -> None:
+        if len(audio) > self.memory_budget:
+            return
+        previous = self._memory.pop(key, None)
+        if previous is not None:
+            self._memory_bytes -= len(previous)
+        self._memory[key] = audio
+        self._memory_bytes += len(audio)
+        while self._memory_bytes > self.memory_budget:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= len(evicted)
+            self._stats['evictions'] += 1
+
+    # -------------------- disk level --------------------
+
+    def _path(self, key: str) -> Path:
+        return self.directory / key[:2] / f"{key}{AUDIO_SUFFIX}"
+
+    def _disk_index(self) -> "OrderedDict[str, int]":
+        """Files already on disk, least recently used first (loaded on first use)"""
+        if self._disk is None:
+            entries = []
+            if self.directory is not None and self.directory.is_dir():
+                for path in self.directory.glob(f"*/*{AUDIO_SUFFIX}"):
+                    try:
+                        stat = path.stat()
+                    except OSError:
+                        continue
+                    entries.append((stat.st_mtime, path.stem, stat.st_size))
+            entries.sort()
+            self._disk = OrderedDict((key, size) for _, key, size in entries)
+            self._disk_bytes = sum(self._disk.values())
+        return self._disk
+
+    def _disk_get(self, key: str) -> Optional[bytes]:
+        if self.directory is None or key not in self._disk_index():
+            return None
+        path = self._path(key)
+        try:
+            audio = path.read_bytes()
+            os.utime(path)  # recency survives restarts
+        except OSError:
+            self._disk_bytes -= self._disk.pop(key, 0)
+            return None
+        self._disk.move_to_end(key)
+        return audio
+
+    def _disk_put(self, key: str, audio: bytes) -> None:
+        if self.directory is None or len(audio) > self.disk_budget:
+            return
+        path = self._path(key)
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            # Write then rename so a crash never leaves a truncated clip under the final name
+            fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                f.write(audio)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"⚠️ TTS cache write failed: {e}")
+            return
+        index = self._disk_index()
+        self._disk_bytes += len(audio) - index.pop(key, 0)
+        index[key] = len(audio)
+        while self._disk_bytes > self.disk_budget and index:
+            evicted, size = index.popitem(last=False)
+            self._disk_bytes -= size
+            self._stats['evictions'] += 1
+            try:
+                self._path(evicted).unlink()
+            except OSError:
+                pass
+
+    # -------------------- public API --------------------
+
+    def get(self, text: str, voice: str, audio_format: str) -> Optional[bytes]:
+        """Cached audio for a phrase, or None"""
+        if not self.enabled:
+            return None
+        key = cache_key(text, voice, audio_format)
+        with self._lock:
+            audio = self._memory_get(key)
+            if audio is not None:
+                self._stats['memory_hits'] += 1
+                self._stats['chars_saved'] += len(text)
+                return audio
+            audio = self._disk_get(key)
+            if audio is not None:
+                self._memory_put(key, audio)
+                self._stats['disk_hits'] += 1
+                self._stats['chars_saved'] += len(text)
+            return audio
+
+    def put(self, text: str, voice: str, audio_format: str, audio: bytes) -> None:
+        if not self.enabled or not audio:
+            return
+        key = cache_key(text, voice, audio_format)
+        with self._lock:
+            self._memory_put(key, audio)
+            self._disk_put(key, audio)
+
+    def get_or_synthesize(self, text: str, voice: str, audio_format: str,
+                          synthesize: Callable[[], Optional[bytes]]) -> Optional[bytes]:
+        """Cached audio, or the result of `synthesize()` (stored unless it returned nothing)"""
+        if not self.enabled:
+            return synthesize()
+        audio = self.get(text, voice, audio_format)
+        if audio is not None:
+            return audio
+
+        key = cache_key(text, voice, audio_format)
+        with self._lock:
+            phrase_lock = self._inflight.setdefault(key, threading.Lock())
+        with phrase_lock:
+            try:
+                # Another request may have synthesized this phrase while we waited
+                audio = self.get(text, voice, audio_format)
+                if audio is not None:
+                    return audio
+                started = time.perf_counter()
+                audio = synthesize()
+                elapsed_ms = (time.perf_counter() - started) * 1000
+                with self._lock:
+                    self._stats['misses'] += 1
+                    if not audio:
+                        self._stats['failures'] += 1
+                        return audio
+                    self._stats['chars_synthesized'] += len(text)
+                    self._stats['synth_ms_total'] += elapsed_ms
+                self.put(text, voice, audio_format, audio)
+                return audio
+            finally:
+                with self._lock:
+                    self._inflight.pop(key, None)
+
+    def prewarm(self, phrases, synthesize: Callable[[str], Optional[bytes]]) -> int:
+        """Synthesize fixed prompts (e.g. the welcome message) ahead of the first request.
+
+        `synthesize(text)` should go through get_or_synthesize (llm.text_to_speech does),
+        so phrases already cached are skipped. Returns how many phrases are now cached.
+        """
+        warmed = 0
+        for text in phrases:
+            try:
+                if synthesize(text):
+                    warmed += 1
+            except Exception as e:
+                logger.warning(f"⚠️ TTS prewarm failed for {text[:40]!r}: {e}")
+        logger.info(f"🔊 TTS cache prewarmed {warmed}/{len(phrases)} phrases")
+        return warmed
+
+    def stats(self) -> Dict:
+        with self._lock:
+            s = dict(self._stats)
+            memory = {'entries': len(self._memory), 'bytes': self._memory_bytes, 'budget': self.memory_budget}
+            disk = {'entries': len(self._disk) if self._disk is not None else None,
+                    'bytes': self._disk_bytes if self._disk is not None else None,
+                    'budget': self.disk_budget, 'directory': str(self.directory) if self.directory else None}
+        synthesized = (s['misses'] - s['failures']) or 1
+        hits = s['memory_hits'] + s['disk_hits']
+        avg_synth_ms = s['synth_ms_total'] / synthesized
+        return {
+            'enabled': self.enabled,
+            'hits': hits,
+            'memory_hits': s['memory_hits'],
+            'disk_hits': s['disk_hits'],
+            'misses': s['misses'],
+            'failures': s['failures'],
+            'hit_rate': round(hits / ((hits + s['misses']) or 1), 3),
+            'evictions': s['evictions'],
+            'chars_synthesized': s['chars_synthesized'],
+            'chars_saved': s['chars_saved'],  # Azure TTS bills per character
+            'avg_synth_ms': round(avg_synth_ms, 3),
+            'est_synth_ms_saved': round(avg_synth_ms * hits, 3),
+            'memory': memory,
+            'disk': disk,
+        }
+
+
+# Shared cache used by llm.text_to_speech
+tts_cache = TTSCache()
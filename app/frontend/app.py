@@ -36,6 +36,43 @@ st.set_page_config(
 BACKEND_URL = "http://localhost:8000"
 logger = logging.getLogger(__name__)
 
+def store_session_tokens(data):
+    """Keep the access/refresh tokens returned by /login, /register or /auth/refresh"""
+    if data.get('access_token'):
+        st.session_state.access_token = data['access_token']
+        st.session_state.refresh_token = data.get('refresh_token')
+        st.session_state.access_token_expires = time.time() + data.get('expires_in', 900)
+
+def clear_session_tokens():
+    for key in ('access_token', 'refresh_token', 'access_token_expires'):
+        st.session_state.pop(key, None)
+
+def auth_headers():
+    """Bearer header for the per-customer endpoints, refreshing the access token shortly before it expires.
+
+    If the token cannot be refreshed it is dropped, so requests go out without one
+    instead of with a token the backend will reject.
+    """
+    if not st.session_state.get('access_token'):
+        return {}
+    if time.time() > st.session_state.get('access_token_expires', 0) - 30:
+        refreshed = False
+        if st.session_state.get('refresh_token'):
+            try:
+                response = requests.post(f"{BACKEND_URL}/auth/refresh",
+                                         json={"refresh_token": st.session_state.refresh_token}, timeout=10)
+                if response.status_code == 200 and response.json().get('access_token'):
+                    store_session_tokens(response.json())
+                    refreshed = True
+                else:
+                    logger.warning(f"Token refresh rejected: {response.status_code}")
+            except requests.RequestException as e:
+                logger.warning(f"Token refresh failed: {e}")
+        if not refreshed:
+            clear_session_tokens()
+            return {}
+    return {"Authorization": f"Bearer {st.session_state.access_token}"}
+
 # Check for password reset parameters in URL
 def check_reset_params():
     """Check if URL contains password reset parameters"""
@@ -939,7 +976,7 @@ def show_my_bookings():
         return
     
     try:
-        response = requests.get(f"{BACKEND_URL}/my_bookings/{email}", timeout=10)
+        response = requests.get(f"{BACKEND_URL}/my_bookings/{email}", headers=auth_headers(), timeout=10)
         
         if response.status_code == 200:
             data = response.json()
@@ -981,7 +1018,7 @@ def show_my_bookings():
                                     response = requests.post(
                                         f"{BACKEND_URL}/cancel_booking",
                                         json={"booking_id": booking_id, "customer_email": email},
-                                        timeout=10
+                                        headers=auth_headers(), timeout=10
                                     )
                                     if response.status_code == 200:
                                         st.success("✅ Booking cancelled successfully!")
@@ -1072,7 +1109,7 @@ def show_my_bookings():
                                                         "new_departure_date": new_departure.strftime('%Y-%m-%d'),
                                                         "new_return_date": new_return.strftime('%Y-%m-%d') if new_return else None
                                                     },
-                                                    timeout=10
+                                                    headers=auth_headers(), timeout=10
                                                 )
                                                 if response.status_code == 200:
                                                     st.success("✅ Booking rescheduled successfully!")
@@ -1125,7 +1162,7 @@ def show_chat_history():
         return
     
     try:
-        response = requests.get(f"{BACKEND_URL}/chat_history/{email}", timeout=10)
+        response = requests.get(f"{BACKEND_URL}/chat_history/{email}", headers=auth_headers(), timeout=10)
         
         if response.status_code == 200:
             data = response.json()
@@ -1533,6 +1570,7 @@ def login_screen():
                             st.session_state.customer_name = name
                             st.session_state.customer_data = data.get('customer', {})
                             st.session_state.logged_in = True
+                            store_session_tokens(data)
                             
                             # Show toast message for successful registration
                             st.toast("✅ Successfully registered!")
@@ -1573,6 +1611,7 @@ def login_screen():
                             st.session_state.customer_name = customer_data.get('name', email.split('@')[0])
                             st.session_state.customer_data = customer_data
                             st.session_state.logged_in = True
+                            store_session_tokens(data)
                             st.success(f"✅ Welcome back {st.session_state.customer_name}!")
                             logger.info(f"✅ User logged in: {email}")
                             print(f"✅ INFO: User logged in: {email}")
@@ -1845,7 +1884,7 @@ def sidebar_navigation():
             email = st.session_state.get('customer_email')
             if email:
                 try:
-                    response = requests.get(f"{BACKEND_URL}/chat_history/{email}", timeout=10)
+                    response = requests.get(f"{BACKEND_URL}/chat_history/{email}", headers=auth_headers(), timeout=10)
                     print(f"📡 Backend response status: {response.status_code}")
                     
                     if response.status_code == 200:
@@ -1948,7 +1987,7 @@ def sidebar_navigation():
         """, unsafe_allow_html=True)
 
 def get_dashboard_stats(email):
-    """Get dashboard statistics"""
+    """Get dashboard statistics (precomputed by the backend's booking rollups)"""
     stats = {
         'total_bookings': 0,
         'cancelled_bookings': 0,
@@ -1957,19 +1996,12 @@ def get_dashboard_stats(email):
     }
     
     try:
-        # Get bookings
-        response = requests.get(f"{BACKEND_URL}/my_bookings/{email}", timeout=10)
+        response = requests.get(f"{BACKEND_URL}/dashboard/{email}", headers=auth_headers(), timeout=10)
         if response.status_code == 200:
-            bookings = response.json().get('bookings', [])
-            # Only count active bookings (exclude cancelled)
-            active_bookings = [b for b in bookings if b.get('status', '').lower() != 'cancelled']
-            cancelled_bookings = [b for b in bookings if b.get('status', '').lower() == 'cancelled']
-            
-            stats['total_bookings'] = len(active_bookings)
-            stats['cancelled_bookings'] = len(cancelled_bookings)
-            stats['total_spent'] = sum(booking.get('total_amount', 0) for booking in active_bookings)
-            # Count upcoming trips (status = confirmed or pending)
-            stats['upcoming_trips'] = sum(1 for b in active_bookings if b.get('status', '').lower() in ['confirmed', 'pending'])
+            rollup = response.json().get('stats', {})
+            # total_bookings counts active bookings only (cancelled excluded)
+            for key in stats:
+                stats[key] = rollup.get(key, 0) or 0
     
     except Exception as e:
         logger.error(f"Error fetching stats: {e}")
@@ -1986,59 +2018,31 @@ def get_booking_analytics(email):
     }
     
     try:
-        response = requests.get(f"{BACKEND_URL}/my_bookings/{email}", timeout=10)
+        response = requests.get(f"{BACKEND_URL}/dashboard/{email}", headers=auth_headers(), timeout=10)
         
         if response.status_code == 200:
             data = response.json()
-            bookings = data.get('bookings', [])
             
-            if bookings:
-                # Status distribution
-                status_counts = {}
-                monthly_totals = {}
-                destination_counts = {}
-                
-                for booking in bookings:
-                    # Count statuses
-                    status = booking.get('status', 'pending')
-                    status_counts[status] = status_counts.get(status, 0) + 1
-                    
-                    # Monthly spending
-                    try:
-                        booking_date = datetime.strptime(booking.get('created_at', ''), '%Y-%m-%d %H:%M:%S.%f')
-                        month_key = booking_date.strftime('%b %Y')
-                        amount = float(booking.get('total_amount', 0))
-                        monthly_totals[month_key] = monthly_totals.get(month_key, 0) + amount
-                    except:
-                        pass
-                    
-                    # Destination counts
-                    destination = booking.get('destination', 'Unknown')
-                    destination_counts[destination] = destination_counts.get(destination, 0) + 1
-                    
-                    # Recent bookings (last 3)
-                    if len(analytics['recent_bookings']) < 3:
-                        analytics['recent_bookings'].append({
-                            'service_type': booking.get('service_type', 'Travel Service'),
-                            'destination': destination,
-                            'departure_date': booking.get('departure_date', 'N/A'),
-                            'status': status,
-                            'amount': booking.get('total_amount', 0)
-                        })
-                
-                analytics['status_distribution'] = status_counts
-                
-                # Convert monthly totals to list format
-                for month, amount in monthly_totals.items():
-                    analytics['monthly_spending'].append({'month': month, 'amount': amount})
-                
-                # Convert destination counts to list format
-                for dest, count in destination_counts.items():
-                    analytics['top_destinations'].append({'destination': dest, 'count': count})
-                
-                # Sort by count
-                analytics['top_destinations'].sort(key=lambda x: x['count'], reverse=True)
-                analytics['monthly_spending'].sort(key=lambda x: x['month'])
+            analytics['status_distribution'] = data.get('status_distribution', {})
+            
+            # Months arrive as 'YYYY-MM', oldest first
+            for entry in data.get('monthly_spending', []):
+                try:
+                    month = datetime.strptime(entry['month'], '%Y-%m').strftime('%b %Y')
+                except (KeyError, ValueError):
+                    continue
+                analytics['monthly_spending'].append({'month': month, 'amount': float(entry.get('amount', 0))})
+            
+            analytics['top_destinations'] = data.get('top_destinations', [])
+            
+            for booking in data.get('recent_bookings', []):
+                analytics['recent_bookings'].append({
+                    'service_type': booking.get('service_type', 'Travel Service'),
+                    'destination': booking.get('destination', 'Unknown'),
+                    'departure_date': booking.get('departure_date', 'N/A'),
+                    'status': booking.get('status', 'pending'),
+                    'amount': booking.get('total_amount', 0)
+                })
     
     except Exception as e:
         logger.error(f"Error fetching analytics: {e}")
@@ -3041,7 +3045,7 @@ def show_dashboard_overview(email):
     
     # Fetch all bookings for this user
     try:
-        response = requests.get(f"{BACKEND_URL}/my_bookings/{email}", timeout=10)
+        response = requests.get(f"{BACKEND_URL}/my_bookings/{email}", headers=auth_headers(), timeout=10)
         
         if response.status_code == 200:
             data = response.json()
@@ -3086,7 +3090,7 @@ def show_dashboard_overview(email):
                                     response = requests.post(
                                         f"{BACKEND_URL}/cancel_booking",
                                         json={"booking_id": booking_id, "customer_email": email},
-                                        timeout=10
+                                        headers=auth_headers(), timeout=10
                                     )
                                     if response.status_code == 200:
                                         st.success("✅ Booking cancelled successfully!")
@@ -3177,7 +3181,7 @@ def show_dashboard_overview(email):
                                                         "new_departure_date": new_departure.strftime('%Y-%m-%d'),
                                                         "new_return_date": new_return.strftime('%Y-%m-%d') if new_return else None
                                                     },
-                                                    timeout=10
+                                                    headers=auth_headers(), timeout=10
                                                 )
                                                 if response.status_code == 200:
                                                     st.success("✅ Booking rescheduled successfully!")
@@ -3297,7 +3301,7 @@ def main():
         email = st.session_state.get('customer_email')
         if email:
             try:
-                response = requests.get(f"{BACKEND_URL}/my_bookings/{email}", timeout=10)
+                response = requests.get(f"{BACKEND_URL}/my_bookings/{email}", headers=auth_headers(), timeout=10)
                 if response.status_code == 200:
                     data = response.json()
                     bookings = data.get('bookings', [])
@@ -3351,7 +3355,7 @@ def main():
                                         try:
                                             response = requests.post(f"{BACKEND_URL}/cancel_booking", 
                                                                    json={"booking_id": booking_id, "customer_email": email}, 
-                                                                   timeout=10)
+                                                                   headers=auth_headers(), timeout=10)
                                             if response.status_code == 200:
                                                 st.success("✅ Booking cancelled successfully!")
                                                 st.rerun()
@@ -3387,7 +3391,7 @@ def main():
                                                                                      "customer_email": email,
                                                                                      "new_departure_date": new_departure.strftime('%Y-%m-%d'),
                                                                                      "new_return_date": new_return.strftime('%Y-%m-%d') if new_return else None}, 
-                                                                               timeout=10)
+                                                                               headers=auth_headers(), timeout=10)
                                                         if response.status_code == 200:
                                                             st.success("✅ Booking rescheduled successfully!")
                                                             st.session_state[f"show_reschedule_{booking_id}"] = False
@@ -3439,7 +3443,7 @@ def main():
         email = st.session_state.get('customer_email')
         if email:
             try:
-                response = requests.get(f"{BACKEND_URL}/chat_history/{email}", timeout=10)
+                response = requests.get(f"{BACKEND_URL}/chat_history/{email}", headers=auth_headers(), timeout=10)
                 if response.status_code == 200:
                     data = response.json()
                     conversations = data.get('conversations', [])
@@ -3506,7 +3510,7 @@ def main():
         if email:
             try:
                 print(f"🔄 Auto-loading chat history for: {email}")
-                response = requests.get(f"{BACKEND_URL}/chat_history/{email}", timeout=10)
+                response = requests.get(f"{BACKEND_URL}/chat_history/{email}", headers=auth_headers(), timeout=10)
                 print(f"📡 Backend response status: {response.status_code}")
                 
                 if response.status_code == 200:
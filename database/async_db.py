@@ -0,0 +1,122 @@
+"""
+Async facade over the synchronous DAO functions in database.py
+
+sqlite3 calls block, so async endpoints must not call database.py directly on the
+event loop: one slow commit would stall every other request on the worker. The
+wrappers here run each call on a small dedicated DB thread pool (every thread
+keeps its own pooled connection) and record how long callers wait on the DB.
+Backends with their own async pool (PostgreSQL) are awaited directly instead.
+
+    from async_db import adb
+    session = await adb.get_livekit_session(room_name)
+"""
+
+import asyncio
+import functools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict
+
+import database
+from storage import STORAGE_API
+
+DB_EXECUTOR_WORKERS = 4
+
+
+class DBCallMetrics:
+    """Per-function call counts plus queue-wait and total-wait timings."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[str, Dict] = {}
+
+    def record(self, name: str, queue_wait: float, total_wait: float, failed: bool) -> None:
+        with self._lock:
+            entry = self._calls.setdefault(name, {
+                'calls': 0, 'errors': 0,
+                'queue_wait_ms_total': 0.0, 'wait_ms_total': 0.0, 'wait_ms_max': 0.0,
+            })
+            entry['calls'] += 1
+            entry['errors'] += int(failed)
+            entry['queue_wait_ms_total'] += queue_wait * 1000
+            entry['wait_ms_total'] += total_wait * 1000
+            entry['wait_ms_max'] = max(entry['wait_ms_max'], total_wait * 1000)
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            result = {}
+            for name, entry in self._calls.items():
+                calls = entry['calls']
+                result[name] = {
+                    'calls': calls,
+                    'errors': entry['errors'],
+                    'avg_queue_wait_ms': round(entry['queue_wait_ms_total'] / calls, 3),
+                    'avg_wait_ms': round(entry['wait_ms_total'] / calls, 3),
+                    'max_wait_ms': round(entry['wait_ms_max'], 3),
+                }
+            return result
+
+
+class AsyncDB:
+    """Awaitable versions of the database.py functions, run on a dedicated executor."""
+
+    def __init__(self, workers: int = DB_EXECUTOR_WORKERS):
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="db")
+        self.metrics = DBCallMetrics()
+
+    async def run(self, func: Callable, *args, **kwargs):
+        """Run a blocking DB function on the DB executor and await its result."""
+        loop = asyncio.get_running_loop()
+        submitted = time.perf_counter()
+        started = submitted
+
+        def call():
+            nonlocal started
+            started = time.perf_counter()
+            return func(*args, **kwargs)
+
+        failed = False
+        try:
+            return await loop.run_in_executor(self._executor, call)
+        except BaseException:
+            failed = True
+            raise
+        finally:
+            self.metrics.record(func.__name__, started - submitted,
+                                time.perf_counter() - submitted, failed)
+
+    async def run_on_backend(self, backend, name: str, *args, **kwargs):
+        """Await a STORAGE_API call on a backend with its own async pool (no executor thread)."""
+        started = time.perf_counter()
+        failed = False
+        try:
+            return await asyncio.wrap_future(backend.submit(name, *args, **kwargs))
+        except BaseException:
+            failed = True
+            raise
+        finally:
+            self.metrics.record(name, 0.0, time.perf_counter() - started, failed)
+
+    def __getattr__(self, name: str):
+        # adb.<dao_function>(...) -> awaitable call of database.<dao_function>
+        func = getattr(database, name)
+        if name.startswith('_') or not callable(func):
+            raise AttributeError(name)
+
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            backend = database.get_backend()
+            if name in STORAGE_API and hasattr(backend, 'submit'):
+                return await self.run_on_backend(backend, name, *args, **kwargs)
+            return await self.run(func, *args, **kwargs)
+
+        return wrapper
+
+    def shutdown(self) -> None:
+        """Wait for in-flight DB calls and stop the executor threads."""
+        self._executor.shutdown(wait=True)
+
+
+# Shared facade used by the async API endpoints
+adb = AsyncDB()
@@ -0,0 +1,141 @@
+"""
+Thread-aware SQLite connection pool
+
+Each thread keeps one long-lived connection per database file. Connections are
+configured with the tuning pragmas once, when they are first opened, so the DAO
+functions in database.py no longer pay a connect/close per call.
+"""
+
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+# Connection tuning (applied once per connection)
+CONNECT_TIMEOUT = 30.0           # seconds sqlite3.connect waits for a lock
+BUSY_TIMEOUT_MS = 5000           # PRAGMA busy_timeout
+CACHE_SIZE_KIB = 16000           # PRAGMA cache_size (negative value = KiB)
+MMAP_SIZE_BYTES = 256 * 1024 * 1024  # PRAGMA mmap_size
+
+CONNECTION_PRAGMAS: List[Tuple[str, object]] = [
+    # Must precede journal_mode: only takes effect on a brand-new file (see maintenance.py)
+    ("auto_vacuum", "INCREMENTAL"),
+    ("journal_mode", "WAL"),
+    ("busy_timeout", BUSY_TIMEOUT_MS),
+    ("synchronous", "NORMAL"),
+    ("cache_size", -CACHE_SIZE_KIB),
+    ("mmap_size", MMAP_SIZE_BYTES),
+]
+
+
+class ConnectionPool:
+    """Per-thread pool of reusable SQLite connections, keyed by database path."""
+
+    def __init__(self, pragmas: Optional[List[Tuple[str, object]]] = None,
+                 timeout: float = CONNECT_TIMEOUT):
+        self._pragmas = pragmas if pragmas is not None else CONNECTION_PRAGMAS
+        self._timeout = timeout
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        # (thread_id, db_path) -> connection, used for stats and close_all()
+        self._connections: Dict[Tuple[int, str], sqlite3.Connection] = {}
+        self._created = 0
+        self._reused = 0
+        self._closed = 0
+        self._connect_seconds = 0.0
+
+    def _open(self, db_path: str) -> sqlite3.Connection:
+        started = time.perf_counter()
+        # check_same_thread=False only so close_all() can close connections owned
+        # by other threads; a connection is never handed to a second thread.
+        conn = sqlite3.connect(db_path, timeout=self._timeout, check_same_thread=False)
+        for name, value in self._pragmas:
+            conn.execute(f"PRAGMA {name}={value};")
+        elapsed = time.perf_counter() - started
+
+        with self._lock:
+            self._connections[(threading.get_ident(), db_path)] = conn
+            self._created += 1
+            self._connect_seconds += elapsed
+        return conn
+
+    def get(self, db_path: str) -> sqlite3.Connection:
+        """Return this thread's connection for db_path, opening it on first use."""
+        conns = getattr(self._local, "connections", None)
+        if conns is None:
+            conns = self._local.connections = {}
+
+        conn = conns.get(db_path)
+        # A connection closed by close_all() is no longer registered; reopen it
+        if conn is not None and self._connections.get((threading.get_ident(), db_path)) is conn:
+            with self._lock:
+                self._reused += 1
+            return conn
+
+        conn = self._open(db_path)
+        conns[db_path] = conn
+        return conn
+
+    def release_thread(self) -> None:
+        """Close every connection owned by the calling thread."""
+        conns = getattr(self._local, "connections", None) or {}
+        thread_id = threading.get_ident()
+        with self._lock:
+            for db_path, conn in conns.items():
+                self._connections.pop((thread_id, db_path), None)
+                conn.close()
+                self._closed += 1
+        conns.clear()
+
+    def close_all(self, db_path: Optional[str] = None) -> None:
+        """Close pooled connections (optionally only those for one database file)."""
+        with self._lock:
+            keys = [key for key in self._connections
+                    if db_path is None or key[1] == db_path]
+            for key in keys:
+                self._connections.pop(key).close()
+                self._closed += 1
+
+    def stats(self) -> Dict:
+        """Return pool counters for monitoring."""
+        with self._lock:
+            open_connections = len(self._connections)
+            threads = len({thread_id for thread_id, _ in self._connections})
+            databases = sorted({path for _, path in self._connections})
+            created = self._created
+            connect_ms = (self._connect_seconds / created * 1000) if created else 0.0
+
+        return {
+            'open_connections': open_connections,
+            'threads': threads,
+            'databases': databases,
+            'connections_created': created,
+            'connections_reused': self._reused,
+            'connections_closed': self._closed,
+            'avg_connect_ms': round(connect_ms, 3),
+            'pragmas': {name: value for name, value in self._pragmas},
+        }
+
+
+# Shared pool used by the DAO layer and the API
+_pool = ConnectionPool()
+
+
+def get_connection(db_path: str) -> sqlite3.Connection:
+    """Get the calling thread's pooled connection for db_path."""
+    return _pool.get(db_path)
+
+
+def release_thread_connections() -> None:
+    """Close the calling thread's pooled connections."""
+    _pool.release_thread()
+
+
+def close_all_connections(db_path: Optional[str] = None) -> None:
+    """Close all pooled connections (used on shutdown and in tests)."""
+    _pool.close_all(db_path)
+
+
+def pool_stats() -> Dict:
+    """Return statistics for the shared connection pool."""
+    return _pool.stats()
@@ -2,194 +2,299 @@
 Database models and functions for customer management and travel bookings
 """
 
+import atexit
+import contextlib
+import functools
 import sqlite3
-from datetime import datetime
-from typing import Optional, List, Dict
+import threading
+from contextvars import ContextVar
+from datetime import datetime, timedelta
+from typing import Callable, Optional, List, Dict
 import json
 import os
 from pathlib import Path
 
+from connection_pool import get_connection
+from maintenance import MAINTENANCE_ENABLED, MaintenanceScheduler
+from migrations import migrate
+from session_cache import SessionCache
+from storage import (
+    BOOKING_EXPORT_FIELDS,
+    BOOKING_ROLLUP_COLUMNS,
+    BOOKING_FIELDS,
+    CONVERSATION_EXPORT_FIELDS,
+    DEFAULT_BOOKING_FIELDS,
+    MAX_BULK_BOOKING_OPERATIONS,
+    STORAGE_API,
+    StorageBackend,
+    analytics_range,
+    booking_analytics_report,
+    booking_rollup_delta,
+    bulk_booking_ids,
+    bulk_booking_summary,
+    create_backend,
+    decode_cursor,
+    encode_cursor,
+    plan_bulk_booking_operations,
+    validate_date_range,
+)
+from transcript_archive import ARCHIVE_AFTER_DAYS, archive_old_sessions, archive_stats, load_archived_rows
+from write_queue import WriteBehindQueue
+
 # Utility constant for timestamp formatting
 _NOW = datetime.now
 
 # Use absolute path for database file (database.py is in the database folder)
 DB_DIR = Path(__file__).parent  # database.py is already in /Production/database/
 DB_DIR.mkdir(exist_ok=True, parents=True)
-DB_PATH = str(DB_DIR / "customers.db")
+DB_PATH = os.getenv("CUSTOMERS_DB_PATH", str(DB_DIR / "customers.db"))
 
-def init_database():
-    """Initialize database tables"""
-    conn = sqlite3.connect(DB_PATH, timeout=30.0)
-    conn.execute("PRAGMA journal_mode=WAL;")  # Write-Ahead Logging for better concurrency
-    conn.execute("PRAGMA busy_timeout=5000;")  # 5 second timeout for locked database
-    cursor = conn.cursor()
-    
-    # Customers table
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS customers (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            email TEXT UNIQUE NOT NULL,
-            name TEXT,
-            password_salt TEXT,
-            password_hash TEXT,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            last_login TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    """)
-    
-    # Add password columns to existing customers table if they don't exist
-    try:
-        cursor.execute("ALTER TABLE customers ADD COLUMN password_salt TEXT")
-        cursor.execute("ALTER TABLE customers ADD COLUMN password_hash TEXT")
-    except sqlite3.OperationalError:
-        # Columns already exist
-        pass
-    
-    # Travel bookings table
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS travel_bookings (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            customer_id INTEGER NOT NULL,
-            customer_email TEXT NOT NULL,
-            service_type TEXT NOT NULL,
-            destination TEXT,
-            departure_date DATE NOT NULL,
-            return_date DATE,
-            num_travelers INTEGER DEFAULT 1,
-            service_details TEXT,
-            special_requests TEXT,
-            total_amount REAL,
-            confirmation_number TEXT,
-            status TEXT DEFAULT 'pending',
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (customer_id) REFERENCES customers(id)
-        )
-    """)
-    
-    # Add confirmation_number column if it doesn't exist
+# Storage backend selector (the `database_url` setting). Unset or sqlite:// keeps
+# the built-in SQLite implementation below, stored at DB_PATH; postgresql:// moves
+# every STORAGE_API function to PostgreSQL (see storage.py).
+DATABASE_URL = os.getenv("DATABASE_URL", "")
+
+# In sharded mode (sharding.py) the transcript and LiveKit session functions run
+# against the shard file that owns their key; unset means the main file.
+_shard_path: ContextVar[Optional[str]] = ContextVar("shard_path", default=None)
+
+def _db_path() -> str:
+    return _shard_path.get() or DB_PATH
+
+@contextlib.contextmanager
+def shard_scope(path: str):
+    """Run the SQLite DAO functions called inside the block against another file"""
+    token = _shard_path.set(path)
     try:
-        cursor.execute("ALTER TABLE travel_bookings ADD COLUMN confirmation_number TEXT")
-    except sqlite3.OperationalError:
-        # Column already exists
-        pass
-    
-    # Conversation history table
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS conversations (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            customer_email TEXT NOT NULL,
-            session_id TEXT NOT NULL,
-            message_type TEXT NOT NULL,
-            message_text TEXT NOT NULL,
-            language TEXT DEFAULT 'en-US',
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    """)
+        yield
+    finally:
+        _shard_path.reset(token)
+
+# ==================== STORAGE BACKEND ====================
+
+# SQLite implementations of the STORAGE_API functions, registered by @_storage_api
+_sqlite_implementations: Dict[str, Callable] = {}
+_backend: Optional[StorageBackend] = None
+_backend_lock = threading.Lock()
+
+def _storage_api(func):
+    """Register func as the SQLite implementation and route calls to the active backend"""
+    name = func.__name__
+    assert name in STORAGE_API, name
+    _sqlite_implementations[name] = func
+
+    @functools.wraps(func)
+    def dispatch(*args, **kwargs):
+        return getattr(get_backend(), name)(*args, **kwargs)
+
+    return dispatch
+
+def get_backend() -> StorageBackend:
+    """Return the storage backend for DATABASE_URL, creating it on first use"""
+    global _backend
+    backend = _backend
+    if backend is not None and backend.url == DATABASE_URL:
+        return backend
+    with _backend_lock:
+        if _backend is None or _backend.url != DATABASE_URL:
+            if _backend is not None:
+                _backend.close()
+            _backend = create_backend(DATABASE_URL, _sqlite_implementations)
+        return _backend
+
+def close_backend():
+    """Close the active storage backend (its connections are reopened on next use)"""
+    global _backend
+    with _backend_lock:
+        if _backend is not None:
+            _backend.close()
+            _backend = None
 
-    # LiveKit session tracking table
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS livekit_sessions (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            room_name TEXT UNIQUE NOT NULL,
-            session_id TEXT,
-            customer_email TEXT,
-            participant_name TEXT,
-            metadata TEXT,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            last_transcript_at TIMESTAMP
-        )
-    """)
-    
-    conn.commit()
-    conn.close()
+def init_database():
+    """Initialize the database by applying any pending schema migrations"""
+    backend = get_backend()
+    if backend.name == 'sqlite':
+        return migrate(DB_PATH)
+    return backend.init_schema()
 
+@_storage_api
 def get_or_create_customer(email: str, name: str = None) -> Dict:
     """Get existing customer or create new one (legacy function for backward compatibility)"""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
+    conn = get_connection(DB_PATH)
     
-    # Check if customer exists
-    cursor.execute("SELECT * FROM customers WHERE email = ?", (email,))
-    customer = cursor.fetchone()
-    
-    if customer:
-        # Update last login
-        cursor.execute("UPDATE customers SET last_login = ? WHERE email = ?", 
-                      (datetime.now(), email))
-        conn.commit()
+    with conn:
+        cursor = conn.cursor()
         
-        # Handle both old and new schema
-        if len(customer) >= 6:  # New schema with password fields
-            customer_data = {
-                'id': customer[0],
-                'email': customer[1],
-                'name': customer[2],
-                'created_at': customer[5],
-                'last_login': customer[6]
-            }
-        else:  # Old schema without password fields
+        # Check if customer exists
+        cursor.execute("SELECT * FROM customers WHERE email = ?", (email,))
+        customer = cursor.fetchone()
+        
+        if customer:
+            # Update last login
+            cursor.execute("UPDATE customers SET last_login = ? WHERE email = ?", 
+                          (datetime.now(), email))
+            
+            # Handle both old and new schema
+            if len(customer) >= 6:  # New schema with password fields
+                customer_data = {
+                    'id': customer[0],
+                    'email': customer[1],
+                    'name': customer[2],
+                    'created_at': customer[5],
+                    'last_login': customer[6]
+                }
+            else:  # Old schema without password fields
+                customer_data = {
+                    'id': customer[0],
+                    'email': customer[1],
+                    'name': customer[2],
+                    'created_at': customer[3],
+                    'last_login': customer[4]
+                }
+        else:
+            # Create new customer (without password for legacy compatibility)
+            cursor.execute("""
+                INSERT INTO customers (email, name, created_at, last_login)
+                VALUES (?, ?, ?, ?)
+            """, (email, name, datetime.now(), datetime.now()))
+            
+            customer_id = cursor.lastrowid
             customer_data = {
-                'id': customer[0],
-                'email': customer[1],
-                'name': customer[2],
-                'created_at': customer[3],
-                'last_login': customer[4]
+                'id': customer_id,
+                'email': email,
+                'name': name,
+                'created_at': datetime.now(),
+                'last_login': datetime.now()
             }
-    else:
-        # Create new customer (without password for legacy compatibility)
-        cursor.execute("""
-            INSERT INTO customers (email, name, created_at, last_login)
-            VALUES (?, ?, ?, ?)
-        """, (email, name, datetime.now(), datetime.now()))
-        conn.commit()
-        
-        customer_id = cursor.lastrowid
-        customer_data = {
-            'id': customer_id,
-            'email': email,
-            'name': name,
-            'created_at': datetime.now(),
-            'last_login': datetime.now()
-        }
     
-    conn.close()
     return customer_data
 
 # Keep the old function name for backward compatibility
 def get_or_create_guest(email: str, name: str = None) -> Dict:
     return get_or_create_customer(email, name)
 
+@_storage_api
+def get_customer_credentials(email: str) -> Optional[Dict]:
+    """Get a customer's login and password-reset fields, or None if unknown"""
+    conn = get_connection(DB_PATH)
+    row = conn.execute("""
+        SELECT id, email, name, password_salt, password_hash, created_at,
+               reset_token, reset_token_expiry
+        FROM customers WHERE email = ?
+    """, (email,)).fetchone()
+
+    if not row:
+        return None
+
+    return {
+        'id': row[0],
+        'email': row[1],
+        'name': row[2],
+        'password_salt': row[3],
+        'password_hash': row[4],
+        'created_at': row[5],
+        'reset_token': row[6],
+        'reset_token_expiry': row[7]
+    }
+
+@_storage_api
+def create_customer(email: str, name: str, password_salt: str, password_hash: str) -> Optional[Dict]:
+    """Register a customer with a password; returns None if the email is taken"""
+    conn = get_connection(DB_PATH)
+    created_at = datetime.now()
+
+    with conn:
+        row = conn.execute("""
+            INSERT INTO customers (email, name, password_salt, password_hash, created_at)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT(email) DO NOTHING
+            RETURNING id
+        """, (email, name, password_salt, password_hash, created_at)).fetchone()
+
+    if not row:
+        return None
+
+    return {'id': row[0], 'email': email, 'name': name, 'created_at': created_at.isoformat()}
+
+@_storage_api
+def set_password_reset_token(email: str, token: str, expiry: datetime) -> bool:
+    """Store a password reset token; returns False if the customer does not exist"""
+    conn = get_connection(DB_PATH)
+    with conn:
+        cursor = conn.execute("""
+            UPDATE customers
+            SET reset_token = ?, reset_token_expiry = ?
+            WHERE email = ?
+        """, (token, expiry.isoformat(), email))
+    return cursor.rowcount > 0
+
+@_storage_api
+def update_customer_password(email: str, password_salt: str, password_hash: str) -> bool:
+    """Set a new password and clear any pending reset token"""
+    conn = get_connection(DB_PATH)
+    with conn:
+        cursor = conn.execute("""
+            UPDATE customers
+            SET password_salt = ?,
+                password_hash = ?,
+                reset_token = NULL,
+                reset_token_expiry = NULL
+            WHERE email = ?
+        """, (password_salt, password_hash, email))
+    return cursor.rowcount > 0
+
+@_storage_api
 def create_travel_booking(customer_email: str, service_type: str, destination: str, 
                          departure_date: str, return_date: str = None, num_travelers: int = 1, 
                          service_details: str = None, special_requests: str = None, total_amount: float = 0,
                          confirmation_number: str = None) -> Dict:
     """Create a new travel booking"""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
+    conn = get_connection(DB_PATH)
     
-    # Get customer ID
-    cursor.execute("SELECT id FROM customers WHERE email = ?", (customer_email,))
-    customer = cursor.fetchone()
+    # Resolve the customer and insert in one statement; no row means no customer, or a
+    # confirmation number that is already stored (a replayed booking - return the original)
+    with conn:
+        row = conn.execute(f"""
+            INSERT INTO travel_bookings 
+            (customer_id, customer_email, service_type, destination, departure_date, return_date,
+             num_travelers, service_details, special_requests, total_amount, confirmation_number, status, created_at)
+            SELECT id, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, 'confirmed', ?
+            FROM customers
+            WHERE email = ?
+              AND (? IS NULL OR NOT EXISTS (
+                  SELECT 1 FROM travel_bookings WHERE confirmation_number = ? AND customer_email = ?))
+            RETURNING id, {_ROLLUP_COLUMNS}
+        """, (customer_email, service_type, destination, departure_date, return_date,
+              num_travelers, service_details, special_requests, total_amount, confirmation_number,
+              datetime.now(), customer_email,
+              confirmation_number or None, confirmation_number, customer_email)).fetchone()
+        if row:
+            _apply_booking_rollup(conn, row[1:], 1)
     
-    if not customer:
-        conn.close()
-        return {"error": "Customer not found"}
-    
-    customer_id = customer[0]
-    
-    # Create travel booking
-    cursor.execute("""
-        INSERT INTO travel_bookings 
-        (customer_id, customer_email, service_type, destination, departure_date, return_date,
-         num_travelers, service_details, special_requests, total_amount, confirmation_number, status, created_at)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, 'confirmed', ?)
-    """, (customer_id, customer_email, service_type, destination, departure_date, return_date,
-          num_travelers, service_details, special_requests, total_amount, confirmation_number, datetime.now()))
+    if not row:
+        existing = conn.execute("""
+            SELECT id, service_type, destination, departure_date, return_date, num_travelers,
+                   total_amount, status
+            FROM travel_bookings
+            WHERE confirmation_number = ? AND customer_email = ?
+        """, (confirmation_number, customer_email)).fetchone() if confirmation_number else None
+        if not existing:
+            return {"error": "Customer not found"}
+        return {
+            'booking_id': existing[0],
+            'confirmation_number': confirmation_number,
+            'customer_email': customer_email,
+            'service_type': existing[1],
+            'destination': existing[2],
+            'departure_date': existing[3],
+            'return_date': existing[4],
+            'num_travelers': existing[5],
+            'total_amount': existing[6],
+            'status': existing[7],
+            'duplicate': True
+        }
     
-    booking_id = cursor.lastrowid
-    conn.commit()
-    conn.close()
+    booking_id = row[0]
     
     return {
         'booking_id': booking_id,
@@ -227,9 +332,10 @@ def create_booking(guest_email: str, room_type: str, check_in: str, check_out: s
         total_amount=total_amount
     )
 
+@_storage_api
 def get_customer_bookings(email: str) -> List[Dict]:
     """Get all travel bookings for a customer"""
-    conn = sqlite3.connect(DB_PATH)
+    conn = get_connection(DB_PATH)
     cursor = conn.cursor()
     
     cursor.execute("""
@@ -256,9 +362,66 @@ def get_customer_bookings(email: str) -> List[Dict]:
             'created_at': row[10]
         })
     
-    conn.close()
     return bookings
 
+@_storage_api
+def list_customer_bookings(email: str, status: Optional[str] = None,
+                           service_type: Optional[str] = None,
+                           departure_from: Optional[str] = None,
+                           departure_to: Optional[str] = None,
+                           limit: int = 20, cursor: Optional[str] = None,
+                           fields: Optional[List[str]] = None) -> Dict:
+    """List a customer's bookings newest first, with filters and keyset pagination.
+
+    `fields` limits the columns that are read (e.g. ['booking_id', 'total_amount']);
+    pass the returned 'next_cursor' back as `cursor` to fetch the next page.
+    Raises ValueError for unknown fields or a malformed cursor.
+    """
+    fields = fields or DEFAULT_BOOKING_FIELDS
+    unknown = [name for name in fields if name not in BOOKING_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown booking fields: {', '.join(unknown)}")
+
+    filters = ["customer_email = ?"]
+    params: List = [email]
+
+    if status:
+        filters.append("status = ?")
+        params.append(status)
+    if service_type:
+        filters.append("service_type = ?")
+        params.append(service_type)
+    if departure_from:
+        filters.append("departure_date >= ?")
+        params.append(departure_from)
+    if departure_to:
+        filters.append("departure_date <= ?")
+        params.append(departure_to)
+    if cursor:
+        filters.append("(created_at, id) < (?, ?)")
+        params.extend(decode_cursor(cursor))
+
+    # id and created_at are always read to build the cursor
+    columns = ["id", "created_at"] + [BOOKING_FIELDS[name] for name in fields]
+    params.append(limit + 1)  # one extra row tells us whether another page exists
+
+    conn = get_connection(DB_PATH)
+    rows = conn.execute(f"""
+        SELECT {', '.join(columns)}
+        FROM travel_bookings
+        WHERE {' AND '.join(filters)}
+        ORDER BY created_at DESC, id DESC
+        LIMIT ?
+    """, tuple(params)).fetchall()
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    return {
+        'bookings': [dict(zip(fields, row[2:])) for row in rows],
+        'next_cursor': encode_cursor(rows[-1][1], rows[-1][0]) if has_more else None
+    }
+
 # Keep the old function name for backward compatibility
 def get_guest_bookings(email: str) -> List[Dict]:
     """Legacy function - maps to customer bookings"""
@@ -278,127 +441,722 @@ def get_guest_bookings(email: str) -> List[Dict]:
         })
     return legacy_bookings
 
+# ==================== BOOKING ROLLUPS ====================
+
+_ROLLUP_COLUMNS = BOOKING_ROLLUP_COLUMNS
+
+def _apply_booking_rollup(conn: sqlite3.Connection, booking: tuple, sign: int) -> None:
+    """Add (sign=1) or remove (sign=-1) one booking's contribution to the rollups.
+
+    Must run inside the transaction that writes the booking row, so the rollups
+    never drift from travel_bookings.
+    """
+    d = booking_rollup_delta(booking, sign)
+
+    conn.execute("""
+        INSERT INTO customer_booking_stats
+        (customer_email, total_bookings, active_bookings, cancelled_bookings, upcoming_trips,
+         total_spent, last_booking_at, updated_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT(customer_email) DO UPDATE SET
+            total_bookings = total_bookings + excluded.total_bookings,
+            active_bookings = active_bookings + excluded.active_bookings,
+            cancelled_bookings = cancelled_bookings + excluded.cancelled_bookings,
+            upcoming_trips = upcoming_trips + excluded.upcoming_trips,
+            total_spent = total_spent + excluded.total_spent,
+            last_booking_at = MAX(COALESCE(last_booking_at, excluded.last_booking_at),
+                                  COALESCE(excluded.last_booking_at, last_booking_at)),
+            updated_at = excluded.updated_at
+    """, (d['customer_email'], d['bookings'], d['active'], d['cancelled'], d['upcoming'],
+          d['active_amount'], d['last_booking_at'], datetime.now()))
+
+    conn.execute("""
+        INSERT INTO customer_booking_status (customer_email, status, bookings)
+        VALUES (?, ?, ?)
+        ON CONFLICT(customer_email, status) DO UPDATE SET bookings = bookings + excluded.bookings
+    """, (d['customer_email'], d['status'], d['bookings']))
+
+    if d['month']:
+        conn.execute("""
+            INSERT INTO customer_booking_monthly
+            (customer_email, month, bookings, total_amount, active_amount)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT(customer_email, month) DO UPDATE SET
+                bookings = bookings + excluded.bookings,
+                total_amount = total_amount + excluded.total_amount,
+                active_amount = active_amount + excluded.active_amount
+        """, (d['customer_email'], d['month'], d['bookings'], d['amount'], d['active_amount']))
+
+    if d['destination']:
+        conn.execute("""
+            INSERT INTO customer_booking_destinations (customer_email, destination, bookings)
+            VALUES (?, ?, ?)
+            ON CONFLICT(customer_email, destination) DO UPDATE SET bookings = bookings + excluded.bookings
+        """, (d['customer_email'], d['destination'], d['bookings']))
+
+    if d['day']:
+        _apply_daily_analytics(conn, d)
+
+def _apply_daily_analytics(conn: sqlite3.Connection, d: Dict) -> None:
+    """Admin-wide daily rollups, bucketed by the day the booking was made"""
+    conn.execute("""
+        INSERT INTO booking_daily_stats (day, bookings, cancelled_bookings, gross_amount, revenue)
+        VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT(day) DO UPDATE SET
+            bookings = bookings + excluded.bookings,
+            cancelled_bookings = cancelled_bookings + excluded.cancelled_bookings,
+            gross_amount = gross_amount + excluded.gross_amount,
+            revenue = revenue + excluded.revenue
+    """, (d['day'], d['bookings'], d['cancelled'], d['amount'], d['active_amount']))
+
+    conn.execute("""
+        INSERT INTO booking_daily_routes (day, origin, destination, bookings, cancelled_bookings, revenue)
+        VALUES (?, ?, ?, ?, ?, ?)
+        ON CONFLICT(day, origin, destination) DO UPDATE SET
+            bookings = bookings + excluded.bookings,
+            cancelled_bookings = cancelled_bookings + excluded.cancelled_bookings,
+            revenue = revenue + excluded.revenue
+    """, (d['day'], *d['route'], d['bookings'], d['cancelled'], d['active_amount']))
+
+    conn.execute("""
+        INSERT INTO booking_daily_classes (day, travel_class, bookings, revenue)
+        VALUES (?, ?, ?, ?)
+        ON CONFLICT(day, travel_class) DO UPDATE SET
+            bookings = bookings + excluded.bookings,
+            revenue = revenue + excluded.revenue
+    """, (d['day'], d['travel_class'], d['bookings'], d['active_amount']))
+
+def _replace_booking_rollup(conn: sqlite3.Connection, old: tuple, new: tuple) -> None:
+    """Move a booking's rollup contribution from its old row values to the new ones."""
+    _apply_booking_rollup(conn, old, -1)
+    _apply_booking_rollup(conn, new, 1)
+    # Zeroed buckets (e.g. a status no booking has any more) would show up as noise
+    conn.execute("DELETE FROM customer_booking_status WHERE customer_email = ? AND bookings <= 0",
+                 (old[0],))
+
+def _count_booking_reschedule(conn: sqlite3.Connection, email: str) -> None:
+    conn.execute("""
+        UPDATE customer_booking_stats
+        SET rescheduled_bookings = rescheduled_bookings + 1, updated_at = ?
+        WHERE customer_email = ?
+    """, (datetime.now(), email))
+
+@_storage_api
+def get_customer_dashboard(email: str, top_destinations: int = 5,
+                           recent_bookings: int = 3) -> Dict:
+    """Return precomputed dashboard aggregates for a customer.
+
+    Reads the rollup tables (a handful of primary-key lookups) instead of
+    scanning the customer's bookings, plus the newest few bookings by index.
+    """
+    conn = get_connection(DB_PATH)
+
+    row = conn.execute("""
+        SELECT total_bookings, active_bookings, cancelled_bookings, upcoming_trips,
+               rescheduled_bookings, total_spent, last_booking_at, updated_at
+        FROM customer_booking_stats
+        WHERE customer_email = ?
+    """, (email,)).fetchone()
+    stats = {
+        'total_bookings': row[1] if row else 0,  # active bookings, as shown on the dashboard
+        'all_bookings': row[0] if row else 0,
+        'cancelled_bookings': row[2] if row else 0,
+        'upcoming_trips': row[3] if row else 0,
+        'rescheduled_bookings': row[4] if row else 0,
+        'total_spent': row[5] if row else 0,
+        'last_booking_at': row[6] if row else None,
+        'updated_at': row[7] if row else None,
+    }
+
+    status_distribution = {
+        status: count for status, count in conn.execute("""
+            SELECT status, bookings FROM customer_booking_status
+            WHERE customer_email = ? AND bookings > 0
+        """, (email,))
+    }
+
+    monthly_spending = [
+        {'month': month, 'bookings': count, 'amount': amount, 'active_amount': active_amount}
+        for month, count, amount, active_amount in conn.execute("""
+            SELECT month, bookings, total_amount, active_amount FROM customer_booking_monthly
+            WHERE customer_email = ? AND bookings > 0
+            ORDER BY month
+        """, (email,))
+    ]
+
+    destinations = [
+        {'destination': destination, 'count': count}
+        for destination, count in conn.execute("""
+            SELECT destination, bookings FROM customer_booking_destinations
+            WHERE customer_email = ? AND bookings > 0
+            ORDER BY bookings DESC, destination
+            LIMIT ?
+        """, (email, top_destinations))
+    ]
+
+    recent = list_customer_bookings(
+        email, limit=recent_bookings,
+        fields=['booking_id', 'service_type', 'destination', 'departure_date', 'status', 'total_amount']
+    )['bookings']
+
+    return {
+        'customer_email': email,
+        'stats': stats,
+        'status_distribution': status_distribution,
+        'monthly_spending': monthly_spending,
+        'top_destinations': destinations,
+        'recent_bookings': recent,
+    }
+
+@_storage_api
+def get_booking_analytics(date_from: Optional[str] = None, date_to: Optional[str] = None,
+                          top_routes: int = 10) -> Dict:
+    """Admin-wide revenue per day, top routes, class mix and cancellation rate.
+
+    Reads the daily rollup tables (one row per day / route / class), so the cost
+    depends on the date range, not on the number of bookings. Days are the day a
+    booking was made; date_from defaults to 30 days before date_to (today).
+    """
+    date_from, date_to = analytics_range(date_from, date_to)
+    conn = get_connection(DB_PATH)
+    daily = conn.execute("""
+        SELECT day, bookings, cancelled_bookings, gross_amount, revenue
+        FROM booking_daily_stats WHERE day BETWEEN ? AND ? ORDER BY day
+    """, (date_from, date_to)).fetchall()
+    routes = conn.execute("""
+        SELECT origin, destination, SUM(bookings) AS total, SUM(cancelled_bookings), SUM(revenue)
+        FROM booking_daily_routes WHERE day BETWEEN ? AND ?
+        GROUP BY origin, destination
+        ORDER BY total DESC, origin, destination
+        LIMIT ?
+    """, (date_from, date_to, top_routes)).fetchall()
+    classes = conn.execute("""
+        SELECT travel_class, SUM(bookings) AS total, SUM(revenue)
+        FROM booking_daily_classes WHERE day BETWEEN ? AND ?
+        GROUP BY travel_class
+        ORDER BY total DESC, travel_class
+    """, (date_from, date_to)).fetchall()
+    return booking_analytics_report(date_from, date_to, daily, routes, classes)
+
+@_storage_api
 def save_conversation(customer_email: str, session_id: str, message_type: str,
                      message_text: str, language: str = 'en-US',
                      created_at: Optional[datetime] = None):
     """Save conversation message to database"""
-    conn = sqlite3.connect(DB_PATH)
+    conn = get_connection(_db_path())
     cursor = conn.cursor()
 
     timestamp = created_at or _NOW()
 
-    cursor.execute("""
-        INSERT INTO conversations
-        (customer_email, session_id, message_type, message_text, language, created_at)
-        VALUES (?, ?, ?, ?, ?, ?)
-    """, (customer_email, session_id, message_type, message_text, language, timestamp))
-
-    conn.commit()
-    conn.close()
+    with conn:
+        cursor.execute("""
+            INSERT INTO conversations
+            (customer_email, session_id, message_type, message_text, language, created_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, (customer_email, session_id, message_type, message_text, language, timestamp))
+
+# ==================== WRITE-BEHIND QUEUE ====================
+# High-volume transcript writes go through a group-commit queue (see write_queue.py)
+
+_write_queue: Optional[WriteBehindQueue] = None
+_write_queue_lock = threading.Lock()
+
+def get_write_queue() -> WriteBehindQueue:
+    """Return the write-behind queue for the current database, starting it on first use"""
+    global _write_queue
+    with _write_queue_lock:
+        if _write_queue is None or _write_queue.db_path != DB_PATH:
+            if _write_queue is not None:
+                _write_queue.stop()
+            _write_queue = WriteBehindQueue(DB_PATH, on_sessions_written=_cache_session_activity)
+        return _write_queue
+
+def _queue_for(key: str) -> Optional[WriteBehindQueue]:
+    """Write-behind queue that owns `key`, or None when the backend writes directly"""
+    backend = get_backend()
+    if backend.name == 'sqlite':
+        return get_write_queue()
+    if backend.name == 'sqlite-sharded':
+        return backend.write_queue(key)
+    return None
+
+def queue_conversation(customer_email: str, session_id: str, message_type: str,
+                       message_text: str, language: str = 'en-US',
+                       created_at: Optional[datetime] = None, wait: bool = False):
+    """Queue a conversation message for the next group commit.
+
+    With wait=True the call blocks until the row is committed (read-your-writes).
+    Non-SQLite backends have their own connection pool and write the row directly.
+    """
+    queue = _queue_for(session_id)
+    if queue is None:
+        return save_conversation(customer_email, session_id, message_type, message_text,
+                                 language, created_at)
+    queue.add_conversation(customer_email, session_id, message_type,
+                           message_text, language, created_at or _NOW(), wait=wait)
+
+def queue_session_activity(room_name: str, customer_email: Optional[str] = None,
+                           last_transcript_at: Optional[datetime] = None, wait: bool = False):
+    """Queue a LiveKit session activity update for the next group commit"""
+    queue = _queue_for(room_name)
+    if queue is None:
+        return update_livekit_session_activity(room_name, customer_email, last_transcript_at)
+    queue.add_session_activity(room_name, customer_email, last_transcript_at, wait=wait)
+
+def flush_pending_writes(timeout: Optional[float] = None):
+    """Block until every queued write has been committed"""
+    if _write_queue is not None:
+        _write_queue.flush(timeout)
+    if _backend is not None and _backend.name == 'sqlite-sharded':
+        _backend.flush_writes(timeout)
+
+def shutdown_write_queue():
+    """Durably flush queued writes and stop the write-behind thread"""
+    global _write_queue
+    with _write_queue_lock:
+        if _write_queue is not None:
+            _write_queue.stop()
+            _write_queue = None
+    if _backend is not None and _backend.name == 'sqlite-sharded':
+        _backend.stop_write_queues()
+
+def write_queue_stats() -> Dict:
+    """Queue depth and flush counters for the write-behind queue"""
+    if _write_queue is None:
+        return {'running': False}
+    return {'running': True, **_write_queue.stats()}
+
+atexit.register(shutdown_write_queue)
 
 # Keep the old function name for backward compatibility
 def save_conversation_legacy(guest_email: str, session_id: str, message_type: str, 
                            message_text: str, language: str = 'en-US'):
     return save_conversation(guest_email, session_id, message_type, message_text, language)
 
+@_storage_api
 def get_conversation_history(customer_email: str, limit: int = 50,
-                             session_id: Optional[str] = None) -> List[Dict]:
-    """Get conversation history for a customer - pairs user messages with AI responses"""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-
-    query = """
-        SELECT id, message_type, message_text, language, created_at, session_id
-        FROM conversations
-        WHERE customer_email = ?
+                             session_id: Optional[str] = None,
+                             before: Optional[int] = None) -> List[Dict]:
+    """Get conversation history for a customer - pairs user messages with AI responses.
+
+    Pairs are returned newest first. Each pair carries the id of its user message as
+    'message_id'; pass the last one back as `before` to fetch the next (older) page.
+    Pairing and the limit are done in SQL over a window of the most recent rows, so
+    the cost depends on the page size rather than on the length of the history.
+    Archived sessions are merged in when they overlap the page.
     """
-    params = [customer_email]
+    conn = get_connection(_db_path())
+
+    if not limit:
+        return []
+
+    before_key = None
+    if before is not None:
+        before_key = message_sort_key(conn, before)
+        if before_key is None:
+            return []
+
+    return [_history_pair(row) for row in
+            conversation_history_rows(conn, customer_email, limit, session_id, before_key)]
+
+def message_sort_key(conn: sqlite3.Connection, message_id: int) -> Optional[tuple]:
+    """(created_at, id) of a conversation row, the position a history cursor points at"""
+    key = conn.execute("SELECT created_at, id FROM conversations WHERE id = ?", (message_id,)).fetchone()
+    if key is None:
+        # The row may be archived (possibly since the previous page was served)
+        sessions = conn.execute("""
+            SELECT session_id FROM conversation_archive WHERE first_message_id <= ? AND last_message_id >= ?
+        """, (message_id, message_id)).fetchall()
+        for (session_id,) in sessions:
+            key = next(((r[5], r[0]) for r in load_archived_rows(conn, session_id, message_id - 1)
+                        if r[0] == message_id), None)
+            if key:
+                break
+    return key
+
+def conversation_history_rows(conn: sqlite3.Connection, customer_email: str, limit: int,
+                              session_id: Optional[str] = None,
+                              before_key: Optional[tuple] = None) -> List[tuple]:
+    """Newest `limit` (id, user_message, ai_response, created_at) pairs older than before_key"""
+    cursor = conn.cursor()
+    filters = "customer_email = ?"
+    params: List = [customer_email]
 
     if session_id:
-        query += " AND session_id = ?"
+        filters += " AND session_id = ?"
         params.append(session_id)
 
-    query += " ORDER BY created_at ASC"
-
-    cursor.execute(query, tuple(params))
+    if before_key is not None:
+        filters += " AND (created_at, id) < (?, ?)"
+        params.extend(before_key)
+
+    # LEAD() pairs each user message with the row that follows it. Only the newest
+    # `window` rows before the cursor are read; the slice always ends right before
+    # the cursor, so the pairing inside it matches pairing over the full history.
+    query = f"""
+        SELECT id, user_message, ai_response, created_at
+        FROM (
+            SELECT id, message_type, message_text AS user_message, created_at,
+                   CASE WHEN LEAD(message_type) OVER w = 'assistant'
+                        THEN LEAD(message_text) OVER w
+                        ELSE 'No response' END AS ai_response
+            FROM (
+                SELECT id, message_type, message_text, created_at
+                FROM conversations
+                WHERE {filters}
+                ORDER BY created_at DESC, id DESC
+                LIMIT ?
+            )
+            WINDOW w AS (ORDER BY created_at, id)
+        )
+        WHERE message_type = 'user'
+        ORDER BY created_at DESC, id DESC
+        LIMIT ?
+    """
 
-    all_messages = cursor.fetchall()
-    conn.close()
-    
-    # Group messages into conversation pairs
-    conversations = []
-    i = 0
-    while i < len(all_messages):
-        msg = all_messages[i]
-        message_type = msg[1]
-        message_text = msg[2]
-        created_at = msg[4]
-        
-        if message_type == 'user':
-            # Look for the next AI response
-            ai_response = "No response"
-            duration = "N/A"
-            
-            if i + 1 < len(all_messages) and all_messages[i + 1][1] == 'assistant':
-                ai_response = all_messages[i + 1][2]
-                i += 1  # Skip the AI response in next iteration
-            
-            conversations.append({
-                'user_message': message_text,
-                'ai_response': ai_response,
-                'created_at': created_at,
-                'duration': duration
-            })
-        
-        i += 1
-    
-    # Return most recent conversations first, limited
-    conversations.reverse()
-    return conversations[:limit]
+    # Two rows per pair is the common case; widen the window only if the slice
+    # was full but held fewer user messages than requested.
+    window = limit * 2 + 1
+    while True:
+        cursor.execute(query, tuple(params + [window, limit]))
+        rows = cursor.fetchall()
+        if len(rows) >= limit:
+            break
+        cursor.execute(
+            f"SELECT COUNT(*) FROM (SELECT 1 FROM conversations WHERE {filters} LIMIT ?)",
+            tuple(params + [window])
+        )
+        if cursor.fetchone()[0] < window:
+            break  # the slice already covered the rest of the history
+        window *= 4
+
+    # Archived sessions that overlap this page, or every older one when the page came up short
+    archived = _archived_history_rows(conn, customer_email, session_id, before_key,
+                                      newer_than=rows[-1][3] if len(rows) >= limit else None)
+    if archived:
+        rows = _merge_archived_history(conn, filters, params, limit, archived)
+    return rows
+
+def _archived_history_rows(conn: sqlite3.Connection, customer_email: str, session_id: Optional[str],
+                           before_key: Optional[tuple], newer_than=None) -> List[tuple]:
+    """The customer's archived (id, message_type, message_text, created_at) rows before before_key"""
+    filters, params = ["customer_email = ?"], [customer_email]
+    if session_id:
+        filters.append("session_id = ?")
+        params.append(session_id)
+    if before_key is not None:
+        filters.append("started_at <= ?")
+        params.append(str(before_key[0]))
+    if newer_than is not None:
+        filters.append("ended_at >= ?")
+        params.append(str(newer_than))
+    sessions = conn.execute(f"""
+        SELECT session_id FROM conversation_archive WHERE {' AND '.join(filters)}
+    """, tuple(params)).fetchall()
+
+    before = (str(before_key[0]), before_key[1]) if before_key is not None else None
+    return [(r[0], r[2], r[3], r[5])
+            for (archived_session,) in sessions
+            for r in load_archived_rows(conn, archived_session)
+            if r[1] == customer_email and (before is None or (str(r[5]), r[0]) < before)]
+
+def _merge_archived_history(conn: sqlite3.Connection, filters: str, params: List, limit: int,
+                            archived: List[tuple]) -> List[tuple]:
+    """conversation_history_rows() over hot and archived rows together, paired in Python"""
+    window = limit * 2 + 1
+    while True:
+        hot = conn.execute(f"""
+            SELECT id, message_type, message_text, created_at
+            FROM conversations
+            WHERE {filters}
+            ORDER BY created_at DESC, id DESC
+            LIMIT ?
+        """, tuple(params + [window])).fetchall()
+        merged = sorted([tuple(r) for r in hot] + archived, key=lambda r: (str(r[3]), r[0]))
+        if len(hot) == window:
+            # Older hot rows were left out: only pair what lies after the oldest one read
+            floor = (str(hot[-1][3]), hot[-1][0])
+            merged = [r for r in merged if (str(r[3]), r[0]) >= floor]
+
+        pairs = [(row[0], row[2], following[2] if following and following[1] == 'assistant' else 'No response',
+                  row[3])
+                 for row, following in zip(merged, merged[1:] + [None]) if row[1] == 'user']
+        if len(pairs) >= limit or len(hot) < window:
+            return pairs[::-1][:limit]
+        window *= 4
+
+def _history_pair(row) -> Dict:
+    return {
+        'message_id': row[0],
+        'user_message': row[1],
+        'ai_response': row[2],
+        'created_at': row[3],
+        'duration': "N/A"
+    }
 
 # Keep the old function name for backward compatibility
 def get_conversation_history_legacy(guest_email: str, limit: int = 50) -> List[Dict]:
     return get_conversation_history(guest_email, limit)
 
 
-def record_livekit_session(room_name: str, participant_name: str,
-                           customer_email: Optional[str] = None,
-                           session_id: Optional[str] = None,
-                           metadata: Optional[Dict] = None) -> Dict:
-    """Create or update a LiveKit session mapping."""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-
-    metadata_json = json.dumps(metadata) if metadata else None
-    now = _NOW()
+# ==================== TRANSCRIPT SEARCH ====================
+
+def _created_at_filters(column: str, date_from: Optional[str], date_to: Optional[str]) -> tuple:
+    """SQL conditions for an inclusive date range ('YYYY-MM-DD' or a full timestamp)"""
+    validate_date_range(date_from, date_to)
+    filters, params = [], []
+    if date_from:
+        filters.append(f"{column} >= ?")
+        params.append(date_from)
+    if date_to:
+        # A bare date includes the whole day
+        filters.append(f"{column} < date(?, '+1 day')" if len(date_to) == 10 else f"{column} <= ?")
+        params.append(date_to)
+    return filters, params
+
+def _fts_query(text: str) -> str:
+    """Turn free text into an FTS5 query: every word must match, quoted so
+    confirmation numbers like ATR-12345 are not parsed as FTS operators"""
+    terms = [term.replace('"', '""') for term in text.split()]
+    return " ".join(f'"{term}"' for term in terms if term)
+
+@_storage_api
+def search_conversations(query: str, customer_email: Optional[str] = None,
+                         date_from: Optional[str] = None, date_to: Optional[str] = None,
+                         limit: int = 20, offset: int = 0) -> Dict:
+    """Full-text search over conversation messages, best matches first.
+
+    Each hit carries a highlighted 'snippet'. Dates filter on created_at
+    (inclusive, 'YYYY-MM-DD' or a full timestamp). The index only covers hot
+    rows: 'archived_sessions' counts the archived sessions in the filter range
+    that were not searched.
+    """
+    match = _fts_query(query)
+    if not match:
+        return {'results': [], 'has_more': False, 'archived_sessions': 0}
 
-    cursor.execute("""
-        INSERT INTO livekit_sessions
-        (room_name, session_id, customer_email, participant_name, metadata, created_at, updated_at)
-        VALUES (?, ?, ?, ?, ?, ?, ?)
-        ON CONFLICT(room_name) DO UPDATE SET
-            session_id = COALESCE(excluded.session_id, livekit_sessions.session_id),
-            customer_email = COALESCE(excluded.customer_email, livekit_sessions.customer_email),
-            participant_name = COALESCE(excluded.participant_name, livekit_sessions.participant_name),
-            metadata = COALESCE(excluded.metadata, livekit_sessions.metadata),
-            updated_at = ?
-    """, (room_name, session_id, customer_email, participant_name, metadata_json, now, now, now))
-
-    conn.commit()
+    filters = ["conversations_fts MATCH ?"]
+    params: List = [match]
 
-    cursor.execute("""
-        SELECT room_name, session_id, customer_email, participant_name, metadata,
-               created_at, updated_at, last_transcript_at
-        FROM livekit_sessions
-        WHERE room_name = ?
-    """, (room_name,))
+    if customer_email:
+        filters.append("c.customer_email = ?")
+        params.append(customer_email)
+    date_filters, date_params = _created_at_filters("c.created_at", date_from, date_to)
+    filters.extend(date_filters)
+    params.extend(date_params)
+
+    params.extend([limit + 1, offset])
+
+    conn = get_connection(_db_path())
+    rows = conn.execute(f"""
+        SELECT c.id, c.session_id, c.customer_email, c.message_type, c.created_at,
+               snippet(conversations_fts, 0, '<mark>', '</mark>', '…', 16),
+               bm25(conversations_fts)
+        FROM conversations_fts
+        JOIN conversations c ON c.id = conversations_fts.rowid
+        WHERE {' AND '.join(filters)}
+        ORDER BY bm25(conversations_fts)
+        LIMIT ? OFFSET ?
+    """, tuple(params)).fetchall()
 
-    row = cursor.fetchone()
-    conn.close()
+    return {
+        'results': [
+            {
+                'id': row[0],
+                'session_id': row[1],
+                'customer_email': row[2],
+                'speaker': row[3],
+                'created_at': row[4],
+                'snippet': row[5],
+                'score': round(-row[6], 4)  # bm25() is lower-is-better
+            }
+            for row in rows[:limit]
+        ],
+        'has_more': len(rows) > limit,
+        'archived_sessions': _archived_session_count(conn, customer_email, date_from, date_to)
+    }
 
-    if not row:
-        return {}
+def _archived_session_count(conn: sqlite3.Connection, customer_email: Optional[str],
+                            date_from: Optional[str], date_to: Optional[str]) -> int:
+    """Archived sessions of the customer (or everyone's) overlapping the date range"""
+    filters, params = _created_at_filters("ended_at", date_from, None)
+    to_filters, to_params = _created_at_filters("started_at", None, date_to)
+    filters, params = filters + to_filters, params + to_params
+    if customer_email:
+        filters.append("customer_email = ?")
+        params.append(customer_email)
+    where = f"WHERE {' AND '.join(filters)}" if filters else ""
+    return conn.execute(f"SELECT COUNT(*) FROM conversation_archive {where}", tuple(params)).fetchone()[0]
+
+def rebuild_conversation_search_index() -> int:
+    """Re-index every conversation row (backfill after bulk loads or restores)"""
+    conn = get_connection(DB_PATH)
+    with conn:
+        conn.execute("INSERT INTO conversations_fts(conversations_fts) VALUES ('rebuild')")
+    return conn.execute("SELECT COUNT(*) FROM conversations").fetchone()[0]
+
+
+# ==================== TRANSCRIPT ARCHIVE ====================
+# Old sessions live compressed in conversation_archive (see transcript_archive.py)
+
+def _shard_paths() -> List[str]:
+    """Transcript shard files when running sharded, else []"""
+    return list(getattr(get_backend(), 'shard_paths', []))
+
+def archive_old_transcripts(older_than_days: int = ARCHIVE_AFTER_DAYS, dry_run: bool = False) -> Dict:
+    """Move idle sessions to the compressed archive and report the space reclaimed"""
+    flush_pending_writes()
+    report = archive_old_sessions(DB_PATH, older_than_days, dry_run=dry_run)
+    shards = [archive_old_sessions(path, older_than_days, dry_run=dry_run) for path in _shard_paths()]
+    if shards:
+        report['shards'] = shards
+    return report
+
+def transcript_archive_stats() -> Dict:
+    """Sessions, messages and bytes held in the transcript archive"""
+    return archive_stats(DB_PATH)
+
+
+# ==================== EXPORT ====================
+# Keyset pages for the streaming export (see export.py): each call is an id range
+# scan, so the cost of a page does not grow with how far the export has got.
+
+def _in_date_range(created_at, date_from: Optional[str], date_to: Optional[str]) -> bool:
+    """Python twin of _created_at_filters() for rows decoded from the archive"""
+    value = str(created_at)
+    if date_from and value < date_from:
+        return False
+    if date_to:
+        if len(date_to) == 10:
+            end = (datetime.fromisoformat(date_to) + timedelta(days=1)).strftime('%Y-%m-%d')
+            return value < end
+        return value <= date_to
+    return True
+
+@_storage_api
+def export_conversations(after_id: int = 0, limit: int = 1000,
+                         date_from: Optional[str] = None, date_to: Optional[str] = None) -> List[Dict]:
+    """Up to `limit` conversation rows with id > after_id in id order, archived rows included"""
+    conn = get_connection(_db_path())
+    filters, params = _created_at_filters("created_at", date_from, date_to)
+    where = " AND ".join(["id > ?"] + filters)
+    rows = conn.execute(f"""
+        SELECT {', '.join(CONVERSATION_EXPORT_FIELDS)}
+        FROM conversations
+        WHERE {where}
+        ORDER BY id
+        LIMIT ?
+    """, tuple([after_id] + params + [limit])).fetchall()
+
+    # Archived sessions whose id span overlaps this page; a full page bounds the span
+    upper = rows[-1][0] if len(rows) == limit else None
+    archive_filters, archive_params = ["last_message_id > ?"], [after_id]
+    if upper is not None:
+        archive_filters.append("first_message_id <= ?")
+        archive_params.append(upper)
+    if date_from:
+        archive_filters.append("ended_at >= ?")
+        archive_params.append(date_from)
+    sessions = conn.execute(f"""
+        SELECT session_id FROM conversation_archive WHERE {' AND '.join(archive_filters)}
+    """, tuple(archive_params)).fetchall()
+
+    merged = list(rows)
+    for (session_id,) in sessions:
+        for r in load_archived_rows(conn, session_id, after_id):
+            if (upper is None or r[0] <= upper) and _in_date_range(r[5], date_from, date_to):
+                merged.append((r[0], r[1], session_id, r[2], r[3], r[4], r[5]))
+    if sessions:
+        merged.sort(key=lambda row: row[0])
+        merged = merged[:limit]
+
+    return [dict(zip(CONVERSATION_EXPORT_FIELDS, row)) for row in merged]
+
+@_storage_api
+def export_bookings(after_id: int = 0, limit: int = 1000,
+                    date_from: Optional[str] = None, date_to: Optional[str] = None) -> List[Dict]:
+    """Up to `limit` travel bookings with id > after_id in id order (date range on created_at)"""
+    conn = get_connection(DB_PATH)
+    filters, params = _created_at_filters("created_at", date_from, date_to)
+    where = " AND ".join(["id > ?"] + filters)
+    rows = conn.execute(f"""
+        SELECT {', '.join(BOOKING_EXPORT_FIELDS)}
+        FROM travel_bookings
+        WHERE {where}
+        ORDER BY id
+        LIMIT ?
+    """, tuple([after_id] + params + [limit])).fetchall()
+    return [dict(zip(BOOKING_EXPORT_FIELDS, row)) for row in rows]
+
+
+# ==================== MAINTENANCE ====================
+# Retention TTLs, WAL checkpoint and incremental vacuum, off-peak (see maintenance.py)
+
+_maintenance: Optional[MaintenanceScheduler] = None
+_maintenance_lock = threading.Lock()
+
+def get_maintenance_scheduler() -> MaintenanceScheduler:
+    """Return the maintenance scheduler for the current database (not started)"""
+    global _maintenance
+    with _maintenance_lock:
+        if _maintenance is None or _maintenance.db_path != DB_PATH:
+            if _maintenance is not None:
+                _maintenance.stop()
+            _maintenance = MaintenanceScheduler(
+                DB_PATH,
+                before_run=flush_pending_writes,
+                extra_paths=_shard_paths,
+                after_run=_after_maintenance,
+            )
+        return _maintenance
+
+def _after_maintenance(report: Dict) -> None:
+    # Deleted sessions must not be served from the cache
+    _session_cache.invalidate()
+    # Nightly analytics snapshots ride along with the off-peak run (see snapshots.py)
+    from snapshots import SNAPSHOT_DIR, build_snapshots
+    if SNAPSHOT_DIR:
+        try:
+            report['snapshots'] = build_snapshots(SNAPSHOT_DIR)
+        except Exception as e:  # a failed snapshot must not fail the maintenance run
+            report['snapshots'] = {'error': str(e)}
+
+def start_maintenance_scheduler() -> bool:
+    """Start off-peak maintenance in this process; False if disabled or not on SQLite"""
+    if not MAINTENANCE_ENABLED or not get_backend().name.startswith('sqlite'):
+        return False
+    get_maintenance_scheduler().start()
+    return True
+
+def stop_maintenance_scheduler():
+    global _maintenance
+    with _maintenance_lock:
+        if _maintenance is not None:
+            _maintenance.stop()
+            _maintenance = None
+
+def run_database_maintenance(dry_run: bool = False) -> Dict:
+    """Run a maintenance pass now; the report has duration_ms and pages_freed"""
+    if not get_backend().name.startswith('sqlite'):
+        raise ValueError("Database maintenance only applies to the SQLite backend")
+    return get_maintenance_scheduler().run_now(dry_run=dry_run)
+
+def maintenance_stats() -> Dict:
+    """Run counters and the most recent maintenance reports"""
+    if _maintenance is None:
+        return {'running': False, 'runs': 0}
+    return _maintenance.stats()
+
+
+# Room -> session mappings, read on every transcript POST (see session_cache.py)
+_session_cache = SessionCache()
+
+_SESSION_COLUMNS = """
+    room_name, session_id, customer_email, participant_name, metadata,
+    created_at, updated_at, last_transcript_at
+"""
 
+def _session_from_row(row) -> Dict:
     metadata_loaded = json.loads(row[4]) if row[4] else None
 
     return {
@@ -412,48 +1170,90 @@ def record_livekit_session(room_name: str, participant_name: str,
         'last_transcript_at': row[7]
     }
 
+def _cache_session_activity(sessions: Dict[str, List]) -> None:
+    """Apply committed write-behind activity updates to the session cache"""
+    for room_name, (updated_at, customer_email, last_transcript_at) in sessions.items():
+        _session_cache.apply_activity(room_name, updated_at, customer_email, last_transcript_at)
+
+def session_cache_stats() -> Dict:
+    """Hit/miss counters for the room -> session cache"""
+    return _session_cache.stats()
+
+
+@_storage_api
+def record_livekit_session(room_name: str, participant_name: str,
+                           customer_email: Optional[str] = None,
+                           session_id: Optional[str] = None,
+                           metadata: Optional[Dict] = None) -> Dict:
+    """Create or update a LiveKit session mapping."""
+    conn = get_connection(_db_path())
+    cursor = conn.cursor()
+
+    metadata_json = json.dumps(metadata) if metadata else None
+    now = _NOW()
 
+    # Upsert and read back the merged row in a single statement
+    with conn:
+        cursor.execute(f"""
+            INSERT INTO livekit_sessions
+            (room_name, session_id, customer_email, participant_name, metadata, created_at, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(room_name) DO UPDATE SET
+                session_id = COALESCE(excluded.session_id, livekit_sessions.session_id),
+                customer_email = COALESCE(excluded.customer_email, livekit_sessions.customer_email),
+                participant_name = COALESCE(excluded.participant_name, livekit_sessions.participant_name),
+                metadata = COALESCE(excluded.metadata, livekit_sessions.metadata),
+                updated_at = ?
+            RETURNING {_SESSION_COLUMNS}
+        """, (room_name, session_id, customer_email, participant_name, metadata_json, now, now, now))
+        row = cursor.fetchone()
+
+    if not row:
+        _session_cache.invalidate(room_name)
+        return {}
+
+    session = _session_from_row(row)
+    _session_cache.put(room_name, session)
+    return session
+
+
+@_storage_api
 def get_livekit_session(room_name: str) -> Optional[Dict]:
-    """Fetch LiveKit session mapping for a room."""
-    conn = sqlite3.connect(DB_PATH)
+    """Fetch LiveKit session mapping for a room (served from the session cache when possible)."""
+    cached = _session_cache.get(room_name)
+    if cached is not None:
+        return cached
+
+    conn = get_connection(_db_path())
     cursor = conn.cursor()
 
-    cursor.execute("""
-        SELECT room_name, session_id, customer_email, participant_name, metadata,
-               created_at, updated_at, last_transcript_at
+    cursor.execute(f"""
+        SELECT {_SESSION_COLUMNS}
         FROM livekit_sessions
         WHERE room_name = ?
     """, (room_name,))
 
     row = cursor.fetchone()
-    conn.close()
 
     if not row:
         return None
 
-    metadata_loaded = json.loads(row[4]) if row[4] else None
-
-    return {
-        'room_name': row[0],
-        'session_id': row[1],
-        'customer_email': row[2],
-        'participant_name': row[3],
-        'metadata': metadata_loaded,
-        'created_at': row[5],
-        'updated_at': row[6],
-        'last_transcript_at': row[7]
-    }
+    session = _session_from_row(row)
+    _session_cache.put(room_name, session)
+    return session
 
 
+@_storage_api
 def update_livekit_session_activity(room_name: str,
                                     customer_email: Optional[str] = None,
                                     last_transcript_at: Optional[datetime] = None) -> None:
     """Update session metadata when activity occurs."""
-    conn = sqlite3.connect(DB_PATH)
+    conn = get_connection(_db_path())
     cursor = conn.cursor()
 
+    now = _NOW()
     updates = ["updated_at = ?"]
-    params = [_NOW()]
+    params = [now]
 
     if customer_email:
         updates.append("customer_email = ?")
@@ -465,19 +1265,20 @@ def update_livekit_session_activity(room_name: str,
 
     params.append(room_name)
 
-    cursor.execute(
-        f"UPDATE livekit_sessions SET {', '.join(updates)} WHERE room_name = ?",
-        tuple(params)
-    )
+    with conn:
+        cursor.execute(
+            f"UPDATE livekit_sessions SET {', '.join(updates)} WHERE room_name = ?",
+            tuple(params)
+        )
 
-    conn.commit()
-    conn.close()
+    _session_cache.apply_activity(room_name, now, customer_email, last_transcript_at)
 
 
+@_storage_api
 def get_transcript_by_session(session_id: str, limit: int = 200,
                               since_id: Optional[int] = None) -> List[Dict]:
-    """Get ordered transcript entries for a LiveKit session."""
-    conn = sqlite3.connect(DB_PATH)
+    """Get ordered transcript entries for a LiveKit session (archived rows included)."""
+    conn = get_connection(_db_path())
     cursor = conn.cursor()
 
     query = """
@@ -500,7 +1301,13 @@ def get_transcript_by_session(session_id: str, limit: int = 200,
     cursor.execute(query, tuple(params))
 
     rows = cursor.fetchall()
-    conn.close()
+
+    # Archived rows all precede the session's remaining hot rows
+    archived = load_archived_rows(conn, session_id, since_id)
+    if archived:
+        rows = [(r[0], r[2], r[3], r[4], r[5]) for r in archived] + rows
+        if limit:
+            rows = rows[:limit]
 
     transcripts = []
     for row in rows:
@@ -515,62 +1322,83 @@ def get_transcript_by_session(session_id: str, limit: int = 200,
     return transcripts
 
 
-def _get_customer_email_for_session(session_id: str) -> Optional[str]:
-    """Fetch the customer email associated with a transcript session."""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-
-    cursor.execute(
-        """
-        SELECT customer_email
-        FROM conversations
-        WHERE session_id = ?
-        ORDER BY created_at DESC
-        LIMIT 1
-        """,
-        (session_id,)
-    )
+@_storage_api
+def get_livekit_transcript(room_name: str, limit: int = 200,
+                           since_id: Optional[int] = None) -> Dict:
+    """Get LiveKit transcript and associated session metadata.
 
-    row = cursor.fetchone()
-    conn.close()
+    One query resolves the room's session (falling back to the room name when the
+    room was never mapped) and range-scans its transcript rows after `since_id`.
+    """
+    conn = get_connection(_db_path())
+    cursor = conn.cursor()
 
-    if not row:
-        return None
+    query = """
+        WITH target AS (
+            SELECT s.session_id AS mapped_session_id,
+                   s.customer_email, s.participant_name, s.last_transcript_at,
+                   COALESCE(NULLIF(s.session_id, ''), r.room_name) AS transcript_session_id,
+                   CASE WHEN COALESCE(s.session_id, '') = '' THEN (
+                       SELECT customer_email FROM conversations
+                       WHERE session_id = r.room_name
+                       ORDER BY id DESC LIMIT 1
+                   ) END AS fallback_email
+            FROM (SELECT ? AS room_name) r
+            LEFT JOIN livekit_sessions s ON s.room_name = r.room_name
+        ),
+        page AS (
+            SELECT id, message_type, message_text, language, created_at
+            FROM conversations
+            WHERE session_id = (SELECT transcript_session_id FROM target) AND id > ?
+            ORDER BY id ASC
+            LIMIT ?
+        )
+        SELECT t.mapped_session_id, t.customer_email, t.participant_name, t.last_transcript_at,
+               t.transcript_session_id, t.fallback_email,
+               p.id, p.message_type, p.message_text, p.language, p.created_at
+        FROM target t
+        LEFT JOIN page p
+        ORDER BY p.id ASC
+    """
+    # LIMIT -1 means no limit in SQLite
+    params = (room_name, since_id if since_id is not None else -1, limit or -1)
 
-    return row[0]
+    cursor.execute(query, params)
+    rows = cursor.fetchall()
 
+    mapped_session_id, customer_email, participant_name, last_transcript_at, \
+        transcript_session_id, fallback_email = rows[0][:6]
 
-def get_livekit_transcript(room_name: str, limit: int = 200,
-                           since_id: Optional[int] = None) -> Dict:
-    """Get LiveKit transcript and associated session metadata."""
-    session_info = get_livekit_session(room_name)
+    transcripts = [
+        {
+            'id': row[6],
+            'speaker': row[7],
+            'text': row[8],
+            'language': row[9],
+            'created_at': row[10]
+        }
+        for row in rows if row[6] is not None
+    ]
+
+    # Sessions moved to the cold tier are decompressed and put in front
+    archived = load_archived_rows(conn, transcript_session_id, since_id)
+    if archived:
+        transcripts = [
+            {'id': r[0], 'speaker': r[2], 'text': r[3], 'language': r[4], 'created_at': r[5]}
+            for r in archived
+        ] + transcripts
+        if limit:
+            transcripts = transcripts[:limit]
+        fallback_email = fallback_email or archived[-1][1]
 
     # Prefer the stored session mapping, but fall back to room_name-based session
-    session_id: Optional[str] = None
-    customer_email: Optional[str] = None
-    participant_name: Optional[str] = None
-    last_transcript_at: Optional[datetime] = None
-
-    if session_info:
-        session_id = session_info.get('session_id') or None
-        customer_email = session_info.get('customer_email')
-        participant_name = session_info.get('participant_name')
-        last_transcript_at = session_info.get('last_transcript_at')
-
-    transcripts: List[Dict] = []
+    session_id = mapped_session_id or None
+    if not session_id and transcripts:
+        session_id = transcript_session_id
+        # Recover customer email from transcript entries
+        customer_email = customer_email or fallback_email
 
-    if session_id:
-        transcripts = get_transcript_by_session(session_id, limit, since_id)
-    else:
-        # Some sessions may not have been mapped yet; use room name as fallback ID
-        fallback_session_id = room_name
-        transcripts = get_transcript_by_session(fallback_session_id, limit, since_id)
-        if transcripts:
-            session_id = fallback_session_id
-            # Try to recover customer email from transcript entries
-            customer_email = customer_email or _get_customer_email_for_session(fallback_session_id)
-
-    # If we still have no transcripts, return minimal info
+    # If we have no transcripts, return minimal info
     if not transcripts:
         return {
             'room_name': room_name,
@@ -580,7 +1408,7 @@ def get_livekit_transcript(room_name: str, limit: int = 200,
             'transcripts': []
         }
 
-    result = {
+    return {
         'room_name': room_name,
         'session_id': session_id,
         'customer_email': customer_email,
@@ -589,11 +1417,10 @@ def get_livekit_transcript(room_name: str, limit: int = 200,
         'last_transcript_at': last_transcript_at
     }
 
-    return result
-
+@_storage_api
 def cancel_booking(booking_id: int, customer_email: str) -> Dict:
     """Cancel a booking"""
-    conn = sqlite3.connect(DB_PATH)
+    conn = get_connection(DB_PATH)
     cursor = conn.cursor()
     
     try:
@@ -608,22 +1435,27 @@ def cancel_booking(booking_id: int, customer_email: str) -> Dict:
         booking = cursor.fetchone()
         
         if not booking:
-            conn.close()
             return {'success': False, 'message': 'Booking not found or access denied'}
         
         if booking[2] == 'cancelled':
-            conn.close()
             return {'success': False, 'message': 'Booking is already cancelled'}
         
-        # Update booking status to cancelled
-        cursor.execute("""
+        # Update booking status to cancelled; the status guard makes a concurrent
+        # cancel a no-op so the rollups are only adjusted once
+        updated = cursor.execute(f"""
             UPDATE travel_bookings 
             SET status = 'cancelled' 
-            WHERE id = ?
-        """, (booking_id,))
+            WHERE id = ? AND COALESCE(status, '') != 'cancelled'
+            RETURNING {_ROLLUP_COLUMNS}
+        """, (booking_id,)).fetchone()
+        
+        if not updated:
+            conn.rollback()
+            return {'success': False, 'message': 'Booking is already cancelled'}
+        
+        _replace_booking_rollup(conn, (*updated[:1], booking[2], *updated[2:]), updated)
         
         conn.commit()
-        conn.close()
         
         return {
             'success': True, 
@@ -632,13 +1464,14 @@ def cancel_booking(booking_id: int, customer_email: str) -> Dict:
         }
     
     except Exception as e:
-        conn.close()
+        conn.rollback()
         return {'success': False, 'message': str(e)}
 
+@_storage_api
 def reschedule_booking(booking_id: int, customer_email: str, 
                       new_departure_date: str = None, new_return_date: str = None) -> Dict:
     """Reschedule a booking"""
-    conn = sqlite3.connect(DB_PATH)
+    conn = get_connection(DB_PATH)
     cursor = conn.cursor()
     
     try:
@@ -653,11 +1486,9 @@ def reschedule_booking(booking_id: int, customer_email: str,
         booking = cursor.fetchone()
         
         if not booking:
-            conn.close()
             return {'success': False, 'message': 'Booking not found or access denied'}
         
         if booking[2] == 'cancelled':
-            conn.close()
             return {'success': False, 'message': 'Cannot reschedule a cancelled booking'}
         
         # Update booking dates
@@ -673,17 +1504,18 @@ def reschedule_booking(booking_id: int, customer_email: str,
             params.append(new_return_date)
         
         if not updates:
-            conn.close()
             return {'success': False, 'message': 'No new dates provided'}
         
         # Add booking_id to params
         params.append(booking_id)
         
-        query = f"UPDATE travel_bookings SET {', '.join(updates)} WHERE id = ?"
-        cursor.execute(query, params)
+        query = f"UPDATE travel_bookings SET {', '.join(updates)} WHERE id = ? RETURNING customer_email"
+        updated = cursor.execute(query, params).fetchone()
+        
+        # Dates are not a rollup dimension; only the reschedule counter moves
+        _count_booking_reschedule(conn, updated[0])
         
         conn.commit()
-        conn.close()
         
         return {
             'success': True, 
@@ -694,7 +1526,64 @@ def reschedule_booking(booking_id: int, customer_email: str,
         }
     
     except Exception as e:
-        conn.close()
+        conn.rollback()
+        return {'success': False, 'message': str(e)}
+
+@_storage_api
+def bulk_update_bookings(customer_email: str, operations: List[Dict]) -> Dict:
+    """Apply a batch of cancel/reschedule operations in one transaction.
+
+    Each operation is {'op': 'cancel' | 'reschedule', 'booking_id': ..., and for
+    reschedules 'new_departure_date' / 'new_return_date'}. Ownership of every
+    booking is checked with one query; operations that fail the checks are
+    reported per item and do not stop the others.
+    """
+    if not operations:
+        return {'success': False, 'message': 'No operations provided'}
+    if len(operations) > MAX_BULK_BOOKING_OPERATIONS:
+        return {'success': False, 'message': f'At most {MAX_BULK_BOOKING_OPERATIONS} operations per request'}
+
+    conn = get_connection(DB_PATH)
+    ids = bulk_booking_ids(operations)
+
+    try:
+        # Write lock up front: statuses read here stay current until commit
+        conn.execute("BEGIN IMMEDIATE")
+        placeholders = ", ".join("?" for _ in ids)
+        owned = {row[0]: row[1:] for row in conn.execute(f"""
+            SELECT id, {_ROLLUP_COLUMNS}
+            FROM travel_bookings
+            WHERE id IN ({placeholders})
+              AND customer_id = (SELECT id FROM customers WHERE email = ?)
+        """, (*ids, customer_email))} if ids else {}
+
+        results, cancels, reschedules = plan_bulk_booking_operations(
+            operations, {booking_id: row[1] for booking_id, row in owned.items()})
+
+        if cancels:
+            placeholders = ", ".join("?" for _ in cancels)
+            for row in conn.execute(f"""
+                UPDATE travel_bookings SET status = 'cancelled'
+                WHERE id IN ({placeholders})
+                RETURNING id, {_ROLLUP_COLUMNS}
+            """, cancels).fetchall():
+                _replace_booking_rollup(conn, owned[row[0]], row[1:])
+
+        if reschedules:
+            conn.executemany("""
+                UPDATE travel_bookings
+                SET departure_date = COALESCE(?, departure_date), return_date = COALESCE(?, return_date)
+                WHERE id = ?
+            """, reschedules)
+            # Dates are not a rollup dimension; only the reschedule counter moves
+            for _, _, booking_id in reschedules:
+                _count_booking_reschedule(conn, owned[booking_id][0])
+
+        conn.commit()
+        return bulk_booking_summary(results)
+
+    except Exception as e:
+        conn.rollback()
         return {'success': False, 'message': str(e)}
 
 # Initialize database on import
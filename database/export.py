@@ -0,0 +1,165 @@
+"""
+Streaming NDJSON/CSV export of conversations and bookings
+
+Rows are read in keyset pages (export_conversations / export_bookings, id order)
+and encoded one page at a time, so memory stays constant however many rows are
+exported. Every row carries its id: pass the last one seen as `after_id` to
+resume an interrupted export. gzip output is compressed as it is produced.
+
+Usage:
+    python export.py conversations --from 2025-01-01 --to 2025-01-31 -o jan.ndjson
+    python export.py bookings --format csv --gzip -o bookings.csv.gz
+    python export.py conversations -o all.ndjson --resume     # continue after the last row in the file
+"""
+
+import argparse
+import csv
+import gzip
+import io
+import json
+import os
+import sys
+import zlib
+from typing import Dict, Iterator, List, Optional
+
+import database
+from storage import BOOKING_EXPORT_FIELDS, CONVERSATION_EXPORT_FIELDS, validate_date_range
+
+EXPORT_BATCH_ROWS = 1000
+
+# kind -> (page function name in database.py, CSV columns)
+EXPORTS = {
+    'conversations': ('export_conversations', CONVERSATION_EXPORT_FIELDS),
+    'bookings': ('export_bookings', BOOKING_EXPORT_FIELDS),
+}
+FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+
+def validate_export(kind: str, fmt: str, date_from: Optional[str], date_to: Optional[str]) -> None:
+    """Raise ValueError for bad parameters (before any bytes are streamed)"""
+    if kind not in EXPORTS:
+        raise ValueError(f"Unknown export '{kind}', expected one of: {', '.join(EXPORTS)}")
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown format '{fmt}', expected one of: {', '.join(FORMATS)}")
+    validate_date_range(date_from, date_to)
+
+
+def iter_pages(kind: str, date_from: Optional[str] = None, date_to: Optional[str] = None,
+               after_id: int = 0, batch_size: int = EXPORT_BATCH_ROWS) -> Iterator[List[Dict]]:
+    """Pages of rows with id > after_id, oldest id first"""
+    fetch = getattr(database, EXPORTS[kind][0])
+    while True:
+        page = fetch(after_id, batch_size, date_from, date_to)
+        if not page:
+            return
+        yield page
+        if len(page) < batch_size:
+            return
+        after_id = page[-1]['id']
+
+
+def _ndjson(pages: Iterator[List[Dict]]) -> Iterator[bytes]:
+    for page in pages:
+        yield "".join(json.dumps(row, ensure_ascii=False, default=str) + "\n" for row in page).encode("utf-8")
+
+
+def _csv(pages: Iterator[List[Dict]], fields: List[str], header: bool) -> Iterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=fields, extrasaction="ignore")
+    if header:
+        writer.writeheader()
+    for page in pages:
+        writer.writerows(page)
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():  # header of an empty export
+        yield buffer.getvalue().encode("utf-8")
+
+
+def gzip_stream(chunks: Iterator[bytes], level: int = 6) -> Iterator[bytes]:
+    """Compress a byte stream on the fly into one gzip member"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # wbits 31 = gzip container
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def export_stream(kind: str, fmt: str = "ndjson", date_from: Optional[str] = None,
+                  date_to: Optional[str] = None, after_id: int = 0, compress: bool = False,
+                  header: bool = True, batch_size: int = EXPORT_BATCH_ROWS) -> Iterator[bytes]:
+    """Encoded export as a byte generator (for StreamingResponse or a file)"""
+    validate_export(kind, fmt, date_from, date_to)
+    pages = iter_pages(kind, date_from, date_to, after_id, batch_size)
+    chunks = _ndjson(pages) if fmt == "ndjson" else _csv(pages, EXPORTS[kind][1], header)
+    return gzip_stream(chunks) if compress else chunks
+
+
+def last_exported_id(path: str, fmt: str) -> int:
+    """Id of the last complete row in an earlier export file (0 if there is none).
+
+    A plain file is cut back to its last complete line so appended rows start
+    cleanly; a gzip file with a partial tail cannot be, so it raises ValueError.
+    """
+    if path.endswith(".gz"):
+        try:
+            with gzip.open(path, "rb") as f:
+                data = f.read()
+        except EOFError:
+            raise ValueError(f"{path} is a truncated gzip stream; restart the export")
+        if data and not data.endswith(b"\n"):
+            raise ValueError(f"{path} ends mid-row; restart the export")
+    else:
+        with open(path, "rb+") as f:
+            data = f.read()
+            complete = data.rfind(b"\n") + 1
+            if complete < len(data):
+                f.truncate(complete)
+                data = data[:complete]
+
+    text = data.decode("utf-8")
+    if fmt == "ndjson":
+        lines = text.splitlines()
+        return json.loads(lines[-1])['id'] if lines else 0
+    rows = list(csv.DictReader(io.StringIO(text, newline="")))
+    return int(rows[-1]['id']) if rows else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stream conversations or bookings to NDJSON/CSV")
+    parser.add_argument("kind", choices=list(EXPORTS))
+    parser.add_argument("--format", choices=list(FORMATS), default="ndjson")
+    parser.add_argument("--from", dest="date_from", help="inclusive start date (YYYY-MM-DD)")
+    parser.add_argument("--to", dest="date_to", help="inclusive end date (YYYY-MM-DD)")
+    parser.add_argument("--after-id", type=int, default=0, help="only rows with a larger id")
+    parser.add_argument("--gzip", action="store_true", help="gzip the output")
+    parser.add_argument("-o", "--output", help="output file (default: stdout)")
+    parser.add_argument("--resume", action="store_true",
+                        help="append to --output, starting after the last row it holds")
+    args = parser.parse_args()
+
+    database.flush_pending_writes()
+    after_id, header, mode = args.after_id, True, "wb"
+    if args.resume and args.output and os.path.exists(args.output):
+        try:
+            after_id = max(after_id, last_exported_id(args.output, args.format))
+        except ValueError as e:
+            sys.exit(f"Cannot resume: {e}")
+        header, mode = False, "ab"  # gzip members can be concatenated
+
+    stream = export_stream(args.kind, args.format, args.date_from, args.date_to,
+                           after_id, args.gzip, header)
+    out = open(args.output, mode) if args.output else sys.stdout.buffer
+    try:
+        for chunk in stream:
+            out.write(chunk)
+    finally:
+        if args.output:
+            out.close()
+    if args.output:
+        print(f"Exported {args.kind} after id {after_id} to {args.output}", file=sys.stderr)
@@ -0,0 +1,337 @@
+"""
+Retention sweeper and off-peak VACUUM scheduler for the SQLite database
+
+A maintenance run:
+  1. deletes livekit_sessions rows idle for more than LIVEKIT_SESSION_TTL_DAYS
+  2. deletes guest (guest@livekit.local) transcripts older than GUEST_TRANSCRIPT_TTL_DAYS,
+     both hot rows and archived sessions
+  3. nulls out expired password reset tokens
+  4. optionally moves idle transcripts to the compressed archive
+  5. runs PRAGMA wal_checkpoint(TRUNCATE) and PRAGMA incremental_vacuum
+
+MaintenanceScheduler runs this once per MAINTENANCE_WINDOW (local time, e.g.
+"02:00-05:00") on a background thread inside the API process. Deletes are done
+in batches of DELETE_BATCH_ROWS so the write lock is never held for long.
+
+incremental_vacuum only returns pages to the OS when the database uses
+auto_vacuum=INCREMENTAL. New databases get it from the connection pragmas;
+existing ones need a one-time full VACUUM:
+
+Usage:
+    python maintenance.py                             # run once now
+    python maintenance.py --dry-run                   # count what would be removed
+    python maintenance.py --enable-incremental-vacuum # one-time conversion (full VACUUM)
+"""
+
+import argparse
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+from datetime import datetime, time as dtime, timedelta
+from typing import Callable, Dict, List, Optional, Tuple
+
+from connection_pool import get_connection
+
+logger = logging.getLogger(__name__)
+
+GUEST_EMAIL = "guest@livekit.local"
+
+LIVEKIT_SESSION_TTL_DAYS = int(os.getenv("LIVEKIT_SESSION_TTL_DAYS", "30"))
+GUEST_TRANSCRIPT_TTL_DAYS = int(os.getenv("GUEST_TRANSCRIPT_TTL_DAYS", "30"))
+MAINTENANCE_ENABLED = os.getenv("DB_MAINTENANCE_ENABLED", "true").lower() in ("1", "true", "yes")
+MAINTENANCE_WINDOW = os.getenv("DB_MAINTENANCE_WINDOW", "02:00-05:00")
+MAINTENANCE_ARCHIVE_TRANSCRIPTS = os.getenv("DB_MAINTENANCE_ARCHIVE_TRANSCRIPTS", "false").lower() in ("1", "true", "yes")
+CHECK_INTERVAL_SECONDS = 300     # how often the scheduler looks at the clock
+DELETE_BATCH_ROWS = 1000         # rows deleted per transaction
+VACUUM_PAGES_PER_STEP = 2000     # pages released per incremental_vacuum call
+HISTORY_SIZE = 20                # recent run reports kept for /db/maintenance
+
+_AUTO_VACUUM_MODES = {0: "none", 1: "full", 2: "incremental"}
+
+
+# ==================== RETENTION ====================
+
+def _delete_in_batches(conn: sqlite3.Connection, table: str, key: str, where: str, params: Tuple) -> int:
+    """DELETE matching rows DELETE_BATCH_ROWS at a time; returns the rows removed"""
+    deleted = 0
+    while True:
+        with conn:
+            cursor = conn.execute(f"""
+                DELETE FROM {table} WHERE {key} IN (
+                    SELECT {key} FROM {table} WHERE {where} LIMIT ?
+                )
+            """, params + (DELETE_BATCH_ROWS,))
+        deleted += cursor.rowcount
+        if cursor.rowcount < DELETE_BATCH_ROWS:
+            return deleted
+
+
+def _count(conn: sqlite3.Connection, table: str, where: str, params: Tuple) -> int:
+    return conn.execute(f"SELECT COUNT(*) FROM {table} WHERE {where}", params).fetchone()[0]
+
+
+def sweep_expired(db_path: str, session_ttl_days: int = LIVEKIT_SESSION_TTL_DAYS,
+                  guest_ttl_days: int = GUEST_TRANSCRIPT_TTL_DAYS,
+                  now: Optional[datetime] = None, dry_run: bool = False) -> Dict:
+    """Apply the retention rules; returns the rows removed (or that would be) per rule"""
+    conn = get_connection(db_path)
+    now = now or datetime.now()
+    session_cutoff = now - timedelta(days=session_ttl_days)
+    guest_cutoff = now - timedelta(days=guest_ttl_days)
+
+    rules = {
+        'livekit_sessions': ("livekit_sessions", "id", "updated_at < ?", (session_cutoff,)),
+        'guest_messages': ("conversations", "id", "customer_email = ? AND created_at < ?",
+                           (GUEST_EMAIL, guest_cutoff)),
+        'guest_archived_sessions': ("conversation_archive", "session_id",
+                                    "customer_email = ? AND ended_at < ?",
+                                    (GUEST_EMAIL, str(guest_cutoff))),
+    }
+    report = {}
+    for name, (table, key, where, params) in rules.items():
+        report[name] = (_count(conn, table, where, params) if dry_run
+                        else _delete_in_batches(conn, table, key, where, params))
+
+    # Expiry is stored as isoformat; julianday() also accepts older "YYYY-MM-DD HH:MM" values
+    token_where = "reset_token_expiry IS NOT NULL AND julianday(reset_token_expiry) < julianday(?)"
+    if dry_run:
+        report['reset_tokens'] = _count(conn, "customers", token_where, (now.isoformat(),))
+    else:
+        with conn:
+            cursor = conn.execute(f"""
+                UPDATE customers SET reset_token = NULL, reset_token_expiry = NULL
+                WHERE {token_where}
+            """, (now.isoformat(),))
+        report['reset_tokens'] = cursor.rowcount
+
+    report.update({'session_cutoff': str(session_cutoff), 'guest_cutoff': str(guest_cutoff)})
+    return report
+
+
+# ==================== CHECKPOINT / VACUUM ====================
+
+def _file_bytes(db_path: str) -> Dict:
+    sizes = {}
+    for name, path in (('db_bytes', db_path), ('wal_bytes', db_path + "-wal")):
+        try:
+            sizes[name] = os.path.getsize(path)
+        except OSError:
+            sizes[name] = 0
+    return sizes
+
+
+def checkpoint_and_vacuum(db_path: str, max_pages: Optional[int] = None) -> Dict:
+    """Release free pages (incremental_vacuum) and truncate the WAL; returns pages freed"""
+    conn = get_connection(db_path)
+    auto_vacuum = _AUTO_VACUUM_MODES.get(conn.execute("PRAGMA auto_vacuum").fetchone()[0], "unknown")
+    freelist_before = conn.execute("PRAGMA freelist_count").fetchone()[0]
+
+    if auto_vacuum == "incremental":
+        remaining = max_pages if max_pages is not None else freelist_before
+        while remaining > 0:
+            step = min(remaining, VACUUM_PAGES_PER_STEP)
+            # executescript steps the pragma to completion; execute() would free a single page
+            conn.executescript(f"PRAGMA incremental_vacuum({step});")
+            remaining -= step
+
+    freelist_after = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    busy, wal_frames, checkpointed = conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchone()
+    return {
+        'auto_vacuum': auto_vacuum,
+        'freelist_pages_before': freelist_before,
+        'freelist_pages_after': freelist_after,
+        'pages_freed': freelist_before - freelist_after,
+        'page_size': conn.execute("PRAGMA page_size").fetchone()[0],
+        'wal_checkpoint': {'busy': bool(busy), 'wal_frames': wal_frames, 'checkpointed_frames': checkpointed},
+    }
+
+
+def enable_incremental_vacuum(db_path: str) -> Dict:
+    """Switch an existing database to auto_vacuum=INCREMENTAL (rewrites the file once)"""
+    conn = get_connection(db_path)
+    before = _file_bytes(db_path)
+    if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+        conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        conn.execute("VACUUM")
+    return {
+        'auto_vacuum': _AUTO_VACUUM_MODES.get(conn.execute("PRAGMA auto_vacuum").fetchone()[0], "unknown"),
+        **{f"{k}_before": v for k, v in before.items()},
+        **{f"{k}_after": v for k, v in _file_bytes(db_path).items()},
+    }
+
+
+# ==================== MAINTENANCE RUN ====================
+
+def run_maintenance(db_path: str, session_ttl_days: int = LIVEKIT_SESSION_TTL_DAYS,
+                    guest_ttl_days: int = GUEST_TRANSCRIPT_TTL_DAYS,
+                    archive_transcripts: bool = MAINTENANCE_ARCHIVE_TRANSCRIPTS,
+                    dry_run: bool = False) -> Dict:
+    """One full maintenance pass; the report includes duration_ms and pages_freed"""
+    started = time.perf_counter()
+    files_before = _file_bytes(db_path)
+    report = {'started_at': datetime.now().isoformat(), 'dry_run': dry_run}
+
+    report['deleted'] = sweep_expired(db_path, session_ttl_days, guest_ttl_days, dry_run=dry_run)
+    if archive_transcripts:
+        from transcript_archive import archive_old_sessions
+        report['archive'] = archive_old_sessions(db_path, dry_run=dry_run)
+    if not dry_run:
+        report['vacuum'] = checkpoint_and_vacuum(db_path)
+        report['pages_freed'] = report['vacuum']['pages_freed']
+    else:
+        report['pages_freed'] = 0
+
+    files_after = _file_bytes(db_path)
+    report.update({
+        **{f"{k}_before": v for k, v in files_before.items()},
+        **{f"{k}_after": v for k, v in files_after.items()},
+        'duration_ms': round((time.perf_counter() - started) * 1000, 1),
+    })
+    return report
+
+
+# ==================== SCHEDULER ====================
+
+def parse_window(window: str) -> Tuple[dtime, dtime]:
+    """"HH:MM-HH:MM" -> (start, end); the window may wrap past midnight"""
+    try:
+        start, end = (datetime.strptime(part.strip(), "%H:%M").time() for part in window.split("-"))
+    except ValueError as e:
+        raise ValueError(f"Invalid maintenance window {window!r}, expected HH:MM-HH:MM") from e
+    return start, end
+
+
+def window_start(now: datetime, window: Tuple[dtime, dtime]) -> Optional[datetime]:
+    """Start of the window `now` falls in, or None when outside it"""
+    start, end = window
+    today_start = datetime.combine(now.date(), start)
+    if start <= end:
+        return today_start if start <= now.time() < end else None
+    # Wrapping window, e.g. 23:00-02:00
+    if now.time() >= start:
+        return today_start
+    if now.time() < end:
+        return today_start - timedelta(days=1)
+    return None
+
+
+class MaintenanceScheduler:
+    """Background thread that runs run_maintenance() once per off-peak window."""
+
+    def __init__(self, db_path: str, window: str = MAINTENANCE_WINDOW,
+                 check_interval: float = CHECK_INTERVAL_SECONDS,
+                 before_run: Optional[Callable[[], None]] = None,
+                 after_run: Optional[Callable[[Dict], None]] = None,
+                 extra_paths: Optional[Callable[[], List[str]]] = None,
+                 clock: Callable[[], datetime] = datetime.now):
+        self.db_path = db_path
+        self.window_text = window
+        self.window = parse_window(window)
+        self.check_interval = check_interval
+        # Hooks used by database.py: flush the write-behind queue, refresh the session cache
+        self.before_run = before_run
+        self.after_run = after_run
+        # Transcript shard files (sharding.py) get the same pass after the main file
+        self.extra_paths = extra_paths
+        self._clock = clock
+        self._run_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._last_window: Optional[datetime] = None
+        self._history = deque(maxlen=HISTORY_SIZE)
+        self._stats = {'runs': 0, 'failures': 0, 'total_pages_freed': 0, 'last_error': None}
+
+    def run_now(self, dry_run: bool = False, **kwargs) -> Dict:
+        """Run maintenance immediately on the calling thread (serialized with scheduled runs)"""
+        with self._run_lock:
+            try:
+                if self.before_run:
+                    self.before_run()
+                report = run_maintenance(self.db_path, dry_run=dry_run, **kwargs)
+                shards = [run_maintenance(path, dry_run=dry_run, **kwargs)
+                          for path in (self.extra_paths() if self.extra_paths else [])]
+                if shards:
+                    report['shards'] = shards
+                    report['pages_freed'] += sum(shard['pages_freed'] for shard in shards)
+                    report['duration_ms'] = round(report['duration_ms'] + sum(s['duration_ms'] for s in shards), 1)
+                if self.after_run and not dry_run:
+                    self.after_run(report)
+            except Exception as e:
+                self._stats['failures'] += 1
+                self._stats['last_error'] = str(e)
+                raise
+            if not dry_run:
+                self._stats['runs'] += 1
+                self._stats['total_pages_freed'] += report['pages_freed']
+                self._history.append(report)
+            return report
+
+    def _tick(self) -> Optional[Dict]:
+        """Run if we are inside a window that has not been handled yet"""
+        current = window_start(self._clock(), self.window)
+        if current is None or current == self._last_window:
+            return None
+        self._last_window = current
+        try:
+            report = self.run_now()
+        except Exception as e:
+            logger.error(f"❌ Database maintenance failed: {e}")
+            return None
+        logger.info(f"🧹 Database maintenance: {report['deleted']}, "
+                    f"{report['pages_freed']} pages freed in {report['duration_ms']} ms")
+        return report
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self._tick()
+            self._stop.wait(self.check_interval)
+
+    def start(self) -> None:
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="db-maintenance", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: Optional[float] = 10.0) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def stats(self) -> Dict:
+        history = list(self._history)
+        return {
+            **self._stats,
+            'running': self._thread is not None and self._thread.is_alive(),
+            'window': self.window_text,
+            'last_run': history[-1] if history else None,
+            'recent_runs': [
+                {'started_at': r['started_at'], 'duration_ms': r['duration_ms'], 'pages_freed': r['pages_freed']}
+                for r in history
+            ],
+        }
+
+
+if __name__ == "__main__":
+    import database
+
+    parser = argparse.ArgumentParser(description="Retention sweep, WAL checkpoint and incremental vacuum")
+    parser.add_argument("--session-ttl-days", type=int, default=LIVEKIT_SESSION_TTL_DAYS)
+    parser.add_argument("--guest-ttl-days", type=int, default=GUEST_TRANSCRIPT_TTL_DAYS)
+    parser.add_argument("--archive-transcripts", action="store_true",
+                        help="also move idle transcripts to the compressed archive")
+    parser.add_argument("--dry-run", action="store_true", help="count rows without deleting anything")
+    parser.add_argument("--enable-incremental-vacuum", action="store_true",
+                        help="convert the database to auto_vacuum=INCREMENTAL (full VACUUM, run once)")
+    args = parser.parse_args()
+
+    database.flush_pending_writes()
+    if args.enable_incremental_vacuum:
+        result = enable_incremental_vacuum(database.DB_PATH)
+    else:
+        result = run_maintenance(database.DB_PATH, args.session_ttl_days, args.guest_ttl_days,
+                                 args.archive_transcripts, args.dry_run)
+    print(json.dumps(result, indent=2, default=str))
@@ -0,0 +1,440 @@
+"""
+Versioned schema migrations for the SQLite database
+
+Each migration is applied once, inside its own transaction, and recorded in the
+schema_migrations table. init_database() runs the pending migrations at startup,
+so request handlers never issue DDL.
+
+Usage:
+    python migrations.py            # apply pending migrations
+    python migrations.py --status   # show applied/pending versions
+"""
+
+import argparse
+import os
+import sqlite3
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List, Tuple
+
+from connection_pool import get_connection
+from storage import daily_analytics_rows
+
+
+def _column_names(cursor: sqlite3.Cursor, table: str) -> List[str]:
+    cursor.execute(f"PRAGMA table_info({table})")
+    return [row[1] for row in cursor.fetchall()]
+
+
+def _add_column_if_missing(cursor: sqlite3.Cursor, table: str, column: str, definition: str) -> None:
+    if column not in _column_names(cursor, table):
+        cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
+
+# ==================== MIGRATIONS ====================
+
+def _v1_base_schema(cursor: sqlite3.Cursor) -> None:
+    """Core tables (matches the schema previously created by init_database)"""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS customers (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            email TEXT UNIQUE NOT NULL,
+            name TEXT,
+            password_salt TEXT,
+            password_hash TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            last_login TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    # Databases created before password auth existed
+    _add_column_if_missing(cursor, "customers", "password_salt", "TEXT")
+    _add_column_if_missing(cursor, "customers", "password_hash", "TEXT")
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS travel_bookings (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            customer_id INTEGER NOT NULL,
+            customer_email TEXT NOT NULL,
+            service_type TEXT NOT NULL,
+            destination TEXT,
+            departure_date DATE NOT NULL,
+            return_date DATE,
+            num_travelers INTEGER DEFAULT 1,
+            service_details TEXT,
+            special_requests TEXT,
+            total_amount REAL,
+            confirmation_number TEXT,
+            status TEXT DEFAULT 'pending',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (customer_id) REFERENCES customers(id)
+        )
+    """)
+    _add_column_if_missing(cursor, "travel_bookings", "confirmation_number", "TEXT")
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS conversations (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            customer_email TEXT NOT NULL,
+            session_id TEXT NOT NULL,
+            message_type TEXT NOT NULL,
+            message_text TEXT NOT NULL,
+            language TEXT DEFAULT 'en-US',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS livekit_sessions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            room_name TEXT UNIQUE NOT NULL,
+            session_id TEXT,
+            customer_email TEXT,
+            participant_name TEXT,
+            metadata TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            last_transcript_at TIMESTAMP
+        )
+    """)
+
+
+def _v2_password_reset_columns(cursor: sqlite3.Cursor) -> None:
+    """Reset token columns (previously added by /forgot_password on every request)"""
+    _add_column_if_missing(cursor, "customers", "reset_token", "TEXT")
+    _add_column_if_missing(cursor, "customers", "reset_token_expiry", "TIMESTAMP")
+
+
+def _v3_hot_path_indexes(cursor: sqlite3.Cursor) -> None:
+    """Indexes for transcript reads, chat history and booking listings"""
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_conversations_session_id
+        ON conversations(session_id, id)
+    """)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_conversations_customer_created
+        ON conversations(customer_email, created_at)
+    """)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_travel_bookings_customer_created
+        ON travel_bookings(customer_email, created_at)
+    """)
+
+
+def _v4_booking_status_index(cursor: sqlite3.Cursor) -> None:
+    """Index for filtered booking listings (customer + status, newest first)"""
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_travel_bookings_customer_status_created
+        ON travel_bookings(customer_email, status, created_at)
+    """)
+
+
+def _v5_conversation_search(cursor: sqlite3.Cursor) -> None:
+    """FTS5 index over conversations.message_text, kept in sync by triggers"""
+    cursor.execute("""
+        CREATE VIRTUAL TABLE IF NOT EXISTS conversations_fts USING fts5(
+            message_text,
+            content='conversations',
+            content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2'
+        )
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS conversations_fts_insert AFTER INSERT ON conversations BEGIN
+            INSERT INTO conversations_fts(rowid, message_text) VALUES (new.id, new.message_text);
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS conversations_fts_delete AFTER DELETE ON conversations BEGIN
+            INSERT INTO conversations_fts(conversations_fts, rowid, message_text)
+            VALUES ('delete', old.id, old.message_text);
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS conversations_fts_update AFTER UPDATE OF message_text ON conversations BEGIN
+            INSERT INTO conversations_fts(conversations_fts, rowid, message_text)
+            VALUES ('delete', old.id, old.message_text);
+            INSERT INTO conversations_fts(rowid, message_text) VALUES (new.id, new.message_text);
+        END
+    """)
+    # Backfill existing rows in the same transaction: an external-content index
+    # that is missing rows would be corrupted by the delete trigger.
+    cursor.execute("INSERT INTO conversations_fts(conversations_fts) VALUES ('rebuild')")
+
+
+def _v6_booking_rollups(cursor: sqlite3.Cursor) -> None:
+    """Per-customer booking rollups for the dashboard, backfilled from travel_bookings"""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS customer_booking_stats (
+            customer_email TEXT PRIMARY KEY,
+            total_bookings INTEGER NOT NULL DEFAULT 0,
+            active_bookings INTEGER NOT NULL DEFAULT 0,
+            cancelled_bookings INTEGER NOT NULL DEFAULT 0,
+            upcoming_trips INTEGER NOT NULL DEFAULT 0,
+            rescheduled_bookings INTEGER NOT NULL DEFAULT 0,
+            total_spent REAL NOT NULL DEFAULT 0,
+            last_booking_at TIMESTAMP,
+            updated_at TIMESTAMP
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS customer_booking_status (
+            customer_email TEXT NOT NULL,
+            status TEXT NOT NULL,
+            bookings INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (customer_email, status)
+        ) WITHOUT ROWID
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS customer_booking_monthly (
+            customer_email TEXT NOT NULL,
+            month TEXT NOT NULL,
+            bookings INTEGER NOT NULL DEFAULT 0,
+            total_amount REAL NOT NULL DEFAULT 0,
+            active_amount REAL NOT NULL DEFAULT 0,
+            PRIMARY KEY (customer_email, month)
+        ) WITHOUT ROWID
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS customer_booking_destinations (
+            customer_email TEXT NOT NULL,
+            destination TEXT NOT NULL,
+            bookings INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (customer_email, destination)
+        ) WITHOUT ROWID
+    """)
+
+    # Backfill from existing bookings; afterwards the booking write path keeps
+    # the rollups current inside its own transactions.
+    cursor.execute("""
+        INSERT OR REPLACE INTO customer_booking_stats
+        (customer_email, total_bookings, active_bookings, cancelled_bookings, upcoming_trips,
+         total_spent, last_booking_at, updated_at)
+        SELECT customer_email,
+               COUNT(*),
+               SUM(COALESCE(status, '') != 'cancelled'),
+               SUM(COALESCE(status, '') = 'cancelled'),
+               SUM(COALESCE(status, '') IN ('confirmed', 'pending')),
+               COALESCE(SUM(CASE WHEN COALESCE(status, '') != 'cancelled' THEN total_amount END), 0),
+               MAX(created_at),
+               CURRENT_TIMESTAMP
+        FROM travel_bookings
+        GROUP BY customer_email
+    """)
+    cursor.execute("""
+        INSERT OR REPLACE INTO customer_booking_status (customer_email, status, bookings)
+        SELECT customer_email, COALESCE(status, 'unknown'), COUNT(*)
+        FROM travel_bookings
+        GROUP BY customer_email, COALESCE(status, 'unknown')
+    """)
+    cursor.execute("""
+        INSERT OR REPLACE INTO customer_booking_monthly
+        (customer_email, month, bookings, total_amount, active_amount)
+        SELECT customer_email, substr(created_at, 1, 7), COUNT(*),
+               COALESCE(SUM(total_amount), 0),
+               COALESCE(SUM(CASE WHEN COALESCE(status, '') != 'cancelled' THEN total_amount END), 0)
+        FROM travel_bookings
+        WHERE created_at IS NOT NULL
+        GROUP BY customer_email, substr(created_at, 1, 7)
+    """)
+    cursor.execute("""
+        INSERT OR REPLACE INTO customer_booking_destinations (customer_email, destination, bookings)
+        SELECT customer_email, destination, COUNT(*)
+        FROM travel_bookings
+        WHERE destination IS NOT NULL AND destination != ''
+        GROUP BY customer_email, destination
+    """)
+
+
+def _v7_conversation_archive(cursor: sqlite3.Cursor) -> None:
+    """Cold tier for old transcripts: one compressed blob per session"""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS conversation_archive (
+            session_id TEXT PRIMARY KEY,
+            customer_email TEXT,
+            message_count INTEGER NOT NULL,
+            first_message_id INTEGER NOT NULL,
+            last_message_id INTEGER NOT NULL,
+            started_at TIMESTAMP,
+            ended_at TIMESTAMP,
+            codec TEXT NOT NULL,
+            raw_bytes INTEGER NOT NULL,
+            compressed_bytes INTEGER NOT NULL,
+            payload BLOB NOT NULL,
+            archived_at TIMESTAMP NOT NULL
+        )
+    """)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_conversation_archive_customer_ended
+        ON conversation_archive(customer_email, ended_at)
+    """)
+
+
+def _v8_retention_indexes(cursor: sqlite3.Cursor) -> None:
+    """Let the retention sweep find expired sessions and reset tokens without a scan"""
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_livekit_sessions_updated
+        ON livekit_sessions(updated_at)
+    """)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_customers_reset_token_expiry
+        ON customers(reset_token_expiry) WHERE reset_token_expiry IS NOT NULL
+    """)
+
+
+def _v9_booking_daily_analytics(cursor: sqlite3.Cursor) -> None:
+    """Daily revenue, route and class rollups for the admin analytics, backfilled from travel_bookings"""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS booking_daily_stats (
+            day TEXT PRIMARY KEY,
+            bookings INTEGER NOT NULL DEFAULT 0,
+            cancelled_bookings INTEGER NOT NULL DEFAULT 0,
+            gross_amount REAL NOT NULL DEFAULT 0,
+            revenue REAL NOT NULL DEFAULT 0
+        ) WITHOUT ROWID
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS booking_daily_routes (
+            day TEXT NOT NULL,
+            origin TEXT NOT NULL,
+            destination TEXT NOT NULL,
+            bookings INTEGER NOT NULL DEFAULT 0,
+            cancelled_bookings INTEGER NOT NULL DEFAULT 0,
+            revenue REAL NOT NULL DEFAULT 0,
+            PRIMARY KEY (day, origin, destination)
+        ) WITHOUT ROWID
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS booking_daily_classes (
+            day TEXT NOT NULL,
+            travel_class TEXT NOT NULL,
+            bookings INTEGER NOT NULL DEFAULT 0,
+            revenue REAL NOT NULL DEFAULT 0,
+            PRIMARY KEY (day, travel_class)
+        ) WITHOUT ROWID
+    """)
+
+    # Route and class are parsed in Python (storage.py), so the backfill streams
+    # the bookings through the same delta function the write path uses
+    daily, routes, classes = daily_analytics_rows(cursor.connection.execute("""
+        SELECT customer_email, status, total_amount, created_at, destination, service_details
+        FROM travel_bookings WHERE created_at IS NOT NULL
+    """))
+    cursor.executemany("""
+        INSERT OR REPLACE INTO booking_daily_stats (day, bookings, cancelled_bookings, gross_amount, revenue)
+        VALUES (?, ?, ?, ?, ?)
+    """, daily)
+    cursor.executemany("""
+        INSERT OR REPLACE INTO booking_daily_routes (day, origin, destination, bookings, cancelled_bookings, revenue)
+        VALUES (?, ?, ?, ?, ?, ?)
+    """, routes)
+    cursor.executemany("""
+        INSERT OR REPLACE INTO booking_daily_classes (day, travel_class, bookings, revenue)
+        VALUES (?, ?, ?, ?)
+    """, classes)
+
+
+def _v10_booking_confirmation_index(cursor: sqlite3.Cursor) -> None:
+    """Look bookings up by confirmation number, so replayed agent bookings are stored once"""
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_travel_bookings_confirmation
+        ON travel_bookings(confirmation_number) WHERE confirmation_number IS NOT NULL
+    """)
+
+
+# (version, description, apply function) - append new migrations, never edit old ones
+MIGRATIONS: List[Tuple[int, str, Callable[[sqlite3.Cursor], None]]] = [
+    (1, "base schema", _v1_base_schema),
+    (2, "password reset token columns", _v2_password_reset_columns),
+    (3, "hot-path indexes for conversations and bookings", _v3_hot_path_indexes),
+    (4, "booking status listing index", _v4_booking_status_index),
+    (5, "full-text search over conversation transcripts", _v5_conversation_search),
+    (6, "per-customer booking rollups for the dashboard", _v6_booking_rollups),
+    (7, "compressed archive table for old transcripts", _v7_conversation_archive),
+    (8, "indexes for the retention sweep", _v8_retention_indexes),
+    (9, "daily booking rollups for the admin analytics", _v9_booking_daily_analytics),
+    (10, "confirmation number lookup for idempotent booking creation", _v10_booking_confirmation_index),
+]
+
+
+# ==================== RUNNER ====================
+
+def _ensure_version_table(conn: sqlite3.Connection) -> None:
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INTEGER PRIMARY KEY,
+            description TEXT NOT NULL,
+            applied_at TIMESTAMP NOT NULL
+        )
+    """)
+
+
+def _applied_versions(conn: sqlite3.Connection) -> List[int]:
+    rows = conn.execute("SELECT version FROM schema_migrations ORDER BY version").fetchall()
+    return [row[0] for row in rows]
+
+
+def current_version(db_path: str) -> int:
+    """Return the highest applied schema version (0 for an empty database)"""
+    conn = get_connection(db_path)
+    _ensure_version_table(conn)
+    applied = _applied_versions(conn)
+    return applied[-1] if applied else 0
+
+
+def migrate(db_path: str) -> List[int]:
+    """Apply all pending migrations, returning the versions that were applied"""
+    conn = get_connection(db_path)
+    _ensure_version_table(conn)
+
+    applied_now = []
+    for version, description, apply in MIGRATIONS:
+        if version in _applied_versions(conn):
+            continue
+
+        # BEGIN IMMEDIATE takes the write lock, so concurrent workers starting up
+        # at the same time serialize here; re-check once the lock is held.
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if version in _applied_versions(conn):
+                conn.rollback()
+                continue
+            apply(conn.cursor())
+            conn.execute(
+                "INSERT INTO schema_migrations (version, description, applied_at) VALUES (?, ?, ?)",
+                (version, description, datetime.now())
+            )
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        applied_now.append(version)
+
+    return applied_now
+
+
+def migration_status(db_path: str) -> Dict:
+    """Return applied and pending migration versions"""
+    conn = get_connection(db_path)
+    _ensure_version_table(conn)
+    applied = _applied_versions(conn)
+    return {
+        'current_version': applied[-1] if applied else 0,
+        'applied': applied,
+        'pending': [version for version, _, _ in MIGRATIONS if version not in applied],
+    }
+
+
+if __name__ == "__main__":
+    # Same location as database.DB_PATH, resolved without importing database
+    # (which would run the migrations as a side effect)
+    db_path = os.getenv("CUSTOMERS_DB_PATH", str(Path(__file__).parent / "customers.db"))
+
+    parser = argparse.ArgumentParser(description="Apply database schema migrations")
+    parser.add_argument("--status", action="store_true", help="show migration status and exit")
+    args = parser.parse_args()
+
+    if args.status:
+        print(migration_status(db_path))
+    else:
+        applied = migrate(db_path)
+        print(f"Applied migrations: {applied or 'none'} - schema at version {current_version(db_path)} ({db_path})")
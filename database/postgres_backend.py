@@ -0,0 +1,1089 @@
+"""
+PostgreSQL storage backend (asyncpg connection pool)
+
+Selected when DATABASE_URL is a postgresql:// URL. The DAO functions in
+database.py are synchronous and are called from request threads, the DB
+executor and the agent, so the backend runs its own event loop on a background
+thread and owns an asyncpg pool there. Synchronous calls submit a coroutine to
+that loop and wait; async callers (async_db.adb) await the same coroutine
+without tying up a DB executor thread.
+
+Results use the same shapes as the SQLite implementation: timestamps are
+returned as strings and travel dates are stored as text, exactly as given.
+"""
+
+import asyncio
+import concurrent.futures
+import json
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+try:
+    import asyncpg
+except ImportError:  # pragma: no cover - only needed when PostgreSQL is configured
+    asyncpg = None
+
+from storage import (
+    BOOKING_EXPORT_FIELDS,
+    BOOKING_ROLLUP_COLUMNS,
+    BOOKING_FIELDS,
+    CONVERSATION_EXPORT_FIELDS,
+    DEFAULT_BOOKING_FIELDS,
+    MAX_BULK_BOOKING_OPERATIONS,
+    StorageBackend,
+    analytics_range,
+    booking_analytics_report,
+    booking_rollup_delta,
+    bulk_booking_ids,
+    bulk_booking_summary,
+    daily_analytics_rows,
+    decode_cursor,
+    encode_cursor,
+    plan_bulk_booking_operations,
+    validate_date_range,
+)
+
+POOL_MIN_SIZE = 2
+POOL_MAX_SIZE = 20
+CALL_TIMEOUT_SECONDS = 30.0
+_SCHEMA_LOCK_ID = 7215090431  # pg_advisory_xact_lock key serializing init_schema()
+
+SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS customers (
+        id BIGSERIAL PRIMARY KEY,
+        email TEXT UNIQUE NOT NULL,
+        name TEXT,
+        password_salt TEXT,
+        password_hash TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        last_login TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        reset_token TEXT,
+        reset_token_expiry TIMESTAMP
+    )
+    """,
+    # departure/return dates stay TEXT: callers pass free-form date strings
+    """
+    CREATE TABLE IF NOT EXISTS travel_bookings (
+        id BIGSERIAL PRIMARY KEY,
+        customer_id BIGINT NOT NULL REFERENCES customers(id),
+        customer_email TEXT NOT NULL,
+        service_type TEXT NOT NULL,
+        destination TEXT,
+        departure_date TEXT NOT NULL,
+        return_date TEXT,
+        num_travelers INTEGER DEFAULT 1,
+        service_details TEXT,
+        special_requests TEXT,
+        total_amount DOUBLE PRECISION,
+        confirmation_number TEXT,
+        status TEXT DEFAULT 'pending',
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS conversations (
+        id BIGSERIAL PRIMARY KEY,
+        customer_email TEXT NOT NULL,
+        session_id TEXT NOT NULL,
+        message_type TEXT NOT NULL,
+        message_text TEXT NOT NULL,
+        language TEXT DEFAULT 'en-US',
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS livekit_sessions (
+        id BIGSERIAL PRIMARY KEY,
+        room_name TEXT UNIQUE NOT NULL,
+        session_id TEXT,
+        customer_email TEXT,
+        participant_name TEXT,
+        metadata TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        last_transcript_at TIMESTAMP
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_conversations_session_id ON conversations(session_id, id)",
+    "CREATE INDEX IF NOT EXISTS idx_conversations_customer_created ON conversations(customer_email, created_at)",
+    "CREATE INDEX IF NOT EXISTS idx_travel_bookings_customer_created ON travel_bookings(customer_email, created_at)",
+    """
+    CREATE INDEX IF NOT EXISTS idx_travel_bookings_customer_status_created
+    ON travel_bookings(customer_email, status, created_at)
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS idx_travel_bookings_confirmation
+    ON travel_bookings(confirmation_number) WHERE confirmation_number IS NOT NULL
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS idx_conversations_fts
+    ON conversations USING GIN (to_tsvector('simple', message_text))
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS customer_booking_stats (
+        customer_email TEXT PRIMARY KEY,
+        total_bookings INTEGER NOT NULL DEFAULT 0,
+        active_bookings INTEGER NOT NULL DEFAULT 0,
+        cancelled_bookings INTEGER NOT NULL DEFAULT 0,
+        upcoming_trips INTEGER NOT NULL DEFAULT 0,
+        rescheduled_bookings INTEGER NOT NULL DEFAULT 0,
+        total_spent DOUBLE PRECISION NOT NULL DEFAULT 0,
+        last_booking_at TIMESTAMP,
+        updated_at TIMESTAMP
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS customer_booking_status (
+        customer_email TEXT NOT NULL,
+        status TEXT NOT NULL,
+        bookings INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (customer_email, status)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS customer_booking_monthly (
+        customer_email TEXT NOT NULL,
+        month TEXT NOT NULL,
+        bookings INTEGER NOT NULL DEFAULT 0,
+        total_amount DOUBLE PRECISION NOT NULL DEFAULT 0,
+        active_amount DOUBLE PRECISION NOT NULL DEFAULT 0,
+        PRIMARY KEY (customer_email, month)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS customer_booking_destinations (
+        customer_email TEXT NOT NULL,
+        destination TEXT NOT NULL,
+        bookings INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (customer_email, destination)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS booking_daily_stats (
+        day TEXT PRIMARY KEY,
+        bookings INTEGER NOT NULL DEFAULT 0,
+        cancelled_bookings INTEGER NOT NULL DEFAULT 0,
+        gross_amount DOUBLE PRECISION NOT NULL DEFAULT 0,
+        revenue DOUBLE PRECISION NOT NULL DEFAULT 0
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS booking_daily_routes (
+        day TEXT NOT NULL,
+        origin TEXT NOT NULL,
+        destination TEXT NOT NULL,
+        bookings INTEGER NOT NULL DEFAULT 0,
+        cancelled_bookings INTEGER NOT NULL DEFAULT 0,
+        revenue DOUBLE PRECISION NOT NULL DEFAULT 0,
+        PRIMARY KEY (day, origin, destination)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS booking_daily_classes (
+        day TEXT NOT NULL,
+        travel_class TEXT NOT NULL,
+        bookings INTEGER NOT NULL DEFAULT 0,
+        revenue DOUBLE PRECISION NOT NULL DEFAULT 0,
+        PRIMARY KEY (day, travel_class)
+    )
+    """,
+]
+
+_ROLLUP_COLUMNS = BOOKING_ROLLUP_COLUMNS
+_SESSION_COLUMNS = """
+    room_name, session_id, customer_email, participant_name, metadata,
+    created_at, updated_at, last_transcript_at
+"""
+
+
+def _text(value):
+    """Timestamps come back as strings, like the SQLite implementation returns them."""
+    return str(value) if isinstance(value, datetime) else value
+
+
+def _parse_timestamp(value: str, end_of_day: bool = False) -> datetime:
+    parsed = datetime.fromisoformat(value)
+    return parsed + timedelta(days=1) if end_of_day else parsed
+
+
+class _Params:
+    """Collects positional query parameters and hands out $n placeholders."""
+
+    def __init__(self, *values):
+        self.values = list(values)
+
+    def add(self, value) -> str:
+        self.values.append(value)
+        return f"${len(self.values)}"
+
+
+class PostgresBackend(StorageBackend):
+    """STORAGE_API implemented on PostgreSQL through an asyncpg pool."""
+
+    name = "postgresql"
+
+    def __init__(self, url: str, min_size: int = POOL_MIN_SIZE, max_size: int = POOL_MAX_SIZE,
+                 timeout: float = CALL_TIMEOUT_SECONDS):
+        if asyncpg is None:
+            raise RuntimeError("asyncpg is required for a postgresql:// DATABASE_URL (pip install asyncpg)")
+        super().__init__(url)
+        self.timeout = timeout
+        self._calls = 0
+
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="db-postgres", daemon=True)
+        self._thread.start()
+
+        # asyncpg only understands the plain postgresql:// scheme
+        dsn = "postgresql://" + url.split("://", 1)[1]
+        try:
+            self._pool = self._wait(asyncpg.create_pool(dsn, min_size=min_size, max_size=max_size))
+        except Exception:
+            self._stop_loop()
+            raise
+
+    # ---------- loop bridge ----------
+
+    def _wait(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result(self.timeout)
+
+    def submit(self, name: str, *args, **kwargs) -> concurrent.futures.Future:
+        """Start a STORAGE_API call on the backend loop and return its future."""
+        self._calls += 1
+        return asyncio.run_coroutine_threadsafe(getattr(self, f"_{name}")(*args, **kwargs), self._loop)
+
+    def _call(name: str):
+        def method(self, *args, **kwargs):
+            return self.submit(name, *args, **kwargs).result(self.timeout)
+        method.__name__ = name
+        return method
+
+    def _stop_loop(self) -> None:
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(5)
+        self._loop.close()
+
+    def close(self) -> None:
+        if self._loop.is_closed():
+            return
+        try:
+            self._wait(self._pool.close())
+        finally:
+            self._stop_loop()
+
+    def stats(self) -> Dict:
+        return {
+            'backend': self.name,
+            'pool_size': self._pool.get_size(),
+            'pool_idle': self._pool.get_idle_size(),
+            'pool_max_size': self._pool.get_max_size(),
+            'calls': self._calls,
+        }
+
+    def init_schema(self) -> List[str]:
+        return self._wait(self._init_schema())
+
+    async def _init_schema(self) -> List[str]:
+        async with self._pool.acquire() as conn:
+            async with conn.transaction():
+                # Workers starting together would race on CREATE ... IF NOT EXISTS
+                await conn.execute("SELECT pg_advisory_xact_lock($1)", _SCHEMA_LOCK_ID)
+                for statement in SCHEMA:
+                    await conn.execute(statement)
+                await self._backfill_daily_analytics(conn)
+        return []
+
+    @staticmethod
+    async def _backfill_daily_analytics(conn) -> None:
+        """Fill the daily analytics tables once for bookings made before they existed."""
+        if await conn.fetchval("SELECT EXISTS (SELECT 1 FROM booking_daily_stats)"):
+            return
+        daily, routes, classes = daily_analytics_rows([
+            tuple(row) async for row in conn.cursor(
+                f"SELECT {_ROLLUP_COLUMNS} FROM travel_bookings WHERE created_at IS NOT NULL")
+        ])
+        await conn.executemany("""
+            INSERT INTO booking_daily_stats (day, bookings, cancelled_bookings, gross_amount, revenue)
+            VALUES ($1, $2, $3, $4, $5)
+        """, [(day, n, c, float(g), float(r)) for day, n, c, g, r in daily])
+        await conn.executemany("""
+            INSERT INTO booking_daily_routes (day, origin, destination, bookings, cancelled_bookings, revenue)
+            VALUES ($1, $2, $3, $4, $5, $6)
+        """, [(*key, n, c, float(r)) for *key, n, c, r in routes])
+        await conn.executemany("""
+            INSERT INTO booking_daily_classes (day, travel_class, bookings, revenue)
+            VALUES ($1, $2, $3, $4)
+        """, [(day, cabin, n, float(r)) for day, cabin, n, r in classes])
+
+    # ---------- customers ----------
+
+    get_or_create_customer = _call("get_or_create_customer")
+    get_customer_credentials = _call("get_customer_credentials")
+    create_customer = _call("create_customer")
+    set_password_reset_token = _call("set_password_reset_token")
+    update_customer_password = _call("update_customer_password")
+
+    async def _get_or_create_customer(self, email: str, name: str = None) -> Dict:
+        now = datetime.now()
+        row = await self._pool.fetchrow("""
+            INSERT INTO customers (email, name, created_at, last_login)
+            VALUES ($1, $2, $3, $3)
+            ON CONFLICT (email) DO UPDATE SET last_login = EXCLUDED.last_login
+            RETURNING id, email, name, created_at, last_login
+        """, email, name, now)
+        return {
+            'id': row['id'],
+            'email': row['email'],
+            'name': row['name'],
+            'created_at': _text(row['created_at']),
+            'last_login': _text(row['last_login'])
+        }
+
+    async def _get_customer_credentials(self, email: str) -> Optional[Dict]:
+        row = await self._pool.fetchrow("""
+            SELECT id, email, name, password_salt, password_hash, created_at,
+                   reset_token, reset_token_expiry
+            FROM customers WHERE email = $1
+        """, email)
+        if not row:
+            return None
+        customer = {key: _text(value) for key, value in row.items()}
+        if row['reset_token_expiry'] is not None:
+            customer['reset_token_expiry'] = row['reset_token_expiry'].isoformat()
+        return customer
+
+    async def _create_customer(self, email: str, name: str, password_salt: str,
+                               password_hash: str) -> Optional[Dict]:
+        created_at = datetime.now()
+        customer_id = await self._pool.fetchval("""
+            INSERT INTO customers (email, name, password_salt, password_hash, created_at)
+            VALUES ($1, $2, $3, $4, $5)
+            ON CONFLICT (email) DO NOTHING
+            RETURNING id
+        """, email, name, password_salt, password_hash, created_at)
+        if customer_id is None:
+            return None
+        return {'id': customer_id, 'email': email, 'name': name, 'created_at': created_at.isoformat()}
+
+    async def _set_password_reset_token(self, email: str, token: str, expiry: datetime) -> bool:
+        status = await self._pool.execute("""
+            UPDATE customers SET reset_token = $1, reset_token_expiry = $2 WHERE email = $3
+        """, token, expiry, email)
+        return status != "UPDATE 0"
+
+    async def _update_customer_password(self, email: str, password_salt: str,
+                                        password_hash: str) -> bool:
+        status = await self._pool.execute("""
+            UPDATE customers
+            SET password_salt = $1, password_hash = $2, reset_token = NULL, reset_token_expiry = NULL
+            WHERE email = $3
+        """, password_salt, password_hash, email)
+        return status != "UPDATE 0"
+
+    # ---------- bookings ----------
+
+    create_travel_booking = _call("create_travel_booking")
+    get_customer_bookings = _call("get_customer_bookings")
+    list_customer_bookings = _call("list_customer_bookings")
+    get_customer_dashboard = _call("get_customer_dashboard")
+    cancel_booking = _call("cancel_booking")
+    reschedule_booking = _call("reschedule_booking")
+    bulk_update_bookings = _call("bulk_update_bookings")
+    get_booking_analytics = _call("get_booking_analytics")
+
+    @staticmethod
+    async def _apply_booking_rollup(conn, booking, sign: int) -> None:
+        """Same rollup maintenance as database._apply_booking_rollup, on PostgreSQL."""
+        d = booking_rollup_delta(booking, sign)
+
+        await conn.execute("""
+            INSERT INTO customer_booking_stats AS s
+            (customer_email, total_bookings, active_bookings, cancelled_bookings, upcoming_trips,
+             total_spent, last_booking_at, updated_at)
+            VALUES ($1, $2, $3, $4, $5, $6, $7, $8)
+            ON CONFLICT (customer_email) DO UPDATE SET
+                total_bookings = s.total_bookings + EXCLUDED.total_bookings,
+                active_bookings = s.active_bookings + EXCLUDED.active_bookings,
+                cancelled_bookings = s.cancelled_bookings + EXCLUDED.cancelled_bookings,
+                upcoming_trips = s.upcoming_trips + EXCLUDED.upcoming_trips,
+                total_spent = s.total_spent + EXCLUDED.total_spent,
+                last_booking_at = GREATEST(s.last_booking_at, EXCLUDED.last_booking_at),
+                updated_at = EXCLUDED.updated_at
+        """, d['customer_email'], d['bookings'], d['active'], d['cancelled'], d['upcoming'],
+            float(d['active_amount']), d['last_booking_at'], datetime.now())
+
+        await conn.execute("""
+            INSERT INTO customer_booking_status AS s (customer_email, status, bookings)
+            VALUES ($1, $2, $3)
+            ON CONFLICT (customer_email, status) DO UPDATE SET bookings = s.bookings + EXCLUDED.bookings
+        """, d['customer_email'], d['status'], d['bookings'])
+
+        if d['month']:
+            await conn.execute("""
+                INSERT INTO customer_booking_monthly AS m
+                (customer_email, month, bookings, total_amount, active_amount)
+                VALUES ($1, $2, $3, $4, $5)
+                ON CONFLICT (customer_email, month) DO UPDATE SET
+                    bookings = m.bookings + EXCLUDED.bookings,
+                    total_amount = m.total_amount + EXCLUDED.total_amount,
+                    active_amount = m.active_amount + EXCLUDED.active_amount
+            """, d['customer_email'], d['month'], d['bookings'],
+                float(d['amount']), float(d['active_amount']))
+
+        if d['destination']:
+            await conn.execute("""
+                INSERT INTO customer_booking_destinations AS t (customer_email, destination, bookings)
+                VALUES ($1, $2, $3)
+                ON CONFLICT (customer_email, destination) DO UPDATE SET bookings = t.bookings + EXCLUDED.bookings
+            """, d['customer_email'], d['destination'], d['bookings'])
+
+        if d['day']:
+            await conn.execute("""
+                INSERT INTO booking_daily_stats AS s (day, bookings, cancelled_bookings, gross_amount, revenue)
+                VALUES ($1, $2, $3, $4, $5)
+                ON CONFLICT (day) DO UPDATE SET
+                    bookings = s.bookings + EXCLUDED.bookings,
+                    cancelled_bookings = s.cancelled_bookings + EXCLUDED.cancelled_bookings,
+                    gross_amount = s.gross_amount + EXCLUDED.gross_amount,
+                    revenue = s.revenue + EXCLUDED.revenue
+            """, d['day'], d['bookings'], d['cancelled'], float(d['amount']), float(d['active_amount']))
+            await conn.execute("""
+                INSERT INTO booking_daily_routes AS r
+                (day, origin, destination, bookings, cancelled_bookings, revenue)
+                VALUES ($1, $2, $3, $4, $5, $6)
+                ON CONFLICT (day, origin, destination) DO UPDATE SET
+                    bookings = r.bookings + EXCLUDED.bookings,
+                    cancelled_bookings = r.cancelled_bookings + EXCLUDED.cancelled_bookings,
+                    revenue = r.revenue + EXCLUDED.revenue
+            """, d['day'], *d['route'], d['bookings'], d['cancelled'], float(d['active_amount']))
+            await conn.execute("""
+                INSERT INTO booking_daily_classes AS c (day, travel_class, bookings, revenue)
+                VALUES ($1, $2, $3, $4)
+                ON CONFLICT (day, travel_class) DO UPDATE SET
+                    bookings = c.bookings + EXCLUDED.bookings,
+                    revenue = c.revenue + EXCLUDED.revenue
+            """, d['day'], d['travel_class'], d['bookings'], float(d['active_amount']))
+
+    async def _create_travel_booking(self, customer_email: str, service_type: str, destination: str,
+                                     departure_date: str, return_date: str = None, num_travelers: int = 1,
+                                     service_details: str = None, special_requests: str = None,
+                                     total_amount: float = 0, confirmation_number: str = None) -> Dict:
+        async with self._pool.acquire() as conn:
+            async with conn.transaction():
+                if confirmation_number:
+                    # Serialise concurrent replays of the same confirmation number
+                    await conn.execute("SELECT pg_advisory_xact_lock(hashtext($1))", confirmation_number)
+                row = await conn.fetchrow(f"""
+                    INSERT INTO travel_bookings
+                    (customer_id, customer_email, service_type, destination, departure_date, return_date,
+                     num_travelers, service_details, special_requests, total_amount, confirmation_number,
+                     status, created_at)
+                    SELECT id, $1, $2, $3, $4, $5, $6, $7, $8, $9, $10, 'confirmed', $11
+                    FROM customers
+                    WHERE email = $1
+                      AND (COALESCE($10::text, '') = '' OR NOT EXISTS (
+                          SELECT 1 FROM travel_bookings
+                          WHERE confirmation_number = $10 AND customer_email = $1))
+                    RETURNING id, {_ROLLUP_COLUMNS}
+                """, customer_email, service_type, destination, departure_date, return_date,
+                    num_travelers, service_details, special_requests,
+                    float(total_amount) if total_amount is not None else None,
+                    confirmation_number, datetime.now())
+                if row:
+                    await self._apply_booking_rollup(conn, tuple(row)[1:], 1)
+
+        if not row:
+            existing = await self._pool.fetchrow("""
+                SELECT id, service_type, destination, departure_date, return_date, num_travelers,
+                       total_amount, status
+                FROM travel_bookings
+                WHERE confirmation_number = $1 AND customer_email = $2
+            """, confirmation_number, customer_email) if confirmation_number else None
+            if not existing:
+                return {"error": "Customer not found"}
+            return {
+                'booking_id': existing['id'],
+                'confirmation_number': confirmation_number,
+                'customer_email': customer_email,
+                'service_type': existing['service_type'],
+                'destination': existing['destination'],
+                'departure_date': _text(existing['departure_date']),
+                'return_date': _text(existing['return_date']),
+                'num_travelers': existing['num_travelers'],
+                'total_amount': existing['total_amount'],
+                'status': existing['status'],
+                'duplicate': True
+            }
+
+        return {
+            'booking_id': row['id'],
+            'confirmation_number': confirmation_number,
+            'customer_email': customer_email,
+            'service_type': service_type,
+            'destination': destination,
+            'departure_date': departure_date,
+            'return_date': return_date,
+            'num_travelers': num_travelers,
+            'total_amount': total_amount,
+            'status': 'confirmed'
+        }
+
+    async def _get_customer_bookings(self, email: str) -> List[Dict]:
+        rows = await self._pool.fetch(f"""
+            SELECT {', '.join(BOOKING_FIELDS[name] for name in DEFAULT_BOOKING_FIELDS)}
+            FROM travel_bookings
+            WHERE customer_email = $1
+            ORDER BY created_at DESC
+        """, email)
+        return [
+            {name: _text(value) for name, value in zip(DEFAULT_BOOKING_FIELDS, row)}
+            for row in rows
+        ]
+
+    async def _list_customer_bookings(self, email: str, status: Optional[str] = None,
+                                      service_type: Optional[str] = None,
+                                      departure_from: Optional[str] = None,
+                                      departure_to: Optional[str] = None,
+                                      limit: int = 20, cursor: Optional[str] = None,
+                                      fields: Optional[List[str]] = None) -> Dict:
+        fields = fields or DEFAULT_BOOKING_FIELDS
+        unknown = [name for name in fields if name not in BOOKING_FIELDS]
+        if unknown:
+            raise ValueError(f"Unknown booking fields: {', '.join(unknown)}")
+
+        params = _Params(email)
+        filters = ["customer_email = $1"]
+        if status:
+            filters.append(f"status = {params.add(status)}")
+        if service_type:
+            filters.append(f"service_type = {params.add(service_type)}")
+        if departure_from:
+            filters.append(f"departure_date >= {params.add(departure_from)}")
+        if departure_to:
+            filters.append(f"departure_date <= {params.add(departure_to)}")
+        if cursor:
+            created_at, row_id = decode_cursor(cursor)
+            try:
+                created_at = _parse_timestamp(created_at)
+            except ValueError as e:
+                raise ValueError("Invalid cursor") from e
+            filters.append(f"(created_at, id) < ({params.add(created_at)}, {params.add(row_id)})")
+
+        columns = ["id", "created_at"] + [BOOKING_FIELDS[name] for name in fields]
+        rows = await self._pool.fetch(f"""
+            SELECT {', '.join(columns)}
+            FROM travel_bookings
+            WHERE {' AND '.join(filters)}
+            ORDER BY created_at DESC, id DESC
+            LIMIT {params.add(limit + 1)}
+        """, *params.values)
+
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        return {
+            'bookings': [{name: _text(value) for name, value in zip(fields, tuple(row)[2:])} for row in rows],
+            'next_cursor': encode_cursor(rows[-1][1], rows[-1][0]) if has_more else None
+        }
+
+    async def _get_customer_dashboard(self, email: str, top_destinations: int = 5,
+                                      recent_bookings: int = 3) -> Dict:
+        async with self._pool.acquire() as conn:
+            row = await conn.fetchrow("""
+                SELECT total_bookings, active_bookings, cancelled_bookings, upcoming_trips,
+                       rescheduled_bookings, total_spent, last_booking_at, updated_at
+                FROM customer_booking_stats
+                WHERE customer_email = $1
+            """, email)
+            status_rows = await conn.fetch("""
+                SELECT status, bookings FROM customer_booking_status
+                WHERE customer_email = $1 AND bookings > 0
+            """, email)
+            monthly_rows = await conn.fetch("""
+                SELECT month, bookings, total_amount, active_amount FROM customer_booking_monthly
+                WHERE customer_email = $1 AND bookings > 0
+                ORDER BY month
+            """, email)
+            destination_rows = await conn.fetch("""
+                SELECT destination, bookings FROM customer_booking_destinations
+                WHERE customer_email = $1 AND bookings > 0
+                ORDER BY bookings DESC, destination
+                LIMIT $2
+            """, email, top_destinations)
+
+        recent = await self._list_customer_bookings(
+            email, limit=recent_bookings,
+            fields=['booking_id', 'service_type', 'destination', 'departure_date', 'status', 'total_amount']
+        )
+
+        return {
+            'customer_email': email,
+            'stats': {
+                'total_bookings': row['active_bookings'] if row else 0,
+                'all_bookings': row['total_bookings'] if row else 0,
+                'cancelled_bookings': row['cancelled_bookings'] if row else 0,
+                'upcoming_trips': row['upcoming_trips'] if row else 0,
+                'rescheduled_bookings': row['rescheduled_bookings'] if row else 0,
+                'total_spent': row['total_spent'] if row else 0,
+                'last_booking_at': _text(row['last_booking_at']) if row else None,
+                'updated_at': _text(row['updated_at']) if row else None,
+            },
+            'status_distribution': {r['status']: r['bookings'] for r in status_rows},
+            'monthly_spending': [
+                {'month': r['month'], 'bookings': r['bookings'], 'amount': r['total_amount'],
+                 'active_amount': r['active_amount']}
+                for r in monthly_rows
+            ],
+            'top_destinations': [{'destination': r['destination'], 'count': r['bookings']}
+                                 for r in destination_rows],
+            'recent_bookings': recent['bookings'],
+        }
+
+    async def _get_booking_analytics(self, date_from: Optional[str] = None, date_to: Optional[str] = None,
+                                     top_routes: int = 10) -> Dict:
+        date_from, date_to = analytics_range(date_from, date_to)
+        async with self._pool.acquire() as conn:
+            daily = await conn.fetch("""
+                SELECT day, bookings, cancelled_bookings, gross_amount, revenue
+                FROM booking_daily_stats WHERE day BETWEEN $1 AND $2 ORDER BY day
+            """, date_from, date_to)
+            routes = await conn.fetch("""
+                SELECT origin, destination, SUM(bookings) AS total, SUM(cancelled_bookings), SUM(revenue)
+                FROM booking_daily_routes WHERE day BETWEEN $1 AND $2
+                GROUP BY origin, destination
+                ORDER BY total DESC, origin, destination
+                LIMIT $3
+            """, date_from, date_to, top_routes)
+            classes = await conn.fetch("""
+                SELECT travel_class, SUM(bookings) AS total, SUM(revenue)
+                FROM booking_daily_classes WHERE day BETWEEN $1 AND $2
+                GROUP BY travel_class
+                ORDER BY total DESC, travel_class
+            """, date_from, date_to)
+        return booking_analytics_report(date_from, date_to,
+                                        [tuple(r) for r in daily], [tuple(r) for r in routes],
+                                        [tuple(r) for r in classes])
+
+    async def _cancel_booking(self, booking_id: int, customer_email: str) -> Dict:
+        try:
+            async with self._pool.acquire() as conn:
+                async with conn.transaction():
+                    # Row lock: a concurrent cancel waits here and then sees 'cancelled'
+                    booking = await conn.fetchrow(f"""
+                        SELECT {_ROLLUP_COLUMNS}
+                        FROM travel_bookings tb
+                        WHERE tb.id = $1
+                          AND tb.customer_id = (SELECT id FROM customers WHERE email = $2)
+                        FOR UPDATE
+                    """, booking_id, customer_email)
+
+                    if not booking:
+                        return {'success': False, 'message': 'Booking not found or access denied'}
+                    if booking['status'] == 'cancelled':
+                        return {'success': False, 'message': 'Booking is already cancelled'}
+
+                    updated = await conn.fetchrow(f"""
+                        UPDATE travel_bookings SET status = 'cancelled' WHERE id = $1
+                        RETURNING {_ROLLUP_COLUMNS}
+                    """, booking_id)
+                    await self._apply_booking_rollup(conn, tuple(booking), -1)
+                    await self._apply_booking_rollup(conn, tuple(updated), 1)
+                    await conn.execute("""
+                        DELETE FROM customer_booking_status WHERE customer_email = $1 AND bookings <= 0
+                    """, booking['customer_email'])
+
+            return {
+                'success': True,
+                'message': 'Booking cancelled successfully',
+                'booking_id': booking_id
+            }
+        except Exception as e:
+            return {'success': False, 'message': str(e)}
+
+    async def _reschedule_booking(self, booking_id: int, customer_email: str,
+                                  new_departure_date: str = None, new_return_date: str = None) -> Dict:
+        try:
+            async with self._pool.acquire() as conn:
+                async with conn.transaction():
+                    booking = await conn.fetchrow("""
+                        SELECT tb.customer_email, tb.status
+                        FROM travel_bookings tb
+                        WHERE tb.id = $1
+                          AND tb.customer_id = (SELECT id FROM customers WHERE email = $2)
+                        FOR UPDATE
+                    """, booking_id, customer_email)
+
+                    if not booking:
+                        return {'success': False, 'message': 'Booking not found or access denied'}
+                    if booking['status'] == 'cancelled':
+                        return {'success': False, 'message': 'Cannot reschedule a cancelled booking'}
+
+                    params = _Params()
+                    updates = []
+                    if new_departure_date:
+                        updates.append(f"departure_date = {params.add(new_departure_date)}")
+                    if new_return_date:
+                        updates.append(f"return_date = {params.add(new_return_date)}")
+                    if not updates:
+                        return {'success': False, 'message': 'No new dates provided'}
+
+                    await conn.execute(
+                        f"UPDATE travel_bookings SET {', '.join(updates)} WHERE id = {params.add(booking_id)}",
+                        *params.values
+                    )
+                    await conn.execute("""
+                        UPDATE customer_booking_stats
+                        SET rescheduled_bookings = rescheduled_bookings + 1, updated_at = $1
+                        WHERE customer_email = $2
+                    """, datetime.now(), booking['customer_email'])
+
+            return {
+                'success': True,
+                'message': 'Booking rescheduled successfully',
+                'booking_id': booking_id,
+                'new_departure_date': new_departure_date,
+                'new_return_date': new_return_date
+            }
+        except Exception as e:
+            return {'success': False, 'message': str(e)}
+
+    async def _bulk_update_bookings(self, customer_email: str, operations: List[Dict]) -> Dict:
+        if not operations:
+            return {'success': False, 'message': 'No operations provided'}
+        if len(operations) > MAX_BULK_BOOKING_OPERATIONS:
+            return {'success': False, 'message': f'At most {MAX_BULK_BOOKING_OPERATIONS} operations per request'}
+
+        try:
+            async with self._pool.acquire() as conn:
+                async with conn.transaction():
+                    # Row locks on every referenced booking until commit
+                    owned = {row['id']: tuple(row)[1:] for row in await conn.fetch(f"""
+                        SELECT id, {_ROLLUP_COLUMNS}
+                        FROM travel_bookings
+                        WHERE id = ANY($1::bigint[])
+                          AND customer_id = (SELECT id FROM customers WHERE email = $2)
+                        ORDER BY id
+                        FOR UPDATE
+                    """, bulk_booking_ids(operations), customer_email)}
+
+                    results, cancels, reschedules = plan_bulk_booking_operations(
+                        operations, {booking_id: row[1] for booking_id, row in owned.items()})
+
+                    if cancels:
+                        for row in await conn.fetch(f"""
+                            UPDATE travel_bookings SET status = 'cancelled'
+                            WHERE id = ANY($1::bigint[])
+                            RETURNING id, {_ROLLUP_COLUMNS}
+                        """, cancels):
+                            await self._apply_booking_rollup(conn, owned[row['id']], -1)
+                            await self._apply_booking_rollup(conn, tuple(row)[1:], 1)
+                        await conn.execute("""
+                            DELETE FROM customer_booking_status WHERE customer_email = ANY($1::text[]) AND bookings <= 0
+                        """, list({owned[booking_id][0] for booking_id in cancels}))
+
+                    if reschedules:
+                        await conn.executemany("""
+                            UPDATE travel_bookings
+                            SET departure_date = COALESCE($1, departure_date),
+                                return_date = COALESCE($2, return_date)
+                            WHERE id = $3
+                        """, reschedules)
+                        counts = {}
+                        for _, _, booking_id in reschedules:
+                            email = owned[booking_id][0]
+                            counts[email] = counts.get(email, 0) + 1
+                        await conn.executemany("""
+                            UPDATE customer_booking_stats
+                            SET rescheduled_bookings = rescheduled_bookings + $1, updated_at = $2
+                            WHERE customer_email = $3
+                        """, [(n, datetime.now(), email) for email, n in counts.items()])
+
+            return bulk_booking_summary(results)
+        except Exception as e:
+            return {'success': False, 'message': str(e)}
+
+    # ---------- conversations ----------
+
+    save_conversation = _call("save_conversation")
+    get_conversation_history = _call("get_conversation_history")
+    search_conversations = _call("search_conversations")
+
+    async def _save_conversation(self, customer_email: str, session_id: str, message_type: str,
+                                 message_text: str, language: str = 'en-US',
+                                 created_at: Optional[datetime] = None) -> None:
+        await self._pool.execute("""
+            INSERT INTO conversations
+            (customer_email, session_id, message_type, message_text, language, created_at)
+            VALUES ($1, $2, $3, $4, $5, $6)
+        """, customer_email, session_id, message_type, message_text, language,
+            created_at or datetime.now())
+
+    async def _get_conversation_history(self, customer_email: str, limit: int = 50,
+                                        session_id: Optional[str] = None,
+                                        before: Optional[int] = None) -> List[Dict]:
+        if not limit:
+            return []
+
+        params = _Params(customer_email)
+        filters = "customer_email = $1"
+        if session_id:
+            filters += f" AND session_id = {params.add(session_id)}"
+        if before is not None:
+            filters += (f" AND (created_at, id) < "
+                        f"(SELECT created_at, id FROM conversations WHERE id = {params.add(before)})")
+
+        window_param = f"${len(params.values) + 1}"
+        limit_param = f"${len(params.values) + 2}"
+        # Same LEAD() pairing over a bounded window as the SQLite implementation
+        query = f"""
+            SELECT id, user_message, ai_response, created_at
+            FROM (
+                SELECT id, message_type, message_text AS user_message, created_at,
+                       CASE WHEN LEAD(message_type) OVER w = 'assistant'
+                            THEN LEAD(message_text) OVER w
+                            ELSE 'No response' END AS ai_response
+                FROM (
+                    SELECT id, message_type, message_text, created_at
+                    FROM conversations
+                    WHERE {filters}
+                    ORDER BY created_at DESC, id DESC
+                    LIMIT {window_param}
+                ) recent
+                WINDOW w AS (ORDER BY created_at, id)
+            ) paired
+            WHERE message_type = 'user'
+            ORDER BY created_at DESC, id DESC
+            LIMIT {limit_param}
+        """
+
+        async with self._pool.acquire() as conn:
+            window = limit * 2 + 1
+            while True:
+                rows = await conn.fetch(query, *params.values, window, limit)
+                if len(rows) >= limit:
+                    break
+                scanned = await conn.fetchval(
+                    f"SELECT COUNT(*) FROM (SELECT 1 FROM conversations WHERE {filters} LIMIT {window_param}) s",
+                    *params.values, window
+                )
+                if scanned < window:
+                    break
+                window *= 4
+
+        return [
+            {
+                'message_id': row['id'],
+                'user_message': row['user_message'],
+                'ai_response': row['ai_response'],
+                'created_at': _text(row['created_at']),
+                'duration': "N/A"
+            }
+            for row in rows
+        ]
+
+    async def _search_conversations(self, query: str, customer_email: Optional[str] = None,
+                                    date_from: Optional[str] = None, date_to: Optional[str] = None,
+                                    limit: int = 20, offset: int = 0) -> Dict:
+        if not query.split():
+            return {'results': [], 'has_more': False, 'archived_sessions': 0}
+
+        validate_date_range(date_from, date_to)
+        params = _Params(query)
+        filters = ["to_tsvector('simple', message_text) @@ q"]
+        if customer_email:
+            filters.append(f"customer_email = {params.add(customer_email)}")
+        if date_from:
+            filters.append(f"created_at >= {params.add(_parse_timestamp(date_from))}")
+        if date_to:
+            # A bare date includes the whole day
+            if len(date_to) == 10:
+                filters.append(f"created_at < {params.add(_parse_timestamp(date_to, end_of_day=True))}")
+            else:
+                filters.append(f"created_at <= {params.add(_parse_timestamp(date_to))}")
+
+        rows = await self._pool.fetch(f"""
+            SELECT id, session_id, customer_email, message_type, created_at,
+                   ts_headline('simple', message_text, q,
+                               'StartSel=<mark>, StopSel=</mark>, MaxWords=16, MinWords=5') AS snippet,
+                   ts_rank(to_tsvector('simple', message_text), q) AS score
+            FROM conversations, plainto_tsquery('simple', $1) AS q
+            WHERE {' AND '.join(filters)}
+            ORDER BY score DESC, id DESC
+            LIMIT {params.add(limit + 1)} OFFSET {params.add(offset)}
+        """, *params.values)
+
+        return {
+            'results': [
+                {
+                    'id': row['id'],
+                    'session_id': row['session_id'],
+                    'customer_email': row['customer_email'],
+                    'speaker': row['message_type'],
+                    'created_at': _text(row['created_at']),
+                    'snippet': row['snippet'],
+                    'score': round(row['score'], 4)
+                }
+                for row in rows[:limit]
+            ],
+            'has_more': len(rows) > limit,
+            'archived_sessions': 0  # no transcript archive on PostgreSQL
+        }
+
+    # ---------- livekit sessions ----------
+
+    record_livekit_session = _call("record_livekit_session")
+    get_livekit_session = _call("get_livekit_session")
+    update_livekit_session_activity = _call("update_livekit_session_activity")
+    get_transcript_by_session = _call("get_transcript_by_session")
+    get_livekit_transcript = _call("get_livekit_transcript")
+
+    @staticmethod
+    def _session_from_row(row) -> Dict:
+        return {
+            'room_name': row['room_name'],
+            'session_id': row['session_id'],
+            'customer_email': row['customer_email'],
+            'participant_name': row['participant_name'],
+            'metadata': json.loads(row['metadata']) if row['metadata'] else None,
+            'created_at': _text(row['created_at']),
+            'updated_at': _text(row['updated_at']),
+            'last_transcript_at': _text(row['last_transcript_at'])
+        }
+
+    async def _record_livekit_session(self, room_name: str, participant_name: str,
+                                      customer_email: Optional[str] = None,
+                                      session_id: Optional[str] = None,
+                                      metadata: Optional[Dict] = None) -> Dict:
+        now = datetime.now()
+        row = await self._pool.fetchrow(f"""
+            INSERT INTO livekit_sessions AS s
+            (room_name, session_id, customer_email, participant_name, metadata, created_at, updated_at)
+            VALUES ($1, $2, $3, $4, $5, $6, $6)
+            ON CONFLICT (room_name) DO UPDATE SET
+                session_id = COALESCE(EXCLUDED.session_id, s.session_id),
+                customer_email = COALESCE(EXCLUDED.customer_email, s.customer_email),
+                participant_name = COALESCE(EXCLUDED.participant_name, s.participant_name),
+                metadata = COALESCE(EXCLUDED.metadata, s.metadata),
+                updated_at = EXCLUDED.updated_at
+            RETURNING {_SESSION_COLUMNS}
+        """, room_name, session_id, customer_email, participant_name,
+            json.dumps(metadata) if metadata else None, now)
+        return self._session_from_row(row) if row else {}
+
+    async def _get_livekit_session(self, room_name: str) -> Optional[Dict]:
+        row = await self._pool.fetchrow(
+            f"SELECT {_SESSION_COLUMNS} FROM livekit_sessions WHERE room_name = $1", room_name
+        )
+        return self._session_from_row(row) if row else None
+
+    async def _update_livekit_session_activity(self, room_name: str,
+                                               customer_email: Optional[str] = None,
+                                               last_transcript_at: Optional[datetime] = None) -> None:
+        await self._pool.execute("""
+            UPDATE livekit_sessions
+            SET updated_at = $1,
+                customer_email = COALESCE($2, customer_email),
+                last_transcript_at = COALESCE($3, last_transcript_at)
+            WHERE room_name = $4
+        """, datetime.now(), customer_email or None, last_transcript_at, room_name)
+
+    async def _get_transcript_by_session(self, session_id: str, limit: int = 200,
+                                         since_id: Optional[int] = None) -> List[Dict]:
+        rows = await self._pool.fetch("""
+            SELECT id, message_type, message_text, language, created_at
+            FROM conversations
+            WHERE session_id = $1 AND id > $2
+            ORDER BY id ASC
+            LIMIT $3
+        """, session_id, since_id if since_id is not None else -1, limit or None)
+        return [
+            {
+                'id': row['id'],
+                'speaker': row['message_type'],
+                'text': row['message_text'],
+                'language': row['language'],
+                'created_at': _text(row['created_at'])
+            }
+            for row in rows
+        ]
+
+    async def _get_livekit_transcript(self, room_name: str, limit: int = 200,
+                                      since_id: Optional[int] = None) -> Dict:
+        session = await self._pool.fetchrow("""
+            SELECT session_id, customer_email, participant_name, last_transcript_at
+            FROM livekit_sessions WHERE room_name = $1
+        """, room_name)
+
+        mapped_session_id = session['session_id'] if session else None
+        customer_email = session['customer_email'] if session else None
+        participant_name = session['participant_name'] if session else None
+        transcript_session_id = mapped_session_id or room_name
+        transcripts = await self._get_transcript_by_session(transcript_session_id, limit, since_id)
+
+        # Prefer the stored session mapping, but fall back to room_name-based session
+        session_id = mapped_session_id or None
+        if not session_id and transcripts:
+            session_id = transcript_session_id
+            if not customer_email:
+                customer_email = await self._pool.fetchval("""
+                    SELECT customer_email FROM conversations
+                    WHERE session_id = $1 ORDER BY id DESC LIMIT 1
+                """, room_name)
+
+        if not transcripts:
+            return {
+                'room_name': room_name,
+                'session_id': session_id,
+                'customer_email': customer_email,
+                'participant_name': participant_name,
+                'transcripts': []
+            }
+
+        return {
+            'room_name': room_name,
+            'session_id': session_id,
+            'customer_email': customer_email,
+            'participant_name': participant_name,
+            'transcripts': transcripts,
+            'last_transcript_at': _text(session['last_transcript_at']) if session else None
+        }
+
+    # ---------- export ----------
+
+    export_conversations = _call("export_conversations")
+    export_bookings = _call("export_bookings")
+
+    async def _export_page(self, table: str, fields: List[str], after_id: int, limit: int,
+                           date_from: Optional[str], date_to: Optional[str]) -> List[Dict]:
+        validate_date_range(date_from, date_to)
+        params = _Params(after_id)
+        filters = ["id > $1"]
+        if date_from:
+            filters.append(f"created_at >= {params.add(_parse_timestamp(date_from))}")
+        if date_to:
+            # A bare date includes the whole day
+            if len(date_to) == 10:
+                filters.append(f"created_at < {params.add(_parse_timestamp(date_to, end_of_day=True))}")
+            else:
+                filters.append(f"created_at <= {params.add(_parse_timestamp(date_to))}")
+
+        rows = await self._pool.fetch(f"""
+            SELECT {', '.join(fields)} FROM {table}
+            WHERE {' AND '.join(filters)}
+            ORDER BY id
+            LIMIT {params.add(limit)}
+        """, *params.values)
+        return [{name: _text(row[name]) for name in fields} for row in rows]
+
+    async def _export_conversations(self, after_id: int = 0, limit: int = 1000,
+                                    date_from: Optional[str] = None, date_to: Optional[str] = None) -> List[Dict]:
+        return await self._export_page("conversations", CONVERSATION_EXPORT_FIELDS,
+                                       after_id, limit, date_from, date_to)
+
+    async def _export_bookings(self, after_id: int = 0, limit: int = 1000,
+                               date_from: Optional[str] = None, date_to: Optional[str] = None) -> List[Dict]:
+        return await self._export_page("travel_bookings", BOOKING_EXPORT_FIELDS,
+                                       after_id, limit, date_from, date_to)
+
+    del _call
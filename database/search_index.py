@@ -0,0 +1,29 @@
+"""
+Backfill / rebuild the full-text search index over conversation transcripts
+
+Usage:
+    python search_index.py            # re-index every row in conversations
+    python search_index.py --optimize # merge FTS segments after large backfills
+"""
+
+import argparse
+import time
+
+import database
+from connection_pool import get_connection
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild the conversation search index")
+    parser.add_argument("--optimize", action="store_true", help="also merge index segments")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    rows = database.rebuild_conversation_search_index()
+    print(f"Indexed {rows} conversation rows in {time.perf_counter() - started:.1f}s")
+
+    if args.optimize:
+        conn = get_connection(database.DB_PATH)
+        with conn:
+            conn.execute("INSERT INTO conversations_fts(conversations_fts) VALUES ('optimize')")
+        print("Index optimized")
@@ -0,0 +1,86 @@
+"""
+Bounded LRU cache of LiveKit room -> session mappings
+
+Every transcript POST looks up the room's session, so the mapping is kept in
+memory. database.py keeps it coherent: record_livekit_session() stores the fresh
+row and session-activity updates patch the cached entry once they are committed.
+Entries also expire after a TTL so changes made by other worker processes are
+picked up.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, Optional
+
+SESSION_CACHE_SIZE = 2048
+SESSION_CACHE_TTL_SECONDS = 30.0
+
+
+class SessionCache:
+    """Thread-safe LRU of room_name -> session dict, with per-entry TTL."""
+
+    def __init__(self, maxsize: int = SESSION_CACHE_SIZE, ttl: float = SESSION_CACHE_TTL_SECONDS):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, room_name: str) -> Optional[Dict]:
+        """Return a copy of the cached session, or None on a miss."""
+        with self._lock:
+            entry = self._entries.get(room_name)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._entries[room_name]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(room_name)
+            self.hits += 1
+            return dict(entry[1])
+
+    def put(self, room_name: str, session: Dict) -> None:
+        with self._lock:
+            self._entries[room_name] = (time.monotonic() + self.ttl, dict(session))
+            self._entries.move_to_end(room_name)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def apply_activity(self, room_name: str, updated_at: datetime,
+                       customer_email: Optional[str] = None,
+                       last_transcript_at: Optional[datetime] = None) -> None:
+        """Patch a cached entry after a committed activity update (no-op if absent)."""
+        with self._lock:
+            entry = self._entries.get(room_name)
+            if entry is None:
+                return
+            session = entry[1]
+            # Stored the way sqlite3 returns them: datetimes come back as ISO strings
+            session['updated_at'] = str(updated_at)
+            if customer_email:
+                session['customer_email'] = customer_email
+            if last_transcript_at:
+                session['last_transcript_at'] = str(last_transcript_at)
+
+    def invalidate(self, room_name: Optional[str] = None) -> None:
+        """Drop one room, or the whole cache when room_name is None."""
+        with self._lock:
+            if room_name is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(room_name, None)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            size = len(self._entries)
+        lookups = self.hits + self.misses
+        return {
+            'size': size,
+            'maxsize': self.maxsize,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+        }
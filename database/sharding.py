@@ -0,0 +1,486 @@
+"""
+Hash-sharded SQLite storage for transcripts and LiveKit sessions
+
+With DATABASE_URL=sqlite+sharded://[directory]?shards=N the `conversations` and
+`livekit_sessions` tables are spread across N SQLite files, so transcript writes
+for different calls no longer serialize on one write lock. Customers, bookings and
+rollups stay in the main file at CUSTOMERS_DB_PATH.
+
+Routing:
+    conversations, conversation_archive   shard_for(session_id)
+    livekit_sessions                      shard_for(room_name)
+
+Single-key functions run the regular SQLite implementations in database.py
+against the owning shard (database.shard_scope). get_conversation_history by
+email and search_conversations scatter to every shard and merge the results.
+
+Message ids stay globally unique: every shard's AUTOINCREMENT starts in its own
+SHARD_ID_RANGE-wide block above the highest id that existed when the layout was
+created, and rebalancing copies rows with their ids.
+
+Shard files are named shard_<i>_of_<N>.db, so a new layout can be built next
+to the old one. Stop the writers before rebalancing.
+
+Usage:
+    python sharding.py status --shards 4
+    python sharding.py rebalance --from-main --to 4     # move rows out of customers.db
+    python sharding.py rebalance --from 4 --to 8 --drop-source
+    python sharding.py bench --shards 1 2 4 8           # write throughput per layout
+"""
+
+import argparse
+import heapq
+import json
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+import zlib
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+from urllib.parse import parse_qs, urlparse
+
+import database
+from connection_pool import close_all_connections, get_connection
+from migrations import migrate
+from storage import SQLiteBackend
+from write_queue import WriteBehindQueue
+
+SHARD_ID_RANGE = 1 << 40     # ids reserved per shard per layout
+COPY_BATCH_ROWS = 2000       # rows read per batch while rebalancing
+
+# Columns copied when rebalancing (conversations keep their ids)
+_CONVERSATION_COLUMNS = "id, customer_email, session_id, message_type, message_text, language, created_at"
+_SESSION_COLUMNS = ("room_name, session_id, customer_email, participant_name, metadata, "
+                    "created_at, updated_at, last_transcript_at")
+_ARCHIVE_COLUMNS = ("session_id, customer_email, message_count, first_message_id, last_message_id, "
+                    "started_at, ended_at, codec, raw_bytes, compressed_bytes, payload, archived_at")
+
+
+# ==================== LAYOUT ====================
+
+def shard_for(key: str, shard_count: int) -> int:
+    """Stable shard index for a session_id / room_name (crc32, same in every process)"""
+    return zlib.crc32((key or "").encode("utf-8")) % shard_count
+
+
+def shard_paths(directory: str, shard_count: int) -> List[str]:
+    return [os.path.join(directory, f"shard_{i:02d}_of_{shard_count:02d}.db") for i in range(shard_count)]
+
+
+def default_shard_directory() -> str:
+    return str(Path(database.DB_PATH).with_name("shards"))
+
+
+def parse_sharded_url(url: str) -> tuple:
+    """sqlite+sharded://[directory]?shards=N -> (directory, N)"""
+    parsed = urlparse(url)
+    try:
+        shard_count = int(parse_qs(parsed.query).get("shards", ["0"])[0])
+    except ValueError:
+        shard_count = 0
+    if shard_count < 1:
+        raise ValueError("sqlite+sharded:// URLs need ?shards=N with N >= 1")
+    directory = (parsed.netloc + parsed.path) or default_shard_directory()
+    return directory, shard_count
+
+
+def _max_conversation_id(path: str) -> int:
+    conn = get_connection(path)
+    if not conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'conversations'").fetchone():
+        return 0  # another process is still creating this file
+    return conn.execute("SELECT COALESCE(MAX(id), 0) FROM conversations").fetchone()[0]
+
+
+def id_floor(paths: List[str]) -> int:
+    """First id block above every conversation id in `paths`"""
+    highest = max([_max_conversation_id(path) for path in paths if os.path.exists(path)] or [0])
+    return (highest // SHARD_ID_RANGE + 1) * SHARD_ID_RANGE
+
+
+def init_shard(path: str, index: int, shard_count: int, floor: int) -> None:
+    """Create/upgrade one shard file and reserve its id block"""
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    migrate(path)  # same schema as the main file; only the transcript tables are used
+    conn = get_connection(path)
+    # BEGIN IMMEDIATE: several workers may start against a new layout at once
+    conn.execute("BEGIN IMMEDIATE")
+    with conn:
+        conn.execute("CREATE TABLE IF NOT EXISTS shard_meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        meta = dict(conn.execute("SELECT key, value FROM shard_meta").fetchall())
+        if meta and (int(meta['shard_index']), int(meta['shard_count'])) != (index, shard_count):
+            raise ValueError(f"{path} belongs to shard {meta['shard_index']} of {meta['shard_count']}")
+        if meta:
+            return
+        conn.executemany("INSERT INTO shard_meta (key, value) VALUES (?, ?)", [
+            ('shard_index', str(index)), ('shard_count', str(shard_count)), ('created_at', datetime.now().isoformat()),
+        ])
+        # AUTOINCREMENT continues from max(seq, max(id)); copied rows are all below the floor
+        start = floor + index * SHARD_ID_RANGE
+        conn.execute("DELETE FROM sqlite_sequence WHERE name = 'conversations'")
+        conn.execute("INSERT INTO sqlite_sequence (name, seq) VALUES ('conversations', ?)", (start,))
+
+
+# ==================== BACKEND ====================
+
+class ShardedSQLiteBackend(SQLiteBackend):
+    """SQLite backend with transcripts and LiveKit sessions spread over N shard files."""
+
+    name = "sqlite-sharded"
+
+    def __init__(self, url: str, implementations: Dict[str, Callable]):
+        super().__init__(url, implementations)
+        self.directory, self.shard_count = parse_sharded_url(url)
+        self.shard_paths = shard_paths(self.directory, self.shard_count)
+        self._queues: Dict[str, WriteBehindQueue] = {}
+        self._queues_lock = threading.Lock()
+
+    def shard_path(self, key: str) -> str:
+        return self.shard_paths[shard_for(key, self.shard_count)]
+
+    def init_schema(self):
+        """Migrate the main file, then create any missing shard files"""
+        applied = migrate(database.DB_PATH)
+        missing = [path for path in self.shard_paths if not os.path.exists(path)]
+        floor = id_floor([database.DB_PATH] + self.shard_paths) if missing else 0
+        for index, path in enumerate(self.shard_paths):
+            init_shard(path, index, self.shard_count, floor)
+        return applied
+
+    def _routed(self, name: str, key: str, *args, **kwargs):
+        with database.shard_scope(self.shard_path(key)):
+            return self.implementations[name](*args, **kwargs)
+
+    # ---------- single-shard calls ----------
+
+    def save_conversation(self, customer_email, session_id, *args, **kwargs):
+        return self._routed('save_conversation', session_id, customer_email, session_id, *args, **kwargs)
+
+    def get_transcript_by_session(self, session_id, *args, **kwargs):
+        return self._routed('get_transcript_by_session', session_id, session_id, *args, **kwargs)
+
+    def record_livekit_session(self, room_name, *args, **kwargs):
+        return self._routed('record_livekit_session', room_name, room_name, *args, **kwargs)
+
+    def get_livekit_session(self, room_name):
+        return self._routed('get_livekit_session', room_name, room_name)
+
+    def update_livekit_session_activity(self, room_name, *args, **kwargs):
+        return self._routed('update_livekit_session_activity', room_name, room_name, *args, **kwargs)
+
+    def get_livekit_transcript(self, room_name: str, limit: int = 200,
+                               since_id: Optional[int] = None) -> Dict:
+        # The session row and its transcript can live on different shards
+        session = self.get_livekit_session(room_name) or {}
+        mapped_session_id = session.get('session_id') or None
+        customer_email = session.get('customer_email')
+        transcript_session_id = mapped_session_id or room_name
+        transcripts = self.get_transcript_by_session(transcript_session_id, limit, since_id)
+
+        session_id = mapped_session_id
+        if not session_id and transcripts:
+            session_id = transcript_session_id
+            customer_email = customer_email or self._last_email(transcript_session_id)
+
+        result = {
+            'room_name': room_name,
+            'session_id': session_id,
+            'customer_email': customer_email,
+            'participant_name': session.get('participant_name'),
+            'transcripts': transcripts,
+        }
+        if transcripts:
+            result['last_transcript_at'] = session.get('last_transcript_at')
+        return result
+
+    def _last_email(self, session_id: str) -> Optional[str]:
+        conn = get_connection(self.shard_path(session_id))
+        row = conn.execute("""
+            SELECT customer_email FROM conversations WHERE session_id = ? ORDER BY id DESC LIMIT 1
+        """, (session_id,)).fetchone() or conn.execute("""
+            SELECT customer_email FROM conversation_archive WHERE session_id = ?
+        """, (session_id,)).fetchone()
+        return row[0] if row else None
+
+    # ---------- scatter-gather ----------
+
+    def get_conversation_history(self, customer_email: str, limit: int = 50,
+                                 session_id: Optional[str] = None,
+                                 before: Optional[int] = None) -> List[Dict]:
+        if session_id:
+            return self._routed('get_conversation_history', session_id,
+                                customer_email, limit, session_id, before)
+        if not limit:
+            return []
+
+        before_key = None
+        if before is not None:
+            # Ids are unique across shards; find the one holding the cursor row
+            before_key = next((key for key in (database.message_sort_key(get_connection(path), before)
+                                               for path in self.shard_paths) if key), None)
+            if before_key is None:
+                return []
+
+        # Each shard returns its newest `limit` pairs; keep the newest overall
+        pages = [database.conversation_history_rows(get_connection(path), customer_email, limit,
+                                                    before_key=before_key)
+                 for path in self.shard_paths]
+        rows = heapq.nlargest(limit, (row for page in pages for row in page),
+                              key=lambda row: (str(row[3]), row[0]))
+        return [database._history_pair(row) for row in rows]
+
+    def search_conversations(self, query: str, customer_email: Optional[str] = None,
+                             date_from: Optional[str] = None, date_to: Optional[str] = None,
+                             limit: int = 20, offset: int = 0) -> Dict:
+        search = self.implementations['search_conversations']
+        hits, has_more, archived = [], False, 0
+        for path in self.shard_paths:
+            with database.shard_scope(path):
+                page = search(query, customer_email, date_from, date_to, limit=offset + limit, offset=0)
+            hits.extend(page['results'])
+            has_more = has_more or page['has_more']
+            archived += page['archived_sessions']
+
+        hits.sort(key=lambda hit: (-hit['score'], hit['id']))
+        return {
+            'results': hits[offset:offset + limit],
+            'has_more': has_more or len(hits) > offset + limit,
+            'archived_sessions': archived,
+        }
+
+    def export_conversations(self, after_id: int = 0, limit: int = 1000,
+                             date_from: Optional[str] = None, date_to: Optional[str] = None) -> List[Dict]:
+        export = self.implementations['export_conversations']
+        pages = []
+        for path in self.shard_paths:
+            with database.shard_scope(path):
+                pages.append(export(after_id, limit, date_from, date_to))
+        return heapq.nsmallest(limit, (row for page in pages for row in page), key=lambda row: row['id'])
+
+    # ---------- write-behind queues (one per shard) ----------
+
+    def write_queue(self, key: str) -> WriteBehindQueue:
+        path = self.shard_path(key)
+        with self._queues_lock:
+            queue = self._queues.get(path)
+            if queue is None:
+                queue = self._queues[path] = WriteBehindQueue(
+                    path, on_sessions_written=database._cache_session_activity)
+            return queue
+
+    def flush_writes(self, timeout: Optional[float] = None) -> None:
+        for queue in list(self._queues.values()):
+            queue.flush(timeout)
+
+    def stop_write_queues(self) -> None:
+        with self._queues_lock:
+            queues, self._queues = list(self._queues.values()), {}
+        for queue in queues:
+            queue.stop()
+
+    def close(self) -> None:
+        self.stop_write_queues()
+        for path in self.shard_paths:
+            close_all_connections(path)
+
+    def stats(self) -> Dict:
+        return {
+            'backend': self.name,
+            'directory': self.directory,
+            'shards': self.shard_count,
+            'write_queues': {os.path.basename(path): queue.stats() for path, queue in self._queues.items()},
+        }
+
+
+# ==================== REBALANCE ====================
+
+def _copy_table(source: str, targets: List[str], table: str, columns: str, key_column: str) -> int:
+    """Stream one table from `source` into the shard that owns each row's key"""
+    source_conn = get_connection(source)
+    key_index = [c.strip() for c in columns.split(",")].index(key_column)
+    placeholders = ", ".join("?" for _ in columns.split(","))
+    copied, last_rowid = 0, -1
+    while True:
+        rows = source_conn.execute(f"""
+            SELECT rowid, {columns} FROM {table} WHERE rowid > ? ORDER BY rowid LIMIT ?
+        """, (last_rowid, COPY_BATCH_ROWS)).fetchall()
+        if not rows:
+            return copied
+        last_rowid = rows[-1][0]
+
+        by_shard: Dict[int, list] = {}
+        for row in rows:
+            by_shard.setdefault(shard_for(row[1 + key_index], len(targets)), []).append(row[1:])
+        for index, batch in by_shard.items():
+            conn = get_connection(targets[index])
+            with conn:
+                conn.executemany(f"INSERT INTO {table} ({columns}) VALUES ({placeholders})", batch)
+        copied += len(rows)
+
+
+def _table_count(path: str, table: str) -> int:
+    return get_connection(path).execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+
+def rebalance(sources: List[str], directory: str, shard_count: int, drop_source: bool = False) -> Dict:
+    """Copy transcripts and sessions from `sources` into a new N-shard layout.
+
+    `sources` is either the main database file or the shard files of the old
+    layout. Row counts are verified before anything is dropped.
+    """
+    started = time.perf_counter()
+    targets = shard_paths(directory, shard_count)
+    if set(targets) & set(sources):
+        raise ValueError("Source and target layouts are the same")
+    for path in targets:
+        if os.path.exists(path) and _table_count(path, "conversations"):
+            raise ValueError(f"{path} already holds conversations; remove it or pick another layout")
+
+    floor = id_floor(sources + [database.DB_PATH])
+    for index, path in enumerate(targets):
+        init_shard(path, index, shard_count, floor)
+
+    tables = [
+        ("conversations", _CONVERSATION_COLUMNS, "session_id"),
+        ("livekit_sessions", _SESSION_COLUMNS, "room_name"),
+        ("conversation_archive", _ARCHIVE_COLUMNS, "session_id"),
+    ]
+    report = {'shards': shard_count, 'directory': directory, 'copied': {}}
+    for table, columns, key_column in tables:
+        copied = sum(_copy_table(source, targets, table, columns, key_column) for source in sources)
+        in_targets = sum(_table_count(path, table) for path in targets)
+        if copied != in_targets:
+            raise RuntimeError(f"{table}: copied {copied} rows but the new shards hold {in_targets}")
+        report['copied'][table] = copied
+
+    report['rows_per_shard'] = [_table_count(path, "conversations") for path in targets]
+
+    if drop_source:
+        for source in sources:
+            if source == database.DB_PATH:
+                conn = get_connection(source)
+                with conn:
+                    for table, _, _ in tables:
+                        conn.execute(f"DELETE FROM {table}")
+            else:
+                close_all_connections(source)
+                for suffix in ("", "-wal", "-shm"):
+                    if os.path.exists(source + suffix):
+                        os.remove(source + suffix)
+    report['source_dropped'] = drop_source
+    report['duration_ms'] = round((time.perf_counter() - started) * 1000, 1)
+    return report
+
+
+def layout_status(directory: str, shard_count: int) -> Dict:
+    paths = shard_paths(directory, shard_count)
+    return {
+        'directory': directory,
+        'shards': [
+            {
+                'path': path,
+                'conversations': _table_count(path, "conversations") if os.path.exists(path) else None,
+                'livekit_sessions': _table_count(path, "livekit_sessions") if os.path.exists(path) else None,
+            }
+            for path in paths
+        ],
+    }
+
+
+# ==================== BENCHMARK ====================
+
+def _bench_writer(writer: int, sessions: int, messages: int, barrier) -> None:
+    """One writer process: `messages` single-row commits spread over `sessions` calls"""
+    barrier.wait()
+    for i in range(messages):
+        database.save_conversation(f"caller{writer}@example.com", f"room-{writer}-{i % sessions}",
+                                   "user" if i % 2 == 0 else "assistant", f"benchmark message {i}")
+
+
+def benchmark(shard_counts: List[int], writers: int = 8, messages: int = 2000,
+              sessions_per_writer: int = 20) -> List[Dict]:
+    """Write throughput (committed rows/s) for each shard count, `writers` processes each"""
+    ctx = multiprocessing.get_context("spawn")
+    saved_env = {name: os.environ.get(name) for name in ("CUSTOMERS_DB_PATH", "DATABASE_URL")}
+    results = []
+    try:
+        for shard_count in shard_counts:
+            with tempfile.TemporaryDirectory() as tmp:
+                # Spawned writers import database.py with this environment
+                os.environ["CUSTOMERS_DB_PATH"] = os.path.join(tmp, "customers.db")
+                os.environ["DATABASE_URL"] = f"sqlite+sharded://{os.path.join(tmp, 'shards')}?shards={shard_count}"
+                layout = shard_paths(os.path.join(tmp, "shards"), shard_count)
+                migrate(os.environ["CUSTOMERS_DB_PATH"])
+                for index, path in enumerate(layout):
+                    init_shard(path, index, shard_count, SHARD_ID_RANGE)
+
+                barrier = ctx.Barrier(writers + 1)
+                procs = [ctx.Process(target=_bench_writer, args=(w, sessions_per_writer, messages, barrier))
+                         for w in range(writers)]
+                for proc in procs:
+                    proc.start()
+                barrier.wait()  # every writer has imported database.py
+                started = time.perf_counter()
+                for proc in procs:
+                    proc.join()
+                elapsed = time.perf_counter() - started
+                for path in [os.environ["CUSTOMERS_DB_PATH"]] + layout:
+                    close_all_connections(path)
+
+            total = writers * messages
+            results.append({
+                'shards': shard_count,
+                'writers': writers,
+                'rows': total,
+                'seconds': round(elapsed, 3),
+                'rows_per_second': round(total / elapsed, 1),
+            })
+    finally:
+        for name, value in saved_env.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+
+    base = results[0]['rows_per_second'] if results else 0
+    for result in results:
+        result['speedup'] = round(result['rows_per_second'] / base, 2) if base else None
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sharded transcript storage tools")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    status = sub.add_parser("status", help="row counts per shard")
+    status.add_argument("--shards", type=int, required=True)
+    status.add_argument("--directory", default=None)
+
+    move = sub.add_parser("rebalance", help="copy rows into a new shard layout")
+    origin = move.add_mutually_exclusive_group(required=True)
+    origin.add_argument("--from", dest="from_shards", type=int, help="shard count of the current layout")
+    origin.add_argument("--from-main", action="store_true", help="move rows out of the main database file")
+    move.add_argument("--to", type=int, required=True, help="shard count of the new layout")
+    move.add_argument("--directory", default=None)
+    move.add_argument("--drop-source", action="store_true", help="remove the old rows once verified")
+
+    bench = sub.add_parser("bench", help="write throughput for several shard counts")
+    bench.add_argument("--shards", type=int, nargs="+", default=[1, 2, 4, 8])
+    bench.add_argument("--writers", type=int, default=8)
+    bench.add_argument("--messages", type=int, default=2000, help="messages per writer")
+    args = parser.parse_args()
+
+    if args.command == "bench":
+        result = benchmark(args.shards, args.writers, args.messages)
+    else:
+        directory = args.directory or default_shard_directory()
+        if args.command == "status":
+            result = layout_status(directory, args.shards)
+        else:
+            database.flush_pending_writes()
+            sources = ([database.DB_PATH] if args.from_main
+                       else shard_paths(directory, args.from_shards))
+            result = rebalance(sources, directory, args.to, args.drop_source)
+    print(json.dumps(result, indent=2))
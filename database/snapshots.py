@@ -0,0 +1,331 @@
+"""
+Columnar (Parquet) analytics snapshots of bookings, sessions and transcript stats
+
+build_snapshots() reads the SQLite files in keyset chunks of CHUNK_ROWS and
+appends Parquet files partitioned by month, one file per month per run:
+
+    <output>/travel_bookings/month=2025-03/part-<run>.parquet
+    <output>/livekit_sessions/month=2025-03/part-<run>.parquet
+    <output>/transcript_stats/month=2025-03/part-<run>.parquet
+
+_snapshot_state.json records how far each source file has been read, so a run
+only appends rows added since the previous one. Parts are written under a
+temporary name and renamed before the state is saved, so an interrupted run
+leaves nothing half-written behind.
+
+transcript_stats has one row per call (session_id): message counts, first/last
+message time, duration and languages, archived rows included. A call is
+written once it has been idle for SESSION_IDLE_MINUTES; a call that resumes
+later is written again, so readers keep the row with the latest snapshot_at.
+Bookings and sessions are appended when created; use --full to rebuild with
+current statuses.
+
+Read them with any Parquet engine, e.g.
+    pyarrow.dataset.dataset("<output>/travel_bookings", partitioning="hive")
+
+pyarrow is optional (pip install pyarrow); only this module needs it.
+
+Usage:
+    python snapshots.py -o /data/snapshots          # append new rows
+    python snapshots.py -o /data/snapshots --full   # rebuild from scratch
+"""
+
+import argparse
+import json
+import os
+import shutil
+import time
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # snapshots are optional; the rest of the app does not need pyarrow
+    pa = None
+    pq = None
+
+import database
+from connection_pool import get_connection
+from transcript_archive import load_archived_rows
+
+SNAPSHOT_DIR = os.getenv("ANALYTICS_SNAPSHOT_DIR", "")  # also built by the nightly maintenance run when set
+CHUNK_ROWS = 5000
+SESSION_IDLE_MINUTES = 30
+STATE_FILE = "_snapshot_state.json"
+
+# Column name -> Arrow type alias
+BOOKING_COLUMNS = [
+    ('id', 'int64'), ('customer_id', 'int64'), ('customer_email', 'string'),
+    ('service_type', 'string'), ('destination', 'string'), ('departure_date', 'string'),
+    ('return_date', 'string'), ('num_travelers', 'int64'), ('service_details', 'string'),
+    ('special_requests', 'string'), ('total_amount', 'double'), ('confirmation_number', 'string'),
+    ('status', 'string'), ('created_at', 'timestamp[us]'),
+]
+SESSION_COLUMNS = [
+    ('id', 'int64'), ('room_name', 'string'), ('session_id', 'string'), ('customer_email', 'string'),
+    ('participant_name', 'string'), ('metadata', 'string'), ('created_at', 'timestamp[us]'),
+    ('updated_at', 'timestamp[us]'), ('last_transcript_at', 'timestamp[us]'),
+]
+TRANSCRIPT_STATS_COLUMNS = [
+    ('session_id', 'string'), ('customer_email', 'string'), ('message_count', 'int64'),
+    ('user_messages', 'int64'), ('assistant_messages', 'int64'), ('total_chars', 'int64'),
+    ('first_message_at', 'timestamp[us]'), ('last_message_at', 'timestamp[us]'),
+    ('duration_seconds', 'double'), ('languages', 'string'), ('snapshot_at', 'timestamp[us]'),
+]
+_TIMESTAMP_FIELDS = {name for columns in (BOOKING_COLUMNS, SESSION_COLUMNS, TRANSCRIPT_STATS_COLUMNS)
+                     for name, kind in columns if kind.startswith('timestamp')}
+
+
+def _schema(columns: List[Tuple[str, str]]):
+    return pa.schema([(name, pa.type_for_alias(kind)) for name, kind in columns])
+
+
+def _timestamp(value) -> Optional[datetime]:
+    if value is None or isinstance(value, datetime):
+        return value
+    try:
+        return datetime.fromisoformat(str(value))
+    except ValueError:
+        return None
+
+
+def _month(value) -> str:
+    return str(value)[:7] if value else "unknown"
+
+
+# ==================== WRITER ====================
+
+class _MonthPartitionedWriter:
+    """One Parquet file per month for this run; each chunk becomes a row group."""
+
+    def __init__(self, dataset_dir: Path, columns: List[Tuple[str, str]], run_id: str, month_field: str):
+        self.dataset_dir = dataset_dir
+        self.schema = _schema(columns)
+        self.names = [name for name, _ in columns]
+        self.run_id = run_id
+        self.month_field = month_field
+        self._writers: Dict[str, tuple] = {}
+        self.rows: Dict[str, int] = {}
+
+    def write(self, rows: List[Dict]) -> None:
+        by_month: Dict[str, List[Dict]] = {}
+        for row in rows:
+            for name in _TIMESTAMP_FIELDS.intersection(row):
+                row[name] = _timestamp(row[name])
+            by_month.setdefault(_month(row[self.month_field]), []).append(row)
+
+        for month, month_rows in by_month.items():
+            if month not in self._writers:
+                directory = self.dataset_dir / f"month={month}"
+                directory.mkdir(parents=True, exist_ok=True)
+                tmp = directory / f"part-{self.run_id}.parquet.tmp"
+                self._writers[month] = (pq.ParquetWriter(str(tmp), self.schema, compression="zstd"), tmp)
+            table = pa.Table.from_pylist([{name: row.get(name) for name in self.names} for row in month_rows],
+                                         schema=self.schema)
+            self._writers[month][0].write_table(table)
+            self.rows[month] = self.rows.get(month, 0) + len(month_rows)
+
+    def commit(self) -> None:
+        for writer, tmp in self._writers.values():
+            writer.close()
+            tmp.rename(tmp.with_suffix(""))  # drop .tmp
+        self._writers.clear()
+
+    def abort(self) -> None:
+        for writer, tmp in self._writers.values():
+            writer.close()
+            tmp.unlink(missing_ok=True)
+        self._writers.clear()
+
+
+# ==================== READERS ====================
+
+def _source_key(path: str) -> str:
+    return os.path.basename(path)
+
+
+def _transcript_sources() -> List[str]:
+    """Files holding conversations and livekit_sessions (the shards in sharded mode)"""
+    return list(getattr(database.get_backend(), 'shard_paths', [])) or [database.DB_PATH]
+
+
+def _id_chunks(path: str, table: str, columns: List[str], after_id: int) -> Iterator[List[Dict]]:
+    conn = get_connection(path)
+    while True:
+        rows = conn.execute(f"""
+            SELECT {', '.join(columns)} FROM {table} WHERE id > ? ORDER BY id LIMIT ?
+        """, (after_id, CHUNK_ROWS)).fetchall()
+        if not rows:
+            return
+        yield [dict(zip(columns, row)) for row in rows]
+        after_id = rows[-1][0]
+
+
+def _session_stats(conn, session_ids: List[str], snapshot_at: datetime) -> Dict[str, Dict]:
+    """Stats per session over hot and archived rows"""
+    placeholders = ", ".join("?" for _ in session_ids)
+    rows = conn.execute(f"""
+        SELECT session_id, id, customer_email, message_type, message_text, language, created_at
+        FROM conversations WHERE session_id IN ({placeholders})
+        ORDER BY session_id, id
+    """, session_ids).fetchall()
+    messages: Dict[str, List[tuple]] = {session_id: [] for session_id in session_ids}
+    for session_id in session_ids:
+        # Archived rows all precede the session's remaining hot rows
+        messages[session_id].extend(load_archived_rows(conn, session_id))
+    for row in rows:
+        messages[row[0]].append(row[1:])
+
+    stats = {}
+    for session_id, rows in messages.items():
+        if not rows:
+            continue
+        first, last = _timestamp(rows[0][5]), _timestamp(rows[-1][5])
+        stats[session_id] = {
+            'session_id': session_id,
+            'customer_email': next((r[1] for r in reversed(rows) if r[1]), None),
+            'message_count': len(rows),
+            'user_messages': sum(1 for r in rows if r[2] == 'user'),
+            'assistant_messages': sum(1 for r in rows if r[2] == 'assistant'),
+            'total_chars': sum(len(r[3] or '') for r in rows),
+            'first_message_at': first,
+            'last_message_at': last,
+            'duration_seconds': (last - first).total_seconds() if first and last else None,
+            'languages': ",".join(sorted({r[4] for r in rows if r[4]})),
+            'snapshot_at': snapshot_at,
+        }
+    return stats
+
+
+def _transcript_stat_chunks(path: str, state: Dict, snapshot_at: datetime,
+                            idle_minutes: int) -> Iterator[List[Dict]]:
+    """Stats rows for calls with messages after state['last_id'] that have gone idle.
+
+    Updates state in place: last_id advances and calls still in progress are kept
+    in state['pending'] to be checked again next run.
+    """
+    conn = get_connection(path)
+    last_id = state.get('last_id', 0)
+    high_water = conn.execute("""
+        SELECT MAX(m) FROM (SELECT MAX(id) AS m FROM conversations
+                            UNION ALL SELECT MAX(last_message_id) FROM conversation_archive)
+    """).fetchone()[0] or last_id
+    candidates = sorted(set(state.get('pending', [])) | {row[0] for row in conn.execute("""
+        SELECT DISTINCT session_id FROM conversations WHERE id > ? AND id <= ?
+        UNION
+        SELECT session_id FROM conversation_archive WHERE last_message_id > ?
+    """, (last_id, high_water, last_id))})
+
+    idle_before = snapshot_at - timedelta(minutes=idle_minutes)
+    pending = []
+    batch = max(1, CHUNK_ROWS // 50)  # calls per stats query
+    for start in range(0, len(candidates), batch):
+        chunk = []
+        for session_id, row in _session_stats(conn, candidates[start:start + batch], snapshot_at).items():
+            if row['last_message_at'] and row['last_message_at'] > idle_before:
+                pending.append(session_id)
+            else:
+                chunk.append(row)
+        if chunk:
+            yield chunk
+
+    state['last_id'] = high_water
+    state['pending'] = pending
+
+
+# ==================== BUILD ====================
+
+def _load_state(output: Path) -> Dict:
+    try:
+        return json.loads((output / STATE_FILE).read_text())
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_state(output: Path, state: Dict) -> None:
+    tmp = output / (STATE_FILE + ".tmp")
+    tmp.write_text(json.dumps(state, indent=2))
+    os.replace(tmp, output / STATE_FILE)
+
+
+def build_snapshots(output_dir: str, full: bool = False,
+                    idle_minutes: int = SESSION_IDLE_MINUTES) -> Dict:
+    """Append rows added since the last run (or rebuild with full=True); returns rows per dataset"""
+    if pa is None:
+        raise RuntimeError("Parquet snapshots need pyarrow (pip install pyarrow)")
+    if not database.get_backend().name.startswith('sqlite'):
+        raise ValueError("Snapshots read the SQLite files directly; not available for this backend")
+
+    started = time.perf_counter()
+    database.flush_pending_writes()
+    output = Path(output_dir)
+    datasets = ("travel_bookings", "livekit_sessions", "transcript_stats")
+    if full:
+        for name in datasets:
+            shutil.rmtree(output / name, ignore_errors=True)
+        (output / STATE_FILE).unlink(missing_ok=True)
+    output.mkdir(parents=True, exist_ok=True)
+    for stale in output.glob("*/month=*/*.parquet.tmp"):  # left by an interrupted run
+        stale.unlink()
+
+    state = _load_state(output)
+    new_state = json.loads(json.dumps(state))  # saved only once every part is in place
+    run_id = f"{datetime.now():%Y%m%dT%H%M%S}-{uuid.uuid4().hex[:6]}"
+    snapshot_at = datetime.now()
+    booking_fields = [name for name, _ in BOOKING_COLUMNS]
+    session_fields = [name for name, _ in SESSION_COLUMNS]
+
+    jobs = [
+        ("travel_bookings", BOOKING_COLUMNS, "created_at", [
+            (path, lambda path, s: _id_chunks(path, "travel_bookings", booking_fields, s.get('last_id', 0)))
+            for path in [database.DB_PATH]
+        ]),
+        ("livekit_sessions", SESSION_COLUMNS, "created_at", [
+            (path, lambda path, s: _id_chunks(path, "livekit_sessions", session_fields, s.get('last_id', 0)))
+            for path in _transcript_sources()
+        ]),
+        ("transcript_stats", TRANSCRIPT_STATS_COLUMNS, "first_message_at", [
+            (path, lambda path, s: _transcript_stat_chunks(path, s, snapshot_at, idle_minutes))
+            for path in _transcript_sources()
+        ]),
+    ]
+
+    writers = []
+    report = {'run_id': run_id, 'output': str(output), 'datasets': {}}
+    try:
+        for name, columns, month_field, sources in jobs:
+            writer = _MonthPartitionedWriter(output / name, columns, run_id, month_field)
+            writers.append(writer)
+            for path, chunks in sources:
+                source_state = new_state.setdefault(name, {}).setdefault(_source_key(path), {})
+                for chunk in chunks(path, source_state):
+                    writer.write(chunk)
+                    if 'id' in chunk[-1]:
+                        source_state['last_id'] = chunk[-1]['id']
+            report['datasets'][name] = {'rows': sum(writer.rows.values()), 'months': dict(sorted(writer.rows.items()))}
+        for writer in writers:
+            writer.commit()
+    except BaseException:
+        for writer in writers:
+            writer.abort()
+        raise
+
+    new_state['last_run'] = {'run_id': run_id, 'at': snapshot_at.isoformat()}
+    _save_state(output, new_state)
+    report['duration_ms'] = round((time.perf_counter() - started) * 1000, 1)
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write Parquet analytics snapshots partitioned by month")
+    parser.add_argument("-o", "--output", default=SNAPSHOT_DIR or None, required=not SNAPSHOT_DIR,
+                        help="snapshot directory (default: ANALYTICS_SNAPSHOT_DIR)")
+    parser.add_argument("--full", action="store_true", help="discard existing snapshots and rebuild")
+    parser.add_argument("--idle-minutes", type=int, default=SESSION_IDLE_MINUTES,
+                        help="calls idle this long are complete enough for transcript_stats")
+    args = parser.parse_args()
+
+    print(json.dumps(build_snapshots(args.output, args.full, args.idle_minutes), indent=2))
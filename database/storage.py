@@ -0,0 +1,374 @@
+"""
+Pluggable storage backends behind the DAO functions in database.py
+
+database.py keeps its public functions; each call is routed to the backend
+selected by DATABASE_URL (the `database_url` setting):
+
+    (unset) / sqlite://...        SQLiteBackend - the built-in implementation in
+                                  database.py, file at CUSTOMERS_DB_PATH
+    sqlite+sharded://[dir]?shards=N
+                                  ShardedSQLiteBackend (sharding.py) - transcripts and
+                                  LiveKit sessions spread over N files by key hash
+    postgresql://... / postgres://...
+                                  PostgresBackend (postgres_backend.py), asyncpg pool
+
+Every backend implements the functions listed in STORAGE_API with the same
+arguments and return shapes; tests/test_storage_conformance.py checks that.
+"""
+
+import base64
+import json
+from datetime import date, datetime, timedelta
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import urlparse
+
+# DAO functions every backend must provide (same signatures as database.py)
+STORAGE_API: Tuple[str, ...] = (
+    # customers
+    "get_or_create_customer",
+    "get_customer_credentials",
+    "create_customer",
+    "set_password_reset_token",
+    "update_customer_password",
+    # bookings
+    "create_travel_booking",
+    "get_customer_bookings",
+    "list_customer_bookings",
+    "get_customer_dashboard",
+    "cancel_booking",
+    "reschedule_booking",
+    "bulk_update_bookings",
+    "get_booking_analytics",
+    # conversations
+    "save_conversation",
+    "get_conversation_history",
+    "search_conversations",
+    # livekit sessions
+    "record_livekit_session",
+    "get_livekit_session",
+    "update_livekit_session_activity",
+    "get_transcript_by_session",
+    "get_livekit_transcript",
+    # bulk export (keyset pages in id order)
+    "export_conversations",
+    "export_bookings",
+)
+
+SQLITE_SCHEMES = ("", "sqlite")
+SHARDED_SQLITE_SCHEMES = ("sqlite+sharded",)
+POSTGRES_SCHEMES = ("postgres", "postgresql", "postgresql+asyncpg")
+
+
+class StorageBackend:
+    """Base class for storage backends: one method per name in STORAGE_API."""
+
+    name = "base"
+
+    def __init__(self, url: str):
+        self.url = url
+
+    def init_schema(self):
+        """Create or upgrade the schema; returns what was applied."""
+        raise NotImplementedError
+
+    def close(self) -> None:
+        """Release connections held by the backend."""
+
+    def stats(self) -> Dict:
+        return {'backend': self.name}
+
+    def __getattr__(self, name: str):
+        if name in STORAGE_API:
+            raise NotImplementedError(f"{type(self).__name__} does not implement {name}()")
+        raise AttributeError(name)
+
+
+class SQLiteBackend(StorageBackend):
+    """The built-in SQLite implementation (the functions defined in database.py)."""
+
+    name = "sqlite"
+
+    def __init__(self, url: str, implementations: Dict[str, Callable]):
+        super().__init__(url)
+        missing = [name for name in STORAGE_API if name not in implementations]
+        if missing:
+            raise ValueError(f"SQLite backend is missing: {', '.join(missing)}")
+        self.implementations = implementations
+        # Bound straight to the module functions, so dispatch adds no extra layer;
+        # subclasses keep the methods they define themselves
+        for name in STORAGE_API:
+            if name not in vars(type(self)):
+                setattr(self, name, implementations[name])
+
+
+def url_scheme(url: Optional[str]) -> str:
+    return urlparse(url or "").scheme.lower()
+
+
+def create_backend(url: Optional[str], sqlite_implementations: Dict[str, Callable]) -> StorageBackend:
+    """Build the backend for a database URL (ValueError for unsupported schemes)."""
+    scheme = url_scheme(url)
+    if scheme in SQLITE_SCHEMES:
+        return SQLiteBackend(url or "", sqlite_implementations)
+    if scheme in SHARDED_SQLITE_SCHEMES:
+        from sharding import ShardedSQLiteBackend
+        return ShardedSQLiteBackend(url, sqlite_implementations)
+    if scheme in POSTGRES_SCHEMES:
+        # Imported lazily: asyncpg is only needed when PostgreSQL is configured
+        from postgres_backend import PostgresBackend
+        return PostgresBackend(url)
+    raise ValueError(f"Unsupported database URL scheme: {scheme!r}")
+
+
+# ==================== SHARED HELPERS ====================
+
+# Columns that list_customer_bookings() can project, keyed by response field name
+BOOKING_FIELDS = {
+    'booking_id': 'id',
+    'service_type': 'service_type',
+    'destination': 'destination',
+    'departure_date': 'departure_date',
+    'return_date': 'return_date',
+    'num_travelers': 'num_travelers',
+    'service_details': 'service_details',
+    'special_requests': 'special_requests',
+    'total_amount': 'total_amount',
+    'confirmation_number': 'confirmation_number',
+    'status': 'status',
+    'created_at': 'created_at',
+}
+
+# Same fields as get_customer_bookings()
+DEFAULT_BOOKING_FIELDS = [name for name in BOOKING_FIELDS if name != 'special_requests']
+
+
+# Columns written by the streaming export (export.py), in output order
+CONVERSATION_EXPORT_FIELDS = ['id', 'customer_email', 'session_id', 'message_type',
+                              'message_text', 'language', 'created_at']
+BOOKING_EXPORT_FIELDS = ['id', 'customer_email'] + [name for name in BOOKING_FIELDS if name != 'booking_id']
+
+
+def encode_cursor(created_at, row_id: int) -> str:
+    """Opaque keyset cursor for (created_at, id)"""
+    raw = json.dumps([str(created_at), row_id]).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor: str) -> tuple:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        created_at, row_id = json.loads(raw)
+        return str(created_at), int(row_id)
+    except (ValueError, TypeError) as e:
+        raise ValueError("Invalid cursor") from e
+
+
+# Cabin classes recognised in service_details, most specific first
+TRAVEL_CLASSES = ("Premium Economy", "First", "Business", "Economy")
+
+
+def parse_route(destination: Optional[str]) -> Tuple[str, str]:
+    """Split a booking destination of the form "X to Y" into (origin, destination).
+
+    Destinations without " to " (hotels, packages) have an empty origin.
+    """
+    text = (destination or '').strip()
+    lowered = text.lower()
+    if ' to ' in lowered:
+        cut = lowered.index(' to ')
+        return text[:cut].strip(), text[cut + 4:].strip()
+    return '', text
+
+
+def travel_class(service_details: Optional[str]) -> str:
+    """Cabin class of a booking, e.g. "Air India - Business Class - ..." -> "Business".
+
+    Other services fall back to the first " - " segment of service_details.
+    """
+    details = (service_details or '').strip()
+    lowered = details.lower()
+    for name in TRAVEL_CLASSES:
+        if name.lower() in lowered:
+            return name
+    return details.split(' - ', 1)[0].strip() or 'Unspecified'
+
+
+# Columns a booking contributes to the rollups, in the order booking_rollup_delta expects
+BOOKING_ROLLUP_COLUMNS = "customer_email, status, total_amount, created_at, destination, service_details"
+
+
+def booking_rollup_delta(booking: tuple, sign: int) -> Dict:
+    """One booking's contribution to the dashboard and analytics rollups, scaled by sign (+1/-1).
+
+    `booking` is (customer_email, status, total_amount, created_at, destination, service_details).
+    """
+    email, status, amount, created_at, destination, service_details = booking
+    status = status or ''
+    amount = amount or 0
+    active = int(status != 'cancelled')
+    origin, route_destination = parse_route(destination)
+    return {
+        'customer_email': email,
+        'status': status or 'unknown',
+        'bookings': sign,
+        'active': sign * active,
+        'cancelled': sign * (1 - active),
+        'upcoming': sign * int(status in ('confirmed', 'pending')),
+        'amount': sign * amount,
+        'active_amount': sign * amount * active,
+        'last_booking_at': created_at if sign > 0 else None,
+        'month': str(created_at)[:7] if created_at else None,
+        'day': str(created_at)[:10] if created_at else None,
+        'destination': destination or None,
+        'route': (origin, route_destination),
+        'travel_class': travel_class(service_details),
+    }
+
+
+def daily_analytics_rows(bookings: Iterable[tuple]) -> Tuple[List[tuple], List[tuple], List[tuple]]:
+    """Backfill rows for the daily analytics tables from (BOOKING_ROLLUP_COLUMNS) tuples.
+
+    Returns (day, bookings, cancelled, gross_amount, revenue),
+    (day, origin, destination, bookings, cancelled, revenue) and
+    (day, travel_class, bookings, revenue) rows.
+    """
+    daily: Dict[str, list] = {}
+    routes: Dict[tuple, list] = {}
+    classes: Dict[tuple, list] = {}
+    for booking in bookings:
+        d = booking_rollup_delta(tuple(booking), 1)
+        if not d['day']:
+            continue
+        day = daily.setdefault(d['day'], [0, 0, 0.0, 0.0])
+        route = routes.setdefault((d['day'], *d['route']), [0, 0, 0.0])
+        cabin = classes.setdefault((d['day'], d['travel_class']), [0, 0.0])
+        for totals, values in ((day, (1, d['cancelled'], d['amount'], d['active_amount'])),
+                               (route, (1, d['cancelled'], d['active_amount'])),
+                               (cabin, (1, d['active_amount']))):
+            for i, value in enumerate(values):
+                totals[i] += value
+    return ([(key, *values) for key, values in daily.items()],
+            [(*key, *values) for key, values in routes.items()],
+            [(*key, *values) for key, values in classes.items()])
+
+
+def validate_date_range(date_from: Optional[str], date_to: Optional[str]) -> None:
+    """ValueError unless each given bound is YYYY-MM-DD or an ISO timestamp (created_at filters)"""
+    for value in (date_from, date_to):
+        if value:
+            try:
+                datetime.fromisoformat(value)
+            except (TypeError, ValueError):
+                raise ValueError(f"Invalid date '{value}', expected YYYY-MM-DD or an ISO timestamp")
+
+
+def analytics_range(date_from: Optional[str], date_to: Optional[str]) -> Tuple[str, str]:
+    """Validated (first day, last day) for the admin analytics, default the last 30 days"""
+    try:
+        last = date.fromisoformat(date_to[:10]) if date_to else date.today()
+        first = date.fromisoformat(date_from[:10]) if date_from else last - timedelta(days=29)
+    except ValueError:
+        raise ValueError("Dates must be YYYY-MM-DD")
+    if first > last:
+        raise ValueError("date_from is after date_to")
+    return first.isoformat(), last.isoformat()
+
+
+def booking_analytics_report(date_from: str, date_to: str, daily: List[tuple],
+                             routes: List[tuple], classes: List[tuple]) -> Dict:
+    """Response of get_booking_analytics() from the rollup rows.
+
+    daily rows are (day, bookings, cancelled, gross_amount, revenue), routes
+    (origin, destination, bookings, cancelled, revenue) and classes
+    (travel_class, bookings, revenue).
+    """
+    bookings = sum(r[1] for r in daily)
+    cancelled = sum(r[2] for r in daily)
+    return {
+        'date_from': date_from,
+        'date_to': date_to,
+        'totals': {
+            'bookings': bookings,
+            'cancelled_bookings': cancelled,
+            'cancellation_rate': round(cancelled / bookings, 4) if bookings else 0.0,
+            'gross_amount': sum(r[3] for r in daily),
+            'revenue': sum(r[4] for r in daily),
+        },
+        'revenue_per_day': [
+            {'day': r[0], 'bookings': r[1], 'cancelled_bookings': r[2], 'gross_amount': r[3], 'revenue': r[4]}
+            for r in daily if r[1]
+        ],
+        'routes': [
+            {'origin': r[0] or None, 'destination': r[1], 'bookings': r[2], 'cancelled_bookings': r[3],
+             'cancellation_rate': round(r[3] / r[2], 4) if r[2] else 0.0, 'revenue': r[4]}
+            for r in routes if r[2]
+        ],
+        'class_mix': [
+            {'travel_class': r[0], 'bookings': r[1], 'share': round(r[1] / bookings, 4) if bookings else 0.0,
+             'revenue': r[2]}
+            for r in classes if r[1]
+        ],
+    }
+
+
+# Largest batch bulk_update_bookings() accepts (one IN (...) ownership query)
+MAX_BULK_BOOKING_OPERATIONS = 500
+
+
+def bulk_booking_ids(operations: List[Dict]) -> List[int]:
+    """Distinct booking ids referenced by a bulk_update_bookings() batch"""
+    ids = set()
+    for op in operations:
+        try:
+            ids.add(int(op.get('booking_id')))
+        except (AttributeError, TypeError, ValueError):
+            pass
+    return sorted(ids)
+
+
+def plan_bulk_booking_operations(operations: List[Dict], statuses: Dict[int, str]) -> Tuple[List[Dict], List[int], List[tuple]]:
+    """Check each cancel/reschedule operation against the caller's bookings.
+
+    `statuses` maps the customer's booking ids to their current status. Operations
+    are checked in order, so a booking cancelled earlier in the batch cannot be
+    rescheduled later in it. Returns (per-item results, ids to cancel,
+    (new_departure_date, new_return_date, id) to reschedule).
+    """
+    statuses = dict(statuses)
+    results, cancels, reschedules = [], [], []
+    for index, op in enumerate(operations):
+        op = op if isinstance(op, dict) else {}
+        kind = op.get('op')
+        try:
+            booking_id = int(op.get('booking_id'))
+        except (TypeError, ValueError):
+            booking_id = None
+        result = {'index': index, 'op': kind, 'booking_id': booking_id, 'success': False}
+        results.append(result)
+
+        if kind not in ('cancel', 'reschedule'):
+            result['message'] = "Unknown operation, expected 'cancel' or 'reschedule'"
+        elif booking_id not in statuses:
+            result['message'] = 'Booking not found or access denied'
+        elif kind == 'cancel':
+            if statuses[booking_id] == 'cancelled':
+                result['message'] = 'Booking is already cancelled'
+            else:
+                statuses[booking_id] = 'cancelled'
+                cancels.append(booking_id)
+                result.update(success=True, message='Booking cancelled successfully')
+        elif statuses[booking_id] == 'cancelled':
+            result['message'] = 'Cannot reschedule a cancelled booking'
+        elif not op.get('new_departure_date') and not op.get('new_return_date'):
+            result['message'] = 'No new dates provided'
+        else:
+            dates = (op.get('new_departure_date'), op.get('new_return_date'))
+            reschedules.append((*dates, booking_id))
+            result.update(success=True, message='Booking rescheduled successfully',
+                          new_departure_date=dates[0], new_return_date=dates[1])
+    return results, cancels, reschedules
+
+
+def bulk_booking_summary(results: List[Dict]) -> Dict:
+    succeeded = sum(1 for r in results if r['success'])
+    return {'success': True, 'succeeded': succeeded, 'failed': len(results) - succeeded, 'results': results}
@@ -0,0 +1,228 @@
+"""
+Hot/cold tiering for conversation transcripts
+
+Sessions whose last message is older than ARCHIVE_AFTER_DAYS are moved out of
+`conversations` into `conversation_archive`, one compressed blob per session.
+get_transcript_by_session(), get_livekit_transcript() and chat history merge
+archived rows back in transparently. Full-text search only covers the hot
+table; its results count the archived sessions it did not search.
+
+Usage:
+    python transcript_archive.py                    # archive sessions older than the default age
+    python transcript_archive.py --older-than-days 30 --codec zstd
+    python transcript_archive.py --dry-run          # report what would be archived
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+import time
+import zlib
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+try:
+    import zstandard
+except ImportError:  # zstd is optional; zlib is always available
+    zstandard = None
+
+from connection_pool import get_connection
+
+ARCHIVE_AFTER_DAYS = int(os.getenv("TRANSCRIPT_ARCHIVE_AFTER_DAYS", "7"))
+ARCHIVE_CODEC = os.getenv("TRANSCRIPT_ARCHIVE_CODEC", "zlib")
+SESSIONS_PER_TRANSACTION = 50  # keeps each write lock short while the app is running
+
+# Row layout inside a payload (conversations columns, created_at as text)
+_ROW_COLUMNS = "id, customer_email, message_type, message_text, language, created_at"
+
+
+# ==================== CODECS ====================
+
+def _compress(codec: str, data: bytes) -> bytes:
+    if codec == "zlib":
+        return zlib.compress(data, 9)
+    if codec == "zstd":
+        if zstandard is None:
+            raise RuntimeError("zstd archiving needs the zstandard package (pip install zstandard)")
+        return zstandard.ZstdCompressor(level=10).compress(data)
+    raise ValueError(f"Unknown archive codec: {codec}")
+
+
+def _decompress(codec: str, payload: bytes) -> bytes:
+    if codec == "zlib":
+        return zlib.decompress(payload)
+    if codec == "zstd":
+        if zstandard is None:
+            raise RuntimeError("archived transcript is zstd-compressed but zstandard is not installed")
+        return zstandard.ZstdDecompressor().decompress(payload)
+    raise ValueError(f"Unknown archive codec: {codec}")
+
+
+def _encode_rows(rows: List[Tuple]) -> bytes:
+    return json.dumps([[str(v) if isinstance(v, datetime) else v for v in row] for row in rows],
+                      ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+# ==================== READ PATH ====================
+
+def load_archived_rows(conn: sqlite3.Connection, session_id: str,
+                       since_id: Optional[int] = None) -> List[Tuple]:
+    """Archived rows of a session with id > since_id, oldest first.
+
+    Rows use the conversations column order: (id, customer_email, message_type,
+    message_text, language, created_at). Returns [] without decompressing when
+    the session has no archived rows after since_id.
+    """
+    row = conn.execute("""
+        SELECT codec, payload FROM conversation_archive
+        WHERE session_id = ? AND last_message_id > ?
+    """, (session_id, since_id if since_id is not None else -1)).fetchone()
+    if not row:
+        return []
+
+    rows = json.loads(_decompress(row[0], row[1]))
+    if since_id is not None:
+        rows = [r for r in rows if r[0] > since_id]
+    return [tuple(r) for r in rows]
+
+
+# ==================== TIERING JOB ====================
+
+def _pages_in_use(conn: sqlite3.Connection) -> int:
+    page_count = conn.execute("PRAGMA page_count").fetchone()[0]
+    freelist = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    return page_count - freelist
+
+
+def _archive_session(conn: sqlite3.Connection, session_id: str, last_id: int, codec: str) -> Tuple[int, int, int]:
+    """Move one session's rows (id <= last_id) into the archive; returns (rows, raw, compressed)."""
+    rows = conn.execute(f"""
+        SELECT {_ROW_COLUMNS} FROM conversations
+        WHERE session_id = ? AND id <= ?
+        ORDER BY id
+    """, (session_id, last_id)).fetchall()
+    if not rows:
+        return 0, 0, 0
+
+    # A session that was archived before and got more rows afterwards: merge
+    existing = conn.execute("""
+        SELECT codec, payload, raw_bytes FROM conversation_archive WHERE session_id = ?
+    """, (session_id,)).fetchone()
+    previous = [tuple(r) for r in json.loads(_decompress(existing[0], existing[1]))] if existing else []
+    all_rows = previous + [tuple(r) for r in rows]
+
+    raw = _encode_rows(all_rows)
+    payload = _compress(codec, raw)
+    customer_email = next((r[1] for r in reversed(all_rows) if r[1]), None)
+
+    conn.execute("""
+        INSERT OR REPLACE INTO conversation_archive
+        (session_id, customer_email, message_count, first_message_id, last_message_id,
+         started_at, ended_at, codec, raw_bytes, compressed_bytes, payload, archived_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """, (session_id, customer_email, len(all_rows), all_rows[0][0], all_rows[-1][0],
+          str(all_rows[0][5]), str(all_rows[-1][5]), codec, len(raw), len(payload),
+          payload, datetime.now()))
+    conn.execute("DELETE FROM conversations WHERE session_id = ? AND id <= ?", (session_id, last_id))
+
+    # Report only what this run added to the archive
+    if existing:
+        return len(rows), len(raw) - existing[2], len(payload) - len(existing[1])
+    return len(rows), len(raw), len(payload)
+
+
+def archive_old_sessions(db_path: str, older_than_days: int = ARCHIVE_AFTER_DAYS,
+                         codec: str = ARCHIVE_CODEC, max_sessions: Optional[int] = None,
+                         dry_run: bool = False) -> Dict:
+    """Move sessions with no messages newer than `older_than_days` to the archive.
+
+    Returns a report with the rows moved, raw vs compressed size and the pages
+    no longer used by the database (freed pages are reused by new writes; the
+    file itself shrinks after a VACUUM / incremental_vacuum).
+    """
+    _compress(codec, b"")  # fail fast on an unknown or unavailable codec
+    started = time.perf_counter()
+    conn = get_connection(db_path)
+    cutoff = datetime.now() - timedelta(days=older_than_days)
+
+    candidates = conn.execute("""
+        SELECT session_id, MAX(id) FROM conversations
+        GROUP BY session_id
+        HAVING MAX(created_at) < ?
+        ORDER BY MAX(id)
+        LIMIT ?
+    """, (cutoff, max_sessions if max_sessions else -1)).fetchall()
+
+    page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+    pages_before = _pages_in_use(conn)
+    report = {
+        'cutoff': str(cutoff),
+        'codec': codec,
+        'dry_run': dry_run,
+        'sessions_archived': 0,
+        'rows_archived': 0,
+        'raw_bytes': 0,
+        'compressed_bytes': 0,
+    }
+
+    if dry_run:
+        report['sessions_archived'] = len(candidates)
+        report['rows_archived'] = sum(
+            conn.execute("SELECT COUNT(*) FROM conversations WHERE session_id = ? AND id <= ?",
+                         (session_id, last_id)).fetchone()[0]
+            for session_id, last_id in candidates
+        )
+    else:
+        for start in range(0, len(candidates), SESSIONS_PER_TRANSACTION):
+            with conn:
+                for session_id, last_id in candidates[start:start + SESSIONS_PER_TRANSACTION]:
+                    rows, raw, compressed = _archive_session(conn, session_id, last_id, codec)
+                    report['sessions_archived'] += 1 if rows else 0
+                    report['rows_archived'] += rows
+                    report['raw_bytes'] += raw
+                    report['compressed_bytes'] += compressed
+
+    pages_after = _pages_in_use(conn)
+    report.update({
+        'compression_ratio': round(report['raw_bytes'] / report['compressed_bytes'], 2)
+        if report['compressed_bytes'] > 0 else None,
+        'pages_in_use_before': pages_before,
+        'pages_in_use_after': pages_after,
+        'bytes_reclaimed': (pages_before - pages_after) * page_size,
+        'duration_ms': round((time.perf_counter() - started) * 1000, 1),
+    })
+    return report
+
+
+def archive_stats(db_path: str) -> Dict:
+    """Size of the cold tier"""
+    conn = get_connection(db_path)
+    sessions, messages, raw, compressed = conn.execute("""
+        SELECT COUNT(*), COALESCE(SUM(message_count), 0),
+               COALESCE(SUM(raw_bytes), 0), COALESCE(SUM(compressed_bytes), 0)
+        FROM conversation_archive
+    """).fetchone()
+    return {
+        'archived_sessions': sessions,
+        'archived_messages': messages,
+        'raw_bytes': raw,
+        'compressed_bytes': compressed,
+    }
+
+
+if __name__ == "__main__":
+    import database
+
+    parser = argparse.ArgumentParser(description="Move old transcripts to the compressed archive")
+    parser.add_argument("--older-than-days", type=int, default=ARCHIVE_AFTER_DAYS,
+                        help=f"archive sessions idle for this many days (default {ARCHIVE_AFTER_DAYS})")
+    parser.add_argument("--codec", choices=["zlib", "zstd"], default=ARCHIVE_CODEC)
+    parser.add_argument("--max-sessions", type=int, default=None, help="stop after this many sessions")
+    parser.add_argument("--dry-run", action="store_true", help="report without moving anything")
+    args = parser.parse_args()
+
+    database.flush_pending_writes()
+    result = archive_old_sessions(database.DB_PATH, args.older_than_days, args.codec,
+                                  args.max_sessions, args.dry_run)
+    print(json.dumps(result, indent=2))
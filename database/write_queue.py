@@ -0,0 +1,286 @@
+"""
+Group-commit write-behind queue for transcript persistence
+
+Transcript rows and LiveKit session-activity updates are buffered in memory and
+written by a background thread in a single transaction every FLUSH_INTERVAL_MS
+or as soon as MAX_BATCH_ROWS are pending, so a busy call costs one commit per
+batch instead of one per utterance. Callers that need read-your-writes can pass
+wait=True to block until their row is committed.
+"""
+
+import logging
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+from connection_pool import get_connection
+
+logger = logging.getLogger(__name__)
+
+FLUSH_INTERVAL_MS = 50     # flush at least this often while rows are pending
+MAX_BATCH_ROWS = 200       # flush immediately once this many rows are pending
+MAX_PENDING_ROWS = 10000   # enqueue blocks (backpressure) above this many rows
+MAX_FLUSH_RETRIES = 20     # consecutive locked/busy failures before a batch is dropped
+MAX_RETRY_DELAY = 1.0      # seconds; retry delay doubles from FLUSH_INTERVAL_MS up to this
+
+_INSERT_CONVERSATION = """
+    INSERT INTO conversations
+    (customer_email, session_id, message_type, message_text, language, created_at)
+    VALUES (?, ?, ?, ?, ?, ?)
+"""
+
+_UPDATE_SESSION_ACTIVITY = """
+    UPDATE livekit_sessions
+    SET updated_at = ?,
+        customer_email = COALESCE(?, customer_email),
+        last_transcript_at = COALESCE(?, last_transcript_at)
+    WHERE room_name = ?
+"""
+
+
+def _is_transient(error: sqlite3.OperationalError) -> bool:
+    """Locked/busy errors go away on retry; e.g. "no such table" or "disk I/O error" do not"""
+    message = str(error).lower()
+    return "locked" in message or "busy" in message
+
+
+class _Waiter:
+    """Completion handle for a caller that asked to wait for its commit."""
+
+    __slots__ = ("event", "error")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.error: Optional[BaseException] = None
+
+
+class WriteBehindQueue:
+    """Buffers conversation inserts and session updates, committing them in batches."""
+
+    def __init__(self, db_path: str, flush_interval_ms: int = FLUSH_INTERVAL_MS,
+                 max_batch_rows: int = MAX_BATCH_ROWS, max_pending_rows: int = MAX_PENDING_ROWS,
+                 max_flush_retries: int = MAX_FLUSH_RETRIES,
+                 on_sessions_written: Optional[Callable[[Dict[str, List]], None]] = None):
+        self.db_path = db_path
+        # Called with {room_name: [updated_at, customer_email, last_transcript_at]}
+        # after session updates are committed (used to keep the session cache fresh)
+        self.on_sessions_written = on_sessions_written
+        self.flush_interval = flush_interval_ms / 1000.0
+        self.max_batch_rows = max_batch_rows
+        self.max_pending_rows = max_pending_rows
+        self.max_flush_retries = max_flush_retries
+        self._failed_attempts = 0  # consecutive transient flush failures
+
+        self._cond = threading.Condition()
+        self._conversations: List[Tuple] = []
+        # room_name -> [updated_at, customer_email, last_transcript_at], coalesced per room
+        self._sessions: Dict[str, List] = {}
+        self._waiters: List[_Waiter] = []
+        self._flush_requested = False
+        self._stopping = False
+
+        self._stats = {
+            'batches': 0,
+            'rows_written': 0,
+            'session_updates_written': 0,
+            'rows_dropped': 0,
+            'retries': 0,
+            'last_batch_rows': 0,
+            'last_flush_ms': 0.0,
+        }
+
+        self._thread = threading.Thread(target=self._run, name="db-write-behind", daemon=True)
+        self._thread.start()
+
+    # ---------- producers ----------
+
+    def _pending_rows(self) -> int:
+        return len(self._conversations) + len(self._sessions)
+
+    def _enqueue(self, add, wait: bool, timeout: Optional[float]) -> None:
+        waiter = _Waiter() if wait else None
+        with self._cond:
+            if self._stopping:
+                raise RuntimeError("write-behind queue is shut down")
+            while self._pending_rows() >= self.max_pending_rows and not self._stopping:
+                self._flush_requested = True
+                self._cond.notify_all()
+                self._cond.wait(self.flush_interval)
+            if self._stopping:
+                raise RuntimeError("write-behind queue is shut down")
+            add()
+            if waiter:
+                self._waiters.append(waiter)
+                self._flush_requested = True
+            if wait or self._pending_rows() >= self.max_batch_rows:
+                self._cond.notify_all()
+
+        if waiter:
+            if not waiter.event.wait(timeout):
+                raise TimeoutError("timed out waiting for write-behind commit")
+            if waiter.error:
+                raise waiter.error
+
+    def add_conversation(self, customer_email: str, session_id: str, message_type: str,
+                         message_text: str, language: str, created_at: datetime,
+                         wait: bool = False, timeout: Optional[float] = None) -> None:
+        """Queue a conversation row; with wait=True, return only after it is committed."""
+        row = (customer_email, session_id, message_type, message_text, language, created_at)
+        self._enqueue(lambda: self._conversations.append(row), wait, timeout)
+
+    def add_session_activity(self, room_name: str, customer_email: Optional[str] = None,
+                             last_transcript_at: Optional[datetime] = None,
+                             wait: bool = False, timeout: Optional[float] = None) -> None:
+        """Queue a session activity update; repeated updates for a room are coalesced."""
+        def add():
+            update = self._sessions.get(room_name)
+            if update is None:
+                self._sessions[room_name] = [datetime.now(), customer_email, last_transcript_at]
+            else:
+                update[0] = datetime.now()
+                update[1] = customer_email or update[1]
+                update[2] = last_transcript_at or update[2]
+        self._enqueue(add, wait, timeout)
+
+    def flush(self, timeout: Optional[float] = None) -> None:
+        """Block until everything queued so far has been committed."""
+        self._enqueue(lambda: None, True, timeout)
+
+    # ---------- flusher ----------
+
+    def _take_batch(self):
+        conversations, self._conversations = self._conversations, []
+        sessions, self._sessions = self._sessions, {}
+        waiters, self._waiters = self._waiters, []
+        self._flush_requested = False
+        return conversations, sessions, waiters
+
+    def _requeue(self, conversations, sessions, waiters) -> None:
+        """Put a batch that hit a transient error back in front of newer rows."""
+        self._conversations = conversations + self._conversations
+        for room_name, update in sessions.items():
+            newer = self._sessions.get(room_name)
+            if newer:
+                newer[1] = newer[1] or update[1]
+                newer[2] = newer[2] or update[2]
+            else:
+                self._sessions[room_name] = update
+        self._waiters = waiters + self._waiters
+
+    def _write(self, conn: sqlite3.Connection, conversations, sessions) -> None:
+        with conn:
+            if conversations:
+                conn.executemany(_INSERT_CONVERSATION, conversations)
+            if sessions:
+                conn.executemany(
+                    _UPDATE_SESSION_ACTIVITY,
+                    [(u[0], u[1], u[2], room_name) for room_name, u in sessions.items()]
+                )
+
+    def _write_rows_individually(self, conn: sqlite3.Connection, conversations, sessions) -> None:
+        """Fallback after a non-transient batch failure: isolate and drop bad rows."""
+        for row in conversations:
+            try:
+                self._write(conn, [row], {})
+            except sqlite3.DatabaseError as e:
+                self._stats['rows_dropped'] += 1
+                logger.error(f"❌ Dropping transcript row for session {row[1]}: {e}")
+        for room_name, update in sessions.items():
+            try:
+                self._write(conn, [], {room_name: update})
+            except sqlite3.DatabaseError as e:
+                self._stats['rows_dropped'] += 1
+                logger.error(f"❌ Dropping session activity update for room {room_name}: {e}")
+
+    def _flush_once(self, conversations, sessions) -> None:
+        conn = get_connection(self.db_path)
+        started = time.perf_counter()
+        try:
+            self._write(conn, conversations, sessions)
+        except sqlite3.IntegrityError:
+            self._write_rows_individually(conn, conversations, sessions)
+
+        if sessions and self.on_sessions_written:
+            self.on_sessions_written(sessions)
+
+        self._stats['batches'] += 1
+        self._stats['rows_written'] += len(conversations)
+        self._stats['session_updates_written'] += len(sessions)
+        self._stats['last_batch_rows'] = len(conversations) + len(sessions)
+        self._stats['last_flush_ms'] = round((time.perf_counter() - started) * 1000, 3)
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                if not self._pending_rows() and not self._waiters and not self._stopping:
+                    self._cond.wait()
+                # Give the batch a chance to fill up unless a flush is already due
+                deadline = time.monotonic() + self.flush_interval
+                while (not self._stopping and not self._flush_requested
+                       and self._pending_rows() < self.max_batch_rows):
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                stopping = self._stopping
+                conversations, sessions, waiters = self._take_batch()
+
+            error = None
+            if conversations or sessions:
+                try:
+                    self._flush_once(conversations, sessions)
+                    self._failed_attempts = 0
+                except sqlite3.OperationalError as e:
+                    if _is_transient(e) and self._failed_attempts < self.max_flush_retries:
+                        # Locked/busy database: keep the rows and try again, backing off
+                        # (also on the final flush at shutdown, where the retries are bounded too)
+                        self._failed_attempts += 1
+                        self._stats['retries'] += 1
+                        logger.warning(f"⚠️ Write-behind flush failed (attempt {self._failed_attempts}), retrying: {e}")
+                        with self._cond:
+                            self._requeue(conversations, sessions, waiters)
+                        time.sleep(min(self.flush_interval * 2 ** (self._failed_attempts - 1), MAX_RETRY_DELAY))
+                        continue
+                    self._failed_attempts = 0
+                    error = e
+                except Exception as e:
+                    self._failed_attempts = 0
+                    error = e
+
+                if error:
+                    self._stats['rows_dropped'] += len(conversations) + len(sessions)
+                    logger.error(f"❌ Write-behind flush failed, {len(conversations) + len(sessions)} rows lost: {error}")
+
+            for waiter in waiters:
+                waiter.error = error
+                waiter.event.set()
+
+            with self._cond:
+                self._cond.notify_all()  # wake producers blocked on backpressure
+            if stopping:
+                return
+
+    # ---------- lifecycle ----------
+
+    def stop(self, timeout: Optional[float] = 30.0) -> None:
+        """Flush everything still pending and stop the background thread.
+
+        The default timeout leaves room for the final flush's locked/busy retries (~17 s at most).
+        """
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        self._thread.join(timeout)
+
+    def stats(self) -> Dict:
+        """Return queue depth and flush counters."""
+        with self._cond:
+            pending = {
+                'pending_conversations': len(self._conversations),
+                'pending_session_updates': len(self._sessions),
+            }
+        return {**pending, **self._stats,
+                'flush_interval_ms': self.flush_interval * 1000,
+                'max_batch_rows': self.max_batch_rows}
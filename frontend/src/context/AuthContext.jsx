@@ -1,11 +1,22 @@
 import { createContext, useContext, useState, useEffect } from "react";
+import axios from "axios";
 
 const AuthContext = createContext();
+const BASE_URL = "http://localhost:8000";
 
 export function useAuth() {
   return useContext(AuthContext);
 }
 
+// Send the access token with every axios request (the API checks it instead of trusting the email in the URL)
+function setAccessToken(token) {
+  if (token) {
+    axios.defaults.headers.common["Authorization"] = `Bearer ${token}`;
+  } else {
+    delete axios.defaults.headers.common["Authorization"];
+  }
+}
+
 export function AuthProvider({ children }) {
   const [user, setUser] = useState(null);
   const [loading, setLoading] = useState(true);
@@ -14,21 +25,48 @@ export function AuthProvider({ children }) {
     // Check if user is logged in from localStorage
     const storedUser = localStorage.getItem("user");
     if (storedUser) {
-      setUser(JSON.parse(storedUser));
+      const parsed = JSON.parse(storedUser);
+      setAccessToken(parsed.accessToken);
+      setUser(parsed);
     }
     setLoading(false);
   }, []);
 
   const login = (userData) => {
+    setAccessToken(userData.accessToken);
     setUser(userData);
     localStorage.setItem("user", JSON.stringify(userData));
   };
 
   const logout = () => {
+    setAccessToken(null);
     setUser(null);
     localStorage.removeItem("user");
   };
 
+  useEffect(() => {
+    // Access tokens are short-lived: on a 401, trade the refresh token for a new pair and retry once
+    const interceptor = axios.interceptors.response.use(undefined, async (error) => {
+      const original = error.config;
+      const stored = JSON.parse(localStorage.getItem("user") || "null");
+      if (error.response?.status !== 401 || !original || original._retried ||
+          original.url?.endsWith("/auth/refresh") || !stored?.refreshToken) {
+        throw error;
+      }
+      original._retried = true;
+      try {
+        const { data } = await axios.post(`${BASE_URL}/auth/refresh`, { refresh_token: stored.refreshToken });
+        login({ ...stored, accessToken: data.access_token, refreshToken: data.refresh_token });
+        original.headers["Authorization"] = `Bearer ${data.access_token}`;
+        return axios(original);
+      } catch (refreshError) {
+        logout();
+        throw error;
+      }
+    });
+    return () => axios.interceptors.response.eject(interceptor);
+  }, []);
+
   const value = {
     user,
     login,
@@ -42,4 +80,3 @@ export function AuthProvider({ children }) {
 
   return <AuthContext.Provider value={value}>{children}</AuthContext.Provider>;
 }
-
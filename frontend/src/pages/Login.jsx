@@ -63,7 +63,9 @@ export default function Login() {
         if (response.ok) {
           login({
             email: formData.email,
-            name: data.name || formData.email.split("@")[0]
+            name: data.customer?.name || formData.email.split("@")[0],
+            accessToken: data.access_token,
+            refreshToken: data.refresh_token
           });
           navigate("/dashboard");
         } else {
@@ -98,7 +100,9 @@ export default function Login() {
         if (response.ok) {
           login({
             email: formData.email,
-            name: formData.name
+            name: formData.name,
+            accessToken: data.access_token,
+            refreshToken: data.refresh_token
           });
           navigate("/dashboard");
         } else {
@@ -0,0 +1,535 @@
+"""
+Benchmark suite for the database layer (database/database.py)
+
+Seeds a SQLite file with realistic volumes, then times every public function
+in database.py, first with one caller and then with concurrent threads. For
+each function it reports p50/p99 latency and the plan of every statement the
+call ran (EXPLAIN QUERY PLAN). Tables the plan reads in full (SCAN) count
+towards rows_scanned. vm_steps is the SQLite bytecode work actually done.
+Results are saved as JSON so runs can be compared.
+
+Scales (customers / bookings / conversation rows):
+    small        1k / 10k / 100k      (default, about a minute)
+    medium       10k / 100k / 1M
+    production   100k / 1M / 10M      (seeding takes a while; use --reuse)
+
+Usage:
+    python tests/benchmark_database.py -o bench.json
+    python tests/benchmark_database.py --scale production --db /tmp/bench.db --reuse -o prod.json
+    python tests/benchmark_database.py --only get_customer_dashboard search_conversations
+    python tests/benchmark_database.py --compare before.json after.json
+"""
+
+import argparse
+import inspect
+import json
+import os
+import platform
+import random
+import re
+import sqlite3
+import sys
+import tempfile
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'database'))
+
+SCALES = {
+    'small': {'customers': 1_000, 'bookings': 10_000, 'messages': 100_000},
+    'medium': {'customers': 10_000, 'bookings': 100_000, 'messages': 1_000_000},
+    'production': {'customers': 100_000, 'bookings': 1_000_000, 'messages': 10_000_000},
+}
+MESSAGES_PER_SESSION = 20
+SEED_BATCH_ROWS = 20_000
+SAMPLE_SIZE = 1_000  # existing bookings / sessions the cases pick from
+
+# Public functions that are not timed, with the reason
+NOT_BENCHMARKED = {
+    'shard_scope': "context manager; no database access of its own",
+    'close_backend': "lifecycle: tears down the backend",
+    'shutdown_write_queue': "lifecycle: stops the write-behind thread",
+    'start_maintenance_scheduler': "lifecycle: starts a background thread",
+    'stop_maintenance_scheduler': "lifecycle: stops the background thread",
+}
+
+ROUTES = [("Chennai", "Riyadh"), ("Mumbai", "Jeddah"), ("Delhi", "Dubai"), ("Bangalore", "Riyadh"),
+          ("Hyderabad", "Dammam"), ("Kochi", "Jeddah"), ("Chennai", "Dubai"), ("Mumbai", "Riyadh")]
+CLASSES = [("Economy", 0.75), ("Business", 0.2), ("First", 0.05)]
+AIRLINES = ["Air India", "Saudia", "Emirates", "IndiGo", "flynas"]
+STATUSES = [("confirmed", 0.8), ("pending", 0.05), ("cancelled", 0.15)]
+LANGUAGES = [("en-US", 0.8), ("ar-SA", 0.1), ("ta-IN", 0.05), ("hi-IN", 0.05)]
+PHRASES = ["I want to book a flight to", "What is the baggage allowance for", "Can you change my seat on",
+           "Your booking is confirmed for", "The fare for Business class to", "Please send the itinerary for",
+           "Is there a vegetarian meal on", "Let me check availability to"]
+
+
+def _weighted(rng: random.Random, choices) -> str:
+    values, weights = zip(*choices)
+    return rng.choices(values, weights)[0]
+
+
+def _customer(rng: random.Random, customers: int) -> int:
+    # A few customers book and talk far more than the rest
+    return int(customers * rng.random() ** 3)
+
+
+def _email(index: int) -> str:
+    return f"customer{index}@example.com"
+
+
+# ==================== SEEDING ====================
+
+def _customer_rows(scale: Dict, rng: random.Random, now: datetime):
+    for i in range(scale['customers']):
+        created = now - timedelta(days=rng.uniform(0, 730))
+        yield (_email(i), f"Customer {i}", uuid.uuid4().hex, uuid.uuid4().hex * 2, created, created)
+
+
+def _booking_rows(scale: Dict, rng: random.Random, now: datetime):
+    for _ in range(scale['bookings']):
+        customer = _customer(rng, scale['customers'])
+        origin, destination = rng.choice(ROUTES)
+        cabin = _weighted(rng, CLASSES)
+        created = now - timedelta(days=rng.uniform(0, 365))
+        departure = created + timedelta(days=rng.randint(3, 120))
+        travelers = rng.randint(1, 4)
+        round_trip = rng.random() < 0.6
+        yield (customer + 1, _email(customer), "Flight", f"{origin} to {destination}",
+               departure.strftime('%Y-%m-%d'),
+               (departure + timedelta(days=rng.randint(3, 21))).strftime('%Y-%m-%d') if round_trip else None,
+               travelers, f"{rng.choice(AIRLINES)} - {cabin} Class - Window seat - No preference meal",
+               "Departure: 09:30, Arrival: 13:45",
+               {'Economy': 10000, 'Business': 25000, 'First': 50000}[cabin] * travelers * (2 if round_trip else 1),
+               f"ATR-{rng.randint(10000, 99999)}", _weighted(rng, STATUSES), created)
+
+
+def _session_rows(scale: Dict, rng: random.Random, now: datetime, livekit: List):
+    for session in range(scale['messages'] // MESSAGES_PER_SESSION):
+        customer = _customer(rng, scale['customers'])
+        started = now - timedelta(days=rng.uniform(0, 365))
+        language = _weighted(rng, LANGUAGES)
+        if session % 2 == 0:
+            ended = started + timedelta(seconds=15 * MESSAGES_PER_SESSION)
+            livekit.append((f"room-{session}", f"session-{session}", _email(customer), f"Customer {customer}",
+                            json.dumps({'source': 'benchmark'}), started, ended, ended))
+        for turn in range(MESSAGES_PER_SESSION):
+            origin, destination = rng.choice(ROUTES)
+            yield (_email(customer), f"session-{session}", "user" if turn % 2 == 0 else "assistant",
+                   f"{rng.choice(PHRASES)} {destination} from {origin} on flight {rng.randint(100, 999)}",
+                   language, started + timedelta(seconds=15 * turn))
+
+
+def _insert(conn: sqlite3.Connection, sql: str, rows) -> int:
+    total, batch = 0, []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= SEED_BATCH_ROWS:
+            with conn:
+                conn.executemany(sql, batch)
+            total += len(batch)
+            batch = []
+    if batch:
+        with conn:
+            conn.executemany(sql, batch)
+        total += len(batch)
+    return total
+
+
+def seed(db_path: str, scale: Dict, seed_value: int = 42) -> Dict:
+    """Fill an initialized, empty database with synthetic customers, bookings and calls"""
+    from migrations import _v6_booking_rollups, _v9_booking_daily_analytics
+
+    rng = random.Random(seed_value)
+    now = datetime.now()
+    started = time.perf_counter()
+    conn = sqlite3.connect(db_path)
+    conn.execute("PRAGMA synchronous = OFF")  # a crash mid-seed just means reseeding
+
+    counts = {'customers': _insert(conn, """
+        INSERT INTO customers (email, name, password_salt, password_hash, created_at, last_login)
+        VALUES (?, ?, ?, ?, ?, ?)
+    """, _customer_rows(scale, rng, now))}
+    counts['travel_bookings'] = _insert(conn, """
+        INSERT INTO travel_bookings
+        (customer_id, customer_email, service_type, destination, departure_date, return_date, num_travelers,
+         service_details, special_requests, total_amount, confirmation_number, status, created_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """, _booking_rows(scale, rng, now))
+    livekit = []
+    counts['conversations'] = _insert(conn, """
+        INSERT INTO conversations (customer_email, session_id, message_type, message_text, language, created_at)
+        VALUES (?, ?, ?, ?, ?, ?)
+    """, _session_rows(scale, rng, now, livekit))
+    counts['livekit_sessions'] = _insert(conn, """
+        INSERT INTO livekit_sessions
+        (room_name, session_id, customer_email, participant_name, metadata, created_at, updated_at, last_transcript_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    """, livekit)
+
+    # Rollups are normally maintained by the write path; rebuild them for the bulk load
+    with conn:
+        _v6_booking_rollups(conn.cursor())
+        _v9_booking_daily_analytics(conn.cursor())
+    conn.execute("ANALYZE")
+    conn.execute("CREATE TABLE IF NOT EXISTS bench_meta (key TEXT PRIMARY KEY, value TEXT)")
+    with conn:
+        conn.execute("INSERT OR REPLACE INTO bench_meta VALUES ('scale', ?)", (json.dumps(scale, sort_keys=True),))
+    conn.close()
+    return {'rows': counts, 'seconds': round(time.perf_counter() - started, 1)}
+
+
+def seeded_scale(db_path: str) -> Optional[Dict]:
+    try:
+        conn = sqlite3.connect(db_path)
+        try:
+            row = conn.execute("SELECT value FROM bench_meta WHERE key = 'scale'").fetchone()
+        finally:
+            conn.close()
+    except sqlite3.Error:
+        return None
+    return json.loads(row[0]) if row else None
+
+
+# ==================== CASES ====================
+
+class Case(NamedTuple):
+    name: str
+    kind: str  # read | write | maintenance (maintenance runs once, single caller)
+    call: Callable[[random.Random], object]
+
+
+def build_cases(db, scale: Dict) -> List[Case]:
+    """One case per public database.py function, with inputs drawn from the seeded data"""
+    from connection_pool import get_connection
+
+    conn = get_connection(db.DB_PATH)
+    bookings = conn.execute("SELECT id, customer_email FROM travel_bookings WHERE status != 'cancelled' "
+                            "ORDER BY random() LIMIT ?", (SAMPLE_SIZE,)).fetchall() or [(0, _email(0))]
+    rooms = conn.execute("SELECT room_name, session_id, customer_email FROM livekit_sessions "
+                         "ORDER BY random() LIMIT ?", (SAMPLE_SIZE,)).fetchall() or [("room-0", "session-0", _email(0))]
+    message_ids = [row[0] for row in conn.execute("SELECT id FROM conversations ORDER BY random() LIMIT ?",
+                                                  (SAMPLE_SIZE,))] or [1]
+    max_message, max_booking = (conn.execute("SELECT MAX(id) FROM conversations").fetchone()[0] or 1,
+                                conn.execute("SELECT MAX(id) FROM travel_bookings").fetchone()[0] or 1)
+    customers = scale['customers']
+
+    def email(rng):
+        return _email(_customer(rng, customers))
+
+    def booking(rng):
+        return rng.choice(bookings)
+
+    def room(rng):
+        return rng.choice(rooms)
+
+    def caller(rng):
+        _, session_id, customer_email = room(rng)
+        return customer_email, session_id
+
+    def new_booking(rng):
+        origin, destination = rng.choice(ROUTES)
+        return db.create_travel_booking(email(rng), "Flight", f"{origin} to {destination}", "2026-03-01",
+                                        "2026-03-10", 1, "Air India - Economy Class - Aisle seat", None, 20000)
+
+    def bulk(rng):
+        picked = rng.sample(bookings, min(20, len(bookings)))
+        owner = picked[0][1]  # the rest are rejected per item: same ownership query either way
+        ops = [{'op': 'reschedule', 'booking_id': b[0], 'new_departure_date': "2026-04-01"} for b in picked]
+        return db.bulk_update_bookings(owner, ops)
+
+    return [
+        # customers
+        Case('get_or_create_customer', 'write', lambda rng: db.get_or_create_customer(email(rng))),
+        Case('get_or_create_guest', 'write', lambda rng: db.get_or_create_guest(email(rng))),
+        Case('get_customer_credentials', 'read', lambda rng: db.get_customer_credentials(email(rng))),
+        Case('create_customer', 'write',
+             lambda rng: db.create_customer(f"bench-{uuid.uuid4().hex}@example.com", "Bench", "salt", "hash")),
+        Case('set_password_reset_token', 'write',
+             lambda rng: db.set_password_reset_token(email(rng), uuid.uuid4().hex, datetime.now() + timedelta(hours=1))),
+        Case('update_customer_password', 'write',
+             lambda rng: db.update_customer_password(email(rng), "salt", uuid.uuid4().hex)),
+        # bookings
+        Case('create_travel_booking', 'write', new_booking),
+        Case('create_booking', 'write',
+             lambda rng: db.create_booking(email(rng), "Flight - Economy", "2026-05-01", "2026-05-08", 2, None, 40000)),
+        Case('get_customer_bookings', 'read', lambda rng: db.get_customer_bookings(email(rng))),
+        Case('list_customer_bookings', 'read',
+             lambda rng: db.list_customer_bookings(email(rng), status='confirmed', limit=20)),
+        Case('get_guest_bookings', 'read', lambda rng: db.get_guest_bookings(email(rng))),
+        Case('get_customer_dashboard', 'read', lambda rng: db.get_customer_dashboard(email(rng))),
+        Case('get_booking_analytics', 'read', lambda rng: db.get_booking_analytics()),
+        Case('reschedule_booking', 'write', lambda rng: db.reschedule_booking(*booking(rng), "2026-06-01")),
+        Case('bulk_update_bookings', 'write', bulk),
+        Case('cancel_booking', 'write', lambda rng: db.cancel_booking(*booking(rng))),  # after the reschedules
+        Case('export_bookings', 'read', lambda rng: db.export_bookings(rng.randint(0, max_booking), 1000)),
+        # conversations
+        Case('save_conversation', 'write',
+             lambda rng: db.save_conversation(*caller(rng), "user", "Benchmark message")),
+        Case('save_conversation_legacy', 'write',
+             lambda rng: db.save_conversation_legacy(*caller(rng), "assistant", "Benchmark reply")),
+        Case('queue_conversation', 'write',
+             lambda rng: db.queue_conversation(*caller(rng), "user", "Queued message")),
+        Case('flush_pending_writes', 'write', lambda rng: db.flush_pending_writes()),
+        Case('get_conversation_history', 'read', lambda rng: db.get_conversation_history(email(rng), 50)),
+        Case('get_conversation_history_legacy', 'read',
+             lambda rng: db.get_conversation_history_legacy(email(rng), 50)),
+        Case('message_sort_key', 'read',
+             lambda rng: db.message_sort_key(get_connection(db.DB_PATH), rng.choice(message_ids))),
+        Case('conversation_history_rows', 'read',
+             lambda rng: db.conversation_history_rows(get_connection(db.DB_PATH), email(rng), 50)),
+        Case('search_conversations', 'read',
+             lambda rng: db.search_conversations(rng.choice(ROUTES)[1], customer_email=email(rng))),
+        Case('export_conversations', 'read',
+             lambda rng: db.export_conversations(rng.randint(0, max_message), 1000)),
+        # livekit sessions
+        Case('record_livekit_session', 'write',
+             lambda rng: db.record_livekit_session(*(lambda r: (r[0], "Caller", r[2], r[1]))(room(rng)))),
+        Case('get_livekit_session', 'read', lambda rng: db.get_livekit_session(room(rng)[0])),
+        Case('update_livekit_session_activity', 'write',
+             lambda rng: db.update_livekit_session_activity(room(rng)[0], last_transcript_at=datetime.now())),
+        Case('queue_session_activity', 'write',
+             lambda rng: db.queue_session_activity(room(rng)[0], last_transcript_at=datetime.now())),
+        Case('get_transcript_by_session', 'read', lambda rng: db.get_transcript_by_session(room(rng)[1])),
+        Case('get_livekit_transcript', 'read', lambda rng: db.get_livekit_transcript(room(rng)[0])),
+        # stats and accessors
+        Case('get_backend', 'read', lambda rng: db.get_backend()),
+        Case('get_write_queue', 'read', lambda rng: db.get_write_queue()),
+        Case('write_queue_stats', 'read', lambda rng: db.write_queue_stats()),
+        Case('session_cache_stats', 'read', lambda rng: db.session_cache_stats()),
+        Case('transcript_archive_stats', 'read', lambda rng: db.transcript_archive_stats()),
+        Case('maintenance_stats', 'read', lambda rng: db.maintenance_stats()),
+        Case('get_maintenance_scheduler', 'read', lambda rng: db.get_maintenance_scheduler()),
+        # maintenance (whole-table jobs; dry runs keep the seeded data reusable)
+        Case('init_database', 'maintenance', lambda rng: db.init_database()),
+        Case('archive_old_transcripts', 'maintenance', lambda rng: db.archive_old_transcripts(30, dry_run=True)),
+        Case('run_database_maintenance', 'maintenance', lambda rng: db.run_database_maintenance(dry_run=True)),
+        Case('rebuild_conversation_search_index', 'maintenance', lambda rng: db.rebuild_conversation_search_index()),
+    ]
+
+
+def public_functions(db) -> List[str]:
+    return sorted(name for name, obj in vars(db).items()
+                  if inspect.isfunction(obj) and obj.__module__ == db.__name__ and not name.startswith('_'))
+
+
+# ==================== MEASUREMENT ====================
+
+def _percentile(sorted_values: List[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, int(round(pct / 100 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[rank]
+
+
+def _summary(latencies: List[float], errors: int, wall: float) -> Dict:
+    values = sorted(latencies)
+    return {
+        'calls': len(values),
+        'errors': errors,
+        'p50_ms': round(_percentile(values, 50) * 1000, 3),
+        'p99_ms': round(_percentile(values, 99) * 1000, 3),
+        'mean_ms': round(sum(values) / len(values) * 1000, 3) if values else 0.0,
+        'max_ms': round(values[-1] * 1000, 3) if values else 0.0,
+        'calls_per_second': round(len(values) / wall, 1) if wall else None,
+    }
+
+
+def _timed_calls(case: Case, calls: int, seed_value: int) -> tuple:
+    rng = random.Random(seed_value)
+    latencies, errors = [], 0
+    for _ in range(calls):
+        started = time.perf_counter()
+        try:
+            case.call(rng)
+        except Exception:
+            errors += 1
+        latencies.append(time.perf_counter() - started)
+    return latencies, errors
+
+
+def time_case(case: Case, iterations: int, threads: int) -> Dict:
+    result = {}
+    started = time.perf_counter()
+    latencies, errors = _timed_calls(case, iterations, 1)
+    result['single'] = _summary(latencies, errors, time.perf_counter() - started)
+
+    if threads > 1:
+        per_thread = max(1, iterations // threads)
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            runs = list(pool.map(lambda i: _timed_calls(case, per_thread, 100 + i), range(threads)))
+        wall = time.perf_counter() - started
+        result['concurrent'] = _summary([l for run in runs for l in run[0]], sum(run[1] for run in runs), wall)
+        result['concurrent']['threads'] = threads
+    return result
+
+
+_TABLE_REF = re.compile(r'\b(?:FROM|JOIN|UPDATE|INTO)\s+([A-Za-z_]\w*)(?:\s+(?:AS\s+)?([A-Za-z_]\w*))?', re.I)
+_NOT_ALIASES = {'where', 'on', 'set', 'join', 'left', 'inner', 'order', 'group', 'limit', 'values', 'select', 'using'}
+
+
+def plan_case(conn: sqlite3.Connection, case: Case, table_rows: Dict[str, int]) -> Dict:
+    """Run the case once with statement tracing and explain what it executed"""
+    statements: List[str] = []
+    steps = [0]
+
+    def count_steps():
+        steps[0] += 1000
+        return 0
+
+    conn.set_trace_callback(statements.append)
+    conn.set_progress_handler(count_steps, 1000)
+    try:
+        case.call(random.Random(7))
+    except Exception:
+        pass
+    finally:
+        conn.set_trace_callback(None)
+        conn.set_progress_handler(None, 0)
+
+    plans, full_scans, rows_scanned = [], set(), 0
+    for sql in statements:
+        if not re.match(r'\s*(SELECT|WITH|UPDATE|DELETE|INSERT)', sql, re.I):
+            continue
+        aliases = {}
+        for table, alias in _TABLE_REF.findall(sql):
+            aliases[table] = table
+            if alias and alias.lower() not in _NOT_ALIASES:
+                aliases[alias] = table
+        try:
+            details = [row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + sql)]
+        except sqlite3.Error as e:
+            details = [f"(not explained: {e})"]
+        plans.append({'sql': " ".join(sql.split())[:300], 'plan': details})
+        for detail in details:
+            match = re.match(r'SCAN (\w+)', detail)
+            if match and 'VIRTUAL TABLE' not in detail:
+                table = aliases.get(match.group(1), match.group(1))
+                if table in table_rows:
+                    full_scans.add(table)
+                    rows_scanned += table_rows[table]
+    return {
+        'statements': len(plans),
+        'full_scans': sorted(full_scans),
+        'rows_scanned': rows_scanned,
+        'vm_steps': steps[0],
+        'queries': plans,
+    }
+
+
+def run_benchmark(db, scale: Dict, iterations: int = 200, threads: int = 8,
+                  only: Optional[List[str]] = None, with_plans: bool = True) -> Dict:
+    """Time every case against the database module's current DB_PATH"""
+    from connection_pool import get_connection
+
+    cases = build_cases(db, scale)
+    covered = {case.name for case in cases}
+    missing = [name for name in public_functions(db) if name not in covered and name not in NOT_BENCHMARKED]
+    if only:
+        cases = [case for case in cases if case.name in only]
+
+    conn = get_connection(db.DB_PATH)
+    table_rows = {name: conn.execute(f"SELECT COUNT(*) FROM {name}").fetchone()[0]
+                  for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table' "
+                                              "AND name NOT LIKE 'sqlite_%' AND sql NOT LIKE '%VIRTUAL%'")}
+    results = []
+    for case in sorted(cases, key=lambda c: c.kind == 'maintenance'):  # whole-table jobs last
+        entry = {'name': case.name, 'kind': case.kind}
+        if case.kind == 'maintenance':
+            entry.update(time_case(case, 1, 1))
+        else:
+            entry.update(time_case(case, iterations, threads))
+        if with_plans:
+            entry['plan'] = plan_case(conn, case, table_rows)
+        db.flush_pending_writes()
+        results.append(entry)
+
+    return {
+        'meta': {
+            'started_at': datetime.now().isoformat(timespec='seconds'),
+            'scale': scale,
+            'table_rows': table_rows,
+            'iterations': iterations,
+            'threads': threads,
+            'sqlite_version': sqlite3.sqlite_version,
+            'python': platform.python_version(),
+            'cpu_count': os.cpu_count(),
+        },
+        'results': results,
+        'not_benchmarked': NOT_BENCHMARKED,
+        'uncovered': missing,
+    }
+
+
+def compare(before: Dict, after: Dict) -> List[Dict]:
+    """p50/p99 of matching cases in two result files, with after/before ratios"""
+    old = {r['name']: r for r in before['results']}
+    rows = []
+    for result in after['results']:
+        if result['name'] not in old:
+            continue
+        row = {'name': result['name']}
+        for mode in ('single', 'concurrent'):
+            if mode in result and mode in old[result['name']]:
+                for metric in ('p50_ms', 'p99_ms'):
+                    a, b = old[result['name']][mode][metric], result[mode][metric]
+                    row[f"{mode}_{metric}"] = [a, b, round(b / a, 2) if a else None]
+        rows.append(row)
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark every public function in database/database.py")
+    parser.add_argument("--scale", choices=list(SCALES), default="small")
+    parser.add_argument("--db", help="benchmark database file (default: a temporary file)")
+    parser.add_argument("--reuse", action="store_true", help="keep an already seeded --db of the same scale")
+    parser.add_argument("--iterations", type=int, default=200, help="calls per case (split across threads)")
+    parser.add_argument("--threads", type=int, default=8, help="concurrent callers")
+    parser.add_argument("--only", nargs="+", help="benchmark only these functions")
+    parser.add_argument("--no-plans", action="store_true", help="skip EXPLAIN QUERY PLAN")
+    parser.add_argument("-o", "--output", help="write results JSON here (default: stdout)")
+    parser.add_argument("--compare", nargs=2, metavar=("BEFORE", "AFTER"), help="compare two result files")
+    args = parser.parse_args()
+
+    if args.compare:
+        with open(args.compare[0]) as f_before, open(args.compare[1]) as f_after:
+            print(json.dumps(compare(json.load(f_before), json.load(f_after)), indent=2))
+        sys.exit(0)
+
+    scale = SCALES[args.scale]
+    db_path = args.db or os.path.join(tempfile.mkdtemp(), "bench.db")
+    reuse = args.reuse and seeded_scale(db_path) == scale
+    if not reuse and os.path.exists(db_path):
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(db_path + suffix):
+                os.remove(db_path + suffix)
+
+    # database.py creates its schema on import, at CUSTOMERS_DB_PATH
+    os.environ["CUSTOMERS_DB_PATH"] = db_path
+    os.environ["DATABASE_URL"] = ""
+    import database
+
+    if not reuse:
+        print(f"Seeding {db_path} ({args.scale})...", file=sys.stderr)
+        print(json.dumps(seed(db_path, scale)), file=sys.stderr)
+    report = run_benchmark(database, scale, args.iterations, args.threads, args.only, not args.no_plans)
+    report['meta']['db_path'] = db_path
+    database.shutdown_write_queue()
+
+    text = json.dumps(report, indent=2, default=str)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text)
+        for result in report['results']:
+            single, concurrent = result['single'], result.get('concurrent', {})
+            print(f"{result['name']:36} p50 {single['p50_ms']:>9.3f} ms  p99 {single['p99_ms']:>9.3f} ms"
+                  + (f"  | x{concurrent['threads']} p99 {concurrent['p99_ms']:>9.3f} ms" if concurrent else "")
+                  + (f"  scans {','.join(result['plan']['full_scans'])}" if result.get('plan', {}).get('full_scans') else ""),
+                  file=sys.stderr)
+        print(f"Results written to {args.output}", file=sys.stderr)
+    else:
+        print(text)
@@ -0,0 +1,108 @@
+"""
+Micro-benchmark for email rendering (app/api/email_templates.py)
+
+Renders a synthetic call transcript (2,000 messages by default) the way
+send_conversation_transcript_email does, and compares it with the previous
+approach of growing one string with `+=` per message card. Reports the
+median and best time over --repeat runs (HTML only, which is what the old
+code produced, and HTML plus the plain-text part) and the size of the parts.
+
+Usage:
+    python tests/benchmark_email_templates.py
+    python tests/benchmark_email_templates.py --messages 10000 --repeat 5
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+from typing import Callable, Dict, List
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'app', 'api'))  # app/api/config.py, not the config/ package
+
+
+def make_transcript(messages: int) -> List[Dict]:
+    speakers = ("user", "assistant", "assistant", "system")
+    return [
+        {
+            'speaker': speakers[i % len(speakers)],
+            'text': f"Message {i}: I would like a Business class seat from Chennai to Riyadh on the 14th & back.",
+            'created_at': f"2025-05-01T10:{i // 60 % 60:02d}:{i % 60:02d}.000000",
+        }
+        for i in range(messages)
+    ]
+
+
+def legacy_transcript_html(transcripts: List[Dict]) -> str:
+    """Previous implementation: one f-string card appended per message, then the page around it"""
+    from email_templates import TEMPLATES
+    from utils import _SPEAKER_STYLES, _SYSTEM_STYLE
+
+    page = TEMPLATES['transcript.html'].render(
+        {'customer_name': "Benchmark Guest", 'room_name': "bench-room", 'messages': "\0"})
+    head, tail = page.split("\0")
+
+    transcript_html = ""
+    for msg in transcripts:
+        style = _SPEAKER_STYLES.get(msg.get('speaker', 'unknown'), _SYSTEM_STYLE)
+        timestamp = msg.get('created_at', '')
+        transcript_html += f"""
+            <div style="margin: 20px auto; max-width: 600px; background: white; border-radius: 16px;
+                        box-shadow: 0 8px 24px {style['shadow_color']}; overflow: hidden; transition: transform 0.2s;">
+                <div style="background: {style['gradient']}; padding: 16px 20px; display: flex; align-items: center; justify-content: space-between;">
+                    <div style="display: flex; align-items: center; gap: 12px;">
+                        <span style="font-size: 1.8rem;">{style['icon']}</span>
+                        <div>
+                            <strong style="color: white; font-size: 1.1rem; display: block;">{style['speaker_label']}</strong>
+                            <span style="color: rgba(255,255,255,0.8); font-size: 0.75rem;">{timestamp[:19] if timestamp else 'Just now'}</span>
+                        </div>
+                    </div>
+                </div>
+                <div style="padding: 20px 24px; background: white;">
+                    <p style="margin: 0; color: {style['text_color']}; line-height: 1.7; font-size: 1rem;">{msg.get('text', '')}</p>
+                </div>
+            </div>
+            """
+    return f"{head}{transcript_html}{tail}"
+
+
+def time_it(func: Callable[[], object], repeat: int) -> Dict:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - started) * 1000)
+    return {'median_ms': round(statistics.median(timings), 3), 'best_ms': round(min(timings), 3)}
+
+
+def run_benchmark(messages: int = 2000, repeat: int = 20) -> Dict:
+    from email_templates import render
+    from utils import _transcript_messages, build_conversation_transcript_email
+
+    transcripts = make_transcript(messages)
+    _, html_body, text_body = build_conversation_transcript_email("Benchmark Guest", transcripts, "bench-room")
+    report = {
+        'messages': messages,
+        'repeat': repeat,
+        'html_bytes': len(html_body.encode('utf-8')),
+        'text_bytes': len(text_body.encode('utf-8')) if text_body else 0,
+        'legacy_concat': time_it(lambda: legacy_transcript_html(transcripts), repeat),
+        'templates_html': time_it(
+            lambda: render("transcript", customer_name="Benchmark Guest", room_name="bench-room",
+                           messages=_transcript_messages(transcripts)), repeat),
+        'templates_html_and_text': time_it(
+            lambda: build_conversation_transcript_email("Benchmark Guest", transcripts, "bench-room"), repeat),
+    }
+    report['speedup_html'] = round(report['legacy_concat']['median_ms']
+                                   / max(report['templates_html']['median_ms'], 1e-6), 2)
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark transcript email rendering")
+    parser.add_argument("--messages", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+    print(json.dumps(run_benchmark(args.messages, args.repeat), indent=2))
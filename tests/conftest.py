@@ -0,0 +1,30 @@
+"""
+Shared pytest fixtures
+"""
+import os
+import sys
+import tempfile
+
+import pytest
+
+ROOT = os.path.join(os.path.dirname(__file__), '..')
+
+# Point the database module at a throwaway file before it is imported
+# (database.py initializes its schema on import).
+os.environ.setdefault("CUSTOMERS_DB_PATH", os.path.join(tempfile.mkdtemp(), "customers.db"))
+sys.path.append(os.path.join(ROOT, 'database'))
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    """Fresh, initialized database module backed by a temporary file"""
+    import database
+    from connection_pool import close_all_connections
+
+    monkeypatch.setattr(database, "DB_PATH", str(tmp_path / "customers.db"))
+    monkeypatch.setattr(database, "DATABASE_URL", "")
+    database._session_cache.invalidate()
+    database.init_database()
+    yield database
+    database.shutdown_write_queue()
+    close_all_connections(database.DB_PATH)
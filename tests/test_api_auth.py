@@ -0,0 +1,154 @@
+"""
+API access control tests: session tokens and admin-only endpoints
+"""
+import os
+import sys
+
+import pytest
+
+for module in ("fastapi", "httpx", "jose", "dotenv", "multipart"):
+    pytest.importorskip(module)
+
+# app/api first so `config` is app/api/config.py, not the top-level config/ package
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'app', 'api'))
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+import api  # noqa: E402
+from session_tokens import SessionTokens  # noqa: E402
+
+ADMIN_KEY = "test-admin-key"
+TOKENS = SessionTokens(secret="test-secret")
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(api, "ADMIN_API_KEY", ADMIN_KEY)
+    monkeypatch.setattr(api, "session_tokens", TOKENS)
+    monkeypatch.setattr(api, "get_customer_bookings", lambda email: [{'customer_email': email}])
+    return TestClient(api.app)
+
+
+def bearer(email, tokens=TOKENS):
+    token = tokens.issue({'id': 1, 'email': email, 'name': "Test"})['access_token']
+    return {"Authorization": f"Bearer {token}"}
+
+
+def test_tokens_are_optional_by_default(client):
+    assert client.get("/my_bookings/alice@example.com").status_code == 200
+    assert client.get("/my_bookings/alice@example.com", headers=bearer("alice@example.com")).status_code == 200
+    # Expired, garbled or signed by another key: served as if no token was sent
+    for headers in ({"Authorization": "Bearer junk"}, bearer("alice@example.com", SessionTokens(secret="other"))):
+        assert client.get("/my_bookings/alice@example.com", headers=headers).status_code == 200
+
+    response = client.get("/my_bookings/bob@example.com", headers=bearer("alice@example.com"))
+    assert response.status_code == 403
+
+
+def test_required_tokens(client, monkeypatch):
+    monkeypatch.setattr(api, "REQUIRE_AUTH_TOKENS", True)
+
+    assert client.get("/my_bookings/alice@example.com").status_code == 401
+    response = client.get("/my_bookings/alice@example.com", headers={"Authorization": "Bearer junk"})
+    assert response.status_code == 401 and response.headers["WWW-Authenticate"] == "Bearer"
+    assert client.get("/my_bookings/Alice@Example.com", headers=bearer("alice@example.com")).status_code == 200
+    assert client.get("/my_bookings/bob@example.com", headers=bearer("alice@example.com")).status_code == 403
+    assert client.get("/flight_classes").status_code == 200  # only per-customer paths are guarded
+
+
+def test_posted_customer_email_must_match_the_token(client, monkeypatch):
+    monkeypatch.setattr(api, "cancel_booking", lambda booking_id, email: {'success': True})
+    monkeypatch.setattr(api, "reschedule_booking", lambda booking_id, email, *dates: {'success': True})
+    monkeypatch.setattr(api, "bulk_update_bookings",
+                        lambda email, operations: {'success': True, 'succeeded': 1, 'failed': 0})
+    calls = [("/cancel_booking", {'booking_id': 1}),
+             ("/reschedule_booking", {'booking_id': 1, 'new_departure_date': "2025-07-01"}),
+             ("/bookings/bulk", {'operations': [{'op': "cancel", 'booking_id': 1}]})]
+
+    for path, body in calls:
+        assert client.post(path, json={**body, 'customer_email': "alice@example.com"}).status_code == 200
+        response = client.post(path, json={**body, 'customer_email': "Alice@Example.com"},
+                               headers=bearer("alice@example.com"))
+        assert response.status_code == 200
+        response = client.post(path, json={**body, 'customer_email': "bob@example.com"},
+                               headers=bearer("alice@example.com"))
+        assert response.status_code == 403
+    response = client.post("/cancel_booking/1", params={'customer_email': "bob@example.com"},
+                           headers=bearer("alice@example.com"))
+    assert response.status_code == 403
+
+    monkeypatch.setattr(api, "REQUIRE_AUTH_TOKENS", True)
+    response = client.post("/cancel_booking", json={'booking_id': 1, 'customer_email': "alice@example.com"})
+    assert response.status_code == 401
+
+
+def test_refresh_issues_a_new_pair(client, monkeypatch):
+    async def credentials(email):
+        return {'id': 1, 'email': email, 'name': "Alice"} if email == "alice@example.com" else None
+    monkeypatch.setattr(api.adb, "get_customer_credentials", credentials)
+    issued = TOKENS.issue({'id': 1, 'email': "alice@example.com", 'name': "Alice"})
+
+    response = client.post("/auth/refresh", json={'refresh_token': issued['refresh_token']})
+    assert response.status_code == 200
+    assert TOKENS.verify(response.json()['access_token'])['sub'] == "alice@example.com"
+    assert client.post("/auth/refresh", json={'refresh_token': issued['access_token']}).status_code == 401
+    gone = TOKENS.issue({'id': 2, 'email': "gone@example.com"})['refresh_token']
+    assert client.post("/auth/refresh", json={'refresh_token': gone}).status_code == 401
+
+
+def test_search_is_scoped_to_the_callers_own_calls(client, monkeypatch):
+    searches = []
+    monkeypatch.setattr(api, "search_conversations",
+                        lambda q, customer_email=None, **kwargs: searches.append(customer_email)
+                        or {'results': [], 'has_more': False, 'archived_sessions': 0})
+
+    assert client.get("/search/conversations", params={'q': "riyadh"}).status_code == 401
+    response = client.get("/search/conversations", params={'q': "riyadh", 'customer_email': "bob@example.com"},
+                          headers=bearer("alice@example.com"))
+    assert response.status_code == 200 and searches == ["alice@example.com"]
+
+    # Support staff may search everyone, or one customer
+    client.get("/search/conversations", params={'q': "riyadh"}, headers={"X-Admin-Key": ADMIN_KEY})
+    client.get("/search/conversations", params={'q': "riyadh", 'customer_email': "bob@example.com"},
+               headers={"X-Admin-Key": ADMIN_KEY})
+    assert searches[1:] == [None, "bob@example.com"]
+
+    def bad_date(*args, **kwargs):
+        raise ValueError("Invalid date '03/01/2025', expected YYYY-MM-DD or an ISO timestamp")
+    monkeypatch.setattr(api, "search_conversations", bad_date)
+    response = client.get("/search/conversations", params={'q': "riyadh", 'date_from': "03/01/2025"},
+                          headers={"X-Admin-Key": ADMIN_KEY})
+    assert response.status_code == 400
+
+
+def test_admin_endpoints_need_the_admin_key(client, monkeypatch):
+    monkeypatch.setattr(api, "get_booking_analytics", lambda *args: {'revenue_by_day': []})
+
+    assert client.get("/admin/analytics").status_code == 401
+    assert client.get("/admin/analytics", headers={"X-Admin-Key": "wrong"}).status_code == 401
+    assert client.get("/admin/analytics", headers=bearer("alice@example.com")).status_code == 401
+    assert client.get("/admin/analytics", headers={"X-Admin-Key": ADMIN_KEY}).status_code == 200
+
+    monkeypatch.setattr(api, "export_stream", lambda *args, **kwargs: iter([b'{"id": 1}\n']))
+    assert client.get("/export/bookings").status_code == 401
+    response = client.get("/export/bookings", headers={"X-Admin-Key": ADMIN_KEY})
+    assert response.status_code == 200 and response.content == b'{"id": 1}\n'
+
+    monkeypatch.setattr(api, "run_database_maintenance",
+                        lambda dry_run: {'dry_run': dry_run, 'pages_freed': 0, 'duration_ms': 1})
+    assert client.post("/db/maintenance/run").status_code == 401
+    response = client.post("/db/maintenance/run", params={'dry_run': True}, headers={"X-Admin-Key": ADMIN_KEY})
+    assert response.status_code == 200 and response.json()['report']['dry_run'] is True
+
+    monkeypatch.setattr(api, "ADMIN_API_KEY", "")
+    assert client.get("/admin/analytics", headers={"X-Admin-Key": ""}).status_code == 403
+
+
+def test_non_ascii_reset_token_is_a_bad_request(client, monkeypatch):
+    async def credentials(email):
+        return {'reset_token': "abc123", 'reset_token_expiry': None}
+    monkeypatch.setattr(api.adb, "get_customer_credentials", credentials)
+
+    response = client.post("/reset_password", json={'token': "abç123", 'email': "alice@example.com",
+                                                    'new_password': "s3cret!"})
+    assert response.status_code == 400
@@ -0,0 +1,146 @@
+"""
+Voice agent booking outbox tests
+"""
+import asyncio
+import importlib.util
+import os
+import pickle
+import sys
+
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'agent'))
+
+from booking_outbox import BookingOutbox, DeliveryError, HttpSender  # noqa: E402
+
+pytestmark = pytest.mark.agent
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeBackend:
+    """Records delivered bookings; failures are queued per confirmation number"""
+
+    def __init__(self):
+        self.delivered = []
+        self.failures = {}
+
+    async def send(self, payload):
+        pending = self.failures.get(payload['confirmation_number'])
+        if pending:
+            raise pending.pop(0)
+        self.delivered.append(payload['confirmation_number'])
+        return {'success': True, 'booking_id': len(self.delivered)}
+
+
+@pytest.fixture
+def outbox(tmp_path):
+    backend, clock = FakeBackend(), FakeClock()
+    box = BookingOutbox(str(tmp_path / "outbox.db"), send=backend.send, clock=clock)
+    return box, backend, clock
+
+
+def _enqueue(box, room, key):
+    return box.enqueue(room, key, {'confirmation_number': key, 'customer_email': 'a@example.com'})
+
+
+def test_enqueue_is_idempotent_and_delivers_once(outbox):
+    box, backend, _ = outbox
+    assert _enqueue(box, "room-1", "INV1")
+    assert not _enqueue(box, "room-1", "INV1")
+
+    assert asyncio.run(box.deliver_now("INV1")) == {'success': True, 'booking_id': 1}
+    assert asyncio.run(box.deliver_now("INV1")) is None
+    assert asyncio.run(box.drain_once()) == 0
+    assert backend.delivered == ["INV1"]
+    assert box.stats()['sent'] == 1
+
+
+def test_room_order_is_kept_across_retries(outbox):
+    box, backend, clock = outbox
+    backend.failures["A1"] = [DeliveryError("timeout")]
+    for key in ("A1", "A2"):
+        _enqueue(box, "room-a", key)
+    _enqueue(box, "room-b", "B1")
+
+    # A2 waits behind A1 in the same room; the other room is not held up
+    assert asyncio.run(box.deliver_now("A2")) is None
+    asyncio.run(box.drain_once())
+    assert backend.delivered == ["B1"]
+
+    # A1 backs off before it is retried
+    assert asyncio.run(box.drain_once()) == 0
+    assert box.stats()['retrying'] == 1
+    clock.now += 2
+    asyncio.run(box.drain_once())
+    asyncio.run(box.drain_once())
+    assert backend.delivered == ["B1", "A1", "A2"]
+
+
+def test_permanent_failure_is_parked_without_blocking_the_room(outbox):
+    box, backend, _ = outbox
+    backend.failures["P1"] = [DeliveryError("Customer not found", retryable=False)]
+    _enqueue(box, "room-p", "P1")
+    _enqueue(box, "room-p", "P2")
+
+    asyncio.run(box.drain_once())
+    asyncio.run(box.drain_once())
+    assert backend.delivered == ["P2"]
+    assert box.failed()[0]['confirmation_number'] == "P1"
+
+    assert box.requeue_failed() == 1
+    asyncio.run(box.drain_once())
+    assert backend.delivered == ["P2", "P1"]
+
+
+def test_startup_replays_bookings_left_by_a_dead_worker(outbox, tmp_path):
+    box, backend, clock = outbox
+    _enqueue(box, "room-r", "R1")
+    box._claim()  # leased by a worker that then died mid-delivery
+
+    restarted = BookingOutbox(box.path, send=backend.send, clock=clock)
+    assert asyncio.run(restarted.drain_once()) == 0  # lease still held
+    clock.now += 31
+
+    async def replay():
+        stop = asyncio.Event()
+        task = asyncio.create_task(restarted.run(stop))
+        while not backend.delivered:
+            await asyncio.sleep(0.01)
+        stop.set()
+        restarted.notify()
+        await task
+
+    asyncio.run(asyncio.wait_for(replay(), 5))
+    assert backend.delivered == ["R1"]
+    assert restarted.stats()['pending'] == 0
+
+
+def test_http_sender_survives_pickling(tmp_path):
+    box = BookingOutbox(str(tmp_path / "outbox.db"), send=HttpSender("http://backend:8000/", timeout=3))
+    copy = pickle.loads(pickle.dumps(box))
+    assert copy.send.url == "http://backend:8000/create_flight_booking"
+    assert copy.send.timeout == 3
+
+
+def test_agent_entrypoint_is_picklable(monkeypatch):
+    """LiveKit pickles the entrypoint into each job process (spawn/forkserver)"""
+    for module in ("livekit.agents", "aiohttp", "dotenv"):
+        pytest.importorskip(module)
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    monkeypatch.setenv("DEEPGRAM_API_KEY", "test")
+    path = os.path.join(os.path.dirname(__file__), '..', 'agent', 'agent.py')
+    spec = importlib.util.spec_from_file_location("voice_agent", path)
+    voice_agent = importlib.util.module_from_spec(spec)
+    monkeypatch.setitem(sys.modules, "voice_agent", voice_agent)
+    spec.loader.exec_module(voice_agent)
+
+    monkeypatch.setenv("TRAVEL_BACKEND_URL", "http://backend:8000")
+    entrypoint = pickle.loads(pickle.dumps(voice_agent.VoiceAssistant().entrypoint))
+    assert entrypoint.__self__.backend_url == "http://backend:8000"
@@ -0,0 +1,636 @@
+"""
+Database layer tests
+"""
+import threading
+
+import pytest
+
+pytestmark = pytest.mark.database
+
+
+def test_connections_are_reused_per_thread(db):
+    """Each thread keeps one pooled connection with the tuning pragmas applied"""
+    from connection_pool import get_connection
+
+    conn = get_connection(db.DB_PATH)
+    assert get_connection(db.DB_PATH) is conn
+    assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    assert conn.execute("PRAGMA synchronous").fetchone()[0] == 1  # NORMAL
+
+    other = []
+    thread = threading.Thread(target=lambda: other.append(get_connection(db.DB_PATH)))
+    thread.start()
+    thread.join()
+    assert other[0] is not conn
+
+
+def test_failed_write_does_not_leave_transaction_open(db):
+    """A failing DAO write rolls back instead of poisoning the pooled connection"""
+    from connection_pool import get_connection
+
+    db.get_or_create_customer("alice@example.com", "Alice")
+    with pytest.raises(Exception):
+        db.save_conversation("alice@example.com", None, "user", "hello")
+
+    assert not get_connection(db.DB_PATH).in_transaction
+
+
+def test_booking_round_trip(db):
+    """Bookings can be created, listed and cancelled through the DAO functions"""
+    db.get_or_create_customer("alice@example.com", "Alice")
+    booking = db.create_travel_booking("alice@example.com", "Flight", "Chennai to Riyadh",
+                                       "2025-01-15", total_amount=10000)
+
+    bookings = db.get_customer_bookings("alice@example.com")
+    assert [b['booking_id'] for b in bookings] == [booking['booking_id']]
+
+    result = db.cancel_booking(booking['booking_id'], "alice@example.com")
+    assert result['success']
+    assert db.get_customer_bookings("alice@example.com")[0]['status'] == 'cancelled'
+
+
+def test_migrations_are_recorded_and_idempotent(db):
+    """init_database applies every migration once and records the schema version"""
+    from migrations import MIGRATIONS, migration_status
+
+    status = migration_status(db.DB_PATH)
+    assert status['current_version'] == MIGRATIONS[-1][0]
+    assert status['pending'] == []
+    assert db.init_database() == []
+
+
+def test_hot_path_queries_use_indexes(db):
+    """Transcript, history and booking lookups are index searches, not table scans"""
+    from connection_pool import get_connection
+
+    conn = get_connection(db.DB_PATH)
+    queries = [
+        "SELECT id FROM conversations WHERE session_id = ? AND id > ? ORDER BY id",
+        "SELECT id FROM conversations WHERE customer_email = ? ORDER BY created_at",
+        "SELECT id FROM travel_bookings WHERE customer_email = ? ORDER BY created_at DESC",
+    ]
+    for query in queries:
+        plan = " ".join(row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {query}", ("x", 0)[:query.count("?")]))
+        assert "USING INDEX" in plan or "USING COVERING INDEX" in plan, plan
+
+
+def test_write_behind_queue_group_commits(db):
+    """Queued transcript rows land in one batch and are visible after a flush"""
+    db.record_livekit_session("room-1", "caller", session_id="session-1")
+    for i in range(5):
+        db.queue_conversation("alice@example.com", "session-1", "user", f"message {i}")
+    db.queue_session_activity("room-1", customer_email="alice@example.com")
+    db.flush_pending_writes(timeout=5)
+
+    assert [t['text'] for t in db.get_transcript_by_session("session-1")] == [f"message {i}" for i in range(5)]
+    assert db.get_livekit_session("room-1")['customer_email'] == "alice@example.com"
+    stats = db.write_queue_stats()
+    assert stats['rows_written'] == 5 and stats['batches'] <= 2
+
+
+def test_write_behind_queue_wait_and_shutdown(db):
+    """wait=True gives read-your-writes and shutdown flushes whatever is pending"""
+    db.queue_conversation("alice@example.com", "session-1", "user", "hello", wait=True)
+    assert len(db.get_transcript_by_session("session-1")) == 1
+
+    db.queue_conversation("alice@example.com", "session-1", "assistant", "hi there")
+    db.shutdown_write_queue()
+    assert len(db.get_transcript_by_session("session-1")) == 2
+
+
+def test_write_behind_queue_fails_fast_on_non_transient_errors(tmp_path):
+    """Errors other than locked/busy fail the waiters instead of retrying forever"""
+    import sqlite3
+    from connection_pool import close_all_connections
+    from write_queue import WriteBehindQueue, _is_transient
+
+    assert _is_transient(sqlite3.OperationalError("database is locked"))
+    assert not _is_transient(sqlite3.OperationalError("disk I/O error"))
+
+    path = str(tmp_path / "empty.db")  # no conversations table
+    queue = WriteBehindQueue(path, flush_interval_ms=5)
+    try:
+        with pytest.raises(sqlite3.OperationalError, match="no such table"):
+            queue.add_conversation("alice@example.com", "s", "user", "hi", "en", None, wait=True, timeout=5)
+        stats = queue.stats()
+        assert (stats['retries'], stats['rows_dropped'], stats['pending_conversations']) == (0, 1, 0)
+    finally:
+        queue.stop()
+        close_all_connections(path)
+
+
+
+def test_write_behind_queue_retries_the_final_flush(tmp_path):
+    """A locked database during the shutdown flush is retried instead of dropping the tail"""
+    import sqlite3
+    from connection_pool import close_all_connections
+    from write_queue import WriteBehindQueue
+
+    path = str(tmp_path / "locked.db")
+    queue = WriteBehindQueue(path, flush_interval_ms=5)
+    written, failures = [], [sqlite3.OperationalError("database is locked")] * 2
+
+    def flush_once(conversations, sessions):
+        if failures:
+            raise failures.pop()
+        written.extend(conversations)
+    queue._flush_once = flush_once
+    try:
+        with queue._cond:  # hold the flusher back so the rows are only written by stop()
+            queue._conversations.append(("alice@example.com", "s", "user", "bye", "en", None))
+        queue.stop()
+        assert len(written) == 1 and queue.stats()['retries'] == 2
+    finally:
+        close_all_connections(path)
+
+def test_conversation_history_pairs_and_paginates(db):
+    """History pairs user/assistant rows newest first and pages with a keyset cursor"""
+    messages = [("user", "hi"), ("assistant", "hello"), ("user", "flights?"),
+                ("user", "to Riyadh"), ("assistant", "sure"), ("assistant", "extra")]
+    for message_type, text in messages:
+        db.save_conversation("alice@example.com", "session-1", message_type, text)
+
+    first = db.get_conversation_history("alice@example.com", limit=2)
+    assert [(c['user_message'], c['ai_response']) for c in first] == [
+        ("to Riyadh", "sure"), ("flights?", "No response")]
+
+    rest = db.get_conversation_history("alice@example.com", limit=2, before=first[-1]['message_id'])
+    assert [(c['user_message'], c['ai_response']) for c in rest] == [("hi", "hello")]
+
+
+def test_list_customer_bookings_filters_projects_and_pages(db):
+    """Booking listings filter by status, project fields and page with opaque cursors"""
+    db.get_or_create_customer("alice@example.com", "Alice")
+    ids = [db.create_travel_booking("alice@example.com", "Flight", "Chennai to Riyadh",
+                                    f"2025-01-{day:02d}", total_amount=day)['booking_id']
+           for day in range(1, 6)]
+    db.cancel_booking(ids[0], "alice@example.com")
+
+    page = db.list_customer_bookings("alice@example.com", status="confirmed", limit=3,
+                                     fields=["booking_id", "total_amount"])
+    assert page['bookings'] == [{'booking_id': ids[i], 'total_amount': i + 1} for i in (4, 3, 2)]
+
+    rest = db.list_customer_bookings("alice@example.com", status="confirmed", limit=3,
+                                     cursor=page['next_cursor'], fields=["booking_id"])
+    assert rest == {'bookings': [{'booking_id': ids[1]}], 'next_cursor': None}
+
+    ranged = db.list_customer_bookings("alice@example.com", departure_from="2025-01-02",
+                                       departure_to="2025-01-03")
+    assert [b['booking_id'] for b in ranged['bookings']] == [ids[2], ids[1]]
+
+    with pytest.raises(ValueError):
+        db.list_customer_bookings("alice@example.com", fields=["password_hash"])
+    with pytest.raises(ValueError):
+        db.list_customer_bookings("alice@example.com", cursor="not-a-cursor")
+
+
+def test_async_facade_runs_off_the_event_loop(db):
+    """adb.<function> awaits the DAO call on the DB executor and records the wait"""
+    import asyncio
+    from async_db import AsyncDB
+
+    adb = AsyncDB(workers=2)
+
+    async def scenario():
+        await adb.record_livekit_session("room-1", "caller", session_id="session-1")
+        return await adb.get_livekit_session("room-1")
+
+    try:
+        session = asyncio.run(scenario())
+    finally:
+        adb.shutdown()
+
+    assert session['session_id'] == "session-1"
+    metrics = adb.metrics.snapshot()
+    assert metrics['get_livekit_session']['calls'] == 1
+    assert metrics['record_livekit_session']['errors'] == 0
+
+
+def test_session_cache_stays_coherent_with_writes(db):
+    """Cached room -> session mappings are refreshed by record and activity updates"""
+    db.record_livekit_session("room-1", "caller", session_id="session-1")
+    assert db.get_livekit_session("room-1")['customer_email'] is None
+
+    db.update_livekit_session_activity("room-1", customer_email="alice@example.com")
+    assert db.get_livekit_session("room-1")['customer_email'] == "alice@example.com"
+
+    db.queue_session_activity("room-1", customer_email="bob@example.com", wait=True)
+    assert db.get_livekit_session("room-1")['customer_email'] == "bob@example.com"
+
+    db.record_livekit_session("room-1", "caller", session_id="session-2")
+    assert db.get_livekit_session("room-1")['session_id'] == "session-2"
+    assert db.session_cache_stats()['hits'] >= 3
+
+
+def test_livekit_transcript_single_query_with_fallback(db):
+    """Transcripts resolve through the room mapping, or the room name when unmapped"""
+    db.record_livekit_session("room-1", "caller", customer_email="alice@example.com",
+                              session_id="session-1")
+    for text in ("one", "two", "three"):
+        db.save_conversation("alice@example.com", "session-1", "user", text)
+    db.save_conversation("bob@example.com", "room-2", "user", "unmapped")
+
+    full = db.get_livekit_transcript("room-1")
+    assert full['session_id'] == "session-1"
+    assert [t['text'] for t in full['transcripts']] == ["one", "two", "three"]
+
+    incremental = db.get_livekit_transcript("room-1", since_id=full['transcripts'][0]['id'], limit=1)
+    assert [t['text'] for t in incremental['transcripts']] == ["two"]
+
+    unmapped = db.get_livekit_transcript("room-2")
+    assert (unmapped['session_id'], unmapped['customer_email']) == ("room-2", "bob@example.com")
+
+    missing = db.get_livekit_transcript("room-3")
+    assert missing == {'room_name': "room-3", 'session_id': None, 'customer_email': None,
+                       'participant_name': None, 'transcripts': []}
+
+
+def test_single_statement_writes_keep_their_return_shapes(db):
+    """RETURNING-based writes return the same dicts as before"""
+    assert db.create_travel_booking("nobody@example.com", "Flight", "X to Y",
+                                    "2025-01-01") == {"error": "Customer not found"}
+
+    first = db.record_livekit_session("room-1", "caller", session_id="session-1",
+                                      metadata={"source": "web"})
+    assert first['session_id'] == "session-1" and first['metadata'] == {"source": "web"}
+
+    merged = db.record_livekit_session("room-1", "caller", customer_email="alice@example.com")
+    assert (merged['session_id'], merged['customer_email']) == ("session-1", "alice@example.com")
+    assert merged['metadata'] == {"source": "web"}
+
+
+def test_conversation_search_ranks_filters_and_tracks_writes(db):
+    """FTS search finds confirmation numbers and cities, honours filters and deletes"""
+    from connection_pool import get_connection
+
+    db.save_conversation("alice@example.com", "s1", "assistant", "Your confirmation is ATR-48213 for Riyadh")
+    db.save_conversation("bob@example.com", "s2", "user", "I want to fly to Riyadh, then Jeddah")
+    db.queue_conversation("bob@example.com", "s2", "user", "Riyadh Riyadh Riyadh please", wait=True)
+
+    hits = db.search_conversations("ATR-48213")['results']
+    assert [h['customer_email'] for h in hits] == ["alice@example.com"]
+    assert "<mark>ATR-48213</mark>" in hits[0]["snippet"]
+
+    riyadh = db.search_conversations("riyadh")['results']
+    assert riyadh[0]['snippet'].count("<mark>") == 3  # best match first
+    assert len(db.search_conversations("riyadh", customer_email="bob@example.com")['results']) == 2
+    assert db.search_conversations("riyadh", date_to="2000-01-01")['results'] == []
+
+    conn = get_connection(db.DB_PATH)
+    with conn:
+        conn.execute("DELETE FROM conversations WHERE session_id = 's2'")
+    assert len(db.search_conversations("riyadh")['results']) == 1
+    assert db.rebuild_conversation_search_index() == 1
+
+
+def test_booking_rollups_track_writes_and_match_backfill(db):
+    """Dashboard rollups follow create/cancel/reschedule and equal a fresh backfill"""
+    from connection_pool import get_connection
+    from migrations import _v6_booking_rollups
+
+    db.get_or_create_customer("alice@example.com", "Alice")
+    first = db.create_travel_booking("alice@example.com", "Flight", "Chennai to Riyadh",
+                                     "2025-01-15", total_amount=10000)
+    db.create_travel_booking("alice@example.com", "Flight", "Chennai to Riyadh",
+                             "2025-02-01", total_amount=5000)
+    db.create_travel_booking("alice@example.com", "Hotel", "Dubai", "2025-03-01", total_amount=2500)
+    assert db.cancel_booking(first['booking_id'], "alice@example.com")['success']
+    assert not db.cancel_booking(first['booking_id'], "alice@example.com")['success']
+    assert db.reschedule_booking(first['booking_id'] + 1, "alice@example.com", "2025-02-10")['success']
+
+    dashboard = db.get_customer_dashboard("alice@example.com")
+    stats = dashboard['stats']
+    assert (stats['total_bookings'], stats['cancelled_bookings'], stats['upcoming_trips']) == (2, 1, 2)
+    assert stats['total_spent'] == 7500
+    assert stats['rescheduled_bookings'] == 1
+    assert dashboard['status_distribution'] == {'confirmed': 2, 'cancelled': 1}
+    assert dashboard['top_destinations'][0] == {'destination': 'Chennai to Riyadh', 'count': 2}
+    assert [m['amount'] for m in dashboard['monthly_spending']] == [17500]
+    assert [m['active_amount'] for m in dashboard['monthly_spending']] == [7500]
+    assert len(dashboard['recent_bookings']) == 3
+
+    # Rebuilding from travel_bookings gives the same numbers as the incremental path
+    conn = get_connection(db.DB_PATH)
+    with conn:
+        _v6_booking_rollups(conn.cursor())
+    rebuilt = db.get_customer_dashboard("alice@example.com")
+    assert {k: v for k, v in rebuilt['stats'].items() if k not in ('updated_at', 'rescheduled_bookings')} == \
+           {k: v for k, v in stats.items() if k not in ('updated_at', 'rescheduled_bookings')}
+    assert rebuilt['status_distribution'] == dashboard['status_distribution']
+    assert rebuilt['monthly_spending'] == dashboard['monthly_spending']
+
+    assert db.get_customer_dashboard("nobody@example.com")['stats']['total_bookings'] == 0
+
+
+
+def test_admin_analytics_rollups_track_writes_and_match_backfill(db):
+    """Daily revenue, route and class rollups follow the write path and equal a fresh backfill"""
+    from connection_pool import get_connection
+    from migrations import _v9_booking_daily_analytics
+
+    for email in ("alice@example.com", "bob@example.com"):
+        db.get_or_create_customer(email)
+    first = db.create_travel_booking("alice@example.com", "Flight", "Chennai to Riyadh", "2025-01-15",
+                                     service_details="Air India - Business Class - Window seat - Veg meal",
+                                     total_amount=25000)
+    db.create_travel_booking("bob@example.com", "Flight", "Chennai to Riyadh", "2025-01-20",
+                             service_details="Saudia - Economy Class - Aisle seat - No preference meal",
+                             total_amount=10000)
+    db.create_travel_booking("bob@example.com", "Flight", "Mumbai to Jeddah", "2025-02-01",
+                             service_details="Economy", total_amount=8000)
+    db.create_travel_booking("alice@example.com", "Hotel", "Dubai", "2025-03-01", total_amount=2500)
+    assert db.cancel_booking(first['booking_id'], "alice@example.com")['success']
+
+    report = db.get_booking_analytics()
+    assert report['totals'] == {'bookings': 4, 'cancelled_bookings': 1, 'cancellation_rate': 0.25,
+                                'gross_amount': 45500, 'revenue': 20500}
+    assert [(d['bookings'], d['revenue']) for d in report['revenue_per_day']] == [(4, 20500)]
+    assert report['routes'][0] == {'origin': 'Chennai', 'destination': 'Riyadh', 'bookings': 2,
+                                   'cancelled_bookings': 1, 'cancellation_rate': 0.5, 'revenue': 10000}
+    assert {r['destination']: r['origin'] for r in report['routes'][1:]} == {'Dubai': None, 'Jeddah': 'Mumbai'}
+    assert {c['travel_class']: c['bookings'] for c in report['class_mix']} == \
+           {'Economy': 2, 'Business': 1, 'Unspecified': 1}
+
+    assert db.get_booking_analytics("2020-01-01", "2020-01-31")['totals']['bookings'] == 0
+    with pytest.raises(ValueError):
+        db.get_booking_analytics("2025-02-01", "2025-01-01")
+
+    conn = get_connection(db.DB_PATH)
+    with conn:
+        _v9_booking_daily_analytics(conn.cursor())
+    assert db.get_booking_analytics() == report
+
+def test_old_sessions_are_archived_and_read_back_transparently(db):
+    """The tiering job compresses idle sessions; transcript reads merge them back in"""
+    from datetime import datetime, timedelta
+    from connection_pool import get_connection
+    from transcript_archive import archive_old_sessions
+
+    old = datetime.now() - timedelta(days=30)
+    db.record_livekit_session("room-old", "Caller", None, session_id="old-session")
+    for i in range(40):
+        db.save_conversation("old@example.com", "old-session", "user" if i % 2 == 0 else "assistant",
+                             f"Message {i} about the Riyadh flight", created_at=old + timedelta(seconds=i))
+    db.save_conversation("new@example.com", "new-session", "user", "still hot")
+    before = db.get_transcript_by_session("old-session", limit=0)
+
+    assert archive_old_sessions(db.DB_PATH, 7, dry_run=True)['rows_archived'] == 40
+    report = db.archive_old_transcripts(7)
+    assert (report['sessions_archived'], report['rows_archived']) == (1, 40)
+    assert 0 < report['compressed_bytes'] < report['raw_bytes']
+    assert report['bytes_reclaimed'] >= 0
+    assert db.transcript_archive_stats()['archived_messages'] == 40
+
+    conn = get_connection(db.DB_PATH)
+    assert conn.execute("SELECT COUNT(*) FROM conversations WHERE session_id = 'old-session'").fetchone()[0] == 0
+    assert db.get_transcript_by_session("new-session")[0]['text'] == "still hot"
+
+    # Reads are unchanged, including paging with since_id and a late hot row
+    assert db.get_transcript_by_session("old-session", limit=0) == before
+    assert db.get_transcript_by_session("old-session", limit=5, since_id=before[9]['id']) == before[10:15]
+    db.save_conversation("old@example.com", "old-session", "user", "back again")
+    merged = db.get_transcript_by_session("old-session", limit=0)
+    assert merged[:-1] == before and merged[-1]['text'] == "back again"
+
+    transcript = db.get_livekit_transcript("room-old", limit=3)
+    assert [t['id'] for t in transcript['transcripts']] == [t['id'] for t in before[:3]]
+
+    # Chat history pages across the archive; search reports what it could not cover
+    history = db.get_conversation_history("old@example.com", limit=3)
+    assert [h['user_message'] for h in history] == ["back again", "Message 38 about the Riyadh flight",
+                                                    "Message 36 about the Riyadh flight"]
+    assert history[1]['ai_response'] == "Message 39 about the Riyadh flight"
+    pages = db.get_conversation_history("old@example.com", limit=15, before=history[-1]['message_id'])
+    assert len(pages) == 15 and pages[-1]['user_message'] == "Message 6 about the Riyadh flight"
+    rest = db.get_conversation_history("old@example.com", limit=15, before=pages[-1]['message_id'])
+    assert [h['user_message'] for h in rest] == [f"Message {i} about the Riyadh flight" for i in (4, 2, 0)]
+    found = db.search_conversations("riyadh", customer_email="old@example.com")
+    assert (found['results'], found['archived_sessions']) == ([], 1)
+    assert db.search_conversations("riyadh", date_from=str(datetime.now().date()))['archived_sessions'] == 0
+
+    # Unmapped rooms recover the customer email from the archive
+    db.save_conversation("orphan@example.com", "room-orphan", "user", "hi", created_at=old)
+    db.archive_old_transcripts(7)
+    fallback = db.get_livekit_transcript("room-orphan")
+    assert (fallback['session_id'], fallback['customer_email']) == ("room-orphan", "orphan@example.com")
+
+
+def test_maintenance_sweeps_expired_rows_and_reports_pages_freed(db):
+    """TTL rules remove old sessions, guest transcripts and reset tokens; vacuum frees pages"""
+    from datetime import datetime, timedelta
+    from connection_pool import get_connection
+    from maintenance import GUEST_EMAIL, MaintenanceScheduler, parse_window, window_start
+
+    old = datetime.now() - timedelta(days=60)
+    conn = get_connection(db.DB_PATH)
+    db.record_livekit_session("room-stale", "Caller", GUEST_EMAIL)
+    db.record_livekit_session("room-live", "Caller", "alice@example.com")
+    with conn:
+        conn.execute("UPDATE livekit_sessions SET updated_at = ? WHERE room_name = 'room-stale'", (old,))
+    for i in range(300):
+        db.save_conversation(GUEST_EMAIL, "room-stale", "user", "x" * 500, created_at=old)
+    db.save_conversation(GUEST_EMAIL, "room-live", "user", "recent guest message")
+    db.save_conversation("alice@example.com", "room-old", "user", "kept", created_at=old)
+    db.create_customer("alice@example.com", "Alice", "salt", "hash")
+    db.create_customer("bob@example.com", "Bob", "salt", "hash")
+    db.set_password_reset_token("alice@example.com", "expired", datetime.now() - timedelta(hours=1))
+    db.set_password_reset_token("bob@example.com", "valid", datetime.now() + timedelta(hours=1))
+
+    assert db.get_livekit_session("room-stale") is not None  # now cached
+    dry = db.run_database_maintenance(dry_run=True)
+    assert dry['deleted']['guest_messages'] == 300
+
+    report = db.run_database_maintenance()
+    deleted = report['deleted']
+    assert (deleted['livekit_sessions'], deleted['guest_messages'], deleted['reset_tokens']) == (1, 300, 1)
+    assert report['vacuum']['auto_vacuum'] == "incremental"
+    assert report['pages_freed'] > 0 and report['vacuum']['freelist_pages_after'] == 0
+    assert report['duration_ms'] >= 0
+
+    assert db.get_livekit_session("room-stale") is None
+    assert db.get_livekit_session("room-live") is not None
+    assert [m['text'] for m in db.get_transcript_by_session("room-live")] == ["recent guest message"]
+    assert len(db.get_transcript_by_session("room-old")) == 1
+    assert db.get_customer_credentials("alice@example.com")['reset_token'] is None
+    assert db.get_customer_credentials("bob@example.com")['reset_token'] == "valid"
+    assert db.maintenance_stats()['runs'] == 1
+
+    # Off-peak scheduling: once per window, including windows that wrap midnight
+    window = parse_window("23:00-02:00")
+    assert window_start(datetime(2025, 1, 2, 1, 30), window) == datetime(2025, 1, 1, 23, 0)
+    assert window_start(datetime(2025, 1, 2, 12, 0), window) is None
+    now = [datetime(2025, 1, 2, 3, 0)]
+    scheduler = MaintenanceScheduler(db.DB_PATH, "02:00-05:00", clock=lambda: now[0])
+    assert scheduler._tick() is not None
+    now[0] += timedelta(hours=1)
+    assert scheduler._tick() is None
+    now[0] += timedelta(days=1)
+    assert scheduler._tick() is not None
+
+
+def test_sharded_mode_routes_by_key_and_rebalances(db, tmp_path, monkeypatch):
+    """Transcripts land on the shard owning their session; cross-shard reads merge; rebalance keeps ids"""
+    from datetime import datetime, timedelta
+    from connection_pool import get_connection
+    from sharding import rebalance, shard_for, shard_paths
+
+    # Rows written before sharding was enabled, moved out of the main file below
+    base = datetime(2025, 3, 1, 9, 0)
+    db.save_conversation("carol@example.com", "legacy-session", "user", "legacy question", created_at=base)
+    db.save_conversation("carol@example.com", "legacy-session", "assistant", "legacy answer",
+                         created_at=base + timedelta(seconds=1))
+    db.record_livekit_session("room-legacy", "Carol", "carol@example.com", session_id="legacy-session")
+
+    directory = str(tmp_path / "shards")
+    moved = rebalance([db.DB_PATH], directory, 3, drop_source=True)
+    assert moved['copied'] == {'conversations': 2, 'livekit_sessions': 1, 'conversation_archive': 0}
+
+    monkeypatch.setattr(db, "DATABASE_URL", f"sqlite+sharded://{directory}?shards=3")
+    db._session_cache.invalidate()
+    db.init_database()
+    backend = db.get_backend()
+    assert backend.name == "sqlite-sharded"
+
+    for i in range(12):
+        session = f"session-{i}"
+        db.save_conversation("carol@example.com", session, "user", f"question {i} about Riyadh",
+                             created_at=base + timedelta(minutes=i + 1))
+        db.queue_conversation("carol@example.com", session, "assistant", f"answer {i}",
+                              created_at=base + timedelta(minutes=i + 1, seconds=1))
+    db.flush_pending_writes()
+
+    # Each session lives on exactly one shard, and ids never collide across shards
+    paths = shard_paths(directory, 3)
+    ids = []
+    for index, path in enumerate(paths):
+        rows = get_connection(path).execute("SELECT id, session_id FROM conversations").fetchall()
+        assert all(shard_for(session, 3) == index for _, session in rows)
+        ids.extend(row_id for row_id, _ in rows)
+    assert len(ids) == len(set(ids)) == 26
+    assert get_connection(db.DB_PATH).execute("SELECT COUNT(*) FROM conversations").fetchone()[0] == 0
+
+    assert [t['text'] for t in db.get_transcript_by_session("session-4")] == ["question 4 about Riyadh", "answer 4"]
+    legacy = db.get_livekit_transcript("room-legacy")
+    assert (legacy['session_id'], len(legacy['transcripts'])) == ("legacy-session", 2)
+
+    # Scatter-gather history pages in global (created_at, id) order
+    page = db.get_conversation_history("carol@example.com", limit=5)
+    assert [p['user_message'] for p in page] == [f"question {i} about Riyadh" for i in range(11, 6, -1)]
+    assert page[0]['ai_response'] == "answer 11"
+    rest = db.get_conversation_history("carol@example.com", limit=50, before=page[-1]['message_id'])
+    assert [p['user_message'] for p in rest][-1] == "legacy question" and len(rest) == 8
+
+    hits = db.search_conversations("Riyadh", limit=4)
+    assert len(hits['results']) == 4 and hits['has_more']
+
+    # Rebalancing to another layout keeps every row and its id
+    db.flush_pending_writes()
+    db.close_backend()
+    report = rebalance(paths, directory, 5, drop_source=True)
+    assert report['copied']['conversations'] == 26 and sum(report['rows_per_shard']) == 26
+    monkeypatch.setattr(db, "DATABASE_URL", f"sqlite+sharded://{directory}?shards=5")
+    db._session_cache.invalidate()
+    db.init_database()
+    assert db.get_conversation_history("carol@example.com", limit=5) == page
+    db.save_conversation("carol@example.com", "session-new", "user", "after rebalance")
+    new_id = db.get_transcript_by_session("session-new")[0]['id']
+    assert new_id not in ids
+    db.close_backend()
+
+
+def test_export_stream_is_resumable_and_includes_archived_rows(db):
+    """NDJSON/CSV export pages by id, merges the archive in order and gzips on the fly"""
+    import csv
+    import gzip
+    import io
+    import json
+    from datetime import datetime, timedelta
+    from export import export_stream
+
+    old = datetime.now() - timedelta(days=30)
+    for i in range(7):
+        db.save_conversation("old@example.com", f"s{i % 2}", "user", f"old {i}", created_at=old + timedelta(seconds=i))
+    db.archive_old_transcripts(7)
+    for i in range(5):
+        db.save_conversation("new@example.com", "s-new", "user", f"new {i}")
+
+    lines = b"".join(export_stream("conversations", batch_size=3)).decode().splitlines()
+    rows = [json.loads(line) for line in lines]
+    assert [r['message_text'] for r in rows] == [f"old {i}" for i in range(7)] + [f"new {i}" for i in range(5)]
+    assert [r['session_id'] for r in rows[:2]] == ["s0", "s1"]
+
+    # Resume after the 4th row, gzip-compressed
+    resumed = gzip.decompress(b"".join(export_stream("conversations", after_id=rows[3]['id'],
+                                                     compress=True, batch_size=4)))
+    assert [json.loads(line)['id'] for line in resumed.decode().splitlines()] == [r['id'] for r in rows[4:]]
+
+    today = datetime.now().strftime('%Y-%m-%d')
+    recent = b"".join(export_stream("conversations", "csv", date_from=today)).decode()
+    assert [r['message_text'] for r in csv.DictReader(io.StringIO(recent))] == [f"new {i}" for i in range(5)]
+
+    assert b"".join(export_stream("bookings", "csv")).decode().startswith("id,customer_email,service_type")
+    with pytest.raises(ValueError):
+        export_stream("customers")
+    with pytest.raises(ValueError):
+        export_stream("bookings", date_from="last week")
+
+
+def test_analytics_snapshots_append_only_new_rows(db, tmp_path):
+    """Parquet snapshots are partitioned by month and each run appends only new rows"""
+    pytest.importorskip("pyarrow")
+    import pyarrow.dataset as ds
+    from datetime import datetime, timedelta
+    from snapshots import build_snapshots
+
+    def read(name):
+        return ds.dataset(str(tmp_path / name), partitioning="hive").to_table().to_pylist()
+
+    db.get_or_create_customer("alice@example.com", "Alice")
+    db.create_travel_booking("alice@example.com", "Flight", "Chennai to Riyadh", "2030-01-01", total_amount=500)
+    db.record_livekit_session("room-1", "Alice", "alice@example.com", session_id="call-1")
+    start = datetime.now() - timedelta(hours=2)
+    for i, lang in enumerate(["en-US", "en-US", "ta-IN"]):
+        db.save_conversation("alice@example.com", "call-1", "user" if i % 2 == 0 else "assistant",
+                             f"message {i}", language=lang, created_at=start + timedelta(minutes=i))
+    db.save_conversation("alice@example.com", "call-live", "user", "still talking")
+
+    first = build_snapshots(str(tmp_path))
+    assert first['datasets']['travel_bookings']['rows'] == 1
+    month = datetime.now().strftime('%Y-%m')
+    assert list((tmp_path / "travel_bookings").iterdir())[0].name == f"month={month}"
+    [stats] = read("transcript_stats")  # the live call is not idle yet
+    assert (stats['session_id'], stats['message_count'], stats['user_messages']) == ("call-1", 3, 2)
+    assert stats['duration_seconds'] == 120 and stats['languages'] == "en-US,ta-IN"
+
+    db.create_travel_booking("alice@example.com", "Hotel", "Dubai", "2030-02-01", total_amount=200)
+    second = build_snapshots(str(tmp_path))
+    assert second['datasets']['travel_bookings']['rows'] == 1
+    assert second['datasets']['livekit_sessions']['rows'] == 0
+    assert sorted(r['destination'] for r in read("travel_bookings")) == ["Chennai to Riyadh", "Dubai"]
+
+    # Once idle, the pending call is written on a later run
+    third = build_snapshots(str(tmp_path), idle_minutes=0)
+    assert third['datasets']['transcript_stats']['rows'] == 1
+    assert sorted(r['session_id'] for r in read("transcript_stats")) == ["call-1", "call-live"]
+    assert len(read("travel_bookings")) == 2
+
+
+def test_benchmark_suite_covers_every_public_function(db):
+    """The DAO benchmark runs end to end at a tiny scale and times every public function"""
+    from tests.benchmark_database import NOT_BENCHMARKED, run_benchmark, seed
+
+    scale = {'customers': 30, 'bookings': 200, 'messages': 800}
+    seeded = seed(db.DB_PATH, scale)
+    assert seeded['rows']['conversations'] == 800
+
+    report = run_benchmark(db, scale, iterations=4, threads=2)
+    assert report['uncovered'] == []
+    results = {r['name']: r for r in report['results']}
+    assert set(results) | set(NOT_BENCHMARKED) >= {'get_customer_dashboard', 'search_conversations', 'shard_scope'}
+    assert all(r['single']['errors'] == 0 for r in results.values())
+    assert results['get_conversation_history']['concurrent']['calls'] == 4
+    # Request-path reads stay on indexes
+    for name in ('get_customer_dashboard', 'get_conversation_history', 'get_livekit_transcript',
+                 'list_customer_bookings', 'get_booking_analytics'):
+        assert results[name]['plan']['full_scans'] == [], name
+    assert results['rebuild_conversation_search_index']['plan']['rows_scanned'] >= 800
@@ -0,0 +1,132 @@
+"""
+Email dispatcher tests
+"""
+import os
+import smtplib
+import socket
+import sys
+import threading
+
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'app', 'api'))
+
+import email_dispatcher  # noqa: E402
+from email_dispatcher import EmailDispatcher  # noqa: E402
+
+SETTINGS = {'server': 'smtp.test', 'port': 587, 'username': 'user', 'password': 'pw',
+            'from_email': 'noreply@test', 'starttls': False}
+
+
+class FakeSMTP:
+    """Stands in for an authenticated smtplib.SMTP connection; failures are queued per recipient"""
+
+    def __init__(self, outbox, failures):
+        self.outbox = outbox
+        self.failures = failures
+        self.closed = False
+
+    def send_message(self, msg):
+        pending = self.failures.get(msg['To'])
+        if pending:
+            raise pending.pop(0)
+        self.outbox.append(msg['To'])
+
+    def quit(self):
+        self.closed = True
+
+    close = quit
+
+
+@pytest.fixture
+def fake_smtp(monkeypatch):
+    monkeypatch.setattr(email_dispatcher, "BACKOFF_BASE_SECONDS", 0.01)
+    sent, failures, connections = [], {}, []
+
+    def connect():
+        connections.append(FakeSMTP(sent, failures))
+        return connections[-1]
+
+    dispatcher = EmailDispatcher(SETTINGS, workers=1, max_queued=50, connect=connect)
+    yield dispatcher, sent, failures, connections
+    dispatcher.stop()
+
+
+def test_connection_is_reused_across_messages(fake_smtp):
+    dispatcher, sent, _, connections = fake_smtp
+    for i in range(5):
+        assert dispatcher.enqueue(f"c{i}@example.com", "Booking", "<p>hi</p>")
+    assert dispatcher.flush(5)
+
+    assert sent == [f"c{i}@example.com" for i in range(5)]
+    assert len(connections) == 1
+    stats = dispatcher.stats()
+    assert (stats['sent'], stats['queue_depth'], stats['connections_opened']) == (5, 0, 1)
+
+
+def test_transient_errors_retry_on_a_new_connection_permanent_ones_do_not(fake_smtp):
+    dispatcher, sent, failures, connections = fake_smtp
+    failures["a@example.com"] = [smtplib.SMTPServerDisconnected("gone")]
+    failures["bad@example.com"] = [smtplib.SMTPRecipientsRefused({"bad@example.com": (550, b"no such user")})]
+
+    dispatcher.enqueue("a@example.com", "Reset", "<p>a</p>")
+    dispatcher.enqueue("bad@example.com", "Reset", "<p>b</p>")
+    assert dispatcher.flush(5)
+
+    assert sent == ["a@example.com"]
+    assert connections[0].closed and len(connections) == 2
+    assert not connections[1].closed
+    stats = dispatcher.stats()
+    assert (stats['sent'], stats['failed'], stats['retries']) == (1, 1, 1)
+
+
+def test_full_queue_and_missing_config_fail_fast():
+    release = threading.Event()
+
+    class Blocking(FakeSMTP):
+        def send_message(self, msg):
+            release.wait(5)
+
+    dispatcher = EmailDispatcher(SETTINGS, workers=1, max_queued=1,
+                                 connect=lambda: Blocking([], {}))
+    try:
+        accepted = [dispatcher.enqueue("x@example.com", "s", "b") for _ in range(5)]
+        assert accepted.count(False) >= 3
+        assert dispatcher.stats()['dropped'] == accepted.count(False)
+    finally:
+        release.set()
+        dispatcher.stop()
+
+    unconfigured = EmailDispatcher({**SETTINGS, 'password': None})
+    assert not unconfigured.configured
+    assert not unconfigured.enqueue("x@example.com", "s", "b")
+
+
+def test_delivers_to_a_local_smtp_server():
+    controller_module = pytest.importorskip("aiosmtpd.controller")
+    from aiosmtpd.smtp import AuthResult
+
+    received = []
+
+    class Handler:
+        async def handle_DATA(self, server, session, envelope):
+            received.append(envelope.rcpt_tos[0])
+            return "250 OK"
+
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    controller = controller_module.Controller(
+        Handler(), hostname="127.0.0.1", port=port, auth_require_tls=False,
+        authenticator=lambda *args: AuthResult(success=True))
+    controller.start()
+    dispatcher = EmailDispatcher({**SETTINGS, 'server': "127.0.0.1", 'port': port}, workers=2)
+    try:
+        for i in range(4):
+            dispatcher.enqueue(f"guest{i}@example.com", "Summary", "<p>summary</p>", text_body="summary")
+        assert dispatcher.flush(10)
+        assert sorted(received) == [f"guest{i}@example.com" for i in range(4)]
+        assert dispatcher.stats()['connections_opened'] <= 2
+    finally:
+        dispatcher.stop()
+        controller.stop()
@@ -0,0 +1,56 @@
+"""
+Email template engine tests
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'app', 'api'))
+
+import email_templates  # noqa: E402
+from email_templates import TEMPLATES, Template, render, render_fragment, render_text, stream  # noqa: E402
+
+CARD = {'icon': "👤", 'speaker_label': "You", 'gradient': "red", 'shadow_color': "blue",
+        'text_color': "#000", 'timestamp': "2025-05-01T10:00:00"}
+
+
+def test_every_email_has_html_and_plain_text_templates():
+    names = {name.rsplit('.', 1)[0] for name in TEMPLATES}
+    assert names == {"booking_confirmation", "password_reset", "transcript", "transcript_message", "summary"}
+    assert all(f"{name}.txt" in TEMPLATES and f"{name}.html" in TEMPLATES for name in names)
+
+
+def test_values_are_escaped_unless_safe():
+    template = Template("t.html", "<p>{{ a }}</p>{{ b|safe }}{ literal }", autoescape=True)
+    assert template.render({'a': "<b>&", 'b': "<i>"}) == "<p>&lt;b&gt;&amp;</p><i>{ literal }"
+    assert Template("t.txt", "{{ a }}", autoescape=False).render({'a': "<b>"}) == "<b>"
+
+    with pytest.raises(ValueError):
+        Template("t.html", "{{ a }}{{ a|safe }}", autoescape=True)
+    with pytest.raises(KeyError, match="reset_link"):
+        render("password_reset")
+
+
+def test_long_transcript_renders_every_message_once():
+    cards = [render_fragment("transcript_message", {**CARD, 'text': f"msg {i} <script>"}) for i in range(2000)]
+    context = {'customer_name': "Guest", 'room_name': "room-1"}
+
+    body = render("transcript", messages=iter(cards), **context)
+    assert body.count("&lt;script&gt;") == 2000 and "<script>" not in body
+    assert body.index("msg 0 ") < body.index("msg 1999 ")
+    assert "".join(stream("transcript", {**context, 'messages': iter(cards)})) == body
+
+
+def test_plain_text_part_can_be_disabled(monkeypatch):
+    assert "https://reset" in render_text("password_reset", reset_link="https://reset")
+    monkeypatch.setattr(email_templates, "PLAIN_TEXT_PARTS", False)
+    assert render_text("password_reset", reset_link="https://reset") is None
+
+
+def test_transcript_benchmark_runs():
+    pytest.importorskip("dotenv")  # utils imports config, which loads .env
+    from tests.benchmark_email_templates import run_benchmark
+
+    report = run_benchmark(messages=200, repeat=2)
+    assert report['html_bytes'] > 200 * 500 and report['text_bytes'] > 0
@@ -0,0 +1,62 @@
+"""
+Auth process-pool password hashing tests
+"""
+import asyncio
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'app', 'api'))
+
+from password_hasher import AuthBusy, PasswordHasher, hashes_match, pbkdf2_hex  # noqa: E402
+
+
+@pytest.fixture
+def hasher():
+    pool = PasswordHasher(workers=2, queue_timeout=5)
+    yield pool
+    pool.shutdown()
+
+
+def test_pool_hashes_match_the_stored_format(hasher):
+    async def scenario():
+        salt, digest = await hasher.hash_password("s3cret!")
+        assert digest == pbkdf2_hex("s3cret!", salt)
+        assert await hasher.verify_password("s3cret!", salt, digest)
+        assert not await hasher.verify_password("wrong", salt, digest)
+        assert not await hasher.verify_password("s3cret!", salt, None)
+        return salt, digest
+
+    salt, digest = asyncio.run(scenario())
+    assert hashes_match("s3cret!", salt, digest)  # sync path used by scripts
+
+
+def test_workers_are_spawned_at_start(hasher):
+    hasher.start()
+    assert hasher.stats()['running']
+    assert hasher._executor._mp_context.get_start_method() == "spawn"
+
+
+def test_concurrent_hashes_are_capped_and_measured(hasher):
+    async def burst():
+        return await asyncio.gather(*(hasher.hash_password(f"pw{i}") for i in range(6)))
+
+    assert len({digest for _, digest in asyncio.run(burst())}) == 6
+    stats = hasher.stats()
+    assert (stats['hashes'], stats['in_flight'], stats['rejected']) == (6, 0, 0)
+    assert stats['avg_hash_ms'] > 0
+    assert stats['max_queue_wait_ms'] > 0  # 6 callers, 2 slots
+
+
+def test_queue_timeout_raises_auth_busy():
+    hasher = PasswordHasher(workers=1, queue_timeout=0.05)
+
+    async def saturated():
+        hasher._gates[asyncio.get_running_loop()] = asyncio.Semaphore(0)  # every slot taken
+        await hasher.verify_password("pw", "salt", "hash")
+
+    with pytest.raises(AuthBusy):
+        asyncio.run(saturated())
+    assert hasher.stats()['rejected'] == 1
+    assert not hasher.stats()['running']  # rejected before touching the pool
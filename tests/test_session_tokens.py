@@ -0,0 +1,99 @@
+"""
+Signed session token tests
+"""
+import os
+import sys
+import time
+
+import pytest
+
+pytest.importorskip("jose")
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'app', 'api'))
+
+from session_tokens import SessionTokens, TokenError  # noqa: E402
+
+CUSTOMER = {'id': 7, 'email': "Asha@Example.com", 'name': "Asha"}
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1_700_000_000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+
+@pytest.fixture
+def tokens(clock):
+    return SessionTokens(secret="test-secret", access_ttl=60, refresh_ttl=3600, cache_size=2, clock=clock)
+
+
+def test_login_tokens_verify_and_are_cached(tokens):
+    issued = tokens.issue(CUSTOMER)
+    assert issued['token_type'] == "bearer" and issued['expires_in'] == 60
+
+    claims = tokens.verify(issued['access_token'])
+    assert (claims['sub'], claims['name'], claims['cid'], claims['typ']) == ("asha@example.com", "Asha", 7, "access")
+    assert tokens.verify(issued['access_token']) is claims  # served from the cache
+    stats = tokens.stats()
+    assert (stats['verified'], stats['cache_hits'], stats['cached']) == (1, 1, 1)
+
+
+def test_cache_is_bounded(tokens):
+    access = [tokens.issue({**CUSTOMER, 'email': f"c{i}@example.com"})['access_token'] for i in range(3)]
+    for token in access:
+        tokens.verify(token)
+    assert tokens.stats()['cached'] == 2
+    tokens.verify(access[0])  # evicted, so verified again
+    assert tokens.stats()['verified'] == 4
+
+
+def test_expired_tampered_and_wrong_type_tokens_are_rejected(tokens, clock):
+    issued = tokens.issue(CUSTOMER)
+    tokens.verify(issued['access_token'])
+
+    with pytest.raises(TokenError, match="access"):
+        tokens.verify(issued['refresh_token'])
+    with pytest.raises(TokenError, match="refresh"):
+        tokens.refresh_claims(issued['access_token'])
+    with pytest.raises(TokenError):
+        tokens.verify(issued['access_token'][:-2] + "xx")
+    with pytest.raises(TokenError):
+        SessionTokens(secret="other-secret").verify(issued['access_token'])
+
+    clock.now += 61
+    with pytest.raises(TokenError, match="expired"):
+        tokens.verify(issued['access_token'])  # cached claims still honour exp
+    assert tokens.refresh_claims(issued['refresh_token'])['sub'] == "asha@example.com"
+    assert tokens.stats()['cached'] == 0
+
+
+def test_cached_check_is_much_cheaper_than_a_password_hash(tokens):
+    from password_hasher import pbkdf2_hex
+
+    token = tokens.issue(CUSTOMER)['access_token']
+    tokens.verify(token)
+    started = time.perf_counter()
+    for _ in range(1000):
+        tokens.verify(token)
+    per_check = (time.perf_counter() - started) / 1000
+
+    started = time.perf_counter()
+    pbkdf2_hex("s3cret!", "salt")
+    assert per_check * 100 < time.perf_counter() - started
+
+
+def test_placeholder_secret_disables_tokens(monkeypatch):
+    monkeypatch.setenv("SECRET_KEY", "your-secret-key-here")
+    tokens = SessionTokens()
+    assert not tokens.enabled and tokens.issue(CUSTOMER) == {}
+
+    issued = SessionTokens(secret="test-secret").issue(CUSTOMER)
+    with pytest.raises(TokenError, match="disabled"):
+        tokens.verify(issued['access_token'])
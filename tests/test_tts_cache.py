@@ -0,0 +1,93 @@
+"""
+TTS audio cache tests
+"""
+import os
+import sys
+import threading
+import time
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'app', 'api'))
+
+from tts_cache import TTSCache, cache_key  # noqa: E402
+
+FORMAT = "riff-16khz-16bit-mono-pcm"
+
+
+class FakeAzure:
+    def __init__(self, delay=0.0):
+        self.calls = []
+        self.delay = delay
+
+    def synthesizer(self, text, voice):
+        def synthesize():
+            self.calls.append((text, voice))
+            time.sleep(self.delay)
+            return f"{voice}:{text}".encode("utf-8") * 10
+        return synthesize
+
+
+def test_repeated_phrases_are_served_from_memory_then_disk(tmp_path):
+    azure = FakeAzure()
+    cache = TTSCache(tmp_path, memory_budget=1 << 20, disk_budget=1 << 20)
+
+    first = cache.get_or_synthesize("Welcome!", "en-US-AriaNeural", FORMAT, azure.synthesizer("Welcome!", "en-US-AriaNeural"))
+    again = cache.get_or_synthesize("Welcome!", "en-US-AriaNeural", FORMAT, azure.synthesizer("Welcome!", "en-US-AriaNeural"))
+    other_voice = cache.get_or_synthesize("Welcome!", "hi-IN-SwaraNeural", FORMAT, azure.synthesizer("Welcome!", "hi-IN-SwaraNeural"))
+    assert first == again != other_voice
+    assert len(azure.calls) == 2
+
+    # A restarted process finds the audio on disk
+    restarted = TTSCache(tmp_path, memory_budget=1 << 20, disk_budget=1 << 20)
+    assert restarted.get("Welcome!", "en-US-AriaNeural", FORMAT) == first
+    assert restarted.get("Welcome!", "en-US-AriaNeural", FORMAT) == first
+    stats = restarted.stats()
+    assert (stats['disk_hits'], stats['memory_hits'], stats['disk']['entries']) == (1, 1, 2)
+    assert stats['chars_saved'] == 2 * len("Welcome!")
+    assert (tmp_path / cache_key("Welcome!", "en-US-AriaNeural", FORMAT)[:2]).is_dir()
+
+
+def test_budgets_evict_least_recently_used(tmp_path):
+    azure = FakeAzure()
+    cache = TTSCache(tmp_path, memory_budget=150, disk_budget=250)
+    for phrase in ("a" * 10, "b" * 10, "c" * 10):  # 120 bytes of audio each
+        cache.get_or_synthesize(phrase, "v", FORMAT, azure.synthesizer(phrase, "v"))
+
+    stats = cache.stats()
+    assert stats['memory']['entries'] == 1 and stats['memory']['bytes'] <= 150
+    assert stats['disk']['entries'] == 2 and stats['disk']['bytes'] <= 250
+    assert cache.get("a" * 10, "v", FORMAT) is None  # oldest clip evicted from both levels
+    assert len(list(tmp_path.glob("*/*.audio"))) == 2
+
+
+def test_failures_are_not_cached_and_concurrent_misses_synthesize_once(tmp_path):
+    cache = TTSCache(tmp_path)
+    assert cache.get_or_synthesize("Hi", "v", FORMAT, lambda: None) is None
+    assert cache.stats()['failures'] == 1 and cache.get("Hi", "v", FORMAT) is None
+
+    azure = FakeAzure(delay=0.05)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(
+        cache.get_or_synthesize("Booking confirmed", "v", FORMAT, azure.synthesizer("Booking confirmed", "v"))))
+        for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(azure.calls) == 1 and len(set(results)) == 1
+    assert cache.stats()['hits'] == 4
+
+
+def test_prewarm_and_disabled_cache(tmp_path):
+    azure = FakeAzure()
+    cache = TTSCache(tmp_path)
+
+    def text_to_speech(text):
+        return cache.get_or_synthesize(text, "v", FORMAT, azure.synthesizer(text, "v"))
+
+    assert cache.prewarm(["Welcome!", "Goodbye!"], text_to_speech) == 2
+    assert cache.prewarm(["Welcome!"], text_to_speech) == 1
+    assert len(azure.calls) == 2
+
+    disabled = TTSCache(tmp_path, enabled=False)
+    disabled.get_or_synthesize("Welcome!", "v", FORMAT, azure.synthesizer("Welcome!", "v"))
+    assert len(azure.calls) == 3 and disabled.stats()['hits'] == 0